@@ -0,0 +1,632 @@
+#! /usr/bin/env python3
+
+"""
+# File Name: cpe_fleet.py
+#
+# Description: A fleet of virtual CPEs that load-tests a running cwmpwalk
+#
+# Functionality:
+#  - VirtualCPE:
+#      A virtual device with its own serial number and SyntheticDataModel
+#        (synthetic_cpe.py), which Informs the ACS and answers whatever
+#        GetParameterNames and GetParameterValues it sends over its own
+#        HTTP/1.1 connection, with optional network latency, response
+#        jitter, chunked HTTP POSTs and injected CWMP Faults
+#  - ConnectionRequestListener:
+#      Listens for the Connection Requests of the VirtualCPEs (an HTTP GET
+#        with Digest authentication on each device's own URL), and starts
+#        the CWMP Session of the device that was asked to Inform
+#  - CPEFleet:
+#      Runs the VirtualCPEs concurrently in one asyncio event loop (either
+#        Informing at once, or on a Connection Request), and reports how
+#        their CWMP Sessions went
+#
+"""
+
+
+import re
+import sys
+import csv
+import time
+import hmac
+import random
+import getopt
+import asyncio
+import hashlib
+import secrets
+import urllib.parse
+
+from synthetic_cpe import (SyntheticDataModel, SyntheticCPE, DEFAULT_DEPTH, DEFAULT_FAN_OUT,
+                           DEFAULT_TABLE_INSTANCES, DEFAULT_PARAMS_PER_OBJECT, DEFAULT_VALUE_SIZE)
+
+
+# The ACS that the fleet Informs by default
+DEFAULT_ACS_URL = "http://127.0.0.1:8000/"
+
+# The number of distinct data models that the devices of a fleet are given
+DEFAULT_MODEL_COUNT = 64
+
+# Seconds that a device waits for an HTTP Response from the ACS
+HTTP_RESPONSE_TIMEOUT = 120
+
+# The Digest realm and the password of the devices' Connection Requests
+#  (the username of a device is its serial number)
+CONNECTION_REQUEST_REALM = "cpe_fleet"
+CONNECTION_REQUEST_PASSWORD = "cwmpwalk"
+
+# Seconds that the listener waits for the headers of a Connection Request
+CONNECTION_REQUEST_TIMEOUT = 10
+
+# The EventCode of the Inform that a Connection Request starts
+CONNECTION_REQUEST_EVENT = "6 CONNECTION REQUEST"
+
+# The columns of the fleet file that fleet_orchestrator.py reads
+FLEET_COLUMNS = ("DeviceId", "ConnectionRequestURL", "Username", "Password")
+
+
+
+class VirtualCPE(object):
+    """A virtual device, which runs the CWMP Session of a SyntheticCPE
+        over its own (persistent) HTTP/1.1 connection
+
+    Before each HTTP POST the device waits for the network latency plus a
+     random response jitter (in seconds).  With a chunk_size its HTTP POSTs
+     are sent chunked (Transfer-Encoding: chunked) in chunks of that size."""
+    def __init__(self, cpe, acs_url=DEFAULT_ACS_URL, latency=0.0, jitter=0.0,
+                 chunk_size=None, start_delay=0.0, seed=0):
+        """Initialize the Virtual CPE"""
+        acs_url_parts = urllib.parse.urlsplit(acs_url)
+
+        self.cpe = cpe
+        self.host = acs_url_parts.hostname
+        self.port = acs_url_parts.port or 80
+        self.netloc = acs_url_parts.netloc
+        self.path = acs_url_parts.path or "/"
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_size = chunk_size
+        self.start_delay = start_delay
+        self.random = random.Random(seed)
+        self.reader = None
+        self.writer = None
+        self.cookie = None
+        self.running = False
+        self.session_count = 0
+        self.status = None
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+        self.response_time_list = []
+
+
+    def get_cpe(self):
+        """Retrieve the SyntheticCPE of the device"""
+        return self.cpe
+
+
+    def is_running(self):
+        """Check to see if the device is in a CWMP Session (or about to start one)"""
+        return self.running
+
+    def is_complete(self):
+        """Check to see if the ACS ended the (last) CWMP Session with an HTTP 204"""
+        return self.error is None and self.status == 204
+
+    def get_session_count(self):
+        """Retrieve the number of CWMP Sessions that the device has run"""
+        return self.session_count
+
+    def get_failure(self):
+        """Retrieve why the CWMP Session failed (or None if it was completed)"""
+        if self.error is not None:
+            return self.error
+        elif self.status != 204:
+            return "HTTP {}".format(self.status)
+
+        return None
+
+    def get_session_time(self):
+        """Retrieve the seconds from the Inform to the end of the CWMP Session"""
+        if self.start_time is None or self.end_time is None:
+            return None
+
+        return self.end_time - self.start_time
+
+    def get_response_times(self):
+        """Retrieve the seconds that the ACS took to answer each HTTP POST"""
+        return self.response_time_list
+
+
+    async def run(self, event_code=None):
+        """Run the CWMP Session: Inform (with the given EventCode), then
+            answer each RPC until the ACS ends it"""
+        self.running = True
+        await asyncio.sleep(self.start_delay)
+        self.session_count += 1
+        self.status = None
+        self.error = None
+        self.start_time = time.monotonic()
+        content = self.cpe.get_inform(event_code)
+
+        try:
+            while True:
+                await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+                self.status, rpc_content = await self._post(content)
+
+                if self.status != 200:
+                    break
+
+                content = self.cpe.respond(rpc_content)
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError) as err:
+            self.error = "{}: {}".format(err.__class__.__name__, err)
+        finally:
+            self.end_time = time.monotonic()
+            await self._close()
+            self.running = False
+
+
+    async def _post(self, content):
+        """Send an HTTP POST, returning the (status, content) of the HTTP Response"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        header_list = ["POST {} HTTP/1.1".format(self.path),
+                       "Host: {}".format(self.netloc),
+                       "Content-Type: text/xml; charset=utf-8"]
+        if self.cookie is not None:
+            header_list.append("Cookie: {}".format(self.cookie))
+
+        if self.chunk_size is not None and len(content) > 0:
+            header_list.append("Transfer-Encoding: chunked")
+            self.writer.write(("\r\n".join(header_list) + "\r\n\r\n").encode("ascii"))
+
+            for index in range(0, len(content), self.chunk_size):
+                chunk = content[index:index + self.chunk_size]
+                self.writer.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+                await self.writer.drain()
+            self.writer.write(b"0\r\n\r\n")
+        else:
+            header_list.append("Content-Length: {}".format(len(content)))
+            self.writer.write(("\r\n".join(header_list) + "\r\n\r\n").encode("ascii") + content)
+
+        await self.writer.drain()
+
+        request_time = time.monotonic()
+        status, header_dict, response_content = await asyncio.wait_for(
+            self._read_response(), HTTP_RESPONSE_TIMEOUT)
+        self.response_time_list.append(time.monotonic() - request_time)
+
+        if "set-cookie" in header_dict:
+            self.cookie = header_dict["set-cookie"].split(";", 1)[0]
+        if header_dict.get("connection", "").lower() == "close":
+            await self._close()
+
+        return status, response_content
+
+    async def _read_response(self):
+        """Read an HTTP Response, returning its (status, headers, content)"""
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise EOFError("The ACS closed the connection")
+
+        status = int(status_line.split()[1])
+        header_dict = {}
+
+        while True:
+            header_line = await self.reader.readline()
+            if header_line in (b"\r\n", b"\n", b""):
+                break
+
+            header_name, _, header_value = header_line.decode("latin-1").partition(":")
+            header_dict[header_name.strip().lower()] = header_value.strip()
+
+        if "content-length" in header_dict:
+            response_content = await self.reader.readexactly(int(header_dict["content-length"]))
+        elif status == 204 or status == 304 or status < 200:
+            response_content = b""
+        else:
+            # The content ends when the ACS closes the connection
+            response_content = await self.reader.read()
+
+        return status, header_dict, response_content
+
+    async def _close(self):
+        """Close the HTTP connection"""
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.reader = None
+            self.writer = None
+
+
+
+class ConnectionRequestListener(object):
+    """Listens for the Connection Requests of a fleet's VirtualCPEs on a
+        single port, where the Connection Request URL of each device is
+        /<Device ID>
+
+    A Connection Request is an HTTP GET with Digest authentication (the
+     username is the device's serial number).  A device that is already in
+     a CWMP Session answers HTTP 503; otherwise it answers HTTP 200 and
+     Informs with the "6 CONNECTION REQUEST" EventCode.  With an
+     ignore_rate, that share of the authenticated requests is answered but
+     never followed by an Inform, as with a device behind a lossy line."""
+    def __init__(self, device_list, host="127.0.0.1", port=7547, ignore_rate=0.0, seed=0):
+        """Initialize the Connection Request Listener"""
+        self.device_dict = {device.get_cpe().get_device_id(): device for device in device_list}
+        self.host = host
+        self.port = port
+        self.ignore_rate = ignore_rate
+        self.random = random.Random(seed)
+        self.nonce_set = set()
+        self.session_task_set = set()
+        self.walked_device_set = set()
+        self.walked_event = None
+        self.request_count = 0
+        self.accepted_count = 0
+        self.ignored_count = 0
+        self.busy_count = 0
+
+
+    def get_device_url(self, device):
+        """Retrieve the Connection Request URL of a device"""
+        return "http://{}:{}/{}".format(self.host, self.port, urllib.parse.quote(device.get_cpe().get_device_id()))
+
+    def get_device_username(self, device):
+        """Retrieve the Connection Request username of a device"""
+        return device.get_cpe().get_device_id().rsplit("-", 1)[-1]
+
+    def get_request_counts(self):
+        """Retrieve the (received, accepted, ignored, busy) Connection Requests"""
+        return self.request_count, self.accepted_count, self.ignored_count, self.busy_count
+
+
+    def write_fleet_file(self, fleet_file):
+        """Write the Connection Request URL and credentials of each device to a CSV fleet file"""
+        with open(fleet_file, "w", encoding="utf-8", newline="") as fleet_fh:
+            csv_writer = csv.writer(fleet_fh)
+            csv_writer.writerow(FLEET_COLUMNS)
+            csv_writer.writerows((device_id, self.get_device_url(device), self.get_device_username(device),
+                                  CONNECTION_REQUEST_PASSWORD) for device_id, device in self.device_dict.items())
+
+
+    async def serve(self):
+        """Answer the Connection Requests until every device has completed a CWMP Session"""
+        self.walked_event = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+
+        async with server:
+            await self.walked_event.wait()
+
+        if len(self.session_task_set) > 0:
+            await asyncio.gather(*self.session_task_set)
+
+
+    async def _handle_connection(self, reader, writer):
+        """Answer a Connection Request"""
+        try:
+            request_line, header_dict = await asyncio.wait_for(_read_request(reader), CONNECTION_REQUEST_TIMEOUT)
+            method, _, request_target = request_line.partition(" ")
+            request_target = request_target.rsplit(" ", 1)[0]
+            device = self.device_dict.get(urllib.parse.unquote(request_target.lstrip("/")))
+            self.request_count += 1
+
+            if device is None:
+                status = "404 Not Found"
+            elif method != "GET":
+                status = "405 Method Not Allowed"
+            elif not self._is_authorized(device, method, header_dict.get("authorization", "")):
+                status = "401 Unauthorized"
+            elif device.is_running():
+                self.busy_count += 1
+                status = "503 Service Unavailable"
+            else:
+                status = "200 OK"
+                self.accepted_count += 1
+
+                if self.random.random() < self.ignore_rate:
+                    self.ignored_count += 1
+                else:
+                    self._start_session(device)
+
+            header_list = ["HTTP/1.1 {}".format(status), "Content-Length: 0", "Connection: close"]
+            if status.startswith("401"):
+                nonce = secrets.token_hex(16)
+                self.nonce_set.add(nonce)
+                header_list.append('WWW-Authenticate: Digest realm="{}", qop="auth", nonce="{}", '
+                                   'algorithm=MD5'.format(CONNECTION_REQUEST_REALM, nonce))
+
+            writer.write(("\r\n".join(header_list) + "\r\n\r\n").encode("ascii"))
+            await writer.drain()
+        except (OSError, EOFError, ValueError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    def _is_authorized(self, device, method, authorization):
+        """Check the Digest authentication of a Connection Request"""
+        scheme, _, credentials = authorization.partition(" ")
+        if scheme.lower() != "digest":
+            return False
+
+        field_dict = {name.lower(): quoted if quoted else token
+                      for name, quoted, token in re.findall(r'(\w+)=(?:"([^"]*)"|([^\s,]*))', credentials)}
+        if field_dict.get("username") != self.get_device_username(device) or \
+                field_dict.get("nonce") not in self.nonce_set:
+            return False
+
+        ha1 = _md5_hex("{}:{}:{}".format(field_dict["username"], CONNECTION_REQUEST_REALM,
+                                         CONNECTION_REQUEST_PASSWORD))
+        ha2 = _md5_hex("{}:{}".format(method, field_dict.get("uri", "")))
+        if "qop" in field_dict:
+            expected = _md5_hex("{}:{}:{}:{}:{}:{}".format(ha1, field_dict["nonce"], field_dict.get("nc", ""),
+                                                           field_dict.get("cnonce", ""), field_dict["qop"], ha2))
+        else:
+            expected = _md5_hex("{}:{}:{}".format(ha1, field_dict["nonce"], ha2))
+
+        if not hmac.compare_digest(expected, field_dict.get("response", "")):
+            return False
+
+        self.nonce_set.discard(field_dict["nonce"])
+        return True
+
+    def _start_session(self, device):
+        """Start the CWMP Session of a device that was sent a Connection Request"""
+        device.running = True
+        session_task = asyncio.create_task(self._run_session(device))
+        self.session_task_set.add(session_task)
+        session_task.add_done_callback(self.session_task_set.discard)
+
+    async def _run_session(self, device):
+        """Run a CWMP Session, noting when every device has completed one"""
+        await device.run(CONNECTION_REQUEST_EVENT)
+
+        if device.is_complete():
+            self.walked_device_set.add(device.get_cpe().get_device_id())
+            if len(self.walked_device_set) == len(self.device_dict):
+                self.walked_event.set()
+
+
+
+class CPEFleet(object):
+    """A fleet of VirtualCPEs that Inform the ACS at once (or spread over a
+        ramp-up time) and are run concurrently in one asyncio event loop
+
+    The devices are given model_count distinct SyntheticDataModels in turn;
+     each model has the given shape, except that its number of table
+     instances varies by up to half either way (by the model's seed), so
+     the walks of the fleet differ in size.  With a connection_request_port
+     the devices don't Inform on their own, but wait for a Connection
+     Request (see ConnectionRequestListener), and the fleet runs until each
+     of them has completed a CWMP Session."""
+    def __init__(self, device_count, acs_url=DEFAULT_ACS_URL, shape=None, model_count=DEFAULT_MODEL_COUNT,
+                 latency=0.0, jitter=0.0, chunk_size=None, fault_rate=0.0, ramp_time=0.0,
+                 connection_request_host="127.0.0.1", connection_request_port=None, ignore_rate=0.0):
+        """Generate the data models and create the devices of the fleet"""
+        shape = dict(shape or {})
+        table_instances = shape.pop("table_instances", DEFAULT_TABLE_INSTANCES)
+        self.model_list = []
+        self.device_list = []
+        self.listener = None
+        self.start_time = None
+        self.end_time = None
+
+        if connection_request_port is not None:
+            # The devices Inform when they are asked to, rather than over a ramp-up
+            ramp_time = 0.0
+
+        for seed in range(min(model_count, device_count)):
+            instance_variance = table_instances // 2
+            self.model_list.append(SyntheticDataModel(
+                table_instances=table_instances + random.Random(seed).randint(-instance_variance, instance_variance),
+                seed=seed, **shape))
+
+        for index in range(device_count):
+            cpe = SyntheticCPE(self.model_list[index % len(self.model_list)],
+                               serial_number="{:012d}".format(index + 1), fault_rate=fault_rate, seed=index)
+            self.device_list.append(VirtualCPE(cpe, acs_url, latency, jitter, chunk_size,
+                                               ramp_time * index / device_count, seed=index))
+
+        if connection_request_port is not None:
+            self.listener = ConnectionRequestListener(self.device_list, connection_request_host,
+                                                      connection_request_port, ignore_rate)
+
+
+    def get_listener(self):
+        """Retrieve the ConnectionRequestListener of the fleet (or None if the devices Inform at once)"""
+        return self.listener
+
+
+    def run(self):
+        """Run the CWMP Sessions of every device of the fleet"""
+        self.start_time = time.monotonic()
+        asyncio.run(self._run_devices())
+        self.end_time = time.monotonic()
+
+    async def _run_devices(self):
+        """Run the devices concurrently"""
+        if self.listener is not None:
+            await self.listener.serve()
+        else:
+            await asyncio.gather(*(device.run() for device in self.device_list))
+
+
+    def print_report(self):
+        """Print how the CWMP Sessions of the fleet went"""
+        completed_list = [device for device in self.device_list if device.is_complete()]
+        failed_list = [device for device in self.device_list if not device.is_complete()]
+        session_time_list = [device.get_session_time() for device in completed_list]
+        response_time_list = [response_time for device in self.device_list
+                              for response_time in device.get_response_times()]
+        rpc_count = sum(device.get_cpe().get_rpc_count() for device in self.device_list)
+        fault_count = sum(device.get_cpe().get_fault_count() for device in self.device_list)
+        wall_time = self.end_time - self.start_time
+
+        print("Devices:          {} ({} completed, {} failed)".format(
+            len(self.device_list), len(completed_list), len(failed_list)))
+        print("Wall time:        {:.2f} s".format(wall_time))
+        print("RPCs answered:    {} ({:.1f} per second, {} CWMP Faults)".format(
+            rpc_count, rpc_count / wall_time, fault_count))
+        print("Session time:     {}".format(_format_percentiles(session_time_list, 1)))
+        print("ACS response:     {}".format(_format_percentiles(response_time_list, 1000, "ms")))
+
+        if self.listener is not None:
+            print("Conn. Requests:   {} received ({} accepted, {} ignored, {} while in a session)".format(
+                *self.listener.get_request_counts()))
+
+        for device in failed_list[:10]:
+            print("  {} failed: {}".format(device.get_cpe().get_device_id(), device.get_failure()))
+        if len(failed_list) > 10:
+            print("  ... and {} more".format(len(failed_list) - 10))
+
+
+
+
+async def _read_request(reader):
+    """Read the request line and headers of an HTTP Request"""
+    request_line = await reader.readline()
+    if not request_line:
+        raise EOFError("The connection was closed")
+
+    header_dict = {}
+    while True:
+        header_line = await reader.readline()
+        if header_line in (b"\r\n", b"\n", b""):
+            break
+
+        header_name, _, header_value = header_line.decode("latin-1").partition(":")
+        header_dict[header_name.strip().lower()] = header_value.strip()
+
+    return request_line.decode("latin-1").strip(), header_dict
+
+
+def _md5_hex(text):
+    """Hash a text for HTTP Digest authentication"""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _format_percentiles(value_list, scale, unit="s"):
+    """Format the median, 95th percentile and maximum of a list of times"""
+    if len(value_list) == 0:
+        return "-"
+
+    sorted_list = sorted(value_list)
+    return "p50 {:.1f} {unit}, p95 {:.1f} {unit}, max {:.1f} {unit}".format(
+        sorted_list[len(sorted_list) // 2] * scale,
+        sorted_list[min(len(sorted_list) - 1, int(len(sorted_list) * 0.95))] * scale,
+        sorted_list[-1] * scale, unit=unit)
+
+
+
+
+def main(argv):
+    """Main CPE Fleet Driver"""
+    device_count = 100
+    acs_url = DEFAULT_ACS_URL
+    shape = {}
+    model_count = DEFAULT_MODEL_COUNT
+    latency = 0.0
+    jitter = 0.0
+    chunk_size = None
+    fault_rate = 0.0
+    ramp_time = 0.0
+    connection_request_host = "127.0.0.1"
+    connection_request_port = None
+    fleet_file = None
+    ignore_rate = 0.0
+    usage_str = ("cpe_fleet.py [-n <Devices>] [-u <ACS URL>] [-d <Depth>] [-f <Fan-Out>] "
+                 "[-i <Table Instances>] [-p <Params per Object>] [-z <Value Size>] [-M <Models>] "
+                 "[-l <Latency ms>] [-j <Jitter ms>] [-k <Chunk Bytes>] [-F <Fault %>] [-r <Ramp-up s>] "
+                 "[-C <[Host:]Port> [-D <Fleet File>] [-g <Ignore %>]]")
+
+    try:
+        opts, args = getopt.getopt(argv, "hn:u:d:f:i:p:z:M:l:j:k:F:r:C:D:g:",
+                                   ["help", "devices=", "url=", "depth=", "fan-out=", "instances=",
+                                    "params=", "value-size=", "models=", "latency=", "jitter=",
+                                    "chunked=", "faults=", "ramp=", "connection-requests=", "fleet-file=",
+                                    "ignore="])
+    except getopt.GetoptError:
+        print(usage_str)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print(usage_str)
+            print("  -n|--devices    :: Virtual devices that Inform at once (default 100)")
+            print("  -u|--url        :: The ACS URL (default {})".format(DEFAULT_ACS_URL))
+            print("  -d|--depth      :: The levels of sub-objects below the root (default {})".format(DEFAULT_DEPTH))
+            print("  -f|--fan-out    :: Named sub-objects per object (default {})".format(DEFAULT_FAN_OUT))
+            print("  -i|--instances  :: Table instances per object (default {})".format(DEFAULT_TABLE_INSTANCES))
+            print("  -p|--params     :: Parameters per object (default {})".format(DEFAULT_PARAMS_PER_OBJECT))
+            print("  -z|--value-size :: Characters per string value (default {})".format(DEFAULT_VALUE_SIZE))
+            print("  -M|--models     :: Distinct data models (default {})".format(DEFAULT_MODEL_COUNT))
+            print("  -l|--latency    :: Network latency before each HTTP POST, in ms")
+            print("  -j|--jitter     :: Random extra response time of up to this many ms")
+            print("  -k|--chunked    :: Send the HTTP POSTs chunked, in chunks of this many bytes")
+            print("  -F|--faults     :: Answer this % of the RPCs with a CWMP Fault")
+            print("  -r|--ramp       :: Spread the Informs over this many seconds")
+            print("  -C|--connection-requests :: Inform on a Connection Request to this [host:]port instead")
+            print("  -D|--fleet-file :: Write the devices' Connection Request URLs and credentials to this CSV file")
+            print("  -g|--ignore     :: Answer but ignore this % of the Connection Requests")
+            sys.exit()
+        elif opt in ("-n", "--devices"):
+            device_count = int(arg)
+        elif opt in ("-u", "--url"):
+            acs_url = arg
+        elif opt in ("-d", "--depth"):
+            shape["depth"] = int(arg)
+        elif opt in ("-f", "--fan-out"):
+            shape["fan_out"] = int(arg)
+        elif opt in ("-i", "--instances"):
+            shape["table_instances"] = int(arg)
+        elif opt in ("-p", "--params"):
+            shape["params_per_object"] = int(arg)
+        elif opt in ("-z", "--value-size"):
+            shape["value_size"] = int(arg)
+        elif opt in ("-M", "--models"):
+            model_count = int(arg)
+        elif opt in ("-l", "--latency"):
+            latency = float(arg) / 1000
+        elif opt in ("-j", "--jitter"):
+            jitter = float(arg) / 1000
+        elif opt in ("-k", "--chunked"):
+            chunk_size = int(arg)
+        elif opt in ("-F", "--faults"):
+            fault_rate = float(arg) / 100
+        elif opt in ("-r", "--ramp"):
+            ramp_time = float(arg)
+        elif opt in ("-C", "--connection-requests"):
+            host, _, port = arg.rpartition(":")
+            connection_request_host = host or connection_request_host
+            connection_request_port = int(port)
+        elif opt in ("-D", "--fleet-file"):
+            fleet_file = arg
+        elif opt in ("-g", "--ignore"):
+            ignore_rate = float(arg) / 100
+
+    if device_count < 1 or model_count < 1 or (chunk_size is not None and chunk_size < 1) or \
+            (fleet_file is not None and connection_request_port is None):
+        print(usage_str)
+        sys.exit(2)
+
+    fleet = CPEFleet(device_count, acs_url, shape, model_count, latency, jitter, chunk_size, fault_rate, ramp_time,
+                     connection_request_host, connection_request_port, ignore_rate)
+    if fleet_file is not None:
+        fleet.get_listener().write_fleet_file(fleet_file)
+
+    if connection_request_port is not None:
+        print("Running {} devices against {}, Informing on Connection Requests to {}:{}".format(
+            device_count, acs_url, connection_request_host, connection_request_port))
+    else:
+        print("Running {} devices against {}".format(device_count, acs_url))
+    fleet.run()
+    fleet.print_report()
+
+
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,376 @@
+"""
+# File Name: synthetic_cpe.py
+#
+# Description: Synthetic CPE data models, and a CPE that answers the RPCs of
+#               a walk from one
+#
+# Functionality:
+#  - SyntheticDataModel:
+#      Generates a data model of a chosen shape: the depth of the object
+#        tree, the named sub-objects (fan-out) and table instances of each
+#        object, the Parameters of each object and the size of their values
+#  - SyntheticCPE:
+#      The CPE side of a CWMP Session: sends an Inform (built from the
+#        inform.xml fixture) and answers the GetParameterNames and
+#        GetParameterValues RPCs from its SyntheticDataModel, with a CWMP
+#        Fault for unknown names (and, to inject faults, for a given
+#        share of the RPCs)
+#
+#  Both are independent of the transport, so they can be driven in-process
+#   or over a socket.
+#
+"""
+
+
+import os
+import re
+import bisect
+import random
+
+import xml.etree.ElementTree as ElementTree
+
+from xml.sax.saxutils import escape
+
+
+# The inform.xml fixture that the Inform of a SyntheticCPE is built from
+INFORM_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inform.xml")
+
+# The default shape of a SyntheticDataModel
+DEFAULT_DEPTH = 3
+DEFAULT_FAN_OUT = 2
+DEFAULT_TABLE_INSTANCES = 4
+DEFAULT_PARAMS_PER_OBJECT = 8
+DEFAULT_VALUE_SIZE = 16
+
+# The xsi:types of the generated Parameters, in turn
+_VALUE_TYPES = ("string", "unsignedInt", "boolean", "int")
+
+# The CWMP Faults that a SyntheticCPE sends
+FAULT_METHOD_NOT_SUPPORTED = ("9000", "Method not supported")
+FAULT_INTERNAL_ERROR = ("9002", "Internal error")
+FAULT_INVALID_PARAMETER_NAME = ("9005", "Invalid parameter name")
+
+_ENVELOPE_TEMPLATE = (
+    "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+    "<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\""
+    " xmlns:soapenc=\"http://schemas.xmlsoap.org/soap/encoding/\""
+    " xmlns:xsd=\"http://www.w3.org/2001/XMLSchema\""
+    " xmlns:xsi=\"http://www.w3.org/2001/XMLSchema-instance\""
+    " xmlns:cwmp=\"urn:dslforum-org:cwmp-1-0\">\n"
+    " <soapenv:Header>\n"
+    "  <cwmp:ID soapenv:mustUnderstand=\"1\">{}</cwmp:ID>\n"
+    " </soapenv:Header>\n"
+    " <soapenv:Body>\n"
+    "{}"
+    " </soapenv:Body>\n"
+    "</soapenv:Envelope>\n")
+
+
+
+class SyntheticDataModel(object):
+    """A generated data model of a chosen shape
+
+    Below the root object (which holds DeviceInfo) every object has
+     params_per_object Parameters and, down to the given depth, fan_out named
+     sub-objects (Object1., Object2., ...) and a table (Table.) with
+     table_instances instances; the instances have the same shape as the
+     named sub-objects.  The string values are value_size characters long,
+     and the values are the same for the same seed."""
+    def __init__(self, root="InternetGatewayDevice", depth=DEFAULT_DEPTH, fan_out=DEFAULT_FAN_OUT,
+                 table_instances=DEFAULT_TABLE_INSTANCES, params_per_object=DEFAULT_PARAMS_PER_OBJECT,
+                 value_size=DEFAULT_VALUE_SIZE, software_version="1.0.0", seed=0):
+        """Generate the data model"""
+        self.root = root
+        self.software_version = software_version
+        self.object_items = {}
+        self.writable = {}
+        self.values = {}
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.fan_out = fan_out
+        self.table_instances = table_instances
+        self.params_per_object = params_per_object
+        self.value_size = value_size
+
+        root_name = root + "."
+        self._add_object(root_name, "0")
+        self._add_object(root_name + "DeviceInfo.", "0")
+        self._add_parameter(root_name + "DeviceInfo.Manufacturer", "0", "string", "Synthetic")
+        self._add_parameter(root_name + "DeviceInfo.SoftwareVersion", "0", "string", software_version)
+        self._add_parameter(root_name + "DeviceInfo.UpTime", "0", "unsignedInt", "3600")
+        self._add_children(root_name, 1)
+
+        self.sorted_object_names = sorted(self.object_items)
+        self.sorted_param_names = sorted(self.values)
+
+
+    def get_root(self):
+        """Retrieve the name of the root object (without the trailing dot)"""
+        return self.root
+
+    def get_software_version(self):
+        """Retrieve the value of DeviceInfo.SoftwareVersion"""
+        return self.software_version
+
+
+    def get_object_count(self):
+        """Retrieve the number of objects (including the root object)"""
+        return len(self.object_items)
+
+    def get_parameter_count(self):
+        """Retrieve the number of Parameters"""
+        return len(self.values)
+
+
+    def get_parameter_names(self, path, next_level):
+        """Retrieve the (name, Writable) items that a GetParameterNames of
+            the path returns, or None if the path doesn't exist"""
+        if not path.endswith("."):
+            if path not in self.values:
+                return None
+            return [(path, self.writable[path])]
+
+        if path not in self.object_items:
+            return None
+
+        if next_level:
+            return [(name, self.writable[name]) for name in self.object_items[path]]
+
+        # The object itself and everything below it
+        item_list = []
+        for object_name in _iter_prefixed(self.sorted_object_names, path):
+            item_list.append((object_name, self.writable[object_name]))
+            item_list.extend((name, self.writable[name])
+                             for name in self.object_items[object_name] if not name.endswith("."))
+
+        return item_list
+
+    def get_parameter_values(self, name_list):
+        """Retrieve the (name, value, xsi:type) of each Parameter that a
+            GetParameterValues of full names and/or partial paths returns,
+            or None if one of the names doesn't exist"""
+        value_list = []
+
+        for name in name_list:
+            if name.endswith("."):
+                if name not in self.object_items:
+                    return None
+                value_list.extend((param_name,) + self.values[param_name]
+                                  for param_name in _iter_prefixed(self.sorted_param_names, name))
+            elif name in self.values:
+                value_list.append((name,) + self.values[name])
+            else:
+                return None
+
+        return value_list
+
+
+    def _add_children(self, object_name, level):
+        """Add the Parameters, named sub-objects and table of an object"""
+        for index in range(1, self.params_per_object + 1):
+            value_type = _VALUE_TYPES[(index - 1) % len(_VALUE_TYPES)]
+            self._add_parameter(object_name + "Param{}".format(index), "1" if index % 2 == 0 else "0",
+                                value_type, self._generate_value(value_type))
+
+        if level > self.depth:
+            return
+
+        for index in range(1, self.fan_out + 1):
+            sub_object_name = object_name + "Object{}.".format(index)
+            self._add_object(sub_object_name, "0")
+            self._add_children(sub_object_name, level + 1)
+
+        if self.table_instances > 0:
+            table_name = object_name + "Table."
+            self._add_parameter(object_name + "TableNumberOfEntries", "0", "unsignedInt",
+                                str(self.table_instances))
+            self._add_object(table_name, "1")
+
+            for instance in range(1, self.table_instances + 1):
+                instance_name = table_name + "{}.".format(instance)
+                self._add_object(instance_name, "1")
+                self._add_children(instance_name, level + 1)
+
+    def _add_object(self, object_name, writable):
+        """Add an object, as an item of its parent object"""
+        self.object_items[object_name] = []
+        self.writable[object_name] = writable
+
+        parent_name = object_name.rsplit(".", 2)[0] + "."
+        if parent_name != object_name and parent_name in self.object_items:
+            self.object_items[parent_name].append(object_name)
+
+    def _add_parameter(self, param_name, writable, value_type, value):
+        """Add a Parameter, as an item of its object"""
+        self.values[param_name] = (value, value_type)
+        self.writable[param_name] = writable
+        self.object_items[param_name.rsplit(".", 1)[0] + "."].append(param_name)
+
+    def _generate_value(self, value_type):
+        """Generate a value of the xsi:type"""
+        if value_type == "string":
+            return "".join(self.random.choice("abcdefghijklmnopqrstuvwxyz0123456789")
+                           for _ in range(self.value_size))
+        elif value_type == "boolean":
+            return self.random.choice(("true", "false"))
+        elif value_type == "unsignedInt":
+            return str(self.random.randint(0, 4294967295))
+
+        return str(self.random.randint(-2147483648, 2147483647))
+
+
+
+class SyntheticCPE(object):
+    """The CPE side of a CWMP Session with a SyntheticDataModel
+
+    get_inform() starts the session; respond() takes the content of each
+     HTTP Response from the ACS (the InformResponse or an RPC) and returns
+     the content of the next HTTP POST (empty after the InformResponse,
+     otherwise the RPC's response or a CWMP Fault).  With a fault_rate, that
+     share of the GetParameterNames and GetParameterValues is answered with
+     an Internal error Fault instead (in the same order for the same seed)."""
+    def __init__(self, data_model, serial_number="000000000001", oui="000CC3", product_class="Synthetic",
+                 fault_rate=0.0, seed=0):
+        """Initialize the CPE"""
+        self.data_model = data_model
+        self.serial_number = serial_number
+        self.oui = oui
+        self.product_class = product_class
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+        self.cwmp_id = 0
+        self.gpn_count = 0
+        self.gpv_count = 0
+        self.fault_count = 0
+
+
+    def get_device_id(self):
+        """Retrieve the Device ID (OUI-SerialNumber) of the CPE"""
+        return "{}-{}".format(self.oui, self.serial_number)
+
+    def get_rpc_count(self):
+        """Retrieve the number of RPCs (GPN and GPV) the CPE answered"""
+        return self.gpn_count + self.gpv_count
+
+    def get_gpn_count(self):
+        """Retrieve the number of GetParameterNames the CPE answered"""
+        return self.gpn_count
+
+    def get_gpv_count(self):
+        """Retrieve the number of GetParameterValues the CPE answered"""
+        return self.gpv_count
+
+    def get_fault_count(self):
+        """Retrieve the number of CWMP Faults the CPE sent"""
+        return self.fault_count
+
+
+    def get_inform(self, event_code=None):
+        """Build the Inform that starts a CWMP Session, from the inform.xml
+            fixture with this CPE's DeviceId, root object and SoftwareVersion
+            (and the given EventCode instead of the fixture's)"""
+        with open(INFORM_FIXTURE, "r", encoding="utf-8") as inform_fh:
+            inform = inform_fh.read()
+
+        if event_code is not None:
+            inform = re.sub(r"<EventCode>[^<]*</EventCode>", "<EventCode>{}</EventCode>".format(escape(event_code)),
+                            inform)
+
+        inform = re.sub(r"<OUI>[^<]*</OUI>", "<OUI>{}</OUI>".format(escape(self.oui)), inform)
+        inform = re.sub(r"<ProductClass>[^<]*</ProductClass>",
+                        "<ProductClass>{}</ProductClass>".format(escape(self.product_class)), inform)
+        inform = re.sub(r"<SerialNumber>[^<]*</SerialNumber>",
+                        "<SerialNumber>{}</SerialNumber>".format(escape(self.serial_number)), inform)
+        inform = re.sub(r"(SoftwareVersion</Name>\s*<Value[^>]*>)[^<]*",
+                        lambda match: match.group(1) + escape(self.data_model.get_software_version()), inform)
+        inform = inform.replace("InternetGatewayDevice.", self.data_model.get_root() + ".")
+
+        return inform.encode("utf-8")
+
+    def respond(self, content):
+        """Answer an RPC from the ACS, returning the content of the next HTTP POST"""
+        body = ElementTree.fromstring(content).find("{http://schemas.xmlsoap.org/soap/envelope/}Body")
+        rpc = body[0]
+        rpc_name = rpc.tag.rsplit("}", 1)[-1]
+        self.cwmp_id += 1
+
+        if rpc_name == "InformResponse":
+            # Hand the CWMP Session over to the ACS with an empty HTTP POST
+            return b""
+        elif rpc_name == "GetParameterNames":
+            self.gpn_count += 1
+            if self._inject_fault():
+                return self._render_fault(FAULT_INTERNAL_ERROR)
+
+            next_level = rpc.findtext("NextLevel", "").strip() in ("1", "true")
+            item_list = self.data_model.get_parameter_names(rpc.findtext("ParameterPath", ""), next_level)
+
+            if item_list is None:
+                return self._render_fault(FAULT_INVALID_PARAMETER_NAME)
+            return self._render_gpn_response(item_list)
+        elif rpc_name == "GetParameterValues":
+            self.gpv_count += 1
+            if self._inject_fault():
+                return self._render_fault(FAULT_INTERNAL_ERROR)
+
+            name_list = [string.text or "" for string in rpc.find("ParameterNames")]
+            value_list = self.data_model.get_parameter_values(name_list)
+
+            if value_list is None:
+                return self._render_fault(FAULT_INVALID_PARAMETER_NAME)
+            return self._render_gpv_response(value_list)
+
+        return self._render_fault(FAULT_METHOD_NOT_SUPPORTED)
+
+
+    def _inject_fault(self):
+        """Check to see if the next RPC should be answered with an injected Fault"""
+        return self.fault_rate > 0 and self.random.random() < self.fault_rate
+
+    def _render_gpn_response(self, item_list):
+        """Render a GetParameterNamesResponse"""
+        return self._render_envelope(
+            "  <cwmp:GetParameterNamesResponse>\n"
+            "   <ParameterList soapenc:arrayType=\"cwmp:ParameterInfoStruct[{}]\">\n{}"
+            "   </ParameterList>\n"
+            "  </cwmp:GetParameterNamesResponse>\n".format(len(item_list), "".join(
+                "    <ParameterInfoStruct><Name>{}</Name><Writable>{}</Writable></ParameterInfoStruct>\n".format(
+                    escape(name), writable) for name, writable in item_list)))
+
+    def _render_gpv_response(self, value_list):
+        """Render a GetParameterValuesResponse"""
+        return self._render_envelope(
+            "  <cwmp:GetParameterValuesResponse>\n"
+            "   <ParameterList soapenc:arrayType=\"cwmp:ParameterValueStruct[{}]\">\n{}"
+            "   </ParameterList>\n"
+            "  </cwmp:GetParameterValuesResponse>\n".format(len(value_list), "".join(
+                "    <ParameterValueStruct><Name>{}</Name>"
+                "<Value xsi:type=\"xsd:{}\">{}</Value></ParameterValueStruct>\n".format(
+                    escape(name), value_type, escape(value)) for name, value, value_type in value_list)))
+
+    def _render_fault(self, fault):
+        """Render a SOAP Fault with a CWMP Fault (code, string)"""
+        self.fault_count += 1
+        return self._render_envelope(
+            "  <soapenv:Fault>\n"
+            "   <faultcode>Client</faultcode>\n"
+            "   <faultstring>CWMP fault</faultstring>\n"
+            "   <detail>\n"
+            "    <cwmp:Fault><FaultCode>{}</FaultCode><FaultString>{}</FaultString></cwmp:Fault>\n"
+            "   </detail>\n"
+            "  </soapenv:Fault>\n".format(fault[0], escape(fault[1])))
+
+    def _render_envelope(self, body):
+        """Wrap an RPC in a SOAP Envelope, encoded as UTF-8"""
+        return _ENVELOPE_TEMPLATE.format(self.cwmp_id, body).encode("utf-8")
+
+
+
+
+def _iter_prefixed(sorted_names, prefix):
+    """Iterate over the names of a sorted list that start with the prefix"""
+    index = bisect.bisect_left(sorted_names, prefix)
+
+    while index < len(sorted_names) and sorted_names[index].startswith(prefix):
+        yield sorted_names[index]
+        index += 1
@@ -0,0 +1,147 @@
+#! /usr/bin/env python3
+
+"""
+# File Name: bench_cwmp_decoder.py
+#
+# Description: A benchmark of the incoming CWMP Message decoding
+#
+# Functionality:
+#  - Builds a GetParameterValuesResponse with a given number of Parameters
+#  - Decodes it with the streaming CWMPDecoder, which is fed the message in
+#      socket-sized chunks, and with the former xmltodict.parse path (when
+#      xmltodict is installed), which parses the whole message into a nested
+#      dict and then walks it
+#  - Reports the wall time and the peak memory (tracemalloc) of both
+#
+"""
+
+
+import os
+import sys
+import time
+import getopt
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cwmp_decoder import CWMPDecoder, READ_CHUNK_SIZE
+
+
+
+def build_gpv_response(param_count):
+    """Build a GetParameterValuesResponse with param_count Parameters"""
+    struct_list = []
+
+    for index in range(param_count):
+        struct_list.append(
+            "<ParameterValueStruct>"
+            "<Name>InternetGatewayDevice.LANDevice.1.Hosts.Host.{}.IPAddress</Name>"
+            "<Value xsi:type=\"xsd:string\">10.0.{}.{}</Value>"
+            "</ParameterValueStruct>\n".format(index + 1, index // 256, index % 256))
+
+    return ("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+            "<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\"\n"
+            "                  xmlns:soapenc=\"http://schemas.xmlsoap.org/soap/encoding/\"\n"
+            "                  xmlns:xsd=\"http://www.w3.org/2001/XMLSchema\"\n"
+            "                  xmlns:xsi=\"http://www.w3.org/2001/XMLSchema-instance\"\n"
+            "                  xmlns:cwmp=\"urn:dslforum-org:cwmp-1-0\">\n"
+            " <soapenv:Header/>\n"
+            " <soapenv:Body>\n"
+            "  <cwmp:GetParameterValuesResponse>\n"
+            "   <ParameterList soapenc:arrayType=\"cwmp:ParameterValueStruct[{}]\">\n"
+            "{}"
+            "   </ParameterList>\n"
+            "  </cwmp:GetParameterValuesResponse>\n"
+            " </soapenv:Body>\n"
+            "</soapenv:Envelope>\n".format(param_count, "".join(struct_list))).encode("utf-8")
+
+
+def decode_streaming(content):
+    """Decode the message with the CWMPDecoder, fed in socket-sized chunks"""
+    chunks = (content[index:index + READ_CHUNK_SIZE]
+              for index in range(0, len(content), READ_CHUNK_SIZE))
+    decoder = CWMPDecoder(chunks)
+    decoder.read_rpc_name()
+    values = {}
+
+    for param_value in decoder.iter_records():
+        values[param_value.name] = param_value.value
+
+    return values
+
+
+def decode_xmltodict(content):
+    """Decode the message the way the walk did before the CWMPDecoder"""
+    import xmltodict
+
+    namespaces = {
+        "urn:dslforum-org:cwmp-1-0": "cwmp",
+        "http://www.w3.org/2001/XMLSchema": "xsd",
+        "http://www.w3.org/2001/XMLSchema-instance": "xsi",
+        "http://schemas.xmlsoap.org/soap/envelope/": "soap-env",
+        "http://schemas.xmlsoap.org/soap/encoding/": "soap-enc"
+    }
+    content_dict = xmltodict.parse(content, process_namespaces=True, namespaces=namespaces)
+    soap_body = content_dict["soap-env:Envelope"]["soap-env:Body"]
+    param_list = soap_body["cwmp:GetParameterValuesResponse"]["ParameterList"]
+    values = {}
+
+    for param_value_struct_item in param_list["ParameterValueStruct"]:
+        values[param_value_struct_item["Name"]] = param_value_struct_item["Value"]["#text"]
+
+    return values
+
+
+def measure(decode_func, content):
+    """Return the wall time (seconds) and peak memory (bytes) of a decode"""
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    values = decode_func(content)
+    elapsed = time.perf_counter() - start_time
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return elapsed, peak_memory, len(values)
+
+
+
+
+def main(argv):
+    """Main CWMP Decoder Benchmark Driver"""
+    param_count = 50000
+    usage_str = "bench_cwmp_decoder.py [-n <Parameter Count>]"
+
+    try:
+        opts, args = getopt.getopt(argv, "hn:", ["help", "params="])
+    except getopt.GetoptError:
+        print(usage_str)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print(usage_str)
+            sys.exit()
+        elif opt in ("-n", "--params"):
+            param_count = int(arg)
+
+    content = build_gpv_response(param_count)
+    print("GetParameterValuesResponse: {} Parameters, {:.1f} MB"
+          .format(param_count, len(content) / (1024 * 1024)))
+
+    decoders = [("CWMPDecoder (streaming)", decode_streaming)]
+    try:
+        import xmltodict
+        decoders.append(("xmltodict.parse", decode_xmltodict))
+    except ImportError:
+        print("xmltodict is not installed - skipping the xmltodict.parse comparison")
+
+    for decoder_name, decode_func in decoders:
+        elapsed, peak_memory, value_count = measure(decode_func, content)
+        print("{:<25} {:8.3f} s  {:8.1f} MB peak  {} values"
+              .format(decoder_name, elapsed, peak_memory / (1024 * 1024), value_count))
+
+
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,161 @@
+#! /usr/bin/env python3
+
+"""
+# File Name: bench_cwmp_envelope.py
+#
+# Description: A benchmark of the outgoing CWMP Message rendering
+#
+# Functionality:
+#  - Renders GetParameterValues RPCs with a given number of Parameter names
+#      (and GetParameterNames RPCs) with the precompiled byte templates of
+#      cwmp_envelope, and with the former line-by-line io.StringIO builder
+#      (including its quadratic build of the logged list of names)
+#  - Reports the CPU time per RPC of both
+#
+"""
+
+
+import io
+import os
+import sys
+import time
+import getopt
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cwmp_envelope import render_get_parameter_names, render_get_parameter_values
+
+
+
+def build_param_name_list(param_count):
+    """Build a list of param_count full Parameter names"""
+    return ["InternetGatewayDevice.LANDevice.1.Hosts.Host.{}.IPAddress".format(index + 1)
+            for index in range(param_count)]
+
+
+def render_gpv_templates(param_name_list):
+    """Render a GetParameterValues (and the logged list of names) the current way"""
+    content = render_get_parameter_values(param_name_list)
+    param_names = ",".join(param_name_list)
+
+    return content, param_names
+
+
+def render_gpv_string_io(param_name_list):
+    """Render a GetParameterValues the way the walk did before cwmp_envelope"""
+    param_names = ""
+    first_param = True
+    out_buffer = io.StringIO()
+
+    out_buffer.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
+    out_buffer.write("<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\"\n")
+    out_buffer.write("                  xmlns:soapenc=\"http://schemas.xmlsoap.org/soap/encoding/\"\n")
+    out_buffer.write("                  xmlns:xsd=\"http://www.w3.org/2001/XMLSchema\"\n")
+    out_buffer.write("                  xmlns:cwmp=\"urn:dslforum-org:cwmp-1-0\">\n")
+    out_buffer.write(" <soapenv:Header>\n")
+    out_buffer.write(" </soapenv:Header>\n")
+    out_buffer.write(" <soapenv:Body>\n")
+    out_buffer.write("  <cwmp:GetParameterValues>\n")
+    out_buffer.write("   <ParameterNames soapenc:arrayType=\"xsd:string[{}]\">\n".format(len(param_name_list)))
+
+    for param_name in param_name_list:
+        if first_param:
+            first_param = False
+            param_names = param_name
+        else:
+            param_names = param_names + "," + param_name
+
+        out_buffer.write("    <string>{}</string>\n".format(param_name))
+
+    out_buffer.write("   </ParameterNames>\n")
+    out_buffer.write("  </cwmp:GetParameterValues>\n")
+    out_buffer.write(" </soapenv:Body>\n")
+    out_buffer.write("</soapenv:Envelope>\n")
+
+    content = bytes(out_buffer.getvalue(), "utf-8")
+    traced_message = out_buffer.getvalue()
+    out_buffer.close()
+
+    return content, param_names, traced_message
+
+
+def render_gpn_templates(parameter_path):
+    """Render a GetParameterNames the current way"""
+    return render_get_parameter_names(parameter_path, True)
+
+
+def render_gpn_string_io(parameter_path):
+    """Render a GetParameterNames the way the walk did before cwmp_envelope"""
+    out_buffer = io.StringIO()
+
+    out_buffer.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
+    out_buffer.write("<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\">\n")
+    out_buffer.write("                  xmlns:cwmp=\"urn:dslforum-org:cwmp-1-0\">\n")
+    out_buffer.write(" <soapenv:Header>\n")
+    out_buffer.write(" </soapenv:Header>\n")
+    out_buffer.write(" <soapenv:Body>\n")
+    out_buffer.write("  <cwmp:GetParameterNames>\n")
+    out_buffer.write("   <ParameterPath>{}</ParameterPath>\n".format(parameter_path))
+    out_buffer.write("   <NextLevel>{}</NextLevel>\n".format("1"))
+    out_buffer.write("  </cwmp:GetParameterNames>\n")
+    out_buffer.write(" </soapenv:Body>\n")
+    out_buffer.write("</soapenv:Envelope>\n")
+
+    content = bytes(out_buffer.getvalue(), "utf-8")
+    traced_message = out_buffer.getvalue()
+    out_buffer.close()
+
+    return content, traced_message
+
+
+def measure(render_func, render_arg, iterations):
+    """Return the CPU time per call of a render function, in microseconds"""
+    start_time = time.process_time()
+    for _ in range(iterations):
+        render_func(render_arg)
+
+    return (time.process_time() - start_time) * 1000000 / iterations
+
+
+
+
+def main(argv):
+    """Main CWMP Envelope Benchmark Driver"""
+    param_count = 1000
+    iterations = 2000
+    usage_str = "bench_cwmp_envelope.py [-n <Parameter Count>] [-i <Iterations>]"
+
+    try:
+        opts, args = getopt.getopt(argv, "hn:i:", ["help", "params=", "iterations="])
+    except getopt.GetoptError:
+        print(usage_str)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print(usage_str)
+            sys.exit()
+        elif opt in ("-n", "--params"):
+            param_count = int(arg)
+        elif opt in ("-i", "--iterations"):
+            iterations = int(arg)
+
+    param_name_list = build_param_name_list(param_count)
+    parameter_path = "InternetGatewayDevice.LANDevice.1.Hosts.Host.1."
+
+    benchmarks = [
+        ("GPV ({} names) templates".format(param_count), render_gpv_templates, param_name_list),
+        ("GPV ({} names) StringIO".format(param_count), render_gpv_string_io, param_name_list),
+        ("GPN templates", render_gpn_templates, parameter_path),
+        ("GPN StringIO", render_gpn_string_io, parameter_path),
+    ]
+
+    for benchmark_name, render_func, render_arg in benchmarks:
+        print("{:<30} {:10.1f} us CPU per RPC".format(
+            benchmark_name, measure(render_func, render_arg, iterations)))
+
+
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,476 @@
+#! /usr/bin/env python3
+
+"""
+# File Name: bench_walk.py
+#
+# Description: A benchmark of whole walks of synthetic CPE data models
+#
+# Functionality:
+#  - Generates a SyntheticDataModel (CPE-Sim/synthetic_cpe.py) of a chosen
+#      shape: depth, fan-out, table instances, Parameters per object and
+#      value size
+#  - Walks it with one or more SyntheticCPEs, either in-process (each HTTP
+#      Request is handed straight to a CWMPHandler, without a socket) or
+#      over loopback (a CWMPServer on a local port, with a client thread
+#      per CPE)
+#  - Reports the RPCs, the wall time, the CPU time (in total, and without
+#      the share of the simulated CPEs), the peak memory (with tracemalloc,
+#      in a separate run) and the Parameters walked per second
+#  - Saves the results as a baseline, or compares them with a saved
+#      baseline and exits with a non-zero status on a regression
+#
+"""
+
+
+import io
+import os
+import sys
+import json
+import time
+import getopt
+import threading
+import http.client
+import tracemalloc
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CPE-Sim"))
+
+from cwmpwalk import (CWMPServer, CWMPHandler, DiscoveryPolicy,
+                      DISCOVERY_NEXT_LEVEL, DISCOVERY_SUBTREE, DISCOVERY_AUTO,
+                      VALUES_LEAF, VALUES_ROOT, VALUES_TOP_LEVEL)
+from synthetic_cpe import (SyntheticDataModel, SyntheticCPE, DEFAULT_DEPTH, DEFAULT_FAN_OUT,
+                           DEFAULT_TABLE_INSTANCES, DEFAULT_PARAMS_PER_OBJECT, DEFAULT_VALUE_SIZE)
+
+
+# The ways of driving the walk
+MODE_IN_PROCESS = "inprocess"
+MODE_LOOPBACK = "loopback"
+
+# The results that are compared with a baseline, and whether a higher
+#  value is better
+COMPARED_RESULTS = [
+    ("rpcs", False),
+    ("wall_seconds", False),
+    ("cpu_seconds", False),
+    ("walk_cpu_seconds", False),
+    ("peak_memory_bytes", False),
+    ("parameters_per_second", True),
+]
+
+
+
+class InProcessSocket(object):
+    """A stand-in for a connected socket: makefile() reads the bytes it was
+        created with, and whatever is sent to it is collected"""
+    def __init__(self, incoming):
+        """Initialize the Socket with the bytes that can be read from it"""
+        self.incoming = incoming
+        self.sent = bytearray()
+
+
+    def makefile(self, mode, buffering=None):
+        """Retrieve the incoming bytes as a file"""
+        return io.BytesIO(self.incoming)
+
+    def sendall(self, data):
+        """Collect the sent bytes"""
+        self.sent += data
+
+    def get_sent(self):
+        """Retrieve the bytes sent to the Socket"""
+        return bytes(self.sent)
+
+
+    def settimeout(self, timeout):
+        """Ignore the timeout, as reading never blocks"""
+
+    def setsockopt(self, level, option, value):
+        """Ignore the socket options"""
+
+
+
+class InProcessTransport(object):
+    """Hands each HTTP POST of a CPE straight to a CWMPHandler, in the
+        calling thread, and parses its HTTP Response"""
+    def __init__(self, http_server, client_address):
+        """Initialize the Transport"""
+        self.http_server = http_server
+        self.client_address = client_address
+        self.cookie = None
+
+
+    def post(self, content):
+        """Send an HTTP POST, returning the (status, content) of the HTTP Response"""
+        request = ("POST / HTTP/1.1\r\n"
+                   "Host: 127.0.0.1\r\n"
+                   "Content-Type: text/xml; charset=utf-8\r\n"
+                   "Content-Length: {}\r\n".format(len(content)))
+        if self.cookie is not None:
+            request += "Cookie: {}\r\n".format(self.cookie)
+
+        connection = InProcessSocket(request.encode("ascii") + b"\r\n" + content)
+        CWMPHandler(connection, self.client_address, self.http_server)
+
+        response = http.client.HTTPResponse(InProcessSocket(connection.get_sent()))
+        response.begin()
+        if response.getheader("Set-Cookie") is not None:
+            self.cookie = response.getheader("Set-Cookie").split(";", 1)[0]
+
+        return response.status, response.read()
+
+    def close(self):
+        """Nothing to close"""
+
+
+
+class LoopbackTransport(object):
+    """Sends each HTTP POST of a CPE over a persistent loopback connection"""
+    def __init__(self, port):
+        """Initialize the Transport"""
+        self.port = port
+        self.connection = None
+        self.cookie = None
+
+
+    def post(self, content):
+        """Send an HTTP POST, returning the (status, content) of the HTTP Response"""
+        headers = {"Content-Type": "text/xml; charset=utf-8"}
+        if self.cookie is not None:
+            headers["Cookie"] = self.cookie
+
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+
+        self.connection.request("POST", "/", body=content, headers=headers)
+        response = self.connection.getresponse()
+        response_content = response.read()
+
+        if response.getheader("Set-Cookie") is not None:
+            self.cookie = response.getheader("Set-Cookie").split(";", 1)[0]
+        if response.getheader("Connection", "").lower() == "close":
+            self.close()
+
+        return response.status, response_content
+
+    def close(self):
+        """Close the connection"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+
+class CPESession(object):
+    """Runs the CWMP Session of a SyntheticCPE over a transport, one HTTP
+        exchange at a time, keeping the CPU time that the CPE took"""
+    def __init__(self, cpe, transport):
+        """Initialize the Session with the CPE's Inform as the first HTTP POST"""
+        self.cpe = cpe
+        self.transport = transport
+        self.content = cpe.get_inform()
+        self.cpu_time = 0.0
+        self.status = None
+
+
+    def step(self):
+        """Send the next HTTP POST and answer the RPC in its HTTP Response,
+            returning False once the CWMP Session is over"""
+        self.status, rpc_content = self.transport.post(self.content)
+
+        if self.status != 200:
+            self.transport.close()
+            return False
+
+        start_time = time.thread_time()
+        self.content = self.cpe.respond(rpc_content)
+        self.cpu_time += time.thread_time() - start_time
+
+        return True
+
+    def run(self):
+        """Run the whole CWMP Session"""
+        while self.step():
+            pass
+
+
+    def is_complete(self):
+        """Check to see if the ACS ended the CWMP Session with an HTTP 204"""
+        return self.status == 204
+
+    def get_cpu_time(self):
+        """Retrieve the CPU time that the CPE took to answer the RPCs, in seconds"""
+        return self.cpu_time
+
+
+
+
+def create_cwmp_server(walk_options, device_count):
+    """Create a CWMPServer, on a free local port, that walks device_count devices"""
+    return CWMPServer("127.0.0.1", 0, concurrent=device_count > 1, max_devices=device_count,
+                      discovery_policy=DiscoveryPolicy(walk_options["discovery"]),
+                      values_mode=walk_options["values_mode"])
+
+
+def walk_in_process(walk_options, cpe_list):
+    """Walk the CPEs in the calling thread, interleaving their CWMP Sessions
+        one HTTP exchange at a time, and return the CWMPServer and the CPESessions"""
+    cwmp_server = create_cwmp_server(walk_options, len(cpe_list))
+    http_server = cwmp_server.get_http_server()
+    session_list = [CPESession(cpe, InProcessTransport(http_server, ("127.0.0.1", 40000 + index)))
+                    for index, cpe in enumerate(cpe_list)]
+
+    try:
+        active_session_list = list(session_list)
+        while len(active_session_list) > 0:
+            active_session_list = [session for session in active_session_list if session.step()]
+    finally:
+        http_server.server_close()
+
+    return cwmp_server, session_list
+
+
+def walk_loopback(walk_options, cpe_list):
+    """Walk the CPEs over loopback connections, with a client thread per
+        CPE, and return the CWMPServer and the CPESessions"""
+    cwmp_server = create_cwmp_server(walk_options, len(cpe_list))
+    http_server = cwmp_server.get_http_server()
+    port = http_server.server_address[1]
+    session_list = [CPESession(cpe, LoopbackTransport(port)) for cpe in cpe_list]
+
+    server_thread = threading.Thread(target=http_server.serve_forever)
+    server_thread.start()
+
+    try:
+        client_thread_list = [threading.Thread(target=session.run) for session in session_list]
+        for client_thread in client_thread_list:
+            client_thread.start()
+        for client_thread in client_thread_list:
+            client_thread.join()
+    finally:
+        # Stop the CWMP Server if a session failed before the walks were complete
+        cwmp_server.stop_server()
+        server_thread.join()
+        http_server.server_close()
+
+    return cwmp_server, session_list
+
+
+WALK_FUNCTIONS = {
+    MODE_IN_PROCESS: walk_in_process,
+    MODE_LOOPBACK: walk_loopback,
+}
+
+
+def measure_walk(mode, walk_options, data_model, device_count):
+    """Walk device_count SyntheticCPEs of the data model, and return the
+        results of the walk"""
+    cpe_list = [SyntheticCPE(data_model, serial_number="{:012d}".format(index + 1))
+                for index in range(device_count)]
+
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    cwmp_server, session_list = WALK_FUNCTIONS[mode](walk_options, cpe_list)
+    wall_seconds = time.perf_counter() - start_wall
+    cpu_seconds = time.process_time() - start_cpu
+
+    parameter_count = 0
+    for implemented_data_model in cwmp_server.get_implemented_data_models().values():
+        for data_model_obj in implemented_data_model:
+            parameter_count += len(data_model_obj.get_parameters())
+
+    return {
+        "complete": (all(session.is_complete() for session in session_list) and
+                     parameter_count == device_count * data_model.get_parameter_count()),
+        "rpcs": sum(cpe.get_rpc_count() for cpe in cpe_list),
+        "faults": sum(cpe.get_fault_count() for cpe in cpe_list),
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "walk_cpu_seconds": cpu_seconds - sum(session.get_cpu_time() for session in session_list),
+        "parameters": parameter_count,
+        "parameters_per_second": parameter_count / wall_seconds,
+    }
+
+
+def run_benchmark(mode, walk_options, data_model, device_count, repeat_count):
+    """Walk the data model repeat_count times, keeping the best times, and
+        once more with tracemalloc to find the peak memory"""
+    run_results_list = [measure_walk(mode, walk_options, data_model, device_count)
+                        for _ in range(repeat_count)]
+
+    results = min(run_results_list, key=lambda run_results: run_results["wall_seconds"])
+    results["cpu_seconds"] = min(run_results["cpu_seconds"] for run_results in run_results_list)
+    results["walk_cpu_seconds"] = min(run_results["walk_cpu_seconds"] for run_results in run_results_list)
+    results["parameters_per_second"] = results["parameters"] / results["wall_seconds"]
+
+    tracemalloc.start()
+    try:
+        measure_walk(mode, walk_options, data_model, device_count)
+        results["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return results
+
+
+def compare_results(baseline_results, results, tolerance):
+    """Print the results next to the baseline, and return the names of the
+        results that regressed by more than the tolerance (a fraction)"""
+    regression_list = []
+
+    print("{:<24} {:>14} {:>14} {:>9}".format("", "baseline", "current", "change"))
+    for result_name, higher_is_better in COMPARED_RESULTS:
+        baseline_value = baseline_results.get(result_name)
+        value = results[result_name]
+
+        if not baseline_value:
+            print("{:<24} {:>14} {:>14.6g}".format(result_name, "-", value))
+            continue
+
+        change = value / baseline_value - 1
+        if result_name == "rpcs":
+            regressed = value != baseline_value
+        elif higher_is_better:
+            regressed = change < -tolerance
+        else:
+            regressed = change > tolerance
+
+        if regressed:
+            regression_list.append(result_name)
+
+        print("{:<24} {:>14.6g} {:>14.6g} {:>+8.1f}%{}".format(
+            result_name, baseline_value, value, change * 100, "  REGRESSION" if regressed else ""))
+
+    return regression_list
+
+
+def load_baseline(baseline_file):
+    """Load the saved baselines, keyed by scenario, or an empty dict"""
+    try:
+        with open(baseline_file, "r", encoding="utf-8") as baseline_fh:
+            return json.load(baseline_fh)
+    except FileNotFoundError:
+        return {}
+
+
+
+
+def main(argv):
+    """Main Walk Benchmark Driver"""
+    mode = MODE_IN_PROCESS
+    depth = DEFAULT_DEPTH
+    fan_out = DEFAULT_FAN_OUT
+    table_instances = DEFAULT_TABLE_INSTANCES
+    params_per_object = DEFAULT_PARAMS_PER_OBJECT
+    value_size = DEFAULT_VALUE_SIZE
+    device_count = 1
+    repeat_count = 3
+    walk_options = {"discovery": DISCOVERY_NEXT_LEVEL, "values_mode": VALUES_LEAF}
+    baseline_file = None
+    save_baseline = False
+    tolerance = 0.10
+    usage_str = ("bench_walk.py [-m <inprocess|loopback>] [-d <Depth>] [-f <Fan-Out>] "
+                 "[-i <Table Instances>] [-p <Params per Object>] [-z <Value Size>] "
+                 "[-n <Devices>] [-D <Discovery Mode>] [-v <Values Mode>] [-r <Repeats>] "
+                 "[-b <Baseline File>] [-s] [-t <Tolerance %>]")
+
+    try:
+        opts, args = getopt.getopt(argv, "hm:d:f:i:p:z:n:D:v:r:b:st:",
+                                   ["help", "mode=", "depth=", "fan-out=", "instances=", "params=",
+                                    "value-size=", "devices=", "discovery=", "values=", "repeat=",
+                                    "baseline=", "save", "tolerance="])
+    except getopt.GetoptError:
+        print(usage_str)
+        sys.exit(2)
+
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print(usage_str)
+            print("  -m|--mode       :: Walk in-process (default) or over loopback")
+            print("  -d|--depth      :: The levels of sub-objects below the root (default {})".format(DEFAULT_DEPTH))
+            print("  -f|--fan-out    :: Named sub-objects per object (default {})".format(DEFAULT_FAN_OUT))
+            print("  -i|--instances  :: Table instances per object (default {})".format(DEFAULT_TABLE_INSTANCES))
+            print("  -p|--params     :: Parameters per object (default {})".format(DEFAULT_PARAMS_PER_OBJECT))
+            print("  -z|--value-size :: Characters per string value (default {})".format(DEFAULT_VALUE_SIZE))
+            print("  -n|--devices    :: Devices walked at once (default 1)")
+            print("  -D|--discovery  :: next-level (default), subtree or auto")
+            print("  -v|--values     :: leaf (default), root or top-level")
+            print("  -r|--repeat     :: Walks to keep the best times of (default 3)")
+            print("  -b|--baseline   :: Compare with the baseline of the scenario in this file")
+            print("  -s|--save       :: Save the results as the scenario's baseline instead")
+            print("  -t|--tolerance  :: Change that is a regression, in % (default 10)")
+            sys.exit()
+        elif opt in ("-m", "--mode"):
+            mode = arg
+        elif opt in ("-d", "--depth"):
+            depth = int(arg)
+        elif opt in ("-f", "--fan-out"):
+            fan_out = int(arg)
+        elif opt in ("-i", "--instances"):
+            table_instances = int(arg)
+        elif opt in ("-p", "--params"):
+            params_per_object = int(arg)
+        elif opt in ("-z", "--value-size"):
+            value_size = int(arg)
+        elif opt in ("-n", "--devices"):
+            device_count = int(arg)
+        elif opt in ("-D", "--discovery"):
+            walk_options["discovery"] = arg
+        elif opt in ("-v", "--values"):
+            walk_options["values_mode"] = arg
+        elif opt in ("-r", "--repeat"):
+            repeat_count = int(arg)
+        elif opt in ("-b", "--baseline"):
+            baseline_file = arg
+        elif opt in ("-s", "--save"):
+            save_baseline = True
+        elif opt in ("-t", "--tolerance"):
+            tolerance = float(arg) / 100
+
+    if (mode not in WALK_FUNCTIONS or
+            walk_options["discovery"] not in (DISCOVERY_NEXT_LEVEL, DISCOVERY_SUBTREE, DISCOVERY_AUTO) or
+            walk_options["values_mode"] not in (VALUES_LEAF, VALUES_ROOT, VALUES_TOP_LEVEL) or
+            (save_baseline and baseline_file is None)):
+        print(usage_str)
+        sys.exit(2)
+
+    data_model = SyntheticDataModel(depth=depth, fan_out=fan_out, table_instances=table_instances,
+                                    params_per_object=params_per_object, value_size=value_size)
+    scenario = "{} d{} f{} i{} p{} z{} n{} {} {}".format(
+        mode, depth, fan_out, table_instances, params_per_object, value_size, device_count,
+        walk_options["discovery"], walk_options["values_mode"])
+
+    print("Scenario: {} ({} objects, {} Parameters per device)".format(
+        scenario, data_model.get_object_count(), data_model.get_parameter_count()))
+    results = run_benchmark(mode, walk_options, data_model, device_count, repeat_count)
+
+    print("{:<24} {}".format("complete", results["complete"]))
+    print("{:<24} {}".format("parameters", results["parameters"]))
+    print("{:<24} {}".format("faults", results["faults"]))
+
+    if baseline_file is None:
+        for result_name, _ in COMPARED_RESULTS:
+            print("{:<24} {:.6g}".format(result_name, results[result_name]))
+    elif save_baseline:
+        baselines = load_baseline(baseline_file)
+        baselines[scenario] = results
+        with open(baseline_file, "w", encoding="utf-8") as baseline_fh:
+            json.dump(baselines, baseline_fh, indent=2, sort_keys=True)
+        for result_name, _ in COMPARED_RESULTS:
+            print("{:<24} {:.6g}".format(result_name, results[result_name]))
+        print("Saved as the baseline of the scenario in {}".format(baseline_file))
+    else:
+        baselines = load_baseline(baseline_file)
+        if scenario not in baselines:
+            print("No baseline for the scenario in {}".format(baseline_file))
+            sys.exit(2)
+
+        regression_list = compare_results(baselines[scenario], results, tolerance)
+        if len(regression_list) > 0 or not results["complete"]:
+            print("Regressed: {}".format(", ".join(regression_list) or "incomplete walk"))
+            sys.exit(1)
+
+
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,184 @@
+"""
+# File Name: cwmp_decoder.py
+#
+# Description: An incremental decoder for incoming CWMP (SOAP) Messages
+#
+# Functionality:
+#  - CWMPDecoder:
+#      Parses a CWMP Message as its body is read from the socket in chunks,
+#        identifies the RPC as soon as its element starts, and then emits
+#        one record per ParameterInfoStruct and ParameterValueStruct, so
+#        that the message is never held in memory as a whole
+#  - ParameterInfo
+#      A record for a GetParameterNamesResponse ParameterInfoStruct
+#  - ParameterValue
+#      A record for an Inform or GetParameterValuesResponse ParameterValueStruct
+#
+"""
+
+
+import collections
+import xml.etree.ElementTree as ElementTree
+
+
+# The size of the chunks that a message body is read in
+READ_CHUNK_SIZE = 64 * 1024
+
+# Namespaces of the CWMP Messages
+SOAP_ENV_NAMESPACE = "http://schemas.xmlsoap.org/soap/envelope/"
+XSI_TYPE_ATTRIBUTE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+CWMP_NAMESPACE_PREFIX = "urn:dslforum-org:cwmp-"
+
+
+ParameterInfo = collections.namedtuple("ParameterInfo", ["name", "writable"])
+ParameterValue = collections.namedtuple("ParameterValue", ["name", "value", "value_type"])
+
+
+
+class CWMPDecoder(object):
+    """Decodes a CWMP Message incrementally from an iterable of byte chunks
+
+    read_rpc_name() consumes the message up to the start of the RPC element
+     (so the SOAP Header has been decoded by then), and iter_records() then
+     yields the ParameterInfo and ParameterValue records of the RPC as they
+     are decoded.  Every struct element is discarded once its record has been
+     emitted.  The Inform DeviceId and the Fault details are kept as dicts."""
+    def __init__(self, chunks):
+        """Initialize the Decoder"""
+        self.chunks = iter(chunks)
+        self.parser = ElementTree.XMLPullParser(events=("start", "end"))
+        self.element_stack = []
+        self.pending_records = collections.deque()
+        self.finished = False
+        self.cwmp_id = None
+        self.rpc_name = None
+        self.device_id = {}
+        self.fault = {}
+
+
+    def get_cwmp_id(self):
+        """Retrieve the cwmp:ID of the SOAP Header, or None"""
+        return self.cwmp_id
+
+    def get_device_id(self):
+        """Retrieve the DeviceId of an Inform as a dict (e.g. OUI, SerialNumber)"""
+        return self.device_id
+
+    def get_fault(self):
+        """Retrieve the CWMP Fault details (FaultCode, FaultString) of a SOAP Fault"""
+        return self.fault
+
+
+    def read_rpc_name(self):
+        """Decode the message up to the start of the RPC element and return
+            its local name (e.g. Inform, GetParameterNamesResponse, Fault),
+            or None if the SOAP Body doesn't contain one"""
+        while self.rpc_name is None and not self.finished:
+            self._feed_next_chunk()
+
+        return self.rpc_name
+
+
+    def iter_records(self):
+        """Yield the ParameterInfo and ParameterValue records of the RPC as
+            they are decoded, until the end of the message"""
+        while True:
+            while len(self.pending_records) > 0:
+                yield self.pending_records.popleft()
+
+            if self.finished:
+                return
+
+            self._feed_next_chunk()
+
+
+    def _feed_next_chunk(self):
+        """Feed the next chunk of the message to the parser"""
+        chunk = next(self.chunks, None)
+
+        if chunk is None:
+            self.finished = True
+            self.parser.close()
+        else:
+            self.parser.feed(chunk)
+
+        for event, element in self.parser.read_events():
+            if event == "start":
+                self._start_element(element)
+            else:
+                self._end_element(element)
+
+
+    def _start_element(self, element):
+        """Track the element path, noting the RPC element when it starts"""
+        self.element_stack.append(element)
+
+        # The RPC is the first element in the SOAP Body
+        if (self.rpc_name is None and len(self.element_stack) == 3 and
+                self.element_stack[1].tag == "{" + SOAP_ENV_NAMESPACE + "}Body"):
+            self.rpc_name = _local_name(element.tag)
+
+
+    def _end_element(self, element):
+        """Emit the record of a completed struct element and discard it"""
+        self.element_stack.pop()
+        local_name = _local_name(element.tag)
+        discard = True
+
+        if local_name == "ParameterInfoStruct":
+            self.pending_records.append(ParameterInfo(
+                _child_text(element, "Name"), _child_text(element, "Writable")))
+        elif local_name == "ParameterValueStruct":
+            value_element = _find_child(element, "Value")
+            value_type = None
+
+            if value_element is not None and XSI_TYPE_ATTRIBUTE in value_element.attrib:
+                value_type = value_element.attrib[XSI_TYPE_ATTRIBUTE].split(":")[-1]
+
+            self.pending_records.append(ParameterValue(
+                _child_text(element, "Name"), _child_text(element, "Value"), value_type))
+        elif local_name == "ID" and _is_cwmp_element(element):
+            self.cwmp_id = element.text
+        elif local_name == "DeviceId":
+            self.device_id = dict((_local_name(child.tag), child.text or "") for child in element)
+        elif local_name == "Fault" and _is_cwmp_element(element):
+            self.fault = dict((_local_name(child.tag), child.text or "") for child in element)
+        else:
+            # Keep the other elements until their parent is complete
+            discard = False
+
+        if discard:
+            element.clear()
+            if len(self.element_stack) > 0:
+                self.element_stack[-1].remove(element)
+
+
+
+
+def _local_name(tag):
+    """Strip the namespace from an element tag"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _is_cwmp_element(element):
+    """Check to see if the element is in a CWMP namespace (any version)"""
+    return element.tag.startswith("{" + CWMP_NAMESPACE_PREFIX)
+
+
+def _find_child(element, local_name):
+    """Find the child element with the local name, whatever its namespace"""
+    for child in element:
+        if _local_name(child.tag) == local_name:
+            return child
+
+    return None
+
+
+def _child_text(element, local_name):
+    """Retrieve the text of the child element with the local name, or an empty string"""
+    child = _find_child(element, local_name)
+
+    if child is None or child.text is None:
+        return ""
+
+    return child.text
@@ -0,0 +1,103 @@
+"""
+# File Name: cwmp_envelope.py
+#
+# Description: Renders the outgoing CWMP (SOAP) Messages
+#
+# Functionality:
+#  - render_get_parameter_names:
+#      Renders a GetParameterNames RPC
+#  - render_get_parameter_values:
+#      Renders a GetParameterValues RPC for a list of Parameter names
+#        and/or partial paths
+#  - render_inform_response:
+#      Renders an InformResponse
+#
+#  The envelopes are precompiled byte templates, so rendering a message is
+#   a single formatting step; the names and IDs are XML escaped.
+#
+"""
+
+
+from xml.sax.saxutils import escape
+
+
+# The parts of every envelope
+_ENVELOPE_START = (
+    b"<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+    b"<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\"\n"
+    b"                  xmlns:soapenc=\"http://schemas.xmlsoap.org/soap/encoding/\"\n"
+    b"                  xmlns:xsd=\"http://www.w3.org/2001/XMLSchema\"\n"
+    b"                  xmlns:cwmp=\"urn:dslforum-org:cwmp-1-0\">\n")
+_EMPTY_HEADER = (
+    b" <soapenv:Header>\n"
+    b" </soapenv:Header>\n")
+_BODY_START = b" <soapenv:Body>\n"
+_ENVELOPE_END = (
+    b" </soapenv:Body>\n"
+    b"</soapenv:Envelope>\n")
+
+# The templates of each CWMP Message
+_GET_PARAMETER_NAMES_TEMPLATE = (
+    _ENVELOPE_START + _EMPTY_HEADER + _BODY_START +
+    b"  <cwmp:GetParameterNames>\n"
+    b"   <ParameterPath>%s</ParameterPath>\n"
+    b"   <NextLevel>%s</NextLevel>\n"
+    b"  </cwmp:GetParameterNames>\n" +
+    _ENVELOPE_END)
+_GET_PARAMETER_VALUES_TEMPLATE = (
+    _ENVELOPE_START + _EMPTY_HEADER + _BODY_START +
+    b"  <cwmp:GetParameterValues>\n"
+    b"   <ParameterNames soapenc:arrayType=\"xsd:string[%d]\">\n"
+    b"%s"
+    b"   </ParameterNames>\n"
+    b"  </cwmp:GetParameterValues>\n" +
+    _ENVELOPE_END)
+_INFORM_RESPONSE_TEMPLATE = (
+    _ENVELOPE_START +
+    b" <soapenv:Header>\n"
+    b"%s"
+    b" </soapenv:Header>\n" +
+    _BODY_START +
+    b"  <cwmp:InformResponse>\n"
+    b"   <MaxEnvelopes>1</MaxEnvelopes>\n"
+    b"  </cwmp:InformResponse>\n" +
+    _ENVELOPE_END)
+_CWMP_ID_TEMPLATE = b"  <cwmp:ID soapenv:mustUnderstand=\"1\">%s</cwmp:ID>\n"
+
+# The parts around each Parameter name of a GetParameterValues
+_STRING_START = "    <string>"
+_STRING_SEPARATOR = "</string>\n    <string>"
+_STRING_END = "</string>\n"
+
+
+
+
+def render_get_parameter_names(parameter_path, next_level=True):
+    """Render a GetParameterNames RPC for an object's path"""
+    return _GET_PARAMETER_NAMES_TEMPLATE % (
+        _escape_bytes(parameter_path), b"1" if next_level else b"0")
+
+
+def render_get_parameter_values(param_name_list):
+    """Render a GetParameterValues RPC for a list of full Parameter names
+        and/or partial paths"""
+    if len(param_name_list) == 0:
+        string_elements = b""
+    else:
+        string_elements = (
+            _STRING_START + _STRING_SEPARATOR.join(map(escape, param_name_list)) + _STRING_END
+        ).encode("utf-8")
+
+    return _GET_PARAMETER_VALUES_TEMPLATE % (len(param_name_list), string_elements)
+
+
+def render_inform_response(cwmp_id=None):
+    """Render an InformResponse, which echoes the cwmp:ID of the Inform (if it had one)"""
+    cwmp_id_element = b"" if cwmp_id is None else _CWMP_ID_TEMPLATE % _escape_bytes(cwmp_id)
+
+    return _INFORM_RESPONSE_TEMPLATE % cwmp_id_element
+
+
+def _escape_bytes(text):
+    """XML escape a text and encode it as UTF-8"""
+    return escape(text).encode("utf-8")
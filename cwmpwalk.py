@@ -10,12 +10,58 @@
 #      A control class that performs the CWMP Data Model walk via the
 #       CWMPServer and keeps a copy of the implemented data model
 #  - CWMPServer:
-#      A simplified CWMP Server that maintains CWMP Session state
+#      A simplified CWMP Server that maintains the CWMP Sessions
+#  - WalkCoordinator:
+#      Walks devices on several worker processes (each with its own
+#        CWMPServer), handing them the connections and combining their
+#        results and metrics
+#  - CWMPSession:
+#      The CWMP Session state of a single device that is being walked
+#  - DiscoveryPolicy:
+#      Chooses the NextLevel argument of each GetParameterNames, which
+#        discovers either one level of the data model or a whole subtree
+#  - PathFilter:
+#      Prunes the walk to the included (and not excluded) subtrees, so the
+#        subtrees that are left out cost no RPCs
+#  - WalkScheduler:
+#      Orders the objects waiting for a GetParameterNames; the
+#        BFSWalkScheduler, DFSWalkScheduler and PriorityWalkScheduler
+#        discover breadth first, depth first or by priority subtrees
+#  - WalkBudget:
+#      Limits the number of RPCs and the wall time of a walk
+#  - MemoryBudget:
+#      Limits the memory of the implemented data models, per walk and per
+#        process, spilling complete objects to disk once it is exceeded
+#  - GPVBatcher:
+#      Collects the Parameters of many objects into GetParameterValues
+#        batches, whose size adapts to how well the device copes with them
 #  - StoppableHTTPServer:
 #      An HTTP Server that can be stopped when the CWMP Session is complete
+#  - ThreadPoolHTTPServer:
+#      A StoppableHTTPServer that handles HTTP Requests on a thread pool,
+#        which allows many devices to be walked concurrently
+#  - HandoffHTTPServer:
+#      The ThreadPoolHTTPServer of a worker process, which is handed its
+#        connections by the WalkCoordinator
+#  - WorkerResultExporter:
+#      Streams the walks of a worker process back to the WalkCoordinator
+#  - WorkerLogHandler:
+#      Writes the log records of the worker processes through the
+#        WalkCoordinator's own loggers
+#  - HTTPContentError
+#      Raised when the content of an HTTP Request can't be read
 #  - CWMPHandler
 #      An HTTP Handler for CWMP Messages, which carries out the
 #        CWMP data model walking mechanism
+#  - DataModelStore
+#      The implemented data model of a device, a trie of path segments
+#        that finds an object or parameter in O(depth)
+#  - DataModelNode
+#      A node of the DataModelStore trie, holding the object of its path
+#  - SpillFile
+#      An append-only temporary file that DataModelObjects are spilled to
+#  - SpilledObject
+#      The place of a spilled DataModelObject in its SpillFile
 #  - DataModelItem
 #      A generic Data Model Entity
 #  - DataModelObject
@@ -26,90 +72,1043 @@
 """
 
 
-import io
+import re
+import time
+import zlib
+import queue
+import signal
+import selectors
+import atexit
 import logging
-import xmltodict
+import logging.handlers
+import threading
+import heapq
+import collections
+import concurrent.futures
+import multiprocessing
+import multiprocessing.reduction
 import sys, getopt
 import subprocess
 import socket
+import itertools
+import secrets
+import pickle
+import tempfile
+import http.cookies
+import urllib.parse
+
+import xml.etree.ElementTree as ElementTree
 
 from http.server import BaseHTTPRequestHandler, HTTPServer
 
+from cwmp_decoder import CWMPDecoder, READ_CHUNK_SIZE
+from cwmp_envelope import render_get_parameter_names, render_get_parameter_values, render_inform_response
+from walk_cache import WalkCache
+from walk_checkpoint import WalkCheckpoints
+from walk_poll import WalkPoller, DEFAULT_HISTORY_SIZE
+from data_model_query import DataModelIndex, DataModelQuery, PATH_INSTANCE_WILDCARD
+from data_model_validator import ConformanceValidator, DefinitionCache, DEFAULT_DEFINITION_CACHE_DIR, DEFAULT_PROFILES
+from walk_export import WalkExporter, create_exporter, WALK_COMPLETED
+from fleet_orchestrator import FleetOrchestrator, read_fleet_file, DEFAULT_CONNECTION_REQUEST_RATE
+from walk_metrics import (WalkMetrics, SessionMetrics, RPC_INFORM, RPC_GPN, RPC_GPV,
+                          PROMETHEUS_CONTENT_TYPE, combine_metrics, render_json_text,
+                          render_prometheus_text)
+
 
 # Global Constants
 _VERSION = "0.1.0-alpha"
 
+# The cookie that ties the HTTP Requests of a device to its CWMP Session
+SESSION_COOKIE_NAME = "cwmpwalk_session"
+
+# Seconds that a persistent connection may wait for the device's next HTTP Request
+HTTP_KEEP_ALIVE_TIMEOUT = 60
+
+# The HTTP GET paths of the walk metrics (Prometheus text and JSON)
+METRICS_PATH = "/metrics"
+METRICS_JSON_PATH = "/metrics.json"
+
+# Multi-process walks: how the worker processes are started, the seconds
+#  between the metrics snapshots that each worker sends, and the most bytes
+#  of a new connection's HTTP headers that are peeked at to choose its
+#  worker (and the seconds to wait for them)
+WORKER_START_METHOD = "spawn"
+WORKER_METRICS_INTERVAL = 1.0
+HANDOFF_MAX_PEEK = 16384
+HANDOFF_TIMEOUT = 10.0
+HANDOFF_RETRY_INTERVAL = 0.05
+
+# The messages and events that the worker processes send to the WalkCoordinator
+WORKER_MESSAGE_EVENTS = "events"
+WORKER_MESSAGE_METRICS = "metrics"
+WORKER_MESSAGE_STOPPED = "stopped"
+WORKER_EVENT_START = "start"
+WORKER_EVENT_OBJECT = "object"
+WORKER_EVENT_END = "end"
+
+# The largest HTTP Request content that is accepted, in bytes
+DEFAULT_MAX_BODY_SIZE = 128 * 1024 * 1024
+
+# The longest chunk size or trailer line of chunked content
+_MAX_CHUNK_LINE_LENGTH = 65536
+
+# Logging: the log file format, and the payload trace, which is rotated
+#  once it reaches TRACE_MAX_BYTES (keeping TRACE_BACKUP_COUNT old files)
+LOG_FORMAT = "%(asctime)-15s %(name)s %(levelname)-8s %(message)s"
+TRACE_LOGGER_NAME = "TRACE_LOGGING"
+TRACE_MAX_BYTES = 10 * 1024 * 1024
+TRACE_BACKUP_COUNT = 5
+
+# The number of Parameters in the first GetParameterValues of a walk
+DEFAULT_GPV_BATCH_SIZE = 32
+
+# GetParameterValues Modes
+#  - leaf: request every Parameter by name
+#  - root: request all values with a single partial path (the root object)
+#  - top-level: request the values with a partial path per top-level object
+VALUES_LEAF = "leaf"
+VALUES_ROOT = "root"
+VALUES_TOP_LEVEL = "top-level"
+
+# Walk Orders of the GetParameterNames
+WALK_ORDER_BFS = "bfs"
+WALK_ORDER_DFS = "dfs"
+WALK_ORDER_PRIORITY = "priority"
+
+# The subtrees that the priority Walk Order discovers first
+DEFAULT_PRIORITY_PATHS = ["DeviceInfo.", "ManagementServer."]
+
+# GetParameterNames Discovery Modes
+DISCOVERY_NEXT_LEVEL = "next-level"
+DISCOVERY_SUBTREE = "subtree"
+DISCOVERY_AUTO = "auto"
+
+# Where a path lies relative to the patterns of a path filter (in increasing order)
+PATH_OUTSIDE = 0
+PATH_ABOVE = 1
+PATH_INSIDE = 2
+
+# The estimated memory of a DataModelObject and of each of its Parameters
+#  (plus the length of the object name and of the string values), in bytes
+OBJECT_SIZE_ESTIMATE = 400
+PARAMETER_SIZE_ESTIMATE = 112
+
+# The xsi:types whose Parameter values are stored as an int
+_INTEGER_VALUE_TYPES = frozenset(["int", "unsignedInt", "long", "unsignedLong"])
+
 
 
 class CWMPWalk(object):
     """Utilizes a simplified CWMP Server to issue GetParameterNames
         and GetParameterValues to walk a Device's CWMP Data Model"""
-    def __init__(self, ip_addr="127.0.0.1", port=8000):
+    def __init__(self, ip_addr="127.0.0.1", port=8000,
+                 concurrent=False, max_workers=16, max_devices=None,
+                 discovery=DISCOVERY_NEXT_LEVEL, subtree_paths=None,
+                 gpv_batch_size=DEFAULT_GPV_BATCH_SIZE, values_mode=VALUES_LEAF,
+                 walk_order=WALK_ORDER_BFS, priority_paths=None, max_rpcs=None, max_walk_time=None,
+                 cache_dir=None, max_body_size=DEFAULT_MAX_BODY_SIZE, export_files=None,
+                 max_walk_memory=None, max_memory=None, spill_dir=None, processes=1,
+                 include_paths=None, exclude_paths=None, checkpoint_dir=None, fleet_file=None,
+                 max_fleet_walks=None, connection_request_rate=DEFAULT_CONNECTION_REQUEST_RATE,
+                 poll=False, poll_paths=None, history_size=DEFAULT_HISTORY_SIZE,
+                 indexed=False, indexed_values=None, definition_files=None, profiles=None,
+                 definition_cache_dir=DEFAULT_DEFINITION_CACHE_DIR):
         """Initialize the Object"""
         self.implemented_data_model = None
-        self.cwmp = CWMPServer(ip_addr, port)
+        self.implemented_data_models = {}
+        self.exporters = [create_exporter(export_file) for export_file in export_files or []]
+        self.orchestrator = None
+        self.poller = None
+        self.validator = None
+        server_exporters = self.exporters
+
+        if poll or poll_paths:
+            if processes > 1:
+                raise ValueError("The poll history is kept in one process, so polling can't use worker processes")
+
+            # Poll the chosen Parameters, or those that change, once a device has been walked
+            self.poller = WalkPoller(PathFilter(poll_paths) if poll_paths else None, history_size)
+
+        if definition_files:
+            # Load (or compile) the data model definitions up front, so a bad file fails before the walk
+            self.validator = ConformanceValidator(DefinitionCache(definition_cache_dir).load(definition_files),
+                                                  profiles)
+
+        if fleet_file is not None:
+            # The orchestrator follows the walks of the fleet through the exporter hooks
+            self.orchestrator = FleetOrchestrator(read_fleet_file(fleet_file),
+                                                  max_fleet_walks or max_workers * processes,
+                                                  connection_request_rate)
+            server_exporters = self.exporters + [self.orchestrator.get_walk_listener()]
+
+        # The options of the walk, which are handed to the worker processes
+        walk_options = {
+            "max_workers": max_workers, "discovery": discovery, "subtree_paths": subtree_paths,
+            "gpv_batch_size": gpv_batch_size, "values_mode": values_mode, "walk_order": walk_order,
+            "priority_paths": priority_paths, "max_rpcs": max_rpcs, "max_walk_time": max_walk_time,
+            "cache_dir": cache_dir, "max_body_size": max_body_size, "max_walk_memory": max_walk_memory,
+            "max_memory": max_memory, "spill_dir": spill_dir, "include_paths": include_paths,
+            "exclude_paths": exclude_paths, "checkpoint_dir": checkpoint_dir,
+            "indexed": indexed, "indexed_values": indexed_values}
+
+        if processes > 1:
+            self.cwmp = WalkCoordinator(ip_addr, port, processes, max_devices, walk_options, server_exporters)
+        else:
+            self.cwmp = _create_cwmp_server(ip_addr, port, walk_options, concurrent=concurrent,
+                                            max_devices=max_devices, exporters=server_exporters,
+                                            poller=self.poller, indexed=indexed, indexed_values=indexed_values)
 
 
     def start_walk(self):
         """Start the CWMP Server, which walks the device's data model"""
-        # Start the Server
-        self.cwmp.start_server()
+        try:
+            # Start the Server (and, for a fleet walk, the Connection Requests)
+            if self.orchestrator is not None:
+                self._walk_fleet()
+            else:
+                self.cwmp.start_server()
+        finally:
+            # Retreive the implemented data model(s) from the Server,
+            #  which keeps the completed walks when interrupted
+            self.implemented_data_model = self.cwmp.get_implemented_data_model()
+            self.implemented_data_models = self.cwmp.get_implemented_data_models()
+
+            # Flush and close the exports, which were written during the walk
+            for exporter in self.exporters:
+                exporter.close()
+
 
-        # Retreive the implemented data model from the Server
-        self.implemented_data_model = self.cwmp.get_implemented_data_model()
+    def stop_walk(self):
+        """Stop the CWMP Server, keeping the data models of the completed walks"""
+        self.cwmp.stop_server()
+
+
+    def _walk_fleet(self):
+        """Run the CWMP Server on a thread while the FleetOrchestrator sends the
+            Connection Requests, until every device of the fleet is done"""
+        server_thread = threading.Thread(target=self._serve_fleet, name="FleetCWMPServer")
+        server_thread.start()
+
+        try:
+            self.orchestrator.run()
+        finally:
+            self.cwmp.stop_server()
+            server_thread.join()
+
+    def _serve_fleet(self):
+        """Run the CWMP Server of a fleet walk, stopping the fleet walk if the server stops first"""
+        try:
+            self.cwmp.start_server()
+        finally:
+            self.orchestrator.stop()
 
 
     def print_results(self):
-        """Print out the implemented data model, as built out during the walk"""
+        """Print out the implemented data model of each device, as built out during the walk"""
         print("Testing...")
         print("")
-        print("The Implemented Data Modle is:")
-        for data_model_obj in self.implemented_data_model:
-            print("{}".format(data_model_obj.get_name()))
-            for data_model_param in data_model_obj.get_parameters():
-                print("- {} = {}".format(data_model_param.get_name(), data_model_param.get_value()))
+        for device_id, data_model in self.implemented_data_models.items():
+            # Write each device's data model at once, rather than a print per line
+            line_list = ["The Implemented Data Model for {} is:".format(device_id)]
+            for data_model_obj in data_model:
+                line_list.append(data_model_obj.get_name())
+                line_list.extend("- {} = {}".format(data_model_param.get_name(), data_model_param.get_value_text())
+                                 for data_model_param in data_model_obj.get_parameters())
+            line_list.append("\n")
+            sys.stdout.write("\n".join(line_list))
+
+
+    def print_poll_history(self):
+        """Print the latest value and the number of samples of each polled Parameter"""
+        if self.poller is None:
+            return
+
+        poll_history = self.poller.get_history()
+        for device_id in poll_history.get_device_ids():
+            line_list = ["The Polled Parameters of {} are:".format(device_id)]
+            for param_name in poll_history.get_parameter_names(device_id):
+                sample_list = poll_history.get_samples(device_id, param_name)
+                line_list.append("- {} = {} ({} samples)".format(param_name, sample_list[-1][1], len(sample_list)))
+            line_list.append("\n")
+            sys.stdout.write("\n".join(line_list))
+
+    def print_query_results(self, queries):
+        """Print the matches of each query: an object pattern (ending in a
+            dot), or a Parameter pattern optionally followed by =<value>"""
+        query = self.get_query()
+
+        for query_text in queries:
+            if query_text.endswith("."):
+                match_list = query.find_objects(query_text)
+            else:
+                path, separator, value = query_text.partition("=")
+                match_list = query.find_parameters(path, value=value if separator else None)
+
+            line_list = ["The Matches of {} are:".format(query_text)]
+            line_list.extend("- {}: {}".format(query_match.device_id, query_match.path) if query_match.path.endswith(".")
+                             else "- {}: {} = {}".format(query_match.device_id, query_match.path, query_match.value)
+                             for query_match in match_list)
+            line_list.append("\n")
+            sys.stdout.write("\n".join(line_list))
+
+    def print_conformance_report(self):
+        """Print the findings of the validation of each walked device's data model"""
+        conformance_results = self.validate()
+        if conformance_results is None:
+            return
+
+        for device_id, finding_list in conformance_results.items():
+            line_list = ["The Conformance Findings for {} are ({} found):".format(device_id, len(finding_list))]
+            for finding in finding_list:
+                detail_list = [] if finding.expected is None else ["expected " + finding.expected]
+                detail_list += [] if finding.actual is None else ["found " + finding.actual]
+                line_list.append("- {}: {} ({})".format(finding.kind, finding.path, ", ".join(detail_list)))
+            line_list.append("\n")
+            sys.stdout.write("\n".join(line_list))
+
+    def print_fleet_report(self):
+        """Print the completion rate and throughput of a fleet walk"""
+        if self.orchestrator is not None:
+            print("")
+            self.orchestrator.print_report()
 
 
     def get_implemented_data_model(self):
         """Get the implemented data model, as built out during the walk"""
         return self.implemented_data_model
 
+    def get_implemented_data_models(self):
+        """Get the implemented data model of each walked device, keyed by Device ID"""
+        return self.implemented_data_models
+
+    def get_poll_history(self):
+        """Get the PollHistory of the polled Parameter values, or None if the walk doesn't poll"""
+        return None if self.poller is None else self.poller.get_history()
+
+    def get_query(self):
+        """Get a DataModelQuery over the implemented data model of each walked device"""
+        return DataModelQuery(self.implemented_data_models)
+
+    def validate(self):
+        """Validate the implemented data model of each walked device against
+            the data model definitions, returning the ConformanceFindings of
+            each device (or None without definitions)"""
+        if self.validator is None:
+            return None
+
+        return self.validator.validate_all(self.implemented_data_models)
+
 
 
 class CWMPServer(object):
-    """An CWMP Server that is also an HTTP Server that can be stopped"""
-    def __init__(self, ip_addr, port):
+    """An CWMP Server that is also an HTTP Server that can be stopped
+
+    In the default (serial) mode a single device is walked and the server
+     stops once its CWMP Session is complete.  In concurrent mode each device
+     gets its own CWMPSession, the HTTP Requests are handled on a thread pool,
+     and the server stops after max_devices walks (or runs until stopped)."""
+    logger = logging.getLogger("CWMPServer")
+
+    def __init__(self, ip_addr, port, concurrent=False, max_workers=16, max_devices=None,
+                 discovery_policy=None, gpv_batch_size=DEFAULT_GPV_BATCH_SIZE,
+                 values_mode=VALUES_LEAF, walk_order=WALK_ORDER_BFS, priority_paths=None,
+                 walk_budget=None, walk_cache=None, max_body_size=DEFAULT_MAX_BODY_SIZE, exporters=None,
+                 memory_budget=None, http_server=None, session_key_prefix="", keep_data_models=True,
+                 path_filter=None, walk_checkpoints=None, poller=None, indexed=False, indexed_values=None):
+        if values_mode not in (VALUES_LEAF, VALUES_ROOT, VALUES_TOP_LEVEL):
+            raise ValueError("Unknown values mode: {}".format(values_mode))
+        if walk_order not in WALK_SCHEDULERS:
+            raise ValueError("Unknown walk order: {}".format(walk_order))
+
         self.port = port
         self.ip_addr = ip_addr
-        self.data_model = []
-        self.device_id = None
-        self.root_data_model = None
-        self.requested_gpn = None
-        self.requested_gpv = None
-        self.pending_gpn_list = []
-        self.http_server = StoppableHTTPServer(("", port), CWMPHandler)
+        self.concurrent = concurrent
+        self.max_devices = max_devices
+        self.discovery_policy = discovery_policy or DiscoveryPolicy()
+        self.path_filter = path_filter if path_filter is not None else PathFilter()
+        self.gpv_batch_size = gpv_batch_size
+        self.gpv_batch_sizes = {}
+        self.values_mode = values_mode
+        self.walk_order = walk_order
+        self.priority_paths = priority_paths
+        self.walk_budget = walk_budget or WalkBudget()
+        self.walk_cache = walk_cache
+        self.walk_checkpoints = walk_checkpoints
+        self.poller = poller
+        self.max_body_size = max_body_size
+        self.exporters = exporters or []
+        self.memory_budget = memory_budget
+        self.indexed = indexed or indexed_values is not None
+        self.indexed_values = indexed_values
+        self.session_key_prefix = session_key_prefix
+        self.keep_data_models = keep_data_models
+        self.sessions = {}
+        self.address_session_keys = {}
+        self.device_session_keys = {}
+        self.completed_data_models = {}
+        self.completed_device_ids = set()
+        self.session_lock = threading.Lock()
+        self.metrics = WalkMetrics()
+
+        if http_server is not None:
+            # An HTTP Server that is handed its connections (see WalkCoordinator)
+            self.http_server = http_server
+        elif concurrent:
+            self.http_server = ThreadPoolHTTPServer(("", port), CWMPHandler, max_workers)
+        else:
+            self.http_server = StoppableHTTPServer(("", port), CWMPHandler)
+
         self.http_server.set_cwmp_server(self)
 
 
     def start_server(self):
         """Keep the CWMP Server up until it is stopped"""
         starting_msg = "Starting the CWMP Server at: {}".format("http://" + self.ip_addr + ":" + str(self.port))
-        logger = logging.getLogger(self.__class__.__name__)
 
-        logger.info(starting_msg)
+        self.logger.info(starting_msg)
         print(starting_msg)
 
         print("Waiting for CWMP Inform...")
-        self.http_server.serve_forever()
+        try:
+            self.http_server.serve_forever()
+        finally:
+            self.http_server.server_close()
 
 
     def stop_server(self):
         """Terminate the CWMP Server"""
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.info("Stopping the CWMP Server")
+        self.logger.info("Stopping the CWMP Server")
         self.http_server.stop_serving()
 
 
+    def is_concurrent(self):
+        """Check to see if the CWMP Server walks multiple devices at once"""
+        return self.concurrent
+
+
+    def get_http_server(self):
+        """Retrieve the HTTP Server that the CWMPHandler is run on"""
+        return self.http_server
+
+
+    def get_discovery_policy(self):
+        """Retrieve the policy that chooses the NextLevel of each GetParameterNames"""
+        return self.discovery_policy
+
+
+    def get_path_filter(self):
+        """Retrieve the Path Filter that prunes the walks"""
+        return self.path_filter
+
+
+    def get_walk_checkpoints(self):
+        """Retrieve the Walk Checkpoints that unfinished walks are resumed from, or None"""
+        return self.walk_checkpoints
+
+
+    def get_walk_cache(self):
+        """Retrieve the on-disk Walk Cache of the device structures, or None"""
+        return self.walk_cache
+
+
+    def get_poller(self):
+        """Retrieve the Walk Poller that polls the devices that were walked before, or None"""
+        return self.poller
+
+
+    def get_max_body_size(self):
+        """Retrieve the largest HTTP Request content that is accepted (None for no limit)"""
+        return self.max_body_size
+
+
+    def get_metrics(self):
+        """Retrieve the live Walk Metrics of the CWMP Sessions"""
+        return self.metrics
+
+
+    def get_exporters(self):
+        """Retrieve the WalkExporters that the walked objects are streamed to"""
+        return self.exporters
+
+
+    def get_memory_budget(self):
+        """Retrieve the Memory Budget of the implemented data models, or None"""
+        return self.memory_budget
+
+
+    def get_gpv_batch_size(self, device_model):
+        """Retrieve the GPV batch size to start with for a device model, which
+            is the best size seen in earlier walks of that model"""
+        with self.session_lock:
+            return self.gpv_batch_sizes.get(device_model, self.gpv_batch_size)
+
+
+    def get_session(self, session_key, client_address):
+        """Retrieve the CWMP Session for the session key (from the session
+            cookie), falling back to the device's address for a device that
+            doesn't return the cookie, or None if there isn't one"""
+        with self.session_lock:
+            session = self.sessions.get(session_key)
+
+            if session is None:
+                session = self.sessions.get(self.address_session_keys.get(client_address))
+
+            return session
+
+    def start_session(self, device_id, client_address):
+        """Create a new CWMP Session, with a new session key, for the device
+            at the address, or return None if the CWMP Server is already
+            busy with another device"""
+
+        with self.session_lock:
+            if device_id in self.device_session_keys:
+                # The device started over, so abandon its previous session
+                self.logger.warning("Abandoning the incomplete CWMP Session for %s", device_id)
+                self._forget_session(self.sessions[self.device_session_keys[device_id]], completed=False)
+
+            if not self.concurrent and len(self.sessions) > 0:
+                return None
+
+            session_key = self.session_key_prefix + secrets.token_hex(16)
+            session = CWMPSession(session_key, client_address, self.values_mode,
+                                  self._create_walk_scheduler(), self.walk_budget, self.exporters,
+                                  self.memory_budget, self.path_filter,
+                                  DataModelIndex(self.indexed_values) if self.indexed else None)
+            self.sessions[session_key] = session
+            self.address_session_keys[client_address] = session_key
+            self.device_session_keys[device_id] = session_key
+            session.get_metrics().set_device_id(device_id)
+            self.metrics.start_session(session.get_metrics())
+            self.logger.info("CWMP Session started for %s at [%s]; %s active",
+                             device_id, client_address, len(self.sessions))
+
+        for exporter in self.exporters:
+            exporter.start_device(device_id)
+
+        return session
+
+    def _forget_session(self, session, completed=True):
+        """Remove a CWMP Session and its keys (the session lock must be held)"""
+        session_key = session.get_session_key()
+        self.sessions.pop(session_key, None)
+        self.metrics.end_session(session.get_metrics(), completed)
+
+        # The data model of an abandoned walk is thrown away
+        if not completed:
+            session.get_implemented_data_model().release()
+
+        for exporter in self.exporters:
+            exporter.end_device(session.get_device_id(), completed)
+
+        # Keep the checkpoint of an abandoned walk, for the device's next session
+        if session.get_walk_checkpoint() is not None:
+            session.get_walk_checkpoint().close()
+
+        if self.device_session_keys.get(session.get_device_id()) == session_key:
+            del self.device_session_keys[session.get_device_id()]
+        if self.address_session_keys.get(session.get_client_address()) == session_key:
+            del self.address_session_keys[session.get_client_address()]
+
+    def _create_walk_scheduler(self):
+        """Create the Walk Scheduler that orders the GPNs of a new CWMP Session"""
+        if self.walk_order == WALK_ORDER_PRIORITY:
+            return PriorityWalkScheduler(self.priority_paths)
+
+        return WALK_SCHEDULERS[self.walk_order]()
+
+    def complete_session(self, session):
+        """Record the data model of a completed CWMP Session, stopping the
+            CWMP Server if no further devices should be walked"""
+
+        best_batch_size = session.get_gpv_batcher().get_best_size()
+
+        # Complete (export, and allow to spill) the objects whose values
+        #  were skipped or never returned
+        session.complete_remaining_objects()
+        session.get_implemented_data_model().freeze()
+
+        # Cache the structure of a complete (and unfiltered) walk for the device's next walk
+        if (self.walk_cache is not None and not session.is_truncated() and not session.is_subtree_skipped() and
+                self.path_filter.is_empty() and
+                session.get_software_version() is not None and not session.is_polling()):
+            try:
+                self.walk_cache.store(session.get_device_id(), session.get_software_version(),
+                                      session.get_implemented_data_model())
+            except OSError as err:
+                self.logger.warning("Unable to store the Walk Cache entry of %s (%s)",
+                                    session.get_device_id(), err)
+
+        # Learn the Parameters of a complete walk, or record the values of a poll
+        if self.poller is not None:
+            if session.is_polling():
+                self.poller.record_poll(session.get_device_id(), session.get_implemented_data_model())
+            elif not session.is_truncated() and not session.is_subtree_skipped():
+                self.poller.learn(session.get_device_id(), session.get_software_version(),
+                                  session.get_implemented_data_model())
+
+        with self.session_lock:
+            self._forget_session(session)
+            if session.get_walk_checkpoint() is not None:
+                # The walk is complete, so there is nothing left to resume
+                self.walk_checkpoints.discard(session.get_device_id())
+            self.completed_device_ids.add(session.get_device_id())
+            # Keep the data model of the device's full walk, rather than that of a poll
+            if self.keep_data_models and not (session.is_polling() and
+                                              session.get_device_id() in self.completed_data_models):
+                previous_data_model = self.completed_data_models.get(session.get_device_id())
+                if previous_data_model is not None:
+                    previous_data_model.release()
+                self.completed_data_models[session.get_device_id()] = session.get_implemented_data_model()
+            else:
+                session.get_implemented_data_model().release()
+            if best_batch_size is not None:
+                self.gpv_batch_sizes[session.get_device_model()] = best_batch_size
+            completed_count = len(self.completed_device_ids)
+            self.logger.info("CWMP Session completed for %s; %s devices walked, %s active",
+                             session.get_device_id(), completed_count, len(self.sessions))
+
+        if (not self.concurrent or
+                (self.max_devices is not None and completed_count >= self.max_devices)):
+            self.stop_server()
+
+    def abandon_session(self, session):
+        """Abandon a CWMP Session that can't go on (e.g. the device sent a
+            response to an RPC that wasn't outstanding)"""
+        with self.session_lock:
+            if self.sessions.get(session.get_session_key()) is session:
+                self.logger.warning("Abandoning the CWMP Session for %s", session.get_device_id())
+                self._forget_session(session, completed=False)
+
+    def get_active_device_ids(self):
+        """Retrieve the Device IDs of the CWMP Sessions that are in progress"""
+        with self.session_lock:
+            return [session.get_device_id() for session in self.sessions.values()]
+
+
+    def get_implemented_data_model(self):
+        """Get the implemented data model of the first walked device"""
+        with self.session_lock:
+            for data_model in self.completed_data_models.values():
+                return data_model
+
+        return []
+
+    def get_implemented_data_models(self):
+        """Get the implemented data model of each walked device, keyed by Device ID"""
+        with self.session_lock:
+            return dict(self.completed_data_models)
+
+
+
+class WalkCoordinator(object):
+    """Walks devices on several worker processes, which share the CWMP port
+
+    The coordinator accepts the connections and hands each one (its socket,
+     over a Unix pipe) to a worker process, which walks its devices with its
+     own concurrent CWMPServer, so the XML of many devices is parsed on all
+     of the host's cores.  The Informs that start new CWMP Sessions are
+     handed to the workers in turn.  A worker's session keys start with its
+     number, so a device that opens a new connection during its CWMP Session
+     is handed to the same worker by its session cookie (or, without the
+     cookie, to the worker that its address last Informed).  The workers stream the complete objects of their walks
+     and snapshots of their metrics back; the coordinator rebuilds the data
+     models, feeds the exporters, serves the combined metrics (by HTTP GET on
+     the CWMP port) and stops after max_devices walks (or runs until
+     stopped)."""
+    logger = logging.getLogger("WalkCoordinator")
+
+    def __init__(self, ip_addr, port, process_count, max_devices=None, walk_options=None, exporters=None):
+        """Initialize the Walk Coordinator and open the CWMP port"""
+        self.walk_options = dict(walk_options or {})
+        if self.walk_options.get("values_mode", VALUES_LEAF) not in (VALUES_LEAF, VALUES_ROOT, VALUES_TOP_LEVEL):
+            raise ValueError("Unknown values mode: {}".format(self.walk_options["values_mode"]))
+        if self.walk_options.get("walk_order", WALK_ORDER_BFS) not in WALK_SCHEDULERS:
+            raise ValueError("Unknown walk order: {}".format(self.walk_options["walk_order"]))
+
+        # Check the path filter patterns (which the workers compile) up front
+        PathFilter(self.walk_options.get("include_paths"), self.walk_options.get("exclude_paths"))
+
+        self.ip_addr = ip_addr
+        self.port = port
+        self.process_count = process_count
+        self.max_devices = max_devices
+        self.exporters = exporters or []
+        self.memory_budget = _create_memory_budget(self.walk_options)
+        self.context = multiprocessing.get_context(WORKER_START_METHOD)
+        self.result_queue = self.context.Queue()
+        self.log_queue = self.context.Queue()
+        self.worker_list = []
+        self.next_worker_index = 0
+        self.address_workers = {}
+        self.worker_metrics = {}
+        self.walking_data_models = {}
+        self.completed_data_models = {}
+        self.stop = False
+        self.lock = threading.Lock()
+        self.listen_socket = socket.create_server(("", port), backlog=128)
+        self.session_cookie_pattern = re.compile(SESSION_COOKIE_NAME.encode("ascii") + rb"=(\d+)-")
+        self.inform_pattern = re.compile(rb"<(?:[\w.-]+:)?Inform[\s>]")
+
+
+    def get_port(self):
+        """Retrieve the port that the CWMP Server listens on"""
+        return self.listen_socket.getsockname()[1]
+
+
+    def start_server(self):
+        """Start the worker processes and hand them the connections until the
+            coordinator is stopped"""
+        starting_msg = "Starting the CWMP Server at: {} with {} worker processes".format(
+            "http://" + self.ip_addr + ":" + str(self.get_port()), self.process_count)
+
+        self.logger.info(starting_msg)
+        print(starting_msg)
+
+        log_listener = logging.handlers.QueueListener(self.log_queue, WorkerLogHandler())
+        log_listener.start()
+        result_thread = threading.Thread(target=self._receive_results, name="WalkCoordinator")
+
+        try:
+            self._start_workers()
+            result_thread.start()
+
+            print("Waiting for CWMP Inform...")
+            self._hand_off_connections()
+        finally:
+            self._stop_workers()
+            if result_thread.is_alive():
+                result_thread.join()
+            log_listener.stop()
+            self.listen_socket.close()
+
+
+    def stop_server(self):
+        """Stop handing out connections, and then stop the worker processes"""
+        self.logger.info("Stopping the Walk Coordinator")
+        self.stop = True
+
+
+    def get_combined_metrics(self):
+        """Retrieve the metrics of all of the worker processes, combined into
+            one metrics dict (see WalkMetrics.to_dict)"""
+        with self.lock:
+            metrics_dict_list = list(self.worker_metrics.values())
+
+        return combine_metrics(metrics_dict_list)
+
+
+    def get_implemented_data_model(self):
+        """Get the implemented data model of the first walked device"""
+        with self.lock:
+            for data_model in self.completed_data_models.values():
+                return data_model
+
+        return []
+
+    def get_implemented_data_models(self):
+        """Get the implemented data model of each walked device, keyed by Device ID"""
+        with self.lock:
+            return dict(self.completed_data_models)
+
+
+    def _start_workers(self):
+        """Start the worker processes, each with a pipe that it is handed its connections over"""
+        root_logger = logging.getLogger()
+        trace_enabled = not logging.getLogger(TRACE_LOGGER_NAME).propagate
+
+        for worker_index in range(self.process_count):
+            handoff_conn, worker_conn = self.context.Pipe()
+            process = self.context.Process(
+                target=_run_walk_worker, name="cwmpwalk-worker-{}".format(worker_index),
+                args=(worker_index, worker_conn, self.result_queue, self.log_queue,
+                      root_logger.getEffectiveLevel(), trace_enabled, self.walk_options))
+            process.start()
+            worker_conn.close()
+            self.worker_list.append((process, handoff_conn))
+
+        self.logger.info("Started %s worker processes", self.process_count)
+
+    def _stop_workers(self):
+        """Tell the worker processes to stop, once their connections are done"""
+        for process, handoff_conn in self.worker_list:
+            try:
+                handoff_conn.send(None)
+            except OSError:
+                pass
+
+        for process, handoff_conn in self.worker_list:
+            process.join(HTTP_KEEP_ALIVE_TIMEOUT + WORKER_METRICS_INTERVAL)
+            if process.is_alive():
+                self.logger.warning("Terminating the worker process %s", process.name)
+                process.terminate()
+                process.join()
+            handoff_conn.close()
+
+
+    def _hand_off_connections(self):
+        """Accept the connections and hand each one to a worker process, once
+            its HTTP headers show which worker it belongs to"""
+        selector = selectors.DefaultSelector()
+        selector.register(self.listen_socket, selectors.EVENT_READ)
+        waiting_connections = {}
+
+        try:
+            while not self.stop:
+                now = time.monotonic()
+
+                # Look at the connections whose HTTP headers were incomplete again
+                for connection, waiting in waiting_connections.items():
+                    if not waiting[2] and now - waiting[1] >= HANDOFF_RETRY_INTERVAL:
+                        selector.register(connection, selectors.EVENT_READ)
+                        waiting[2] = True
+
+                for key, _ in selector.select(HANDOFF_RETRY_INTERVAL if len(waiting_connections) > 0 else 0.5):
+                    if key.fileobj is self.listen_socket:
+                        try:
+                            connection, client_address = self.listen_socket.accept()
+                        except OSError:
+                            continue
+                        connection.setblocking(False)
+                        selector.register(connection, selectors.EVENT_READ)
+                        waiting_connections[connection] = [client_address, time.monotonic(), True, time.monotonic()]
+                        continue
+
+                    connection = key.fileobj
+                    waiting = waiting_connections[connection]
+                    selector.unregister(connection)
+                    waiting[1] = time.monotonic()
+                    waiting[2] = False
+
+                    if self._route_connection(connection, waiting[0],
+                                              time.monotonic() - waiting[3] >= HANDOFF_TIMEOUT):
+                        del waiting_connections[connection]
+        finally:
+            for connection in waiting_connections:
+                connection.close()
+            selector.close()
+
+    def _route_connection(self, connection, client_address, timed_out):
+        """Hand a connection to its worker process (or answer a metrics GET),
+            returning False if its HTTP headers are still incomplete"""
+        try:
+            head = connection.recv(HANDOFF_MAX_PEEK, socket.MSG_PEEK)
+        except BlockingIOError:
+            return timed_out and self._close_connection(connection)
+        except OSError:
+            return self._close_connection(connection)
+
+        if len(head) == 0:
+            # The device closed the connection without a request
+            return self._close_connection(connection)
+
+        header_end = head.find(b"\r\n\r\n")
+        if header_end < 0 and len(head) < HANDOFF_MAX_PEEK and not timed_out:
+            return False
+        elif head.startswith(b"GET "):
+            # Answer on a thread of its own, as a slow client would hold up the hand-off
+            threading.Thread(target=self._serve_metrics, args=(connection, head),
+                             name="WalkCoordinatorMetrics", daemon=True).start()
+            return True
+
+        match = self.session_cookie_pattern.search(head, 0, header_end)
+        if match is not None and int(match.group(1)) < self.process_count:
+            worker_index = int(match.group(1))
+        elif (header_end + 4 == len(head) and not timed_out and
+              re.search(rb"(?i)\r\n(content-length: *[1-9]|transfer-encoding: *chunked)", head[:header_end])):
+            # Wait for the start of the content, to see whether it's an Inform
+            return False
+        elif self.inform_pattern.search(head, header_end) is not None:
+            # A new CWMP Session, for the next worker in turn
+            worker_index = self.next_worker_index
+            self.next_worker_index = (worker_index + 1) % self.process_count
+            self.address_workers[client_address[0]] = worker_index
+        else:
+            worker_index = self.address_workers.get(
+                client_address[0], zlib.crc32(client_address[0].encode("utf-8")) % self.process_count)
+
+        process, handoff_conn = self.worker_list[worker_index]
+        try:
+            connection.setblocking(True)
+            handoff_conn.send(client_address)
+            multiprocessing.reduction.send_handle(handoff_conn, connection.fileno(), process.pid)
+        except OSError as err:
+            self.logger.warning("Unable to hand the connection from %s to worker %s (%s)",
+                                client_address, worker_index, err)
+
+        return self._close_connection(connection)
+
+    def _serve_metrics(self, connection, head):
+        """Answer an HTTP GET of the combined metrics, and close the connection"""
+        request_line = head.split(b"\r\n", 1)[0].decode("latin-1").split(" ")
+        path = urllib.parse.urlsplit(request_line[1]).path if len(request_line) > 1 else ""
+
+        if path == METRICS_PATH:
+            status_line = "200 OK"
+            content_type = PROMETHEUS_CONTENT_TYPE
+            content = render_prometheus_text(self.get_combined_metrics()).encode("utf-8")
+        elif path == METRICS_JSON_PATH:
+            status_line = "200 OK"
+            content_type = "application/json"
+            content = render_json_text(self.get_combined_metrics()).encode("utf-8")
+        else:
+            status_line = "404 Not Found"
+            content_type = "text/plain"
+            content = b"Not Found"
+
+        try:
+            connection.setblocking(True)
+            connection.settimeout(HANDOFF_TIMEOUT)
+            connection.recv(head.find(b"\r\n\r\n") + 4)
+            connection.sendall("HTTP/1.1 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+                status_line, content_type, len(content)).encode("ascii") + content)
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+    def _close_connection(self, connection):
+        """Close the coordinator's side of a connection"""
+        connection.close()
+        return True
+
+
+    def _receive_results(self):
+        """Receive the events and metrics of the worker processes until they have all stopped"""
+        stopped_count = 0
+
+        while stopped_count < len(self.worker_list):
+            try:
+                message = self.result_queue.get(timeout=WORKER_METRICS_INTERVAL)
+            except queue.Empty:
+                if not any(process.is_alive() for process, _ in self.worker_list):
+                    break
+                continue
+
+            if message[0] == WORKER_MESSAGE_EVENTS:
+                self._process_worker_events(message[2])
+            elif message[0] == WORKER_MESSAGE_METRICS:
+                with self.lock:
+                    self.worker_metrics[message[1]] = message[2]
+            elif message[0] == WORKER_MESSAGE_STOPPED:
+                stopped_count += 1
+
+    def _process_worker_events(self, event_list):
+        """Rebuild the data models from the events of a worker process"""
+        for event in event_list:
+            device_id = event[1]
+
+            if event[0] == WORKER_EVENT_START:
+                with self.lock:
+                    previous_data_model = self.walking_data_models.get(device_id)
+                    if previous_data_model is not None:
+                        previous_data_model.release()
+                    self.walking_data_models[device_id] = DataModelStore(self.memory_budget,
+                                                                         self._create_data_model_index())
+                for exporter in self.exporters:
+                    exporter.start_device(device_id)
+            elif event[0] == WORKER_EVENT_OBJECT:
+                data_model_obj = unpack_data_model_object(event[2])
+                with self.lock:
+                    data_model = self.walking_data_models.get(device_id)
+                if data_model is None:
+                    continue
+
+                data_model.add_object(data_model_obj)
+                for exporter in self.exporters:
+                    exporter.export_object(device_id, data_model_obj)
+                data_model.complete_object(data_model_obj)
+            elif event[0] == WORKER_EVENT_END:
+                completed = event[2] == WALK_COMPLETED
+                with self.lock:
+                    data_model = self.walking_data_models.pop(device_id, None)
+                    if completed and data_model is not None:
+                        data_model.freeze()
+                        previous_data_model = self.completed_data_models.get(device_id)
+                        if previous_data_model is not None:
+                            previous_data_model.release()
+                        self.completed_data_models[device_id] = data_model
+                    elif data_model is not None:
+                        data_model.release()
+                    completed_count = len(self.completed_data_models)
+                for exporter in self.exporters:
+                    exporter.end_device(device_id, completed)
+
+                self.logger.info("The walk of %s %s; %s devices walked",
+                                 device_id, "completed" if completed else "was abandoned", completed_count)
+                if self.max_devices is not None and completed_count >= self.max_devices:
+                    self.stop_server()
+
+    def _create_data_model_index(self):
+        """Create the DataModelIndex of a rebuilt data model, or None if the walk isn't indexed"""
+        if not self.walk_options.get("indexed") and self.walk_options.get("indexed_values") is None:
+            return None
+
+        return DataModelIndex(self.walk_options.get("indexed_values"))
+
+
+
+class CWMPSession(object):
+    """The CWMP Session state of a single device that is being walked"""
+    logger = logging.getLogger("CWMPSession")
+
+    def __init__(self, session_key, client_address=None, values_mode=VALUES_LEAF,
+                 gpn_scheduler=None, walk_budget=None, exporters=None, memory_budget=None, path_filter=None,
+                 data_model_index=None):
+        self.session_key = session_key
+        self.client_address = client_address
+        self.values_mode = values_mode
+        self.walk_budget = walk_budget or WalkBudget()
+        self.path_filter = path_filter if path_filter is not None else PathFilter()
+        self.start_time = time.monotonic()
+        self.rpc_count = 0
+        self.truncated = False
+        self.subtree_skipped = False
+        self.next_level_only = False
+        self.data_model = DataModelStore(memory_budget, data_model_index)
+        self.device_id = None
+        self.device_model = None
+        self.software_version = None
+        self.cached_walk = None
+        self.walk_checkpoint = None
+        self.poll_parameter_names = None
+        self.root_data_model = None
+        self.outstanding_rpc = None
+        self.requested_gpn = None
+        self.requested_gpn_next_level = True
+        self.requested_gpv = None
+        self.requested_gpv_path = None
+        self.gpn_scheduler = gpn_scheduler if gpn_scheduler is not None else BFSWalkScheduler()
+        self.pending_gpv_path_queue = collections.deque()
+        self.gpv_batcher = GPVBatcher()
+        self.rpc_sent_time = None
+        self.rpc_received_time = None
+        self.rpc_received_bytes = 0
+        self.mean_rtt = None
+        self.mean_item_cost = None
+        self.subtree_sizes = {}
+        self.metrics = SessionMetrics(session_key, client_address)
+        self.exporters = exporters or []
+        self.tracks_completion = len(self.exporters) > 0 or memory_budget is not None or data_model_index is not None
+        self.pending_value_counts = {}
+        self.retrieved_gpv_paths = set()
+        self.completed_object_names = set()
+
+
+    def get_session_key(self):
+        """Retrieve the key that identifies this CWMP Session (the value of its session cookie)"""
+        return self.session_key
+
+
+    def get_metrics(self):
+        """Retrieve the Session Metrics of the CWMP Session"""
+        return self.metrics
+
+
+    def get_client_address(self):
+        """Retrieve the address of the device's connection"""
+        return self.client_address
+
+
     def get_device_id(self):
         """Retrieve the Device ID that is being worked on"""
         return self.device_id
@@ -120,19 +1119,76 @@ class CWMPServer(object):
 
     def set_device_id(self, value):
         """Set the Device ID for the device to be worked on"""
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.info("Device ID has now been set: {}".format(value))
+        self.logger.info("Device ID has now been set: %s", value)
         self.device_id = value
 
 
+    def get_device_model(self):
+        """Retrieve the model (OUI-ProductClass) of the device being worked on"""
+        return self.device_model
+
+    def set_device_model(self, value):
+        """Set the model (OUI-ProductClass) of the device to be worked on"""
+        self.device_model = value
+
+
+    def get_software_version(self):
+        """Retrieve the SoftwareVersion of the device being worked on"""
+        return self.software_version
+
+    def set_software_version(self, value):
+        """Set the SoftwareVersion of the device to be worked on"""
+        self.software_version = value
+
+
+    def get_cached_walk(self):
+        """Retrieve the CachedWalk of the device's previous walk, or None"""
+        return self.cached_walk
+
+    def set_cached_walk(self, value):
+        """Set the CachedWalk that the walk discovers known objects from"""
+        self.cached_walk = value
+
+
+    def get_path_filter(self):
+        """Retrieve the Path Filter that prunes the walk"""
+        return self.path_filter
+
+
+    def get_walk_checkpoint(self):
+        """Retrieve the WalkCheckpoint that the walk is checkpointed to (and
+            resumed from), or None"""
+        return self.walk_checkpoint
+
+    def set_walk_checkpoint(self, value):
+        """Set the WalkCheckpoint that the walk is checkpointed to"""
+        self.walk_checkpoint = value
+
+
+    def get_poll_parameter_names(self):
+        """Retrieve the full names of the Parameters that the session polls,
+            or None if it walks the device"""
+        return self.poll_parameter_names
+
+    def is_polling(self):
+        """Check to see if the session only polls the values of known Parameters"""
+        return self.poll_parameter_names is not None
+
+    def set_poll_parameter_names(self, value):
+        """Set the full names of the Parameters to poll (which are requested
+            by name), or None to walk the device"""
+        self.poll_parameter_names = value
+        if value is not None:
+            self.values_mode = VALUES_LEAF
+
+
     def get_root_data_model(self):
         """Retrieve the Root Data Model of the device being worked on"""
         return self.root_data_model
 
     def set_root_data_model(self, value):
         """Set the Root Data Model for the device to be be worked on"""
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.debug("Root Data Model has now been set: {}".format(value))
+        self.logger.debug("Root Data Model has now been set: %s", value)
         self.root_data_model = value
 
 
@@ -142,339 +1198,1488 @@ class CWMPServer(object):
 
     def add_object_to_data_model(self, data_model_obj):
         """Add a Data Model Object to the implemented data model"""
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.info("Object [{}] has been added to the data model".format(data_model_obj.get_name()))
-        self.data_model.append(data_model_obj)
+        self.logger.debug("Object [%s] has been added to the data model", data_model_obj.get_name())
+        self.data_model.add_object(data_model_obj)
+
+        # Queue the partial path GPV that retrieves the values of the subtree
+        #  that this object is the top of
+        if self._get_gpv_path(data_model_obj.get_name()) == data_model_obj.get_name():
+            self.pending_gpv_path_queue.append(data_model_obj.get_name())
+
+    def get_object(self, name):
+        """Retrieve a Data Model Object of the implemented data model by its name, or None"""
+        return self.data_model.get_object(name)
+
+    def get_parameter(self, full_param_name):
+        """Retrieve a Data Model Parameter of any object in the implemented
+            data model by its full name, or None if it isn't there"""
+        return self.data_model.get_parameter(full_param_name)
+
+
+    def get_outstanding_rpc(self):
+        """Retrieve the RPC (GetParameterNames or GetParameterValues) that
+            is waiting for a response from the device"""
+        return self.outstanding_rpc
+
+
+    def is_awaiting_response(self, rpc_name):
+        """Check to see if the RPC that is waiting for a response from the
+            device is rpc_name (GetParameterNames or GetParameterValues)"""
+        if self.outstanding_rpc != rpc_name:
+            return False
+        elif rpc_name == "GetParameterNames":
+            return self.requested_gpn is not None
+
+        return self.requested_gpv is not None or self.requested_gpv_path is not None
 
 
     def get_requested_gpn(self):
         """Retrieve the Requested GPN that is being worked on"""
         return self.requested_gpn
 
-    def set_requested_gpn(self, data_model_obj):
+    def set_requested_gpn(self, data_model_obj, next_level=True):
         """Set the Requested GPN to be worked on"""
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.debug("Requested GPN has now been set: {}".format(data_model_obj.get_name()))
+        self.logger.debug("Requested GPN has now been set: %s (NextLevel=%s)",
+                          data_model_obj.get_name(), next_level)
         self.requested_gpn = data_model_obj
+        self.requested_gpn_next_level = next_level
+        self.outstanding_rpc = "GetParameterNames"
+
+    def get_requested_gpn_next_level(self):
+        """Retrieve the NextLevel argument of the Requested GPN"""
+        return self.requested_gpn_next_level
+
+    def skip_requested_gpn(self):
+        """Record that the Sub-Objects of the Requested GPN are left
+            undiscovered, as the device faulted on it"""
+        self.logger.warning("Skipping the Sub-Objects of [%s]", self.requested_gpn.get_name())
+        self.subtree_skipped = True
+
+    def retry_requested_gpn_next_level(self):
+        """Record that the device faulted on a GPN with NextLevel=false, so
+            the rest of its walk is discovered one level at a time, and
+            requeue the Requested GPN"""
+        if not self.next_level_only:
+            self.logger.warning("%s rejected GetParameterNames with NextLevel=false; "
+                                "discovering its data model one level at a time", self.device_id)
+            self.next_level_only = True
+
+        self.append_gpn_items([self.requested_gpn])
+
+    def is_next_level_only(self):
+        """Check to see if the device is discovered one level at a time, as
+            it faulted on a GPN with NextLevel=false"""
+        return self.next_level_only
+
+    def is_subtree_skipped(self):
+        """Check to see if the walk left a subtree undiscovered because of a CWMP Fault"""
+        return self.subtree_skipped
 
 
     def get_requested_gpv(self):
         """Retrieve the Requested GPV that is being worked on"""
         return self.requested_gpv
 
-    def set_requested_gpv(self, data_model_obj):
-        """Set the Requested GPV to be worked on"""
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.debug("Requested GPV has now been set: {}".format(data_model_obj.get_name()))
-        self.requested_gpv = data_model_obj
+    def set_requested_gpv(self, param_list):
+        """Set the Requested GPV (a batch of DataModelParameters) to be worked on"""
+        self.logger.debug("Requested GPV has now been set: %s Parameters", len(param_list))
+        self.requested_gpv = param_list
+        self.requested_gpv_path = None
+        self.outstanding_rpc = "GetParameterValues"
+
+    def get_requested_gpv_path(self):
+        """Retrieve the partial path of the Requested GPV, or None if it requested Parameters by name"""
+        return self.requested_gpv_path
+
+    def set_requested_gpv_path(self, partial_path):
+        """Set the Requested GPV to be worked on to a partial path"""
+        self.logger.debug("Requested GPV has now been set: %s", partial_path)
+        self.requested_gpv = None
+        self.requested_gpv_path = partial_path
+        self.outstanding_rpc = "GetParameterValues"
 
 
     def append_gpn_items(self, partial_path_list):
-        """Add the DataModelObject List to the end of the Pending GPN List"""
-        logger = logging.getLogger(self.__class__.__name__)
-        self.pending_gpn_list.extend(partial_path_list)
-        logger.info("Appending {} items to the Pending GPN List".format(len(partial_path_list)))
-        logger.info("There are now {} items in the Pending GPN List".format(len(self.pending_gpn_list)))
+        """Add the DataModelObject List to the Pending GPN Scheduler"""
+        self.gpn_scheduler.push_items(partial_path_list)
+        self.logger.debug("Appending %s items to the Pending GPN List", len(partial_path_list))
+        self.logger.debug("There are now %s items in the Pending GPN List", len(self.gpn_scheduler))
 
     def get_next_gpn_item(self):
-        """Get the next DataModelObject item from the Pending GPN List"""
-        logger = logging.getLogger(self.__class__.__name__)
-        a_data_model_obj = self.pending_gpn_list.pop(0)
-        logger.info("Retrieving [{}] from the Pending GPN List; {} items left".format(a_data_model_obj.get_name(), len(self.pending_gpn_list)))
+        """Get the next DataModelObject item from the Pending GPN Scheduler"""
+        a_data_model_obj = self.gpn_scheduler.pop()
+        self.logger.info("Retrieving [%s] from the Pending GPN List; %s items left",
+                         a_data_model_obj.get_name(), len(self.gpn_scheduler))
         return a_data_model_obj
 
+    def get_pending_gpn_count(self):
+        """Retrieve the number of DataModelObject items waiting for a GPN"""
+        return len(self.gpn_scheduler)
+
     def more_gpn_items(self):
-        """Check to see if there are more DataModelObject items in the Pending GPN List"""
-        items_in_list = False
-        if len(self.pending_gpn_list) > 0:
-            items_in_list = True
+        """Check to see if there are more DataModelObject items to discover,
+            within the Walk Budget"""
+        if len(self.gpn_scheduler) == 0:
+            return False
+
+        if self.walk_budget.is_exhausted(self.rpc_count, time.monotonic() - self.start_time):
+            if not self.truncated:
+                self.logger.warning("The Walk Budget of %s is exhausted; %s objects are left undiscovered",
+                                    self.device_id, len(self.gpn_scheduler))
+                self.truncated = True
+
+            return False
+
+        return True
+
+    def is_truncated(self):
+        """Check to see if the walk stopped discovering because of the Walk Budget"""
+        return self.truncated
+
+
+    def get_gpv_batcher(self):
+        """Retrieve the GPV Batcher that holds the Parameters whose values are pending"""
+        return self.gpv_batcher
+
+    def append_gpv_parameters(self, data_model_obj, param_list):
+        """Queue the values of an object's Parameters, unless a partial path
+            GPV will retrieve them (the object is exported once its values are in)"""
+        if self._get_gpv_path(data_model_obj.get_name()) is None:
+            self._queue_gpv_parameters(data_model_obj, param_list)
+
+        self._complete_object_if_ready(data_model_obj)
+
+    def requeue_gpv_path(self, partial_path):
+        """Queue the values of the Parameters below a partial path, whose
+            partial path GPV failed, to be retrieved by name instead"""
+        self.retrieved_gpv_paths.add(partial_path)
 
-        return items_in_list
+        for data_model_obj in self.data_model.iter_subtree(partial_path):
+            self._queue_gpv_parameters(data_model_obj, data_model_obj.get_parameters())
+            self._complete_object_if_ready(data_model_obj)
+
+    def complete_requested_gpv(self):
+        """Record that the values of the Requested GPV are in (or were
+            skipped), completing the objects that have all of their values"""
+        if not self.tracks_completion:
+            return
+
+        if self.requested_gpv_path is not None:
+            self.retrieved_gpv_paths.add(self.requested_gpv_path)
+            for data_model_obj in self.data_model.iter_subtree(self.requested_gpv_path):
+                self._complete_object_if_ready(data_model_obj)
+            return
+
+        for dm_param in self.requested_gpv:
+            pending_count = self.pending_value_counts[dm_param.parent_path] - 1
+
+            if pending_count > 0:
+                self.pending_value_counts[dm_param.parent_path] = pending_count
+            else:
+                del self.pending_value_counts[dm_param.parent_path]
+                self._complete_object_if_ready(self.data_model.get_object(dm_param.parent_path))
+
+    def complete_remaining_objects(self):
+        """Complete the objects that are still waiting for values at the end
+            of the walk (their values were skipped, or never returned)"""
+        if not self.tracks_completion:
+            return
+
+        for data_model_obj in list(self.data_model.iter_subtree("", include_spilled=False)):
+            if data_model_obj.get_name() not in self.completed_object_names:
+                self._complete_object(data_model_obj)
+
+        self.pending_value_counts.clear()
+        self.completed_object_names.clear()
+
+    def _queue_gpv_parameters(self, data_model_obj, param_list):
+        """Hand an object's Parameters to the GPV Batcher, counting them as
+            pending values of the object (unless the resumed walk retrieved them)"""
+        if self.walk_checkpoint is not None:
+            param_list = self.walk_checkpoint.take_parameter_values(param_list)
+
+        if len(param_list) == 0:
+            return
+
+        self.gpv_batcher.append_parameters(param_list)
+
+        if self.tracks_completion:
+            name = data_model_obj.get_name()
+            self.pending_value_counts[name] = self.pending_value_counts.get(name, 0) + len(param_list)
+
+    def _complete_object_if_ready(self, data_model_obj):
+        """Complete an object once none of its values are pending"""
+        if not self.tracks_completion or data_model_obj is None:
+            return
+
+        name = data_model_obj.get_name()
+        gpv_path = self._get_gpv_path(name)
+
+        if (name in self.completed_object_names or name in self.pending_value_counts or
+                (gpv_path is not None and gpv_path not in self.retrieved_gpv_paths)):
+            return
+
+        self._complete_object(data_model_obj)
+
+    def _complete_object(self, data_model_obj):
+        """Hand a complete object to the exporters, after which it may be
+            spilled to disk"""
+        self.completed_object_names.add(data_model_obj.get_name())
+
+        for exporter in self.exporters:
+            exporter.export_object(self.device_id, data_model_obj)
+
+        self.data_model.complete_object(data_model_obj)
+
+    def _get_gpv_path(self, name):
+        """Retrieve the partial path whose GPV retrieves the values of an
+            object, or None if they are retrieved by name (as they are when
+            the Path Filter prunes the subtree of the partial path)"""
+        depth = name.count(".") - 1
+
+        if self.values_mode == VALUES_ROOT:
+            gpv_path = name.split(".", 1)[0] + "."
+        elif self.values_mode == VALUES_TOP_LEVEL and depth > 0:
+            gpv_path = ".".join(name.split(".", 2)[:2]) + "."
+        else:
+            return None
+
+        if self.path_filter.prunes_below(gpv_path):
+            return None
+
+        return gpv_path
+
+
+    def get_next_gpv_path(self):
+        """Get the next partial path from the Pending GPV Path Queue"""
+        return self.pending_gpv_path_queue.popleft()
+
+    def more_gpv_paths(self):
+        """Check to see if there are more partial paths in the Pending GPV Path Queue"""
+        return len(self.pending_gpv_path_queue) > 0
+
+
+    def set_rpc_sent(self):
+        """Record that an RPC has just been sent to the device"""
+        self.rpc_sent_time = time.monotonic()
+        self.rpc_count += 1
+
+    def get_rpc_count(self):
+        """Retrieve the number of RPCs (GPN and GPV) sent during the walk"""
+        return self.rpc_count
+
+    def set_rpc_received(self):
+        """Record that the response to the last RPC has just arrived"""
+        self.rpc_received_time = time.monotonic()
+        self.rpc_received_bytes = 0
+
+    def add_rpc_received_bytes(self, byte_count):
+        """Count bytes of the response to the last RPC as they are read"""
+        self.rpc_received_bytes += byte_count
+
+    def get_rpc_response_time(self):
+        """Retrieve the time the device took to respond to the last RPC, in seconds"""
+        if self.rpc_sent_time is None or self.rpc_received_time is None:
+            return 0.0
+
+        return self.rpc_received_time - self.rpc_sent_time
+
+    def get_rpc_response_bytes(self):
+        """Retrieve the size of the response to the last RPC, in bytes"""
+        return self.rpc_received_bytes
+
+    def record_rpc_timing(self, item_count):
+        """Update the mean round trip time and the mean per-item processing
+            time after the response to the last RPC has been processed"""
+        if self.rpc_sent_time is None or self.rpc_received_time is None:
+            return
+
+        rtt = self.get_rpc_response_time()
+        item_cost = (time.monotonic() - self.rpc_received_time) / max(item_count, 1)
+        self.mean_rtt = _ewma(self.mean_rtt, rtt)
+        self.mean_item_cost = _ewma(self.mean_item_cost, item_cost)
+
+    def get_mean_rtt(self):
+        """Retrieve the mean round trip time of an RPC, in seconds"""
+        return self.mean_rtt or 0.0
+
+    def get_mean_item_cost(self):
+        """Retrieve the mean time spent on each item of a response, in seconds"""
+        return self.mean_item_cost or 0.0
+
+
+    def get_subtree_size(self, shape):
+        """Retrieve the (item count, object count) of a subtree of the given
+            shape, as seen in an earlier NextLevel=false GPN, or None"""
+        return self.subtree_sizes.get(shape)
+
+    def record_subtree_size(self, shape, item_count, object_count):
+        """Record the size of a subtree discovered with a NextLevel=false GPN"""
+        self.subtree_sizes[shape] = (item_count, object_count)
+
+
+
+class DiscoveryPolicy(object):
+    """Chooses, per subtree, how GetParameterNames discovers the data model:
+        - next-level: NextLevel=true, one RPC for every object in the tree
+        - subtree: NextLevel=false on the root, the whole tree in one RPC
+        - auto: NextLevel=true near the root, and below that a per-subtree
+                 choice based on the observed round trip time and the
+                 size of subtrees of the same shape
+       Paths in subtree_paths are always discovered with NextLevel=false"""
+    def __init__(self, mode=DISCOVERY_NEXT_LEVEL, subtree_paths=None,
+                 auto_depth=2, max_subtree_items=5000):
+        """Initialize the Discovery Policy"""
+        if mode not in (DISCOVERY_NEXT_LEVEL, DISCOVERY_SUBTREE, DISCOVERY_AUTO):
+            raise ValueError("Unknown discovery mode: {}".format(mode))
+
+        self.mode = mode
+        self.subtree_paths = subtree_paths or []
+        self.auto_depth = auto_depth
+        self.max_subtree_items = max_subtree_items
+
+
+    def use_next_level(self, session, path):
+        """Return True to discover the object at path one level at a time,
+            or False to discover its whole subtree in a single GPN"""
+        for subtree_path in self.subtree_paths:
+            if path.startswith(subtree_path):
+                return False
+
+        if self.mode == DISCOVERY_NEXT_LEVEL:
+            return True
+        elif self.mode == DISCOVERY_SUBTREE:
+            return False
+        else:
+            return self._auto_next_level(session, path)
+
+
+    def _auto_next_level(self, session, path):
+        """Compare the estimated cost of both ways of discovering the subtree"""
+        # Walk the root and the top-level objects one level at a time, as
+        #  their subtrees can be most of the data model
+        if path.count(".") - 1 < self.auto_depth:
+            return True
+
+        subtree_size = session.get_subtree_size(get_path_shape(path))
+        if subtree_size is None:
+            # Nothing is known about this kind of subtree yet, so fetch it whole
+            return False
+
+        item_count, object_count = subtree_size
+        if item_count > self.max_subtree_items:
+            # Too much for a single response from a weak CPE
+            return True
+
+        # Walking per level costs a round trip for every object, while a
+        #  single GPN costs one round trip plus the time to handle every item
+        per_level_cost = object_count * session.get_mean_rtt()
+        subtree_cost = session.get_mean_rtt() + item_count * session.get_mean_item_cost()
+
+        return per_level_cost < subtree_cost
+
+
+
+class PathFilter(object):
+    """Prunes the walk to the subtrees that are included and not excluded
+
+    The patterns are object paths (ending in a dot, for the whole subtree)
+     or Parameter names, either full or relative to the root object (e.g.
+     DeviceInfo.), in which {i} matches any instance number (e.g.
+     WANDevice.{i}.WANConnectionDevice.{i}.).  Without include patterns the
+     whole data model is included.  The objects above an included subtree
+     are discovered (one level at a time) so that the walk can reach it, but
+     their Parameters are left out; an excluded subtree gets no GPN or GPV.
+
+    The patterns are compiled into tries of their path segments, so a path
+     is matched against all of them in a single pass over its segments."""
+    def __init__(self, include_paths=None, exclude_paths=None):
+        """Compile the include and exclude patterns"""
+        self.include_paths = list(include_paths or [])
+        self.exclude_paths = list(exclude_paths or [])
+        self.include_trie = _compile_path_patterns(self.include_paths)
+        self.exclude_trie = _compile_path_patterns(self.exclude_paths)
+
+
+    def get_include_paths(self):
+        """Retrieve the include patterns"""
+        return self.include_paths
+
+    def get_exclude_paths(self):
+        """Retrieve the exclude patterns"""
+        return self.exclude_paths
+
+    def is_empty(self):
+        """Check to see if the filter lets the whole data model through"""
+        return len(self.include_paths) == 0 and len(self.exclude_paths) == 0
+
+
+    def allows_object(self, name):
+        """Check to see if an object must be discovered: it is included (or
+            above an included subtree) and isn't excluded"""
+        if self.is_empty():
+            return True
+
+        return ((len(self.include_paths) == 0 or _locate_path(self.include_trie, name) != PATH_OUTSIDE) and
+                _locate_path(self.exclude_trie, name) != PATH_INSIDE)
+
+    def allows_parameter(self, full_param_name):
+        """Check to see if the value of a Parameter must be retrieved: it is
+            included and isn't excluded"""
+        if self.is_empty():
+            return True
+
+        return ((len(self.include_paths) == 0 or _locate_path(self.include_trie, full_param_name) == PATH_INSIDE) and
+                _locate_path(self.exclude_trie, full_param_name) != PATH_INSIDE)
+
+    def prunes_below(self, name):
+        """Check to see if the filter leaves out part of an object's subtree,
+            which then can't be discovered or retrieved as a whole"""
+        if self.is_empty():
+            return False
+
+        return ((len(self.include_paths) > 0 and _locate_path(self.include_trie, name) == PATH_ABOVE) or
+                _locate_path(self.exclude_trie, name) == PATH_ABOVE)
+
+
+
+class WalkScheduler(object):
+    """Orders the DataModelObjects that are waiting for a GetParameterNames"""
+    def push(self, data_model_obj):
+        """Add a DataModelObject to the Scheduler"""
+        raise NotImplementedError
+
+    def push_items(self, data_model_obj_list):
+        """Add the Sub-Objects of an object to the Scheduler"""
+        for data_model_obj in data_model_obj_list:
+            self.push(data_model_obj)
+
+    def pop(self):
+        """Take the next DataModelObject to discover from the Scheduler"""
+        raise NotImplementedError
+
+    def __len__(self):
+        """Retrieve the number of DataModelObjects in the Scheduler"""
+        raise NotImplementedError
+
+
+
+class BFSWalkScheduler(WalkScheduler):
+    """Discovers the data model breadth first (a FIFO queue)"""
+    def __init__(self):
+        """Initialize the Scheduler"""
+        self.pending_queue = collections.deque()
+
+    def push(self, data_model_obj):
+        """Add a DataModelObject to the end of the queue"""
+        self.pending_queue.append(data_model_obj)
+
+    def pop(self):
+        """Take the DataModelObject at the front of the queue"""
+        return self.pending_queue.popleft()
+
+    def __len__(self):
+        """Retrieve the number of DataModelObjects in the queue"""
+        return len(self.pending_queue)
+
+
+
+class DFSWalkScheduler(WalkScheduler):
+    """Discovers the data model depth first (a LIFO stack), which bounds the
+        number of pending objects by the depth times the fan-out of the data
+        model (the unvisited siblings of each object on the current path)"""
+    def __init__(self):
+        """Initialize the Scheduler"""
+        self.pending_stack = []
+
+    def push(self, data_model_obj):
+        """Add a DataModelObject to the top of the stack"""
+        self.pending_stack.append(data_model_obj)
+
+    def push_items(self, data_model_obj_list):
+        """Add the Sub-Objects so that the first of them is discovered first"""
+        self.pending_stack.extend(reversed(data_model_obj_list))
+
+    def pop(self):
+        """Take the DataModelObject at the top of the stack"""
+        return self.pending_stack.pop()
+
+    def __len__(self):
+        """Retrieve the number of DataModelObjects on the stack"""
+        return len(self.pending_stack)
+
+
+
+class PriorityWalkScheduler(WalkScheduler):
+    """Discovers the subtrees in the order of a list of priority paths, and
+        breadth first within the same priority
+
+    The priority paths are either full paths or paths relative to the root
+     object (e.g. DeviceInfo.).  The objects above a priority path get its
+     priority as well, so that the walk can reach it."""
+    def __init__(self, priority_paths=None):
+        """Initialize the Scheduler"""
+        self.priority_paths = priority_paths or DEFAULT_PRIORITY_PATHS
+        self.pending_heap = []
+        self.push_count = 0
+
+    def push(self, data_model_obj):
+        """Add a DataModelObject to the heap, by priority and then arrival"""
+        heapq.heappush(self.pending_heap,
+                       (self._get_priority(data_model_obj.get_name()), self.push_count, data_model_obj))
+        self.push_count += 1
+
+    def pop(self):
+        """Take the DataModelObject with the highest priority from the heap"""
+        return heapq.heappop(self.pending_heap)[2]
+
+    def __len__(self):
+        """Retrieve the number of DataModelObjects in the heap"""
+        return len(self.pending_heap)
+
+    def _get_priority(self, name):
+        """Retrieve the priority (lower is earlier) of an object"""
+        relative_name = name.split(".", 1)[-1]
+
+        for priority, priority_path in enumerate(self.priority_paths):
+            for object_name in (name, relative_name):
+                if object_name.startswith(priority_path) or priority_path.startswith(object_name):
+                    return priority
+
+        return len(self.priority_paths)
+
+
+
+WALK_SCHEDULERS = {
+    WALK_ORDER_BFS: BFSWalkScheduler,
+    WALK_ORDER_DFS: DFSWalkScheduler,
+    WALK_ORDER_PRIORITY: PriorityWalkScheduler
+}
+
+
+
+class WalkBudget(object):
+    """Limits the number of RPCs and the wall time of a walk
+
+    Once the budget is exhausted no further GetParameterNames are sent, but
+     the values of the Parameters that were already discovered are still
+     retrieved, so that the walked subtrees are complete."""
+    def __init__(self, max_rpcs=None, max_time=None):
+        """Initialize the Walk Budget"""
+        self.max_rpcs = max_rpcs
+        self.max_time = max_time
+
+    def is_exhausted(self, rpc_count, elapsed_time):
+        """Check to see if a walk has used up the budget"""
+        if self.max_rpcs is not None and rpc_count >= self.max_rpcs:
+            return True
+
+        if self.max_time is not None and elapsed_time >= self.max_time:
+            return True
+
+        return False
+
+
+
+class MemoryBudget(object):
+    """Limits the memory that the implemented data models are kept in, per
+        walk and for the whole process
+
+    The size of each complete object (one whose Parameter values have been
+     retrieved) is estimated; once a walk, or all of the walks together, go
+     over the budget, the walk's oldest complete objects are spilled to an
+     append-only SpillFile in the spill directory (the system's temporary
+     directory by default).  Objects that are still waiting for values are
+     never spilled."""
+    logger = logging.getLogger("MemoryBudget")
+
+    def __init__(self, max_walk_bytes=None, max_process_bytes=None, spill_dir=None):
+        """Initialize the Memory Budget"""
+        self.max_walk_bytes = max_walk_bytes
+        self.max_process_bytes = max_process_bytes
+        self.spill_dir = spill_dir
+        self.resident_bytes = 0
+        self.spilled_bytes = 0
+        self.lock = threading.Lock()
+
+
+    def get_resident_bytes(self):
+        """Retrieve the estimated size of the complete objects kept in memory"""
+        return self.resident_bytes
+
+    def get_spilled_bytes(self):
+        """Retrieve the estimated size of the objects spilled to disk"""
+        return self.spilled_bytes
+
+
+    def add_resident_bytes(self, byte_count):
+        """Account for a complete object that is kept in memory"""
+        with self.lock:
+            self.resident_bytes += byte_count
+
+    def release_resident_bytes(self, byte_count):
+        """Account for complete objects that are no longer kept in memory"""
+        with self.lock:
+            self.resident_bytes -= byte_count
+
+    def record_spill(self, byte_count):
+        """Account for a complete object that was spilled to disk"""
+        with self.lock:
+            self.resident_bytes -= byte_count
+            self.spilled_bytes += byte_count
+
+    def is_exceeded(self, walk_resident_bytes):
+        """Check to see if a walk (of the given resident size), or the
+            process, is over the budget"""
+        if self.max_walk_bytes is not None and walk_resident_bytes > self.max_walk_bytes:
+            return True
+
+        return self.max_process_bytes is not None and self.resident_bytes > self.max_process_bytes
+
+
+    def create_spill_file(self):
+        """Create a SpillFile in the spill directory"""
+        self.logger.info("Spilling complete objects to disk; %s bytes are resident", self.resident_bytes)
+        return SpillFile(self.spill_dir)
+
+
+
+class GPVBatcher(object):
+    """Collects the DataModelParameters of many pending objects into
+        GetParameterValues batches of an adaptive target size
+
+    The batch size doubles after each batch that was answered quickly and
+     without a fault, and halves after a slow or oversized response or a
+     fault.  After the first shrink it only grows slowly, and never back up
+     to the smallest size that failed.  The largest batch size that worked
+     is kept as the best size for the device model.  When the faults narrow
+     down to a single bad Parameter, the batch size from before the faults
+     is restored, as the fault wasn't caused by the batch size."""
+    def __init__(self, batch_size=DEFAULT_GPV_BATCH_SIZE, min_size=1, max_size=1024,
+                 max_response_time=5.0, max_response_bytes=1024 * 1024):
+        """Initialize the GPV Batcher"""
+        self.pending_param_list = collections.deque()
+        self.batch_size = batch_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_response_time = max_response_time
+        self.max_response_bytes = max_response_bytes
+        self.failed_size = None
+        self.best_size = None
+        self.pre_fault_state = None
+
+
+    def get_batch_size(self):
+        """Retrieve the current target size of a batch"""
+        return self.batch_size
+
+    def set_batch_size(self, value):
+        """Set the target size of a batch"""
+        self.batch_size = max(self.min_size, min(self.max_size, value))
+
+    def get_best_size(self):
+        """Retrieve the largest batch size that was answered without trouble, or None"""
+        return self.best_size
+
+
+    def append_parameters(self, param_list):
+        """Add the DataModelParameters to the end of the pending Parameters"""
+        self.pending_param_list.extend(param_list)
+
+    def more_parameters(self):
+        """Check to see if there are pending Parameters"""
+        return len(self.pending_param_list) > 0
+
+    def get_pending_count(self):
+        """Retrieve the number of pending Parameters"""
+        return len(self.pending_param_list)
+
+    def is_batch_ready(self):
+        """Check to see if there are enough pending Parameters for a full batch"""
+        return len(self.pending_param_list) >= self.batch_size
+
+    def get_next_batch(self):
+        """Take the next batch of DataModelParameters from the pending Parameters"""
+        batch_len = min(self.batch_size, len(self.pending_param_list))
+        return [self.pending_param_list.popleft() for _ in range(batch_len)]
+
+    def requeue_batch(self, param_list):
+        """Put a batch that has to be retried back in front of the pending Parameters"""
+        self.pending_param_list.extendleft(reversed(param_list))
+
+
+    def record_response(self, batch_len, response_time, response_bytes):
+        """Adapt the batch size to a GPV Response for a batch of batch_len Parameters"""
+        if response_time > self.max_response_time or response_bytes > self.max_response_bytes:
+            self._shrink(batch_len)
+        elif batch_len >= self.batch_size:
+            # Only a full batch proves that the batch size works
+            self.best_size = max(self.best_size or 0, batch_len)
+            self._grow()
+
+    def record_fault(self, batch_len):
+        """Adapt the batch size to a Fault in response to a GPV for batch_len Parameters"""
+        if batch_len > 1:
+            if self.pre_fault_state is None:
+                self.pre_fault_state = (self.batch_size, self.failed_size, self.best_size)
+
+            self._shrink(batch_len)
+        elif self.pre_fault_state is not None:
+            self.batch_size, self.failed_size, self.best_size = self.pre_fault_state
+            self.pre_fault_state = None
+
+
+    def _grow(self):
+        """Increase the batch size"""
+        if self.failed_size is None:
+            self.set_batch_size(self.batch_size * 2)
+        else:
+            self.set_batch_size(min(self.batch_size + max(1, self.batch_size // 4),
+                                    self.failed_size - 1))
+
+    def _shrink(self, batch_len):
+        """Decrease the batch size below a batch size that failed"""
+        if self.failed_size is None or batch_len < self.failed_size:
+            self.failed_size = batch_len
+
+        if self.best_size is not None and self.best_size >= batch_len:
+            self.best_size = None
+
+        self.set_batch_size(batch_len // 2)
 
 
 
 class StoppableHTTPServer(HTTPServer):
     """A Stoppable HTTP Server"""
+    logger = logging.getLogger("StoppableHTTPServer")
+
     def serve_forever(self):
         """Keep the HTTP Server up until it is stopped"""
         self.stop = False
-        logger = logging.getLogger(self.__class__.__name__)
 
-        logger.info("Starting the HTTP Server")
+        self.logger.info("Starting the HTTP Server")
         while not self.stop:
-            logger.info("Waiting for an HTTP Request")
+            self.logger.info("Waiting for an HTTP Request")
             self.handle_request()
 
 
-    def stop_serving(self):
-        """Terminate the HTTP Server"""
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.info("Stopping the HTTP Server")
-        self.stop = True
+    def stop_serving(self):
+        """Terminate the HTTP Server"""
+        self.logger.info("Stopping the HTTP Server")
+        self.stop = True
+
+
+    def get_cwmp_server(self):
+        """Retrieve the value of the CWMP Server"""
+        return self.cwmp_server
+
+    def set_cwmp_server(self, value):
+        """Set the value of the CWMP Server"""
+        self.cwmp_server = value
+
+
+
+class ThreadPoolHTTPServer(StoppableHTTPServer):
+    """A Stoppable HTTP Server that handles the HTTP Requests on a thread pool
+
+    A worker thread handles one HTTP Request at a time: between the HTTP
+     Requests of a persistent connection, the connection waits in the
+     server's selector rather than on a worker thread, so max_workers bounds
+     the HTTP Requests that are handled at once, not the connections that
+     are open.  A connection that is idle for HTTP_KEEP_ALIVE_TIMEOUT is
+     closed."""
+    logger = logging.getLogger("ThreadPoolHTTPServer")
+
+    # Wake up periodically so that a stop from a worker thread is noticed
+    timeout = 0.5
+
+    def __init__(self, server_address, handler_class, max_workers=16, bind_and_activate=True):
+        """Initialize the HTTP Server and its thread pool"""
+        super(ThreadPoolHTTPServer, self).__init__(server_address, handler_class, bind_and_activate)
+        self.max_workers = max_workers
+        self.executor = None
+        self.selector = None
+        self.idle_connections = {}
+        self.parked_connections = collections.deque()
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.wakeup_writer.setblocking(False)
+
+
+    def serve_forever(self):
+        """Keep the HTTP Server up until it is stopped, handing each
+            HTTP Request to a worker thread"""
+        self.stop = False
+
+        self.logger.info("Starting the HTTP Server with %s worker threads", self.max_workers)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as self.executor, \
+                selectors.DefaultSelector() as self.selector:
+            self.selector.register(self._get_accept_fileobj(), selectors.EVENT_READ, None)
+            self.selector.register(self.wakeup_reader, selectors.EVENT_READ, self.wakeup_reader)
+
+            try:
+                while not self.stop:
+                    for key, _ in self.selector.select(self.timeout):
+                        if key.data is None:
+                            self._accept_connection()
+                        elif key.data is self.wakeup_reader:
+                            self._register_parked_connections()
+                        else:
+                            # The next HTTP Request of an idle connection
+                            self.selector.unregister(key.fileobj)
+                            del self.idle_connections[key.fileobj]
+                            self.executor.submit(self._process_request_worker, key.fileobj, key.data)
+
+                    self._close_idle_connections(time.monotonic() - HTTP_KEEP_ALIVE_TIMEOUT)
+            finally:
+                self._register_parked_connections()
+                self._close_idle_connections(None)
+
+    def server_close(self):
+        """Close the listening socket and the selector's wakeup sockets"""
+        super(ThreadPoolHTTPServer, self).server_close()
+        self.wakeup_reader.close()
+        self.wakeup_writer.close()
+
+
+    def process_request(self, request, client_address):
+        """Handle the HTTP Request on one of the worker threads"""
+        self.executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        """Process an HTTP Request, and then park its connection until the
+            next one (or close it) (runs on a worker thread)"""
+        keep_alive = False
+
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+            keep_alive = not handler.close_connection
+        except Exception:
+            self.handle_error(request, client_address)
+
+        if keep_alive and not self.stop:
+            self.parked_connections.append((request, client_address))
+            try:
+                self.wakeup_writer.send(b"\0")
+            except (BlockingIOError, OSError):
+                # A wakeup is already pending (or the server is closing)
+                pass
+        else:
+            self.shutdown_request(request)
+
+
+    def _get_accept_fileobj(self):
+        """Retrieve what the selector waits on for new connections"""
+        return self.socket
+
+    def _accept_connection(self):
+        """Accept a new connection, and hand its first HTTP Request to a worker thread"""
+        self._handle_request_noblock()
+
+    def _register_parked_connections(self):
+        """Let the selector wait for the next HTTP Request of the connections
+            that the worker threads parked"""
+        try:
+            while len(self.wakeup_reader.recv(4096)) > 0:
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+        while len(self.parked_connections) > 0:
+            request, client_address = self.parked_connections.popleft()
+            self.idle_connections[request] = time.monotonic()
+            self.selector.register(request, selectors.EVENT_READ, client_address)
+
+    def _close_idle_connections(self, idle_since):
+        """Close the connections that have been idle since before idle_since
+            (or, with None, all of them)"""
+        for request, idle_time in list(self.idle_connections.items()):
+            if idle_since is None or idle_time < idle_since:
+                self.logger.debug("Closing an idle persistent connection")
+                self.selector.unregister(request)
+                del self.idle_connections[request]
+                self.shutdown_request(request)
+
+
+
+class HandoffHTTPServer(ThreadPoolHTTPServer):
+    """The ThreadPoolHTTPServer of a worker process, which is handed its
+        connections (with their addresses) over a pipe from the
+        WalkCoordinator instead of accepting them"""
+    logger = logging.getLogger("HandoffHTTPServer")
+
+    def __init__(self, handoff_conn, handler_class, max_workers=16):
+        """Initialize the HTTP Server, which doesn't listen on a port of its own"""
+        super(HandoffHTTPServer, self).__init__(("", 0), handler_class, max_workers, bind_and_activate=False)
+        self.handoff_conn = handoff_conn
+
+
+    def _get_accept_fileobj(self):
+        """Wait on the pipe that the connections are handed over on"""
+        return self.handoff_conn
+
+    def _accept_connection(self):
+        """Take a connection that is handed over, stopping once the
+            coordinator hands over None (or has gone away)"""
+        try:
+            client_address = self.handoff_conn.recv()
+        except EOFError:
+            # The coordinator has gone away
+            self.stop = True
+            return
+
+        if client_address is None:
+            self.stop = True
+            return
+
+        request = socket.socket(fileno=multiprocessing.reduction.recv_handle(self.handoff_conn))
+        self.process_request(request, client_address)
+
+
+
+class WorkerResultExporter(WalkExporter):
+    """Streams the walks of a worker process back to the WalkCoordinator
+
+    The events (a walk started, an object is complete, a walk ended) are
+     buffered and put on the result queue in a single message at every flush
+     (at least once a second, and at the end of each walk)."""
+    def __init__(self, worker_index, result_queue):
+        """Initialize the Exporter"""
+        super(WorkerResultExporter, self).__init__("worker {}".format(worker_index))
+        self.worker_index = worker_index
+        self.result_queue = result_queue
+        self.event_list = []
+
+
+    def _write_start_device(self, device_id):
+        """Buffer the start of a device's walk"""
+        self.event_list.append((WORKER_EVENT_START, device_id))
+
+    def _write_object(self, device_id, data_model_obj):
+        """Buffer a complete object"""
+        self.event_list.append((WORKER_EVENT_OBJECT, device_id, pack_data_model_object(data_model_obj)))
+
+    def _write_end_device(self, device_id, state):
+        """Buffer the end of a device's walk"""
+        self.event_list.append((WORKER_EVENT_END, device_id, state))
+
+    def _flush_output(self):
+        """Send the buffered events to the WalkCoordinator"""
+        if len(self.event_list) > 0:
+            self.result_queue.put((WORKER_MESSAGE_EVENTS, self.worker_index, self.event_list))
+            self.event_list = []
+
+    def _close_output(self):
+        """Nothing to close; the result queue belongs to the WalkCoordinator"""
+        pass
+
+
+
+class WorkerLogHandler(logging.Handler):
+    """Writes the log records that the worker processes queue through the
+        WalkCoordinator's own loggers (and so into its log and trace files)"""
+    def emit(self, record):
+        """Hand the log record to the logger of the same name"""
+        logging.getLogger(record.name).handle(record)
+
+
+
+class HTTPContentError(Exception):
+    """The content of an HTTP Request can't be read; the status code is
+        that of the HTTP error response (e.g. 411, 413)"""
+    def __init__(self, status_code, message):
+        """Initialize the Error"""
+        super(HTTPContentError, self).__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+    def get_status_code(self):
+        """Retrieve the status code of the HTTP error response"""
+        return self.status_code
+
+    def get_message(self):
+        """Retrieve the description of the error"""
+        return self.message
+
+
+
+class CWMPHandler(BaseHTTPRequestHandler):
+    """An HTTP Request Handler for the following CWMP RPCs:
+        - Inform, GetParameterNamesResponse, GetParameterValuesResponse
+
+    The connection is kept open (HTTP/1.1) for the whole CWMP Session, and
+     every response carries a Content-Length.  The InformResponse sets a
+     session cookie, which ties the later HTTP Requests to the session."""
+    logger = logging.getLogger("CWMPHandler")
+    trace_logger = logging.getLogger(TRACE_LOGGER_NAME)
+
+    protocol_version = "HTTP/1.1"
+
+    # Send each RPC as soon as it is written, instead of waiting for the
+    #  device to acknowledge the previous segment (TCP_NODELAY)
+    disable_nagle_algorithm = True
+
+    # Close a persistent connection that the device leaves idle
+    timeout = HTTP_KEEP_ALIVE_TIMEOUT
+
+    def handle(self):
+        """Handle a single HTTP Request when the HTTP Server parks the
+            persistent connections between HTTP Requests (a
+            ThreadPoolHTTPServer), otherwise all of the HTTP Requests of the
+            connection"""
+        if isinstance(self.server, ThreadPoolHTTPServer):
+            self.handle_one_request()
+        else:
+            super(CWMPHandler, self).handle()
+
+    def log_message(self, format, *args):
+        """Change logging from stderr to debug log"""
+        self.logger.debug("%s - - %s", self.address_string(), format % args)
+
+
+    def do_GET(self):
+        """Handle the HTTP GET Messages: the walk metrics (as Prometheus text
+            or JSON), otherwise invalid CWMP Messages"""
+        url_path = urllib.parse.urlsplit(self.path).path
+        walk_metrics = self.server.get_cwmp_server().get_metrics()
+
+        if url_path == METRICS_PATH:
+            self.logger.debug("Sending the walk metrics as Prometheus text")
+            self._send_http_response(200, walk_metrics.render_prometheus().encode("utf-8"),
+                                     content_type=PROMETHEUS_CONTENT_TYPE)
+        elif url_path == METRICS_JSON_PATH:
+            self.logger.debug("Sending the walk metrics as JSON")
+            self._send_http_response(200, walk_metrics.render_json().encode("utf-8"),
+                                     content_type="application/json")
+        else:
+            # Log the Request
+            self.logger.warning("Received incoming HTTP GET")
+            self.logger.debug("  Path: %s", self.path)
+
+            # Respond with a 404 Error (shouldn't process GET)
+            self.send_error(404, "CWMP File Not Found: %s" % self.path)
+
+
+    def do_POST(self):
+        """Handle the HTTP POST Messages containing CWMP Messages"""
+        cwmp_server = self.server.get_cwmp_server()
+        session = cwmp_server.get_session(self._get_session_cookie(), self._get_client_address())
+        content_type = self.headers.get("Content-Type", "")
+        self.request_start_time = time.monotonic()
+        self.request_bytes = 0
+
+        if session is not None:
+            session.set_rpc_received()
+
+        # Log the Request
+        self.logger.info("Received incoming HTTP POST")
+        self.logger.debug("  Path: %s", self.path)
+        self.logger.debug("  Content-Length: %s", self.headers.get("Content-Length"))
+        self.logger.debug("  Transfer-Encoding: %s", self.headers.get("Transfer-Encoding"))
+        self.logger.debug("  Content-Type: %s", content_type)
+
+        # Process the Request, whose content (with a Content-Length or chunked)
+        #  is read in chunks while it is being decoded
+        try:
+            content_chunks = self._read_content(session, cwmp_server.get_max_body_size())
+            first_chunk = next(content_chunks, None)
+
+            if first_chunk is None:
+                # Validate that this is the Empty HTTP POST that is sent after the Inform
+                #  - Make sure that we have a Device ID from an Inform
+                #  - Make sure that we don't have any pending GPN or GPV
+                if (session is not None and
+                        session.get_requested_gpn() is None and
+                        session.get_requested_gpv() is None and
+                        session.is_device_id_present()):
+                    self.logger.info("Processing incoming EMPTY HTTP POST as a CWMP Message")
+                    self._write_incoming_cwmp_message("<EMPTY>")
+
+                    if session.is_polling():
+                        # Only retrieve the values of the polled Parameters
+                        self._queue_polled_parameters(session)
+                    else:
+                        # Start with the Root Data Model Object
+                        a_data_model_obj = DataModelObject()
+                        a_data_model_obj.set_name(session.get_root_data_model() + ".")
+                        a_data_model_obj.set_writable(False)
+
+                        session.append_gpn_items([a_data_model_obj])
+                    self._continue_walk(session)
+                else:
+                    # Invalid input - return a fault
+                    self.logger.warning("Invalid Empty POST Received")
+                    self.send_error(500, "Invalid Empty POST Received")
+            elif "xml" in content_type:
+                self.logger.info("Processing incoming HTTP POST as a CWMP Message")
+
+                # Decode the content while it is read, and process the
+                #  CWMP Message (Inform, GPNResp, GPVResp, Fault)
+                decoded_chunks = itertools.chain([first_chunk], content_chunks)
+
+                # Trace the CWMP Conversation
+                if self.trace_logger.isEnabledFor(logging.DEBUG):
+                    decoded_chunks = self._trace_content_chunks(decoded_chunks)
+
+                decoder = CWMPDecoder(decoded_chunks)
+
+                try:
+                    self._process_cwmp_message(session, decoder)
+                except ElementTree.ParseError as err:
+                    self.logger.warning("Malformed CWMP Message received (%s) - Sending an HTTP 500", err)
+                    self.send_error(500, "Malformed CWMP Message")
+            else:
+                # Invalid input - return a fault
+                self.logger.warning("Invalid Content Type Received %s - Sending an HTTP 500", content_type)
+                self.send_error(500, "Invalid Content-Type: %s" % content_type)
+
+            # Read any content that wasn't decoded, so that the next
+            #  HTTP Request on a persistent connection starts at its beginning
+            if not self.close_connection:
+                for _ in content_chunks:
+                    pass
+        except HTTPContentError as err:
+            self.logger.warning("%s - Sending an HTTP %s", err.get_message(), err.get_status_code())
+            self.send_error(err.get_status_code(), err.get_message())
+
+
+
+    def _get_session_cookie(self):
+        """Retrieve the session key from the HTTP Request's session cookie, or None"""
+        cookies = http.cookies.SimpleCookie()
+
+        try:
+            cookies.load(self.headers.get("Cookie", ""))
+        except http.cookies.CookieError:
+            return None
+
+        if SESSION_COOKIE_NAME not in cookies:
+            return None
+
+        return cookies[SESSION_COOKIE_NAME].value
 
+    def _get_client_address(self):
+        """Retrieve the address of the device's connection"""
+        return self.client_address[0]
 
-    def get_cwmp_server(self):
-        """Retrieve the value of the CWMP Server"""
-        return self.cwmp_server
 
-    def set_cwmp_server(self, value):
-        """Set the value of the CWMP Server"""
-        self.cwmp_server = value
 
+    def _write_incoming_cwmp_message(self, message):
+        """Write Incoming CWMP Trace Messages to a separate log file (when payload tracing is on)"""
+        if self.trace_logger.isEnabledFor(logging.DEBUG):
+            self.trace_logger.debug("Incoming HTTP POST from [%s]\n%s",
+                                    self.address_string(), _get_payload_text(message))
 
 
-class CWMPHandler(BaseHTTPRequestHandler):
-    """An HTTP Request Handler for the following CWMP RPCs:
-        - Inform, GetParameterNamesResponse, GetParameterValuesResponse"""
-    def log_message(self, format, *args):
-        """Change logging from stderr to debug log"""
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.debug("%s - - %s" % (self.address_string(), format % args))
 
+    def _write_outgoing_cwmp_message(self, message):
+        """Write Outgoing CWMP Trace Messages to a separate log file (when payload tracing is on)"""
+        if self.trace_logger.isEnabledFor(logging.DEBUG):
+            self.trace_logger.debug("Outgoing HTTP Response to [%s]\n%s",
+                                    self.address_string(), _get_payload_text(message))
 
-    def do_GET(self):
-        """Handle the HTTP GET Messages, as invalid CWMP Messages"""
-        # Log the Request
-        logger = logging.getLogger(self.__class__.__name__)
-        logger.warning("Received incoming HTTP GET")
-        logger.debug("  Path: " + self.path)
 
-        # Respond with a 404 Error (shouldn't process GET)
-        self.send_error(404, "CWMP File Not Found: %s" % self.path)
 
+    def _trace_content_chunks(self, content_chunks):
+        """Pass the HTTP Content through, writing it to the payload trace
+            once all of it has been read"""
+        traced_chunks = []
 
-    def do_POST(self):
-        """Handle the HTTP POST Messages containing CWMP Messages"""
-        content = ""
-        content_length = 0
-        logger = logging.getLogger(self.__class__.__name__)
-        cwmp_server = self.server.get_cwmp_server()
+        for chunk in content_chunks:
+            traced_chunks.append(chunk)
+            yield chunk
 
-        # Process the Request
-        # TODO: Should we do chunked encoding? - Might have to, or might have to front it with nginx
-        if "Content-Length" in self.headers:
-            content_length = int(self.headers["Content-Length"])
-            content = self.rfile.read(content_length)
+        self._write_incoming_cwmp_message(b"".join(traced_chunks))
 
-            # Log the Request
-            logger.info("Received incoming HTTP POST")
-            logger.debug("  Path: " + self.path)
-            logger.debug("  Content-Length: " + str(content_length))
-            logger.debug("  Content-Type: " + self.headers["Content-Type"])
 
-            if content_length == 0:
-                # Validate that this is the Empty HTTP POST that is sent after the Inform
-                #  - Make sure that we have a Device ID from an Inform
-                #  - Make sure that we don't have any pending GPN or GPV
-                if (cwmp_server.get_requested_gpn() is None and
-                        cwmp_server.get_requested_gpv() is None and
-                        cwmp_server.is_device_id_present()):
-                    logger.info("Processing incoming EMPTY HTTP POST as a CWMP Message")
-                    self._write_incoming_cwmp_message("<EMPTY>")
 
-                    # Start with the Root Data Model Object
-                    a_data_model_obj = DataModelObject()
-                    a_data_model_obj.set_name(cwmp_server.get_root_data_model() + ".")
-                    a_data_model_obj.set_writable(False)
+    def _read_content(self, session, max_body_size):
+        """Start reading the HTTP Content, which is either chunked or has a
+            Content-Length, raising an HTTPContentError if it can't be read"""
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            return self._read_chunked_content(session, max_body_size)
 
-                    cwmp_server.set_requested_gpn(a_data_model_obj)
+        if "Content-Length" not in self.headers:
+            # Without a length the end of the content isn't known
+            raise HTTPContentError(411, "Content-Length Required")
 
-                    self._get_parameter_names(a_data_model_obj)
-                else:
-                    # Invalid input - return a fault
-                    logger.warning("Invalid Empty POST Received")
-                    self.send_error(500, "Invalid Empty POST Received")
-            elif "xml" in self.headers["Content-Type"]:
-                logger.info("Processing incoming HTTP POST as a CWMP Message")
+        try:
+            content_length = int(self.headers["Content-Length"])
+        except ValueError:
+            raise HTTPContentError(400, "Invalid Content-Length: %s" % self.headers["Content-Length"])
 
-                # Trace the CWMP Conversation
-                self._write_incoming_cwmp_message(content)
+        if content_length < 0:
+            raise HTTPContentError(400, "Invalid Content-Length: %s" % content_length)
+        if max_body_size is not None and content_length > max_body_size:
+            raise HTTPContentError(413, "Content-Length %s exceeds the maximum of %s" % (content_length, max_body_size))
 
-                # Convert content from XML to Dictionary
-                content_dict = self._convert_content_to_dict(content)
+        return self._read_content_chunks(session, content_length)
 
-                # Process the CWMP Message (Inform, Empty, GPNResp, GPVResp)
-                self._process_cwmp_message(content_dict["soap-env:Envelope"])
-            else:
-                # Invalid input - return a fault
-                logger.warning(
-                    "Invalid Content Type Received {} - Sending an HTTP 500"
-                    .format(self.headers["Content-Type"]))
-                self.send_error(500, "Invalid Content-Type: %s" % self.headers["Content-Type"])
 
 
+    def _read_content_chunks(self, session, content_length):
+        """Read the HTTP Content from the socket in chunks"""
+        remaining = content_length
 
-    def _write_incoming_cwmp_message(self, message):
-        """Write Incoming CWMP Trace Messages to a separate log file"""
-        trace_logger = logging.getLogger("TRACE_LOGGING")
-        message_type = "Incoming HTTP POST from [{}]".format(self.address_string())
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, READ_CHUNK_SIZE))
+            if not chunk:
+                break
 
-        trace_logger.debug(message_type)
-        # TODO: Add in a Flag that logs the contents
-#        trace_logger.debug(message)
+            remaining -= len(chunk)
+            self.request_bytes += len(chunk)
+            if session is not None:
+                session.add_rpc_received_bytes(len(chunk))
+            yield chunk
 
 
 
-    def _write_outgoing_cwmp_message(self, message):
-        """Write Outgoing CWMP Trace Messages to a separate log file"""
-        trace_logger = logging.getLogger("TRACE_LOGGING")
-        message_type = "Outgoing HTTP Response to [{}]".format(self.address_string())
+    def _read_chunked_content(self, session, max_body_size):
+        """Read chunked HTTP Content from the socket, yielding the data of
+            each chunk (in pieces of at most READ_CHUNK_SIZE) as it arrives"""
+        body_size = 0
+
+        while True:
+            size_line = self.rfile.readline(_MAX_CHUNK_LINE_LENGTH + 1)
 
-        trace_logger.debug(message_type)
-        # TODO: Add in a Flag that logs the contents
-#        trace_logger.debug(message)
+            # The chunk size is in hex, and may be followed by chunk extensions
+            try:
+                chunk_size = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise HTTPContentError(400, "Malformed Chunked Content")
 
+            if chunk_size < 0:
+                raise HTTPContentError(400, "Malformed Chunked Content")
+            elif chunk_size == 0:
+                break
 
+            body_size += chunk_size
+            if max_body_size is not None and body_size > max_body_size:
+                raise HTTPContentError(413, "Chunked Content exceeds the maximum of %s" % max_body_size)
 
-    def _convert_content_to_dict(self, content_str):
-        """Convert the XML Content into a Dictionary"""
-        content_dict = {}
+            remaining = chunk_size
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, READ_CHUNK_SIZE))
+                if not chunk:
+                    raise HTTPContentError(400, "Incomplete Chunked Content")
 
-        # Use these standard namespaces
-        namespaces = {
-            "urn:dslforum-org:cwmp-1-0": "cwmp",
-            "urn:dslforum-org:cwmp-1-1": "cwmp",
-            "urn:dslforum-org:cwmp-1-2": "cwmp",
-            "http://www.w3.org/2001/XMLSchema": "xsd",
-            "http://www.w3.org/2001/XMLSchema-instance": "xsi",
-            "http://schemas.xmlsoap.org/soap/envelope/": "soap-env",
-            "http://schemas.xmlsoap.org/soap/encoding/": "soap-enc"
-        }
+                remaining -= len(chunk)
+                self.request_bytes += len(chunk)
+                if session is not None:
+                    session.add_rpc_received_bytes(len(chunk))
+                yield chunk
 
-        content_dict = xmltodict.parse(content_str, process_namespaces=True, namespaces=namespaces)
+            # Each chunk ends with a CRLF
+            if self.rfile.readline(_MAX_CHUNK_LINE_LENGTH + 1).strip() != b"":
+                raise HTTPContentError(400, "Malformed Chunked Content")
 
-        return content_dict
+        # Skip the trailer, which ends with an empty line
+        while True:
+            trailer_line = self.rfile.readline(_MAX_CHUNK_LINE_LENGTH + 1)
+            if trailer_line in (b"\r\n", b"\n", b""):
+                break
 
 
 
-    def _process_cwmp_message(self, soap_envelope):
+    def _process_cwmp_message(self, session, decoder):
         """Process the Incoming CWMP Message, which could be one of:
-             Inform, GetParameterNamesResponse, GetParameterValuesResponse"""
-        soap_body = soap_envelope["soap-env:Body"]
-        soap_header = soap_envelope["soap-env:Header"]
-        logger = logging.getLogger(self.__class__.__name__)
-
-        if "cwmp:Inform" in soap_body:
-            logger.info("Incoming HTTP POST is a CWMP Inform RPC")
-            self._process_inform(soap_header, soap_body)
-        elif "cwmp:GetParameterNamesResponse" in soap_body:
-            logger.info("Incoming HTTP POST is a Response to a CWMP GetParameterNames RPC")
-            self._process_gpn_response(soap_body)
-        elif "cwmp:GetParameterValuesResponse" in soap_body:
-            logger.info("Incoming HTTP POST is a Response to a CWMP GetParameterValues RPC")
-            self._process_gpv_response(soap_body)
+             Inform, GetParameterNamesResponse, GetParameterValuesResponse, Fault"""
+        rpc_name = decoder.read_rpc_name()
+
+        if rpc_name == "Inform":
+            self.logger.info("Incoming HTTP POST is a CWMP Inform RPC")
+            self._process_inform(decoder)
+        elif rpc_name == "GetParameterNamesResponse":
+            self.logger.info("Incoming HTTP POST is a Response to a CWMP GetParameterNames RPC")
+            self._process_gpn_response(session, decoder)
+        elif rpc_name == "GetParameterValuesResponse":
+            self.logger.info("Incoming HTTP POST is a Response to a CWMP GetParameterValues RPC")
+            self._process_gpv_response(session, decoder)
+        elif rpc_name == "Fault":
+            self.logger.info("Incoming HTTP POST is a CWMP Fault")
+            self._process_fault(session, decoder)
         else:
-            logger.warning("Unsupported CWMP RPC encountered - Sending an HTTP 500")
+            self.logger.warning("Unsupported CWMP RPC encountered - Sending an HTTP 500")
             self.send_error(500, "Unsupported CWMP RPC encountered")
 
 
 
-    def _process_inform(self, soap_header, soap_body):
+    def _process_inform(self, decoder):
         """Process the incoming CWMP Inform RPC"""
+        root_dm = None
+        software_version = None
         cwmp_server = self.server.get_cwmp_server()
-        logger = logging.getLogger(self.__class__.__name__)
+
+        for param_value in decoder.iter_records():
+            if "SoftwareVersion" in param_value.name:
+                root_dm = param_value.name.split(".")[0]
+                software_version = param_value.value
+
+        cwmp_device_id = decoder.get_device_id()
+        device_id = cwmp_device_id.get("OUI", "") + "-" + cwmp_device_id.get("SerialNumber", "")
+        device_model = cwmp_device_id.get("OUI", "") + "-" + cwmp_device_id.get("ProductClass", "")
+        self.logger.info("The CWMP Inform Message is from %s", device_id)
+        session = cwmp_server.start_session(device_id, self._get_client_address())
 
         # Are we already in a CWMP Session with another device?
-        if cwmp_server.is_device_id_present():
+        if session is None:
             # YES; Response with a fault
-            logger.warning(
-                "Already Processing Device {} - Sending an HTTP 500"
-                .format(cwmp_server.get_device_id()))
-            self.send_error(500, "Already Processing Device: %s" % cwmp_server.get_device_id())
+            active_device_ids = ", ".join(cwmp_server.get_active_device_ids())
+            self.logger.warning("Already Processing Device %s - Sending an HTTP 500", active_device_ids)
+            self.send_error(500, "Already Processing Device: %s" % active_device_ids)
         else:
             # NO; Save the OUI-SN as the Found Device and send the InformResponse
-            cwmp_device_id = soap_body["cwmp:Inform"]["DeviceId"]
-            device_id = cwmp_device_id["OUI"] + "-" + cwmp_device_id["SerialNumber"]
-            logger.info("The CWMP Inform Message is from {}".format(device_id))
+            session.set_root_data_model(root_dm)
+            session.set_software_version(software_version)
+            self.logger.info("The %s Device is using a %s Root Data Model",
+                             device_id, session.get_root_data_model())
+
+            # Start with the best GPV batch size seen for this model of device
+            session.set_device_model(device_model)
+            session.get_gpv_batcher().set_batch_size(cwmp_server.get_gpv_batch_size(device_model))
+
+            # Only poll the values of a device that was walked before
+            poller = cwmp_server.get_poller()
+            if poller is not None:
+                session.set_poll_parameter_names(poller.plan(device_id, session.get_software_version()))
 
-            param_list = soap_body["cwmp:Inform"]["ParameterList"]
-            for param_val_struct_item in param_list["ParameterValueStruct"]:
-                if "SoftwareVersion" in param_val_struct_item["Name"]:
-                    root_dm = param_val_struct_item["Name"].split(".")[0]
-                    logger.info("The {} Device is using a {} Root Data Model".format(device_id, root_dm))
-                    cwmp_server.set_root_data_model(root_dm)
+            # Discover the known structure of a device from the Walk Cache
+            walk_cache = cwmp_server.get_walk_cache()
+            if walk_cache is not None and session.get_software_version() is not None and not session.is_polling():
+                session.set_cached_walk(walk_cache.load(device_id, session.get_software_version()))
 
-            cwmp_server.set_device_id(device_id)
-            self._send_inform_response(soap_header)
+            # Checkpoint the walk, resuming it if an earlier session of the device was dropped
+            walk_checkpoints = cwmp_server.get_walk_checkpoints()
+            if (walk_checkpoints is not None and session.get_software_version() is not None and
+                    not session.is_polling()):
+                session.set_walk_checkpoint(walk_checkpoints.open(
+                    device_id, session.get_software_version(), session.get_root_data_model()))
 
+            session.set_device_id(device_id)
+            self._send_inform_response(session, decoder.get_cwmp_id())
 
 
-    def _process_gpn_response(self, soap_body):
+
+    def _process_gpn_response(self, session, decoder):
         """Process an incoming GetParameterNames Response"""
-        gpv_param_list = []
-        sub_object_list = []
-        cwmp_server = self.server.get_cwmp_server()
-        logger = logging.getLogger(self.__class__.__name__)
-        requested_data_model_obj = cwmp_server.get_requested_gpn()
+        dm_item_list = []
 
-        if not cwmp_server.is_device_id_present():
+        if session is None or not session.is_device_id_present():
             # Invalid GetParameterNames Response received - respond with a fault
-            logger.warning(
+            self.logger.warning(
                 "No Device ID found - Invalid GPN Response received - Sending an HTTP 500")
             self.send_error(500, "No Device ID found")
+        elif not session.is_awaiting_response("GetParameterNames"):
+            self._reject_unexpected_response(session, "GetParameterNames")
         else:
-            logger.info("The CWMP GetParameterNames Response contains:")
-            param_list = soap_body["cwmp:GetParameterNamesResponse"]["ParameterList"]
+            requested_data_model_obj = session.get_requested_gpn()
+            self.logger.info("The CWMP GetParameterNames Response contains:")
 
-            if isinstance(param_list["ParameterInfoStruct"], list):
-                for param_info_struct_item in param_list["ParameterInfoStruct"]:
-                    dm_item = self._process_gpn_param_info_struct(param_info_struct_item)
+            for param_info in decoder.iter_records():
+                dm_item_list.append(self._process_gpn_param_info_struct(param_info))
 
-                    if dm_item.is_object():
-                        sub_object_list.append(dm_item)
-                    else:
-                        gpv_param_list.append(dm_item)
+            if session.get_requested_gpn_next_level():
+                self._add_gpn_next_level_items(session, requested_data_model_obj, dm_item_list)
             else:
-                dm_item = self._process_gpn_param_info_struct(param_list["ParameterInfoStruct"])
+                self._add_gpn_subtree_items(session, requested_data_model_obj, dm_item_list)
+
+            if session.get_walk_checkpoint() is not None:
+                session.get_walk_checkpoint().record_gpn(
+                    requested_data_model_obj.get_name(), session.get_requested_gpn_next_level(), dm_item_list)
+
+            session.record_rpc_timing(len(dm_item_list))
+            self._record_rpc_response(session, RPC_GPN, session.get_rpc_response_time())
+            self._continue_walk(session)
+
 
-                if dm_item.is_object():
+
+    def _add_gpn_next_level_items(self, session, requested_data_model_obj, dm_item_list):
+        """Add the Parameters of a GetParameterNames (NextLevel=true) Response
+            to the requested DataModelObject and queue its Sub-Objects"""
+        gpv_param_list = []
+        sub_object_list = []
+        path_filter = session.get_path_filter()
+
+        # Leave out the items that the Path Filter prunes
+        for dm_item in dm_item_list:
+            if dm_item.is_object():
+                if path_filter.allows_object(dm_item.get_name()):
                     sub_object_list.append(dm_item)
-                else:
-                    gpv_param_list.append(dm_item)
+            elif path_filter.allows_parameter(dm_item.get_full_param_name()):
+                gpv_param_list.append(dm_item)
 
-            # Add the DataModelObject to the CWMP Server
-            cwmp_server.add_object_to_data_model(requested_data_model_obj)
+        # Add the DataModelObject to the CWMP Session
+        session.add_object_to_data_model(requested_data_model_obj)
 
-            # Add the Data Model Parameters to the DataModelObject
-            for dm_param in gpv_param_list:
-                requested_data_model_obj.add_parameter(dm_param)
+        # Add the Data Model Parameters to the DataModelObject
+        for dm_param in gpv_param_list:
+            requested_data_model_obj.add_parameter(dm_param)
 
-            if len(gpv_param_list) > 0:
-                # We found Parameters to Retrieve Values for
-                cwmp_server.set_requested_gpv(requested_data_model_obj)
-                cwmp_server.append_gpn_items(sub_object_list)
+        # Hand the Sub-Objects to the Walk Scheduler
+        session.append_gpn_items(sub_object_list)
 
-                # Send a GPV for the Parameters in the Object
-                self._get_parameter_values(gpv_param_list)
-            elif len(sub_object_list) > 0:
-                # We didn't find Parameters to Retrieve, but we have sub-objects
-                a_data_model_obj = sub_object_list.pop(0)
-                cwmp_server.set_requested_gpn(a_data_model_obj)
-                cwmp_server.append_gpn_items(sub_object_list)
+        # Queue the Parameters to Retrieve Values for (an object without
+        #  any is exported right away)
+        session.append_gpv_parameters(requested_data_model_obj, gpv_param_list)
 
-                # Send a GPN for the Sub-Objects of this Object
-                self._get_parameter_names(a_data_model_obj)
-            elif cwmp_server.more_gpn_items():
-                # We didn't find any Parameters or Sub-Objects, so work off the pending object list
-                logger.warning("Found an empty object [{}], but still proceeding...".format(requested_data_model_obj.get_name()))
-                next_gpn_obj = cwmp_server.get_next_gpn_item()
-                cwmp_server.set_requested_gpn(next_gpn_obj)
+        if len(dm_item_list) == 0:
+            # We didn't find any Parameters or Sub-Objects
+            self.logger.warning("Found an empty object [%s], but still proceeding...",
+                                requested_data_model_obj.get_name())
 
-                # Send a GPN for the Sub-Objects of this Object
-                self._get_parameter_names(next_gpn_obj)
+
+
+    def _add_gpn_subtree_items(self, session, requested_data_model_obj, dm_item_list):
+        """Build the whole DataModelObject hierarchy below the requested
+            DataModelObject from a GetParameterNames (NextLevel=false) Response"""
+        requested_name = requested_data_model_obj.get_name()
+        object_dict = {requested_name: requested_data_model_obj}
+        path_filter = session.get_path_filter()
+
+        # Add the DataModelObject to the CWMP Session
+        session.add_object_to_data_model(requested_data_model_obj)
+
+        for dm_item in dm_item_list:
+            # Leave out the items that the Path Filter prunes
+            if not (path_filter.allows_object(dm_item.get_name()) if dm_item.is_object() else
+                    path_filter.allows_parameter(dm_item.get_full_param_name())):
+                continue
+
+            if dm_item.is_object():
+                if dm_item.get_name() in object_dict:
+                    # The object was already created for one of its Parameters
+                    object_dict[dm_item.get_name()].set_writable(dm_item.get_writable())
+                else:
+                    object_dict[dm_item.get_name()] = dm_item
+                    session.add_object_to_data_model(dm_item)
             else:
-                # Nothing left to do, so terminate the CWMP Session
-                self._terminate_cwmp_session()
+                parent_name = dm_item.get_full_param_name().rsplit(".", 1)[0] + "."
+                parent_obj = object_dict.get(parent_name)
+
+                if parent_obj is None:
+                    # The CPE listed the Parameter before (or without) its object
+                    parent_obj = DataModelObject()
+                    parent_obj.set_name(parent_name)
+                    parent_obj.set_writable(False)
+                    object_dict[parent_name] = parent_obj
+                    session.add_object_to_data_model(parent_obj)
+
+                parent_obj.add_parameter(dm_item)
 
+        # Retrieve the Values of every Parameter in the subtree
+        for dm_obj in object_dict.values():
+            session.append_gpv_parameters(dm_obj, dm_obj.get_parameters())
+        session.record_subtree_size(get_path_shape(requested_name), len(dm_item_list), len(object_dict))
 
 
-    def _process_gpn_param_info_struct(self, param_info_struct_item):
+
+    def _process_gpn_param_info_struct(self, param_info):
         """Process the GPN ParameterInfoStruct Element"""
         dm_item = None
         is_writable = False
-        param_info_name = param_info_struct_item["Name"]
-        param_info_writable = param_info_struct_item["Writable"]
-        logger = logging.getLogger(self.__class__.__name__)
+        param_info_name = param_info.name
+        param_info_writable = param_info.writable
 
         # Handle the different Writable Boolean Values
         if (param_info_writable == "true" or
@@ -487,196 +2692,646 @@ class CWMPHandler(BaseHTTPRequestHandler):
             dm_item = DataModelObject()
             dm_item.set_name(param_info_name)
             dm_item.set_writable(is_writable)
-            logger.info("- Sub-Object: {}".format(param_info_name))
+            self.logger.debug("- Sub-Object: %s", param_info_name)
         else:
             dm_item = DataModelParameter()
             dm_item.set_full_param_name(param_info_name)
             dm_item.set_writable(is_writable)
-            logger.info("- Parameter: {}".format(param_info_name))
+            self.logger.debug("- Parameter: %s", param_info_name)
 
         return dm_item
 
 
 
-    def _process_gpv_response(self, soap_body):
+    def _process_gpv_response(self, session, decoder):
         """Process the incoming GetParameterValues Response"""
-        cwmp_server = self.server.get_cwmp_server()
-        logger = logging.getLogger(self.__class__.__name__)
-        requested_data_model_obj = cwmp_server.get_requested_gpn()
+        item_count = 0
 
-        if not cwmp_server.is_device_id_present():
+        if session is None or not session.is_device_id_present():
             # Invalid GetParameterParameters Response received - respond with a fault
-            logger.warning(
+            self.logger.warning(
                 "No Device ID found - Invalid GPV Response received - Sending an HTTP 500")
             self.send_error(500, "No Device ID found")
+        elif not session.is_awaiting_response("GetParameterValues"):
+            self._reject_unexpected_response(session, "GetParameterValues")
         else:
-            logger.info("The CWMP GetParameterParameters Response contains:")
-            param_list = soap_body["cwmp:GetParameterValuesResponse"]["ParameterList"]
-
-            if isinstance(param_list["ParameterValueStruct"], list):
-                for param_value_struct_item in param_list["ParameterValueStruct"]:
-                    name = param_value_struct_item["Name"]
-                    value = param_value_struct_item["Value"]["#text"]
-                    requested_data_model_obj.get_parameter(name).set_value(value)
+            self.logger.info("The CWMP GetParameterParameters Response contains:")
+
+            for param_value in decoder.iter_records():
+                name = param_value.name
+                value = param_value.value
+
+                # Route the value to its Parameter through the name index
+                dm_param = session.get_parameter(name)
+                if dm_param is None and session.get_requested_gpv_path() is not None:
+                    dm_param = self._create_unannounced_parameter(session, name)
+
+                if dm_param is None:
+                    self.logger.warning("Ignoring the value of an unknown Parameter [%s]", name)
+                else:
+                    dm_param.set_value(value, param_value.value_type)
+                item_count += 1
+
+            if session.get_requested_gpv_path() is None:
+                session.get_gpv_batcher().record_response(
+                    len(session.get_requested_gpv()), session.get_rpc_response_time(),
+                    session.get_rpc_response_bytes())
+                if session.get_walk_checkpoint() is not None:
+                    session.get_walk_checkpoint().record_gpv(session.get_requested_gpv())
+            session.complete_requested_gpv()
+            session.record_rpc_timing(item_count)
+            self._record_rpc_response(session, RPC_GPV, session.get_rpc_response_time())
+            self.server.get_cwmp_server().get_metrics().record_gpv_parameters(session.get_metrics(), item_count)
+            self._continue_walk(session)
+
+
+
+    def _reject_unexpected_response(self, session, rpc_name):
+        """Answer a response to an RPC that isn't outstanding with an HTTP 500,
+            abandoning the CWMP Session"""
+        self.logger.warning("No %s is outstanding - Unexpected %s Response received - Sending an HTTP 500",
+                            rpc_name, rpc_name)
+        self.send_error(500, "Unexpected %s Response" % rpc_name)
+        self.server.get_cwmp_server().abandon_session(session)
+
+
+
+    def _create_unannounced_parameter(self, session, full_param_name):
+        """Create a Parameter, found by a partial path GetParameterValues, that
+            GetParameterNames never announced (its Writable Property is unknown)"""
+        parent_name = full_param_name.rsplit(".", 1)[0] + "."
+        parent_obj = session.get_object(parent_name)
+
+        if parent_obj is None:
+            parent_obj = DataModelObject()
+            parent_obj.set_name(parent_name)
+            session.add_object_to_data_model(parent_obj)
+
+        self.logger.debug("Creating the unannounced Parameter [%s]", full_param_name)
+        dm_param = DataModelParameter()
+        dm_param.set_full_param_name(full_param_name)
+        parent_obj.add_parameter(dm_param)
+
+        return dm_param
+
+
+
+    def _process_fault(self, session, decoder):
+        """Process an incoming SOAP Fault, which the device sends instead of
+            the response to an RPC that it couldn't carry out"""
+
+        if session is None or session.get_outstanding_rpc() is None:
+            self.logger.warning("No RPC is outstanding - Unexpected CWMP Fault received - Sending an HTTP 500")
+            self.send_error(500, "Unexpected CWMP Fault")
+            return
+
+        for _ in decoder.iter_records():
+            pass
+
+        cwmp_fault = decoder.get_fault()
+        self.logger.warning("The device responded to the CWMP %s with Fault %s: %s",
+                            session.get_outstanding_rpc(), cwmp_fault.get("FaultCode"),
+                            cwmp_fault.get("FaultString"))
+        self._record_rpc_response(session, session.get_outstanding_rpc(), session.get_rpc_response_time(), True)
+
+        if (session.get_outstanding_rpc() == "GetParameterValues" and
+                session.get_requested_gpv_path() is not None):
+            # Fall back to retrieving the Parameters below the partial path by name
+            partial_path = session.get_requested_gpv_path()
+            self.logger.warning("Retrieving the Parameters below [%s] by name", partial_path)
+            session.requeue_gpv_path(partial_path)
+        elif session.get_outstanding_rpc() == "GetParameterValues":
+            gpv_batcher = session.get_gpv_batcher()
+            param_list = session.get_requested_gpv()
+            gpv_batcher.record_fault(len(param_list))
+
+            if len(param_list) > 1:
+                # Retry the Parameters in smaller batches
+                gpv_batcher.requeue_batch(param_list)
             else:
-                name = param_value_struct_item["Name"]
-                value = param_value_struct_item["Value"]["#text"]
-                requested_data_model_obj.get_parameter(name).set_value(value)
+                self.logger.warning("Skipping the value of Parameter [%s]", param_list[0].get_full_param_name())
+                session.complete_requested_gpv()
+        elif not session.get_requested_gpn_next_level():
+            # Retry the object one level at a time, rather than drop its subtree
+            session.retry_requested_gpn_next_level()
+        else:
+            session.skip_requested_gpn()
+
+        self._continue_walk(session)
 
-            if cwmp_server.more_gpn_items():
-                next_gpn_obj = cwmp_server.get_next_gpn_item()
-                cwmp_server.set_requested_gpn(next_gpn_obj)
 
+
+    def _continue_walk(self, session):
+        """Send the next RPC of the walk: a GPV once a full batch of Parameter
+            values is pending, otherwise a GPN for a pending object"""
+        gpv_batcher = session.get_gpv_batcher()
+
+        while True:
+            if gpv_batcher.is_batch_ready():
+                # Send a GPV for a full batch of Parameters
+                self._send_gpv(session, gpv_batcher.get_next_batch())
+            elif session.more_gpn_items():
+                a_data_model_obj = session.get_next_gpn_item()
+                if self._discover_known_object(session, a_data_model_obj):
+                    # Discovered without a GPN, so move on to the next pending object
+                    continue
                 # Send a GPN for the Sub-Objects of this Object
-                self._get_parameter_names(next_gpn_obj)
+                self._send_gpn(session, a_data_model_obj)
+            elif gpv_batcher.more_parameters():
+                # Nothing left to discover, so send a GPV for the remaining Parameters
+                self._send_gpv(session, gpv_batcher.get_next_batch())
+            elif session.more_gpv_paths():
+                # Send a GPV for all of the Parameters below a partial path
+                self._send_gpv_path(session, session.get_next_gpv_path())
             else:
                 # Nothing left to do, so terminate the CWMP Session
-                self._terminate_cwmp_session()
+                self._terminate_cwmp_session(session)
+            break
 
+        self.server.get_cwmp_server().get_metrics().record_pending(
+            session.get_metrics(), session.get_pending_gpn_count(), gpv_batcher.get_pending_count())
 
 
-    def _get_parameter_names(self, a_data_model_obj):
-        """Send a GetParameterNames RPC to the CPE"""
-        out_buffer = io.StringIO()
-        logger = logging.getLogger(self.__class__.__name__)
 
-        # Build CWMP Request
-        out_buffer.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
-        out_buffer.write("<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\">\n")
-        out_buffer.write("                  xmlns:cwmp=\"urn:dslforum-org:cwmp-1-0\">\n")
-        out_buffer.write(" <soapenv:Header>\n")
-        out_buffer.write(" </soapenv:Header>\n")
-        out_buffer.write(" <soapenv:Body>\n")
-        out_buffer.write("  <cwmp:GetParameterNames>\n")
-        out_buffer.write("   <ParameterPath>{}</ParameterPath>\n".format(a_data_model_obj.get_name()))
-        out_buffer.write("   <NextLevel>1</NextLevel>\n")
-        out_buffer.write("  </cwmp:GetParameterNames>\n")
-        out_buffer.write(" </soapenv:Body>\n")
-        out_buffer.write("</soapenv:Envelope>\n")
+    def _record_rpc_response(self, session, rpc_name, latency, fault=False):
+        """Record the latency and the size of the device's response to an RPC
+            (or, for an Inform, the time it took to handle it)"""
+        self.server.get_cwmp_server().get_metrics().record_rpc_response(
+            session.get_metrics(), rpc_name, latency, self.request_bytes, fault)
 
-        # Send HTTP Response
-        self.send_response(200)
-        self.send_header("Content-type", "application/xml")
-        self.end_headers()
-        self.wfile.write(bytes(out_buffer.getvalue(), "utf-8"))
+    def _record_rpc_sent(self, session, rpc_name, content):
+        """Record the size of an RPC (or InformResponse) sent to the device"""
+        self.server.get_cwmp_server().get_metrics().record_rpc_sent(
+            session.get_metrics(), rpc_name, len(content))
 
-        logger.info("Sending a CWMP GetParameterNames for: [{}]".format(a_data_model_obj.get_name()))
-        self._write_outgoing_cwmp_message(out_buffer.getvalue())
 
-        out_buffer.close()
 
+    def _discover_known_object(self, session, a_data_model_obj):
+        """Discover an object that was taken for a GPN without one, if the
+            resumed walk already sent a GPN for it (see the Walk Checkpoint)
+            or it is known from the Walk Cache (the tables and the unknown
+            objects aren't), returning True if it was discovered"""
+        walk_checkpoint = session.get_walk_checkpoint()
+        gpn_items = None if walk_checkpoint is None else walk_checkpoint.take_gpn_items(a_data_model_obj.get_name())
 
+        if gpn_items is not None:
+            # Process the checkpointed items as if they were the GPN Response
+            self.logger.debug("Resuming [%s] from the Walk Checkpoint", a_data_model_obj.get_name())
+            next_level, param_info_list = gpn_items
+            dm_item_list = [self._process_gpn_param_info_struct(param_info) for param_info in param_info_list]
+            if next_level:
+                self._add_gpn_next_level_items(session, a_data_model_obj, dm_item_list)
+            else:
+                self._add_gpn_subtree_items(session, a_data_model_obj, dm_item_list)
+            return True
 
-    def _get_parameter_values(self, param_list):
-        """Send a GetParameterValues RPC to the CPE"""
-        param_names = ""
-        first_param = True
-        out_buffer = io.StringIO()
-        logger = logging.getLogger(self.__class__.__name__)
+        cached_walk = session.get_cached_walk()
+        if cached_walk is None:
+            return False
 
-        # Build CWMP Request
-        out_buffer.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
-        out_buffer.write("<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\"\n")
-        out_buffer.write("                  xmlns:soapenc=\"http://schemas.xmlsoap.org/soap/encoding/\"\n")
-        out_buffer.write("                  xmlns:xsd=\"http://www.w3.org/2001/XMLSchema\"\n")
-        out_buffer.write("                  xmlns:cwmp=\"urn:dslforum-org:cwmp-1-0\">\n")
-        out_buffer.write(" <soapenv:Header>\n")
-        out_buffer.write(" </soapenv:Header>\n")
-        out_buffer.write(" <soapenv:Body>\n")
-        out_buffer.write("  <cwmp:GetParameterValues>\n")
-        out_buffer.write("   <ParameterNames soapenc:arrayType=\"xsd:string[{}]\">\n".format(len(param_list)))
-
-        # Insert the Parameters
-        for param in param_list:
-            if first_param:
-                first_param = False
-                param_names = param.get_name()
-            else:
-                param_names = param_names + "," + param.get_name()
+        param_info_list = cached_walk.get_next_level_items(a_data_model_obj.get_name())
+        if param_info_list is None:
+            return False
+
+        # Process the cached items as if they were a GPN Response
+        self.logger.debug("Discovering [%s] from the Walk Cache", a_data_model_obj.get_name())
+        dm_item_list = [self._process_gpn_param_info_struct(param_info) for param_info in param_info_list]
+        self._add_gpn_next_level_items(session, a_data_model_obj, dm_item_list)
+
+        return True
+
+
+
+    def _queue_polled_parameters(self, session):
+        """Add the polled Parameters (and their objects) to the data model
+            without a GPN, and queue their values"""
+        object_dict = {}
+
+        for full_param_name in session.get_poll_parameter_names():
+            parent_name = full_param_name.rsplit(".", 1)[0] + "."
+            parent_obj = object_dict.get(parent_name)
+
+            if parent_obj is None:
+                parent_obj = DataModelObject()
+                parent_obj.set_name(parent_name)
+                object_dict[parent_name] = parent_obj
+                session.add_object_to_data_model(parent_obj)
+
+            dm_param = DataModelParameter()
+            dm_param.set_full_param_name(full_param_name)
+            parent_obj.add_parameter(dm_param)
+
+        for dm_obj in object_dict.values():
+            session.append_gpv_parameters(dm_obj, list(dm_obj.get_parameters()))
+
+        self.logger.info("Polling the values of %s Parameters of %s",
+                         len(session.get_poll_parameter_names()), session.get_device_id())
+
+
+
+    def _send_gpn(self, session, a_data_model_obj):
+        """Send a GetParameterNames RPC for the DataModelObject, using the
+            NextLevel chosen by the Discovery Policy"""
+        cached_walk = session.get_cached_walk()
+
+        if cached_walk is not None and cached_walk.is_table(a_data_model_obj.get_name()):
+            # Only discover the current instances of a known table
+            next_level = True
+        elif session.is_next_level_only():
+            # The device faulted on a GPN with NextLevel=false
+            next_level = True
+        elif session.get_path_filter().prunes_below(a_data_model_obj.get_name()):
+            # Only discover the subtrees that the Path Filter lets through
+            next_level = True
+        else:
+            discovery_policy = self.server.get_cwmp_server().get_discovery_policy()
+            next_level = discovery_policy.use_next_level(session, a_data_model_obj.get_name())
+
+        session.set_requested_gpn(a_data_model_obj, next_level)
+        content = self._get_parameter_names(a_data_model_obj, next_level)
+        session.set_rpc_sent()
+        self._record_rpc_sent(session, RPC_GPN, content)
 
-            out_buffer.write("    <string>{}</string>\n".format(param.get_full_param_name()))
 
-        # Finish the GPV
-        out_buffer.write("   </ParameterNames>\n")
-        out_buffer.write("  </cwmp:GetParameterValues>\n")
-        out_buffer.write(" </soapenv:Body>\n")
-        out_buffer.write("</soapenv:Envelope>\n")
+
+    def _send_gpv(self, session, param_list):
+        """Send a GetParameterValues RPC for a batch of DataModelParameters"""
+        session.set_requested_gpv(param_list)
+        content = self._get_parameter_values([dm_param.get_full_param_name() for dm_param in param_list])
+        session.set_rpc_sent()
+        self._record_rpc_sent(session, RPC_GPV, content)
+
+
+
+    def _send_gpv_path(self, session, partial_path):
+        """Send a GetParameterValues RPC for every Parameter below a partial path"""
+        session.set_requested_gpv_path(partial_path)
+        content = self._get_parameter_values([partial_path])
+        session.set_rpc_sent()
+        self._record_rpc_sent(session, RPC_GPV, content)
+
+
+
+    def _get_parameter_names(self, a_data_model_obj, next_level=True):
+        """Send a GetParameterNames RPC to the CPE, returning its content"""
+
+        # Build CWMP Request
+        content = render_get_parameter_names(a_data_model_obj.get_name(), next_level)
 
         # Send HTTP Response
-        self.send_response(200)
-        self.send_header("Content-type", "application/xml")
-        self.end_headers()
-        self.wfile.write(bytes(out_buffer.getvalue(), "utf-8"))
+        self._send_http_response(200, content)
+
+        self.logger.info("Sending a CWMP GetParameterNames for: [%s] (NextLevel=%s)",
+                         a_data_model_obj.get_name(), next_level)
+        self._write_outgoing_cwmp_message(content)
+
+        return content
 
-        logger.info("Sending a CWMP GetParameterValues for: [{}]".format(param_names))
-        self._write_outgoing_cwmp_message(out_buffer.getvalue())
 
-        out_buffer.close()
 
+    def _get_parameter_values(self, param_name_list):
+        """Send a GetParameterValues RPC to the CPE for a list of full
+            Parameter names and/or partial paths, returning its content"""
+
+        # Build CWMP Request
+        content = render_get_parameter_values(param_name_list)
+
+        # Send HTTP Response
+        self._send_http_response(200, content)
 
+        self.logger.info("Sending a CWMP GetParameterValues for %s names, starting with: [%s]",
+                         len(param_name_list), param_name_list[0])
+        self._write_outgoing_cwmp_message(content)
 
-    def _send_inform_response(self, soap_header):
-        """Send an InformResponse back"""
-        cwmp_id = None
-        out_buffer = io.StringIO()
-        logger = logging.getLogger(self.__class__.__name__)
+        return content
 
-        if "cwmp:ID" in soap_header:
-            cwmp_id = soap_header["cwmp:ID"]["#text"]
 
-        # Build CWMP Response
-        out_buffer.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n")
-        out_buffer.write("<soapenv:Envelope xmlns:soapenv=\"http://schemas.xmlsoap.org/soap/envelope/\">\n")
-        out_buffer.write("                  xmlns:cwmp=\"urn:dslforum-org:cwmp-1-0\">\n")
-        out_buffer.write(" <soapenv:Header>\n")
 
-        # Include the CWMP ID if it was in the Inform
-        if cwmp_id is not None:
-            out_buffer.write(
-                "  <cwmp:ID soapenv:mustUnderstand=\"1\">{}</cwmp:ID>\n".format(cwmp_id))
+    def _send_inform_response(self, session, cwmp_id):
+        """Send an InformResponse back, setting the session cookie"""
 
-        # Finish building the CWMP Response
-        out_buffer.write(" </soapenv:Header>\n")
-        out_buffer.write(" <soapenv:Body>\n")
-        out_buffer.write("  <cwmp:InformResponse>\n")
-        out_buffer.write("   <MaxEnvelopes>1</MaxEnvelopes>\n")
-        out_buffer.write("  </cwmp:InformResponse>\n")
-        out_buffer.write(" </soapenv:Body>\n")
-        out_buffer.write("</soapenv:Envelope>\n")
+        # Build CWMP Response, including the CWMP ID if it was in the Inform
+        content = render_inform_response(cwmp_id)
 
         # Send HTTP Response
-        self.send_response(200)
-        self.send_header("Content-type", "application/xml")
-        self.end_headers()
-        self.wfile.write(bytes(out_buffer.getvalue(), "utf-8"))
+        self._send_http_response(200, content, {
+            "Set-Cookie": "{}={}; Path=/".format(SESSION_COOKIE_NAME, session.get_session_key())})
+
+        self.logger.info("Sending a CWMP InformResponse")
+        self._write_outgoing_cwmp_message(content)
+
+        self._record_rpc_response(session, RPC_INFORM, time.monotonic() - self.request_start_time)
+        self._record_rpc_sent(session, RPC_INFORM, content)
+
 
-        logger.info("Sending a CWMP InformResponse")
-        self._write_outgoing_cwmp_message(out_buffer.getvalue())
 
-        out_buffer.close()
+    def _send_http_response(self, status_code, content, headers=None, content_type="application/xml"):
+        """Send an HTTP Response with a CWMP Message (or other bytes) as its
+            content, writing the status line, the headers and the content at once"""
+        self.log_request(status_code)
+        header_lines = ["{} {} {}".format(self.protocol_version, status_code, self.responses[status_code][0]),
+                        "Server: {}".format(self.version_string()),
+                        "Date: {}".format(self.date_time_string()),
+                        "Content-type: {}".format(content_type),
+                        "Content-Length: {}".format(len(content))]
+        header_lines.extend("{}: {}".format(header_name, header_value)
+                            for header_name, header_value in (headers or {}).items())
 
+        # Build the whole HTTP Response, so that it goes out in a single write
+        self.wfile.write("\r\n".join(header_lines).encode("latin-1", "strict") + b"\r\n\r\n" + content)
 
 
-    def _terminate_cwmp_session(self):
+
+    def _terminate_cwmp_session(self, session):
         """Terminate the CWMP Session by sending an HTTP 204 response"""
-        logger = logging.getLogger(self.__class__.__name__)
 
-        # Tell the Server to stop responding to HTTP Requests
-        self.server.stop_serving()
+        # Hand the walked data model to the CWMP Server, which stops
+        #  responding to HTTP Requests once no more devices are expected
+        self.server.get_cwmp_server().complete_session(session)
 
-        # Send an HTTP 204 Response to terminate the CWMP Session
+        # Send an HTTP 204 Response to terminate the CWMP Session, which
+        #  also closes the persistent connection
         self.send_response(204)
-        self.send_header("Content-type", "text/plain")
+        self.send_header("Connection", "close")
         self.end_headers()
-        self.wfile.write(bytes("", "utf-8"))
 
-        logger.info("Terminating the CWMP Session with an HTTP 204")
+        self.logger.info("Terminating the CWMP Session with an HTTP 204")
         self._write_outgoing_cwmp_message("<EMPTY>")
 
 
 
+class DataModelStore(object):
+    """The implemented data model of a device, kept as a trie of path segments
+
+    Each DataModelObject hangs off the node of its last path segment, so a
+     lookup by path walks one node per segment (O(depth)) and the common
+     prefixes of the paths are stored once.  The segments are interned, and
+     iterating the store yields the DataModelObjects parents first.  Once
+     its walk is complete the store is frozen: no more objects are added, nor
+     Parameters or values changed, so each node can cache a hash of its
+     subtree (see data_model_diff).
+
+    With a MemoryBudget, complete objects may be spilled to a SpillFile; the
+     node then holds a SpilledObject, and the object is read back from disk
+     (as a new DataModelObject) whenever it is looked up or iterated.
+
+    With a DataModelIndex, each complete object is also indexed (see
+     data_model_query), so the store can be queried by Parameter name and
+     value without a scan."""
+    def __init__(self, memory_budget=None, index=None):
+        """Initialize the Data Model Store"""
+        self.root_node = DataModelNode()
+        self.object_count = 0
+        self.memory_budget = memory_budget
+        self.index = index
+        self.spill_file = None
+        self.resident_queue = collections.deque()
+        self.resident_bytes = 0
+        self.spilled_count = 0
+        self.frozen = False
+
+
+    def __len__(self):
+        """Retrieve the number of DataModelObjects in the store"""
+        return self.object_count
+
+    def __iter__(self):
+        """Iterate over every DataModelObject, parents before their children"""
+        return self.iter_subtree("")
+
+
+    def freeze(self):
+        """Record that the walk of the store is complete, so its objects and
+            Parameter values no longer change"""
+        self.frozen = True
+
+    def is_frozen(self):
+        """Check to see if the store is frozen (see freeze)"""
+        return self.frozen
+
+
+    def add_object(self, data_model_obj):
+        """Add a DataModelObject to the store, replacing one of the same name"""
+        if self.frozen:
+            raise ValueError("Unable to add [{}] to a frozen data model".format(data_model_obj.get_name()))
+
+        node = self.root_node
+
+        node.subtree_hash = None
+        for segment in _split_path(data_model_obj.get_name()):
+            node = node.get_or_add_child(segment)
+            node.subtree_hash = None
+
+        if node.data_model_obj is None:
+            self.object_count += 1
+        node.data_model_obj = data_model_obj
+
+    def get_object(self, name):
+        """Retrieve a DataModelObject by its name (e.g. Device.DeviceInfo.), or None"""
+        node = self._find_node(name)
+
+        if node is None:
+            return None
+
+        return node.get_object()
+
+    def get_parameter(self, full_param_name):
+        """Retrieve a DataModelParameter by its full name, or None"""
+        parent_name, _, param_name = full_param_name.rpartition(".")
+        data_model_obj = self.get_object(parent_name + ".")
+
+        if data_model_obj is None:
+            return None
+
+        return data_model_obj.parameter_dict.get(param_name)
+
+
+    def get_root_node(self):
+        """Retrieve the root node of the trie"""
+        return self.root_node
+
+    def get_index(self):
+        """Retrieve the DataModelIndex of the complete objects, or None"""
+        return self.index
+
+
+    def iter_subtree(self, path, include_spilled=True):
+        """Iterate over the DataModelObjects at and below a path, parents
+            first, reading the spilled objects back from disk (or skipping
+            them)"""
+        node = self._find_node(path)
+        node_stack = [] if node is None else [node]
+
+        while len(node_stack) > 0:
+            node = node_stack.pop()
+
+            if node.data_model_obj is not None and (include_spilled or not node.is_spilled()):
+                yield node.get_object()
+            if node.children is not None:
+                node_stack.extend(reversed(list(node.children.values())))
+
+
+    def get_spilled_count(self):
+        """Retrieve the number of DataModelObjects that were spilled to disk"""
+        return self.spilled_count
+
+    def complete_object(self, data_model_obj):
+        """Record that an object's Parameter values are in, indexing it and
+            allowing it to be spilled to disk once the Memory Budget is exceeded"""
+        if self.index is not None:
+            self.index.add_object(data_model_obj)
+
+        if self.memory_budget is None:
+            return
+
+        node = self._find_node(data_model_obj.get_name())
+        if node is None or node.data_model_obj is not data_model_obj:
+            return
+
+        object_size = _estimate_object_size(data_model_obj)
+        self.resident_queue.append((node, object_size))
+        self.resident_bytes += object_size
+        self.memory_budget.add_resident_bytes(object_size)
+
+        while len(self.resident_queue) > 0 and self.memory_budget.is_exceeded(self.resident_bytes):
+            self._spill_node(*self.resident_queue.popleft())
+
+    def release(self):
+        """Return the resident size of the store to the Memory Budget, once
+            the store is thrown away (replaced or abandoned), and remove its
+            SpillFile; its objects are no longer accounted for, nor spilled"""
+        if self.memory_budget is not None and self.resident_bytes > 0:
+            self.memory_budget.release_resident_bytes(self.resident_bytes)
+
+        self.resident_queue.clear()
+        self.resident_bytes = 0
+
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+
+    def _spill_node(self, node, object_size):
+        """Write the object of a node to the SpillFile, freeing its memory"""
+        if node.is_spilled() or node.data_model_obj is None:
+            return
+
+        if self.spill_file is None:
+            self.spill_file = self.memory_budget.create_spill_file()
+
+        record = pickle.dumps(pack_data_model_object(node.data_model_obj), pickle.HIGHEST_PROTOCOL)
+        offset = self.spill_file.append(record)
+
+        node.data_model_obj = SpilledObject(self.spill_file, offset, len(record))
+        self.resident_bytes -= object_size
+        self.spilled_count += 1
+        self.memory_budget.record_spill(object_size)
+
+
+    def _find_node(self, path):
+        """Walk the trie down to the node of a path, or return None"""
+        node = self.root_node
+
+        for segment in _split_path(path):
+            if node.children is None:
+                return None
+            node = node.children.get(segment)
+            if node is None:
+                return None
+
+        return node
+
+
+
+class DataModelNode(object):
+    """A node of the DataModelStore trie"""
+    __slots__ = ("children", "data_model_obj", "subtree_hash")
+
+    def __init__(self):
+        self.children = None
+        self.data_model_obj = None
+        self.subtree_hash = None
+
+
+    def get_object(self):
+        """Retrieve the DataModelObject of the node (reading it back from
+            disk if it was spilled), or None"""
+        if self.is_spilled():
+            return self.data_model_obj.load()
+
+        return self.data_model_obj
+
+    def is_spilled(self):
+        """Check to see if the node's object was spilled to disk"""
+        return isinstance(self.data_model_obj, SpilledObject)
+
+
+    def get_or_add_child(self, segment):
+        """Retrieve the child node of a path segment, adding it if needed"""
+        if self.children is None:
+            self.children = {}
+
+        child = self.children.get(segment)
+        if child is None:
+            child = DataModelNode()
+            self.children[sys.intern(segment)] = child
+
+        return child
+
+
+
+class SpillFile(object):
+    """An append-only temporary file of spilled DataModelObjects, which are
+        read back by their offset (the file is removed once it is closed)"""
+    def __init__(self, spill_dir=None):
+        """Create the Spill File"""
+        self.spill_fh = tempfile.TemporaryFile(prefix="cwmpwalk-spill-", dir=spill_dir)
+        self.size = 0
+        self.lock = threading.Lock()
+
+
+    def append(self, record):
+        """Append a record, returning its offset"""
+        with self.lock:
+            offset = self.size
+            self.spill_fh.seek(offset)
+            self.spill_fh.write(record)
+            self.size += len(record)
+
+        return offset
+
+    def read(self, offset, length):
+        """Read back the record at an offset"""
+        with self.lock:
+            self.spill_fh.seek(offset)
+            return self.spill_fh.read(length)
+
+    def close(self):
+        """Close (and so remove) the Spill File"""
+        with self.lock:
+            self.spill_fh.close()
+
+
+
+class SpilledObject(object):
+    """The place of a DataModelObject in a SpillFile"""
+    __slots__ = ("spill_file", "offset", "length")
+
+    def __init__(self, spill_file, offset, length):
+        self.spill_file = spill_file
+        self.offset = offset
+        self.length = length
+
+
+    def load(self):
+        """Read the DataModelObject (and its Parameters) back from the SpillFile"""
+        return unpack_data_model_object(pickle.loads(self.spill_file.read(self.offset, self.length)))
+
+
+
 class DataModelItem(object):
     """Base class for both DataModelObject and DataModelParameter"""
+    __slots__ = ("name", "writable", "is_item_an_object")
+
     def __init__(self, is_obj):
         self.name = None
         self.writable = None
@@ -694,7 +3349,7 @@ class DataModelItem(object):
 
     def set_name(self, value):
         """Set the name of the Data Model Item"""
-        self.name = value
+        self.name = sys.intern(value)
 
 
     def get_writable(self):
@@ -709,6 +3364,8 @@ class DataModelItem(object):
 
 class DataModelObject(DataModelItem):
     """Represents an implemented Data Model Object"""
+    __slots__ = ("parameter_dict",)
+
     def __init__(self):
         """Initialize the Data Model Object"""
         super(DataModelObject, self).__init__(True)
@@ -717,44 +3374,75 @@ class DataModelObject(DataModelItem):
 
     def add_parameter(self, item):
         """Add a Data Model Parameter to this Data Model Object"""
-        self.parameter_dict[item.get_full_param_name()] = item
+        # The Parameter shares this object's name as its parent path
+        item.parent_path = self.name
+        self.parameter_dict[item.get_name()] = item
 
     def get_parameters(self):
         """Retrieve the list of Data Model Parameters"""
         return self.parameter_dict.values()
 
     def get_parameter(self, param_name):
-        """Retrieve a specific Data Model Parameter"""
-        return self.parameter_dict[param_name]
+        """Retrieve a specific Data Model Parameter by its name or full name"""
+        parent_path, _, name = param_name.rpartition(".")
+
+        if parent_path != "" and parent_path + "." != self.name:
+            raise KeyError(param_name)
+
+        return self.parameter_dict[name]
 
 
 
 class DataModelParameter(DataModelItem):
-    """Represents an implemented Data Model Parameter"""
+    """Represents an implemented Data Model Parameter
+
+    The full parameter name isn't stored; it is the parent path (shared with
+     the parent DataModelObject) followed by the name.  The value is kept as
+     the text the device sent; get_typed_value() converts it into the Python
+     type that matches its xsi:type (int, bool or str)."""
+    __slots__ = ("parent_path", "value", "value_type")
+
     def __init__(self):
         """Initialize the Data Model Parameter"""
         super(DataModelParameter, self).__init__(False)
+        self.parent_path = None
         self.value = None
-        self.full_param_name = None
+        self.value_type = None
 
 
     def get_value(self):
-        """Retrieve the Data Model Parameter's value"""
+        """Retrieve the Data Model Parameter's value, as the device sent it"""
+        return self.value
+
+    def get_value_text(self):
+        """Retrieve the Data Model Parameter's value as CWMP text (e.g. true, 42)"""
         return self.value
 
-    def set_value(self, value):
+    def get_typed_value(self):
+        """Retrieve the Data Model Parameter's value converted from its
+            xsi:type into an int, bool or str"""
+        return _convert_value(self.value, self.value_type)
+
+    def set_value(self, value, value_type=None):
         """Set the value of the Data Model Parameter"""
         self.value = value
+        self.value_type = None if value_type is None else sys.intern(value_type)
+
+
+    def get_value_type(self):
+        """Retrieve the xsi:type of the Data Model Parameter's value (e.g. unsignedInt), or None"""
+        return self.value_type
 
 
     def get_full_param_name(self):
         """Retrieve the full parameter name of the Data Model Parameter"""
-        return self.full_param_name
+        return self.parent_path + self.name
 
     def set_full_param_name(self, value):
         """Set the full parameter name of the Data Model Parameter"""
-        self.set_name(value.split(".")[-1])
-        self.full_param_name = value
+        parent_path, _, name = value.rpartition(".")
+        self.set_name(name)
+        self.parent_path = sys.intern(parent_path + ".")
 
 
 
@@ -764,26 +3452,69 @@ def main(argv):
 
     port = 8000
     interface = "en0"
+    concurrent = False
+    max_workers = 16
+    max_devices = None
+    discovery = DISCOVERY_NEXT_LEVEL
+    subtree_paths = []
+    gpv_batch_size = DEFAULT_GPV_BATCH_SIZE
+    values_mode = VALUES_LEAF
+    walk_order = WALK_ORDER_BFS
+    priority_paths = []
+    max_rpcs = None
+    max_walk_time = None
+    cache_dir = None
+    max_body_size = DEFAULT_MAX_BODY_SIZE
+    trace_file = None
+    export_files = []
+    max_walk_memory = None
+    max_memory = None
+    spill_dir = None
+    processes = 1
+    include_paths = []
+    exclude_paths = []
+    checkpoint_dir = None
+    fleet_file = None
+    max_fleet_walks = None
+    connection_request_rate = DEFAULT_CONNECTION_REQUEST_RATE
+    poll = False
+    poll_paths = []
+    history_size = DEFAULT_HISTORY_SIZE
+    queries = []
+    indexed_values = []
+    definition_files = []
+    profiles = []
+    definition_cache_dir = DEFAULT_DEFINITION_CACHE_DIR
 
     ### TODO: The file name should probably be absolute instead of relative
     ###         (based on standard install location?)
-    logging.basicConfig(filename="logs/cwmpwalk.log",
-                        format='%(asctime)-15s %(name)s %(levelname)-8s %(message)s')
-    logging.getLogger().setLevel(logging.INFO)
+    _start_logging("logs/cwmpwalk.log")
 
     logging.info("#######################################################")
     logging.info("## Starting cwmpwalk.py                              ##")
     logging.info("#######################################################")
 
     # Usage string for input argument handling
-    usage_str = "cwmpwalk.py [-p <CWMP ACS URL Port>]"
+    usage_str = "cwmpwalk.py [-p <CWMP ACS URL Port>] [-c [-w <Workers>] [-n <Devices>]] [-d <Discovery Mode>] [-s <Subtree Path>]... [-b <GPV Batch Size>] [-v <Values Mode>]"
+    usage_str += " [-o <Walk Order>] [-P <Priority Path>]... [-r <Max RPCs>] [-t <Max Seconds>] [-C <Cache Dir>] [-m <Max Body Bytes>] [-T <Trace File>] [-e <Export File>]..."
+    usage_str += " [-M <Walk Memory MB>] [-X <Process Memory MB>] [-S <Spill Dir>] [-W <Processes>]"
+    usage_str += " [-I <Include Path>] [-E <Exclude Path>] [-R <Checkpoint Dir>] [-F <Fleet File> [-L <Fleet Walks>] [-Q <Requests/s>]]"
+    usage_str += " [-l] [-G <Poll Path>]... [-H <History Samples>] [-q <Query>]... [-k <Indexed Parameter>]..."
+    usage_str += " [-D <Definition XML>]... [-A <Profile>]... [-K <Definition Cache Dir>]"
 
     # Retrieve the input arguments
     logging.info("Processing the Input Arguments...")
-    logging.debug("Found Input Arguments: {}".format(argv))
+    logging.debug("Found Input Arguments: %s", argv)
 
     try:
-        opts, args = getopt.getopt(argv, "hi:p:", "intf, port")
+        opts, args = getopt.getopt(
+            argv, "hi:p:Vcw:n:d:s:b:v:o:P:r:t:C:m:T:e:M:X:S:W:I:E:R:F:L:Q:lG:H:q:k:D:A:K:",
+            ["help", "intf=", "port=", "version", "concurrent", "workers=", "devices=",
+             "discovery=", "subtree=", "batch=", "values=", "order=", "priority=",
+             "max-rpcs=", "max-time=", "cache=", "max-body=", "trace=", "export=",
+             "walk-memory=", "max-memory=", "spill-dir=", "processes=", "include=", "exclude=", "resume=",
+             "fleet=", "fleet-walks=", "request-rate=", "poll", "poll-path=", "history=",
+             "query=", "index-value=", "definition=", "profile=", "definition-cache="])
     except getopt.GetoptError:
         print("Error Encountered:")
         logging.error("Error Encountered:")
@@ -800,6 +3531,43 @@ def main(argv):
             print(usage_str)
             print("  -i|--intf     :: System Interface (e.g. 'en0') to run the CWMP ACS on")
             print("  -p|--port     :: Port to run the CWMP ACS on")
+            print("  -c|--concurrent :: Walk many devices at once, one CWMP Session per device")
+            print("  -w|--workers  :: Number of worker threads in concurrent mode, which bounds the HTTP Requests handled at once;"
+                  " idle persistent connections don't hold one (default 16)")
+            print("  -n|--devices  :: Stop after walking this many devices in concurrent mode")
+            print("  -d|--discovery :: GetParameterNames discovery mode: next-level (default), subtree or auto")
+            print("  -s|--subtree  :: Discover this object's whole subtree with one GetParameterNames (repeatable)")
+            print("  -b|--batch    :: Number of Parameters in the first GetParameterValues (default 32)")
+            print("  -v|--values   :: GetParameterValues mode: leaf (default), root or top-level")
+            print("  -o|--order    :: Walk order of the GetParameterNames: bfs (default), dfs or priority")
+            print("  -P|--priority :: Subtree that the priority walk order discovers first (repeatable)")
+            print("  -r|--max-rpcs :: Stop discovering after this many RPCs per device")
+            print("  -t|--max-time :: Stop discovering after this many seconds per device")
+            print("  -C|--cache    :: Directory of the Walk Cache, which re-walks known devices without rediscovering them")
+            print("  -m|--max-body :: Largest HTTP Request content accepted, in bytes (default 128 MB; 0 for no limit)")
+            print("  -T|--trace    :: Trace the CWMP Messages into this file (rotated at 10 MB)")
+            print("  -e|--export   :: Stream the walked objects into this .jsonl, .csv or .db (SQLite) file (repeatable)")
+            print("  -M|--walk-memory :: Spill the complete objects of a walk to disk beyond this many MB")
+            print("  -X|--max-memory :: Spill the complete objects to disk once all of the walks use this many MB")
+            print("  -S|--spill-dir :: Directory of the spill files (default: the temporary directory)")
+            print("  -W|--processes :: Walk on this many worker processes (implies -c; -w is per process)")
+            print("  -I|--include   :: Only walk this subtree or Parameter ({i} matches any instance; repeatable)")
+            print("  -E|--exclude   :: Don't walk this subtree or Parameter ({i} matches any instance; repeatable)")
+            print("  -R|--resume    :: Checkpoint the walks in this directory, and resume the unfinished ones")
+            print("  -F|--fleet     :: Walk the devices of this CSV file by sending them Connection Requests (implies -c)")
+            print("  -L|--fleet-walks :: Walk at most this many devices of the fleet at once (default: the workers)")
+            print("  -Q|--request-rate :: Send at most this many Connection Requests per second (default {:g})".format(
+                DEFAULT_CONNECTION_REQUEST_RATE))
+            print("  -l|--poll      :: Once a device has been walked, only poll the values of its changing Parameters")
+            print("  -G|--poll-path :: Poll this subtree or Parameter instead ({i} matches any instance; repeatable)")
+            print("  -H|--history   :: Samples kept per polled Parameter (default {})".format(DEFAULT_HISTORY_SIZE))
+            print("  -q|--query     :: Print the objects (path ending in '.') or Parameters (optionally '=<value>')")
+            print("                    of the walked devices that match this path ({i} matches any instance; repeatable)")
+            print("  -k|--index-value :: Index the values of the Parameters of this name, for the queries (repeatable)")
+            print("  -D|--definition :: Validate the walked data models against this BBF data model XML (repeatable)")
+            print("  -A|--profile   :: Check the requirements of this profile (repeatable; default {})".format(
+                ", ".join(DEFAULT_PROFILES)))
+            print("  -K|--definition-cache :: Directory of the compiled definitions (default: the temporary directory)")
             print("  -V|--version  :: Print the version of the tool")
             sys.exit()
         elif opt in ("-i", "--intf"):
@@ -809,12 +3577,347 @@ def main(argv):
         elif opt in ("-V", "--version"):
             print("Report Tool :: version={}".format(_VERSION))
             sys.exit()
+        elif opt in ("-c", "--concurrent"):
+            concurrent = True
+        elif opt in ("-w", "--workers"):
+            max_workers = int(arg)
+        elif opt in ("-n", "--devices"):
+            max_devices = int(arg)
+        elif opt in ("-d", "--discovery"):
+            discovery = arg
+        elif opt in ("-s", "--subtree"):
+            subtree_paths.append(arg)
+        elif opt in ("-b", "--batch"):
+            gpv_batch_size = int(arg)
+        elif opt in ("-v", "--values"):
+            values_mode = arg
+        elif opt in ("-o", "--order"):
+            walk_order = arg
+        elif opt in ("-P", "--priority"):
+            priority_paths.append(arg)
+        elif opt in ("-r", "--max-rpcs"):
+            max_rpcs = int(arg)
+        elif opt in ("-t", "--max-time"):
+            max_walk_time = float(arg)
+        elif opt in ("-C", "--cache"):
+            cache_dir = arg
+        elif opt in ("-m", "--max-body"):
+            max_body_size = int(arg) or None
+        elif opt in ("-T", "--trace"):
+            trace_file = arg
+        elif opt in ("-e", "--export"):
+            export_files.append(arg)
+        elif opt in ("-M", "--walk-memory"):
+            max_walk_memory = int(float(arg) * 1024 * 1024)
+        elif opt in ("-X", "--max-memory"):
+            max_memory = int(float(arg) * 1024 * 1024)
+        elif opt in ("-S", "--spill-dir"):
+            spill_dir = arg
+        elif opt in ("-W", "--processes"):
+            processes = int(arg)
+        elif opt in ("-I", "--include"):
+            include_paths.append(arg)
+        elif opt in ("-E", "--exclude"):
+            exclude_paths.append(arg)
+        elif opt in ("-R", "--resume"):
+            checkpoint_dir = arg
+        elif opt in ("-F", "--fleet"):
+            fleet_file = arg
+            concurrent = True
+        elif opt in ("-L", "--fleet-walks"):
+            max_fleet_walks = int(arg)
+        elif opt in ("-Q", "--request-rate"):
+            connection_request_rate = float(arg)
+        elif opt in ("-l", "--poll"):
+            poll = True
+        elif opt in ("-G", "--poll-path"):
+            poll_paths.append(arg)
+        elif opt in ("-H", "--history"):
+            history_size = int(arg)
+        elif opt in ("-q", "--query"):
+            queries.append(arg)
+        elif opt in ("-k", "--index-value"):
+            indexed_values.append(arg)
+        elif opt in ("-D", "--definition"):
+            definition_files.append(arg)
+        elif opt in ("-A", "--profile"):
+            profiles.append(arg)
+        elif opt in ("-K", "--definition-cache"):
+            definition_cache_dir = arg
 
 
     # Main logic
-    walker = CWMPWalk(_get_ip_address(interface), port)
-    walker.start_walk()
+    if trace_file is not None:
+        _start_payload_trace(trace_file)
+
+    walker = CWMPWalk(_get_ip_address(interface), port, concurrent, max_workers, max_devices,
+                      discovery, subtree_paths, gpv_batch_size, values_mode,
+                      walk_order, priority_paths or None, max_rpcs, max_walk_time, cache_dir,
+                      max_body_size, export_files, max_walk_memory, max_memory, spill_dir, processes,
+                      include_paths, exclude_paths, checkpoint_dir, fleet_file, max_fleet_walks,
+                      connection_request_rate, poll, poll_paths, history_size,
+                      len(queries) > 0, indexed_values or None, definition_files, profiles or None,
+                      definition_cache_dir)
+    try:
+        walker.start_walk()
+    except KeyboardInterrupt:
+        # A concurrent walk without a device limit runs until interrupted
+        print("Walk interrupted")
     walker.print_results()
+    walker.print_poll_history()
+    walker.print_query_results(queries)
+    walker.print_conformance_report()
+    walker.print_fleet_report()
+
+
+def _create_cwmp_server(ip_addr, port, walk_options, **server_args):
+    """Create a CWMPServer from the options of a walk (see CWMPWalk)"""
+    return CWMPServer(ip_addr, port, max_workers=walk_options["max_workers"],
+                      discovery_policy=DiscoveryPolicy(walk_options["discovery"], walk_options["subtree_paths"]),
+                      gpv_batch_size=walk_options["gpv_batch_size"], values_mode=walk_options["values_mode"],
+                      walk_order=walk_options["walk_order"], priority_paths=walk_options["priority_paths"],
+                      walk_budget=WalkBudget(walk_options["max_rpcs"], walk_options["max_walk_time"]),
+                      walk_cache=None if walk_options["cache_dir"] is None else WalkCache(walk_options["cache_dir"]),
+                      max_body_size=walk_options["max_body_size"], memory_budget=_create_memory_budget(walk_options),
+                      path_filter=PathFilter(walk_options.get("include_paths"), walk_options.get("exclude_paths")),
+                      walk_checkpoints=(None if walk_options.get("checkpoint_dir") is None else
+                                        WalkCheckpoints(walk_options["checkpoint_dir"])),
+                      **server_args)
+
+
+def _create_memory_budget(walk_options):
+    """Create the MemoryBudget of a walk, or None if its memory isn't bounded"""
+    if walk_options.get("max_walk_memory") is None and walk_options.get("max_memory") is None:
+        return None
+
+    return MemoryBudget(walk_options["max_walk_memory"], walk_options["max_memory"], walk_options.get("spill_dir"))
+
+
+def _run_walk_worker(worker_index, handoff_conn, result_queue, log_queue, log_level, trace_enabled, walk_options):
+    """Run a worker process of a WalkCoordinator: walk the devices of the
+        connections it is handed, and stream the results and metrics back"""
+    # The coordinator decides when the workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _start_worker_logging(log_queue, log_level, trace_enabled)
+
+    result_exporter = WorkerResultExporter(worker_index, result_queue)
+    http_server = HandoffHTTPServer(handoff_conn, CWMPHandler, walk_options["max_workers"])
+    cwmp_server = _create_cwmp_server("", 0, walk_options, concurrent=True, exporters=[result_exporter],
+                                      http_server=http_server, session_key_prefix="{}-".format(worker_index),
+                                      keep_data_models=False)
+    stop_event = threading.Event()
+    metrics_thread = threading.Thread(target=_send_worker_metrics,
+                                      args=(worker_index, cwmp_server, result_queue, stop_event))
+    metrics_thread.start()
+
+    try:
+        http_server.serve_forever()
+    finally:
+        http_server.server_close()
+        result_exporter.close()
+        stop_event.set()
+        metrics_thread.join()
+        result_queue.put((WORKER_MESSAGE_METRICS, worker_index, cwmp_server.get_metrics().to_dict()))
+        result_queue.put((WORKER_MESSAGE_STOPPED, worker_index))
+
+
+def _send_worker_metrics(worker_index, cwmp_server, result_queue, stop_event):
+    """Send a snapshot of a worker's metrics to the WalkCoordinator every WORKER_METRICS_INTERVAL"""
+    while not stop_event.wait(WORKER_METRICS_INTERVAL):
+        result_queue.put((WORKER_MESSAGE_METRICS, worker_index, cwmp_server.get_metrics().to_dict()))
+
+
+def _start_worker_logging(log_queue, log_level, trace_enabled):
+    """Queue the log records (and the payload trace) of a worker process to
+        the WalkCoordinator, which writes them"""
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(log_level)
+
+    if trace_enabled:
+        trace_logger = logging.getLogger(TRACE_LOGGER_NAME)
+        for handler in list(trace_logger.handlers):
+            trace_logger.removeHandler(handler)
+        trace_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        trace_logger.setLevel(logging.DEBUG)
+        trace_logger.propagate = False
+
+
+def get_path_shape(path):
+    """Retrieve the shape of a data model path, which has its instance
+        numbers replaced by {i} (e.g. Device.IP.Interface.{i}.)"""
+    return ".".join(["{i}" if segment.isdigit() else segment for segment in path.split(".")])
+
+
+def _compile_path_patterns(pattern_list):
+    """Compile path filter patterns into a trie of their segments, whose
+        nodes map a segment (or the {i} wildcard) to the next node, and None
+        to True where a pattern ends"""
+    trie = {}
+
+    for pattern in pattern_list:
+        segment_list = pattern[:-1].split(".") if pattern.endswith(".") else pattern.split(".")
+        for segment in segment_list:
+            if segment == "" or ("{" in segment and segment != PATH_INSTANCE_WILDCARD):
+                raise ValueError("Invalid path filter pattern: {}".format(pattern))
+
+        node = trie
+        for segment in segment_list:
+            node = node.setdefault(segment, {})
+        node[None] = True
+
+    return trie
+
+
+def _locate_path(trie, name):
+    """Locate an object path or Parameter name relative to the patterns of
+        a trie (matching them as full paths and as paths relative to the root)"""
+    if len(trie) == 0:
+        return PATH_OUTSIDE
+
+    segment_list = name[:-1].split(".") if name.endswith(".") else name.split(".")
+    return max(_match_path_segments(trie, segment_list), _match_path_segments(trie, segment_list[1:]))
+
+
+def _match_path_segments(trie, segment_list):
+    """Match the segments of a path against the patterns of a trie: the path
+        is inside a pattern's subtree, above it, or outside of all of them"""
+    node_list = [trie]
+
+    for segment in segment_list:
+        if any(None in node for node in node_list):
+            return PATH_INSIDE
+
+        next_node_list = []
+        for node in node_list:
+            if segment in node:
+                next_node_list.append(node[segment])
+            if PATH_INSTANCE_WILDCARD in node and segment.isdigit():
+                next_node_list.append(node[PATH_INSTANCE_WILDCARD])
+
+        if len(next_node_list) == 0:
+            return PATH_OUTSIDE
+        node_list = next_node_list
+
+    if any(None in node for node in node_list):
+        return PATH_INSIDE
+
+    return PATH_ABOVE
+
+
+def _split_path(path):
+    """Split a data model path into its segments (the trailing dot is optional)"""
+    return [segment for segment in path.split(".") if segment != ""]
+
+
+def pack_data_model_object(data_model_obj):
+    """Pack a DataModelObject and its Parameters into a (picklable) record"""
+    return (data_model_obj.get_name(), data_model_obj.get_writable(),
+            [(dm_param.get_name(), dm_param.get_writable(), dm_param.get_value_text(), dm_param.get_value_type())
+             for dm_param in data_model_obj.get_parameters()])
+
+
+def unpack_data_model_object(record):
+    """Rebuild a DataModelObject and its Parameters from a packed record"""
+    name, writable, param_list = record
+    data_model_obj = DataModelObject()
+    data_model_obj.set_name(name)
+    data_model_obj.set_writable(writable)
+
+    for param_name, param_writable, value_text, value_type in param_list:
+        dm_param = DataModelParameter()
+        dm_param.set_name(param_name)
+        dm_param.set_writable(param_writable)
+        dm_param.set_value(value_text, value_type)
+        data_model_obj.add_parameter(dm_param)
+
+    return data_model_obj
+
+
+def _estimate_object_size(data_model_obj):
+    """Estimate the memory of a DataModelObject and its Parameters, in bytes"""
+    object_size = OBJECT_SIZE_ESTIMATE + len(data_model_obj.get_name())
+
+    for dm_param in data_model_obj.get_parameters():
+        object_size += PARAMETER_SIZE_ESTIMATE
+        if dm_param.get_value() is not None:
+            object_size += len(dm_param.get_value())
+
+    return object_size
+
+
+def _convert_value(value, value_type):
+    """Convert a Parameter value from its xsi:type into an int, bool or str,
+        keeping the text if it doesn't parse"""
+    if value is None:
+        return None
+    elif value_type in _INTEGER_VALUE_TYPES:
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    elif value_type == "boolean":
+        if value in ("1", "true", "True"):
+            return True
+        elif value in ("0", "false", "False"):
+            return False
+
+    return value
+
+
+def _start_logging(log_file):
+    """Log into the log file from a listener thread: the log records are
+        queued by the thread that logs them, so logging doesn't block the walk"""
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root_logger = logging.getLogger()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+
+    _start_log_listener(log_queue, file_handler)
+
+
+def _start_payload_trace(trace_file):
+    """Trace the CWMP Messages into a size-rotated trace file from a listener thread"""
+    trace_queue = queue.SimpleQueue()
+    trace_handler = logging.handlers.RotatingFileHandler(
+        trace_file, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT)
+    trace_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    trace_logger = logging.getLogger(TRACE_LOGGER_NAME)
+    trace_logger.addHandler(logging.handlers.QueueHandler(trace_queue))
+    trace_logger.setLevel(logging.DEBUG)
+    trace_logger.propagate = False
+
+    _start_log_listener(trace_queue, trace_handler)
+
+
+def _start_log_listener(log_queue, handler):
+    """Start a listener thread that hands the queued log records to the
+        handler, and flushes the queue when the tool exits"""
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+def _get_payload_text(message):
+    """Retrieve a traced CWMP Message (text or bytes) as text"""
+    if isinstance(message, bytes):
+        return message.decode("utf-8", "replace")
+
+    return message
+
+
+def _ewma(mean, sample, weight=0.2):
+    """Fold a sample into an exponentially weighted moving average"""
+    if mean is None:
+        return sample
+
+    return mean + weight * (sample - mean)
 
 
 def _get_ip_address(netdev='en0'):
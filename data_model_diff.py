@@ -0,0 +1,189 @@
+"""
+# File Name: data_model_diff.py
+#
+# Description: Compares two implemented data models (e.g. two walks of the
+#               same device, or the walks of two devices)
+#
+# Functionality:
+#  - DataModelDiff:
+#      Compares two DataModelStores, skipping every subtree whose hash is
+#        the same in both, and reports the changes in path order
+#  - DataModelChange
+#      A single change: an added or removed object or parameter, or a
+#        changed value or Writable Property
+#
+"""
+
+
+import logging
+import hashlib
+import collections
+
+
+# The kinds of DataModelChange
+OBJECT_ADDED = "object-added"
+OBJECT_REMOVED = "object-removed"
+PARAMETER_ADDED = "parameter-added"
+PARAMETER_REMOVED = "parameter-removed"
+VALUE_CHANGED = "value-changed"
+WRITABLE_CHANGED = "writable-changed"
+
+# The size of the subtree hashes
+HASH_DIGEST_SIZE = 16
+
+
+DataModelChange = collections.namedtuple("DataModelChange", ["kind", "path", "old_value", "new_value"])
+
+
+
+class DataModelDiff(object):
+    """The differences between an old and a new implemented data model
+
+    Each node of a DataModelStore caches a Merkle-style hash of its subtree
+     (its own object, the object's Parameters and the hashes of its child
+     nodes), so subtrees that are equal in both models are skipped after a
+     single comparison, and a diff of two near-identical models only visits
+     the paths that lead to a change.  A removed or added subtree is reported
+     as its objects; their Parameters are only reported for objects that are
+     in both models.  The cached hashes are only valid while the models don't
+     change, so both must be frozen (their walks complete)."""
+    logger = logging.getLogger("DataModelDiff")
+
+    def __init__(self, old_data_model, new_data_model):
+        """Compare the old and the new data model"""
+        if not old_data_model.is_frozen() or not new_data_model.is_frozen():
+            raise ValueError("Only frozen data models (of complete walks) can be compared")
+
+        self.change_list = []
+        self.visited_node_count = 0
+
+        self._diff_nodes(old_data_model.get_root_node(), new_data_model.get_root_node())
+        self.logger.info("Found %s changes after visiting %s nodes",
+                         len(self.change_list), self.visited_node_count)
+
+
+    def get_changes(self, kind=None):
+        """Retrieve the list of DataModelChanges, optionally of a single kind"""
+        if kind is None:
+            return list(self.change_list)
+
+        return [change for change in self.change_list if change.kind == kind]
+
+    def is_empty(self):
+        """Check to see if the two data models are the same"""
+        return len(self.change_list) == 0
+
+    def get_visited_node_count(self):
+        """Retrieve the number of trie nodes that the diff had to visit"""
+        return self.visited_node_count
+
+
+    def _diff_nodes(self, old_node, new_node):
+        """Compare a node of both models, descending only into changed subtrees"""
+        self.visited_node_count += 1
+
+        if get_subtree_hash(old_node) == get_subtree_hash(new_node):
+            return
+
+        self._diff_objects(old_node.get_object(), new_node.get_object())
+
+        old_children = old_node.children or {}
+        new_children = new_node.children or {}
+
+        for segment in _sorted_segments(set(old_children) | set(new_children)):
+            if segment not in new_children:
+                self._add_subtree_changes(OBJECT_REMOVED, old_children[segment])
+            elif segment not in old_children:
+                self._add_subtree_changes(OBJECT_ADDED, new_children[segment])
+            else:
+                self._diff_nodes(old_children[segment], new_children[segment])
+
+
+    def _diff_objects(self, old_obj, new_obj):
+        """Compare the same object (which may be missing) in both models"""
+        if old_obj is None and new_obj is None:
+            return
+        elif new_obj is None:
+            self.change_list.append(DataModelChange(OBJECT_REMOVED, old_obj.get_name(), None, None))
+            return
+        elif old_obj is None:
+            self.change_list.append(DataModelChange(OBJECT_ADDED, new_obj.get_name(), None, None))
+            return
+
+        if bool(old_obj.get_writable()) != bool(new_obj.get_writable()):
+            self.change_list.append(DataModelChange(
+                WRITABLE_CHANGED, old_obj.get_name(), old_obj.get_writable(), new_obj.get_writable()))
+
+        old_params = old_obj.parameter_dict
+        new_params = new_obj.parameter_dict
+
+        for param_name in sorted(set(old_params) | set(new_params)):
+            old_param = old_params.get(param_name)
+            new_param = new_params.get(param_name)
+
+            if new_param is None:
+                self.change_list.append(DataModelChange(
+                    PARAMETER_REMOVED, old_param.get_full_param_name(), old_param.get_value(), None))
+            elif old_param is None:
+                self.change_list.append(DataModelChange(
+                    PARAMETER_ADDED, new_param.get_full_param_name(), None, new_param.get_value()))
+            else:
+                if old_param.get_value_text() != new_param.get_value_text():
+                    self.change_list.append(DataModelChange(
+                        VALUE_CHANGED, new_param.get_full_param_name(),
+                        old_param.get_value(), new_param.get_value()))
+                if bool(old_param.get_writable()) != bool(new_param.get_writable()):
+                    self.change_list.append(DataModelChange(
+                        WRITABLE_CHANGED, new_param.get_full_param_name(),
+                        old_param.get_writable(), new_param.get_writable()))
+
+
+    def _add_subtree_changes(self, kind, node):
+        """Report every object of a subtree that is only in one of the models"""
+        node_stack = [node]
+
+        while len(node_stack) > 0:
+            node = node_stack.pop()
+            self.visited_node_count += 1
+
+            if node.data_model_obj is not None:
+                self.change_list.append(DataModelChange(kind, node.get_object().get_name(), None, None))
+            if node.children is not None:
+                node_stack.extend(node.children[segment] for segment in reversed(_sorted_segments(node.children)))
+
+
+
+
+def get_subtree_hash(node):
+    """Retrieve the hash of a DataModelStore node's subtree, computing and
+        caching it (and those of the nodes below it) if needed"""
+    if node.subtree_hash is None:
+        subtree_hash = hashlib.blake2b(digest_size=HASH_DIGEST_SIZE)
+
+        if node.data_model_obj is not None:
+            _update_object_hash(subtree_hash, node.get_object())
+
+        if node.children is not None:
+            for segment in sorted(node.children):
+                subtree_hash.update(b"\x01" + segment.encode("utf-8") + b"\x00")
+                subtree_hash.update(get_subtree_hash(node.children[segment]))
+
+        node.subtree_hash = subtree_hash.digest()
+
+    return node.subtree_hash
+
+
+def _update_object_hash(subtree_hash, data_model_obj):
+    """Add an object and its Parameters to a subtree hash"""
+    subtree_hash.update(b"\x02" + (b"1" if data_model_obj.get_writable() else b"0"))
+
+    for param_name in sorted(data_model_obj.parameter_dict):
+        dm_param = data_model_obj.parameter_dict[param_name]
+        subtree_hash.update("\x03{}\x00{}\x00{}\x00".format(
+            param_name, "1" if dm_param.get_writable() else "0",
+            dm_param.get_value_text()).encode("utf-8"))
+
+
+def _sorted_segments(segments):
+    """Sort path segments, with instance numbers in numeric order"""
+    return sorted(segments, key=lambda segment: (0, int(segment), "") if segment.isdigit() else (1, 0, segment))
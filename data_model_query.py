@@ -0,0 +1,245 @@
+"""
+# File Name: data_model_query.py
+#
+# Description: Indexed queries over implemented data models (of one device, or
+#               of many stored devices)
+#
+# Functionality:
+#  - DataModelIndex:
+#      The indexes of a DataModelStore, built as the walk completes its
+#        objects: an inverted index of the Parameter names (their last path
+#        segment) and optional indexes of the values of chosen Parameters
+#  - DataModelQuery:
+#      Finds the objects, Parameters and table instances of one or more
+#        DataModelStores by path pattern ({i} matches any instance number),
+#        Parameter name and value, descending the trie of each store along
+#        the pattern and using its DataModelIndex rather than a scan
+#  - QueryMatch
+#      A single result: the device, the path and (for a Parameter) the value
+#
+"""
+
+
+import re
+import logging
+import collections
+
+
+# The instance number wildcard of the path patterns
+PATH_INSTANCE_WILDCARD = "{i}"
+
+# The Device ID of the results of a query over a single DataModelStore
+SINGLE_DEVICE_ID = None
+
+
+QueryMatch = collections.namedtuple("QueryMatch", ["device_id", "path", "value"])
+
+
+
+class DataModelIndex(object):
+    """The indexes of a DataModelStore
+
+    Each object is indexed once its Parameter values are in (when the
+     DataModelStore completes it): the leaf index maps the name of each
+     Parameter to the objects that have one, and for the value_leaves
+     Parameter names the value index maps each value (as CWMP text) to the
+     objects whose Parameter has it.  The object names are the interned
+     names of the DataModelObjects, so the index holds no copies of them."""
+    def __init__(self, value_leaves=None):
+        """Initialize the Data Model Index, empty"""
+        self.value_leaves = frozenset(value_leaves or [])
+        self.leaf_index = {}
+        self.value_index = {leaf: {} for leaf in self.value_leaves}
+        self.object_count = 0
+
+
+    def get_value_leaves(self):
+        """Retrieve the Parameter names whose values are indexed"""
+        return self.value_leaves
+
+    def get_object_count(self):
+        """Retrieve the number of indexed objects"""
+        return self.object_count
+
+
+    def add_object(self, data_model_obj):
+        """Index the Parameters (and the indexed values) of a DataModelObject"""
+        object_name = data_model_obj.get_name()
+
+        for dm_param in data_model_obj.get_parameters():
+            leaf = dm_param.get_name()
+            self.leaf_index.setdefault(leaf, set()).add(object_name)
+
+            if leaf in self.value_leaves:
+                self.value_index[leaf].setdefault(dm_param.get_value_text(), set()).add(object_name)
+
+        self.object_count += 1
+
+
+    def get_leaf_object_names(self, leaf):
+        """Retrieve the names of the objects that have a Parameter of this name"""
+        return self.leaf_index.get(leaf, set())
+
+    def is_value_indexed(self, leaf):
+        """Check to see if the values of the Parameters of this name are indexed"""
+        return leaf in self.value_leaves
+
+    def get_value_object_names(self, leaf, value_text):
+        """Retrieve the names of the objects whose Parameter of this name has
+            the value (as CWMP text)"""
+        return self.value_index[leaf].get(value_text, set())
+
+
+
+class DataModelQuery(object):
+    """Queries over one DataModelStore, or over the DataModelStores of many
+        devices (a dict keyed by Device ID)
+
+    A path pattern is a full path (or one relative to the root object),
+     where {i} matches any instance number: an object pattern ends in a
+     dot, a Parameter pattern doesn't.  The patterns are matched by
+     descending the trie of each store, so only the matching subtrees are
+     visited; a Parameter name (leaf) or an indexed value is looked up in
+     the DataModelIndex of the store instead, when the store has one.
+     Spilled objects are read back from disk only when they match."""
+    logger = logging.getLogger("DataModelQuery")
+
+    def __init__(self, data_models):
+        """Initialize the Query over a DataModelStore or a dict of them"""
+        if isinstance(data_models, dict):
+            self.data_models = data_models
+        else:
+            self.data_models = {SINGLE_DEVICE_ID: data_models}
+
+
+    def find_objects(self, pattern):
+        """Find the objects whose path matches an object pattern (e.g.
+            WANDevice.{i}.WANConnectionDevice.{i}.)"""
+        match_list = []
+
+        for device_id, data_model in self.data_models.items():
+            for object_path in _match_object_paths(data_model, pattern):
+                match_list.append(QueryMatch(device_id, object_path, None))
+
+        return match_list
+
+    def get_instances(self, table_pattern):
+        """Find the instances of the tables whose path matches an object
+            pattern (e.g. WANDevice.{i}.WANConnectionDevice.)"""
+        return self.find_objects(table_pattern.rstrip(".") + "." + PATH_INSTANCE_WILDCARD + ".")
+
+    def find_parameters(self, path=None, leaf=None, value=None, value_pattern=None):
+        """Find the Parameters below an object pattern (or matching a
+            Parameter pattern), with a given name (leaf), whose value (as
+            CWMP text) is the given one or matches a regular expression;
+            each criterion is optional, and the results are in path order"""
+        subtree = True
+        if path is not None and not path.endswith("."):
+            # A Parameter pattern names the leaf itself, of the matching
+            #  objects only (not of their descendants)
+            subtree = False
+            path, _, path_leaf = path.rpartition(".")
+            path += "."
+            if leaf is not None and leaf != path_leaf:
+                return []
+            leaf = path_leaf
+
+        value_regex = None if value_pattern is None else re.compile(value_pattern)
+        match_list = []
+
+        for device_id, data_model in self.data_models.items():
+            for data_model_obj in self._iter_candidate_objects(data_model, path, leaf, value, subtree):
+                if leaf is not None:
+                    dm_param = data_model_obj.parameter_dict.get(leaf)
+                    param_list = [] if dm_param is None else [dm_param]
+                else:
+                    param_list = data_model_obj.get_parameters()
+
+                for dm_param in param_list:
+                    value_text = dm_param.get_value_text()
+                    if value is not None and value_text != value:
+                        continue
+                    if value_regex is not None and (value_text is None or value_regex.search(value_text) is None):
+                        continue
+                    match_list.append(QueryMatch(device_id, dm_param.get_full_param_name(), dm_param.get_value()))
+
+        match_list.sort(key=lambda query_match: (str(query_match.device_id), query_match.path))
+        return match_list
+
+
+    def _iter_candidate_objects(self, data_model, path, leaf, value, subtree=True):
+        """Iterate over the objects that may hold matching Parameters: those
+            from the DataModelIndex (for a leaf or an indexed value) that
+            are below the path, otherwise the subtrees that match the path;
+            without subtree, only the objects that match the path itself"""
+        index = data_model.get_index()
+
+        if index is not None and leaf is not None:
+            if value is not None and index.is_value_indexed(leaf):
+                object_names = index.get_value_object_names(leaf, value)
+            else:
+                object_names = index.get_leaf_object_names(leaf)
+
+            path_regex = None if path is None else _compile_subtree_regex(data_model, path, subtree)
+            for object_name in sorted(object_names):
+                if path_regex is None or path_regex.match(object_name) is not None:
+                    data_model_obj = data_model.get_object(object_name)
+                    if data_model_obj is not None:
+                        yield data_model_obj
+            return
+
+        if not subtree:
+            for object_path in _match_object_paths(data_model, path):
+                data_model_obj = data_model.get_object(object_path)
+                if data_model_obj is not None:
+                    yield data_model_obj
+            return
+
+        for object_path in [""] if path is None else _match_object_paths(data_model, path):
+            for data_model_obj in data_model.iter_subtree(object_path):
+                yield data_model_obj
+
+
+
+
+def _split_pattern(data_model, pattern):
+    """Split a path pattern into its segments, prefixing a pattern that is
+        relative to the root object with the name of the root object"""
+    segment_list = [segment for segment in pattern.split(".") if segment != ""]
+    root_children = data_model.get_root_node().children or {}
+
+    if len(segment_list) > 0 and segment_list[0] not in root_children and len(root_children) == 1:
+        segment_list.insert(0, next(iter(root_children)))
+
+    return segment_list
+
+
+def _match_object_paths(data_model, pattern):
+    """Descend the trie of a DataModelStore along an object pattern,
+        returning the paths of the matching objects"""
+    node_list = [("", data_model.get_root_node())]
+
+    for segment in _split_pattern(data_model, pattern):
+        next_node_list = []
+
+        for node_path, node in node_list:
+            if node.children is None:
+                continue
+            elif segment == PATH_INSTANCE_WILDCARD:
+                next_node_list.extend((node_path + child_segment + ".", child_node)
+                                      for child_segment, child_node in node.children.items()
+                                      if child_segment.isdigit())
+            elif segment in node.children:
+                next_node_list.append((node_path + segment + ".", node.children[segment]))
+
+        node_list = next_node_list
+
+    return sorted(node_path for node_path, node in node_list if node.data_model_obj is not None)
+
+
+def _compile_subtree_regex(data_model, pattern, subtree=True):
+    """Compile an object pattern into a regular expression that matches the
+        names of the objects at and below it (or, without subtree, only the
+        names of the objects that match it)"""
+    return re.compile("".join(r"\d+\." if segment == PATH_INSTANCE_WILDCARD else re.escape(segment) + r"\."
+                              for segment in _split_pattern(data_model, pattern)) + ("" if subtree else "$"))
@@ -9,8 +9,9 @@
 #  - DataModelSanityTester:
 #     A concrete Tester that performs a sanity check on the implemented
 #     data model for a Device by walking it via GetParameterNames and
-#     GetParameterValues RPC calls.  Essentialy it is that starting point
-#     of an ID-106 Test Client
+#     GetParameterValues RPC calls, and validates it against the data
+#     model definitions (see data_model_validator).  Essentialy it is that
+#     starting point of an ID-106 Test Client
 #  - This is an example of how cwmpwalk.py could be used
 #
 """
@@ -22,6 +23,7 @@ sys.path.append("../report-tool")
 import logging
 
 from cwmpwalk import CWMPWalk
+from data_model_validator import ConformanceValidator, DefinitionCache
 from nodes import Document
 
 
@@ -29,10 +31,15 @@ from nodes import Document
 class DataModelSanityTester(object):
     """A contrete Tester that performs a Data Model Sanity Check via
         an HTTP Request Handler"""
-    def __init__(self):
-        """Initialize the Tester"""
+    def __init__(self, definition_files=None, profiles=None):
+        """Initialize the Tester, with the BBF data model XML files to
+            validate the implemented data model against"""
         self.implemented_data_model = None
         self.cwmp_walker = CWMPWalk(port=8000)
+        self.validator = None
+
+        if definition_files:
+            self.validator = ConformanceValidator(DefinitionCache().load(definition_files), profiles)
 
 
     def test(self):
@@ -51,6 +58,14 @@ class DataModelSanityTester(object):
             for data_model_param in data_model_obj.get_parameters():
                 print("- {} = {}".format(data_model_param.get_name(), data_model_param.get_value()))
 
+        if self.validator is not None:
+            finding_list = self.validator.validate(self.implemented_data_model)
+            print("")
+            print("The Conformance Findings are ({} found):".format(len(finding_list)))
+            for finding in finding_list:
+                print("- {}: {} (expected {}, found {})".format(finding.kind, finding.path,
+                                                             finding.expected, finding.actual))
+
 
 
 
@@ -61,5 +76,5 @@ if __name__ == "__main__":
 
     myDoc = Document()
 
-    tester = DataModelSanityTester()
+    tester = DataModelSanityTester(sys.argv[1:])
     tester.test()
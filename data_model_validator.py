@@ -0,0 +1,594 @@
+"""
+# File Name: data_model_validator.py
+#
+# Description: Conformance validation of implemented data models against the
+#               Broadband Forum data model definitions (e.g. TR-098, TR-181)
+#
+# Functionality:
+#  - DataModelDefinition:
+#      The compiled definition of one or more data models (from the BBF
+#        cwmp-datamodel XML): the objects (by path, with {i} for each
+#        instance number), their Parameters' access and type, and the
+#        Parameters and objects that each profile requires
+#  - DefinitionCache:
+#      Keeps each compiled DataModelDefinition in a pickle file keyed by
+#        its XML files (their paths, sizes and modification times), so the
+#        XML is only parsed once
+#  - ConformanceValidator:
+#      Checks implemented data models against a DataModelDefinition for
+#        unknown objects and Parameters, objects and Parameters that the
+#        chosen profiles require but are missing, Writable Properties that
+#        don't match the access, and xsi:types that don't match the syntax;
+#        many data models are validated on a pool of processes
+#  - ConformanceFinding
+#      A single finding: its kind, the path, and the expected and actual
+#        access, type or requirement
+#
+"""
+
+
+import os
+import re
+import pickle
+import hashlib
+import logging
+import tempfile
+import collections
+import concurrent.futures
+import multiprocessing
+
+import xml.etree.ElementTree as ElementTree
+
+
+# The kinds of ConformanceFinding
+UNKNOWN_OBJECT = "unknown-object"
+UNKNOWN_PARAMETER = "unknown-parameter"
+MISSING_OBJECT = "missing-object"
+MISSING_PARAMETER = "missing-parameter"
+WRITABLE_MISMATCH = "writable-mismatch"
+TYPE_MISMATCH = "type-mismatch"
+
+# The profiles whose requirements are checked by default
+DEFAULT_PROFILES = ["Baseline:1"]
+
+# The default directory of the compiled definitions
+DEFAULT_DEFINITION_CACHE_DIR = os.path.join(tempfile.gettempdir(), "cwmpwalk-definitions")
+
+# The version of the compiled definition format (part of the cache key, so
+#  that a new format never loads an old pickle)
+DEFINITION_FORMAT_VERSION = 1
+
+# The instance number placeholder of the object paths of a definition
+PATH_INSTANCE_PLACEHOLDER = "{i}"
+
+# Vendor-specific objects and Parameters (e.g. X_000CC3_Debug) may extend any
+#  object, so they are never reported as unknown
+VENDOR_EXTENSION_PREFIX = "X_"
+
+# The base types of the Parameter syntax, which are the xsi:types of the values
+_BASE_TYPES = frozenset(["string", "unsignedInt", "int", "unsignedLong", "long", "boolean",
+                         "dateTime", "base64", "hexBinary", "decimal"])
+
+# The start method of the validation processes (as for the walk's worker processes)
+VALIDATION_START_METHOD = "spawn"
+
+
+ConformanceFinding = collections.namedtuple("ConformanceFinding", ["kind", "path", "expected", "actual"])
+ObjectDefinition = collections.namedtuple("ObjectDefinition", ["writable", "parameters"])
+ParameterDefinition = collections.namedtuple("ParameterDefinition", ["writable", "value_type"])
+
+# The ConformanceValidator of a validation process (see _start_validation_worker)
+_worker_validator = None
+
+
+
+class DataModelDefinition(object):
+    """The compiled definitions of the data models of one or more XML files,
+        keyed by model name (e.g. Device:2.15)
+
+    Each model maps the path of each of its objects (a table instance is
+     {i}, e.g. Device.IP.Interface.{i}.) to an ObjectDefinition, whose
+     Parameters map their names to a ParameterDefinition (the xsi:type is
+     None if the syntax couldn't be resolved).  Each profile (e.g.
+     Baseline:1, including those it is based on or extends) maps the paths of
+     its objects to the object's requirement and those of its Parameters."""
+    def __init__(self, source_files, models, profiles):
+        """Initialize the Data Model Definition"""
+        self.source_files = list(source_files)
+        self.models = models
+        self.profiles = profiles
+
+
+    def get_source_files(self):
+        """Retrieve the XML files that the definition was compiled from"""
+        return self.source_files
+
+    def get_model_names(self):
+        """Retrieve the names of the defined models"""
+        return list(self.models)
+
+
+    def get_objects(self, model_name):
+        """Retrieve the ObjectDefinitions of a model, keyed by path"""
+        return self.models[model_name]
+
+    def get_profile(self, model_name, profile_name):
+        """Retrieve the requirements of a model's profile, keyed by object
+            path, or None if the model has no such profile"""
+        return self.profiles[model_name].get(profile_name)
+
+
+    def find_model(self, root_name, model_name=None):
+        """Find the model of a root object (e.g. InternetGatewayDevice.): the
+            named one, or else the latest version of the models of the root
+            object, or None"""
+        if model_name is not None:
+            return model_name if model_name in self.models else None
+
+        candidate_list = [name for name, objects in self.models.items() if root_name in objects]
+        if len(candidate_list) == 0:
+            return None
+
+        return max(candidate_list, key=_get_model_version)
+
+
+
+class DefinitionCache(object):
+    """Keeps the compiled DataModelDefinitions as pickle files
+
+    The file of a definition is named after a hash of its XML files' paths,
+     sizes and modification times (and of the compiled format version), so a
+     changed XML file is compiled again, and loading a known one only has to
+     unpickle it."""
+    logger = logging.getLogger("DefinitionCache")
+
+    def __init__(self, cache_dir=DEFAULT_DEFINITION_CACHE_DIR):
+        """Initialize the Definition Cache, creating the cache directory if needed"""
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    def get_cache_dir(self):
+        """Retrieve the directory that the Definition Cache is kept in"""
+        return self.cache_dir
+
+
+    def load(self, xml_files):
+        """Retrieve the DataModelDefinition of the XML files, compiling (and
+            storing) it unless it is cached"""
+        cache_file = self._get_cache_file(xml_files)
+
+        try:
+            with open(cache_file, "rb") as cache_fh:
+                definition = pickle.load(cache_fh)
+            self.logger.info("Loaded the compiled definition of %s from %s", ", ".join(xml_files), cache_file)
+            return definition
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as err:
+            self.logger.warning("Ignoring the unreadable compiled definition %s (%s)", cache_file, err)
+
+        definition = compile_definition(xml_files)
+
+        # Write the definition atomically, so that a reader never sees half of it
+        cache_fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(cache_fd, "wb") as cache_fh:
+                pickle.dump(definition, cache_fh, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, cache_file)
+        except OSError as err:
+            os.unlink(temp_file)
+            self.logger.warning("Unable to store the compiled definition %s (%s)", cache_file, err)
+        except BaseException:
+            # Don't leave the temporary file behind, whatever went wrong
+            os.unlink(temp_file)
+            raise
+
+        return definition
+
+
+    def _get_cache_file(self, xml_files):
+        """Retrieve the path of the pickle file of the XML files"""
+        key_hash = hashlib.sha1(str(DEFINITION_FORMAT_VERSION).encode("ascii"))
+
+        for xml_file in xml_files:
+            file_stat = os.stat(xml_file)
+            key_hash.update("\0{}\0{}\0{}".format(os.path.abspath(xml_file), file_stat.st_size,
+                                                  file_stat.st_mtime_ns).encode("utf-8"))
+
+        return os.path.join(self.cache_dir, key_hash.hexdigest() + ".pickle")
+
+
+
+class ConformanceValidator(object):
+    """Validates implemented data models against a DataModelDefinition
+
+    Each data model is checked against the model of its root object (the
+     latest version, unless model_name chooses one):
+     - unknown-object / unknown-parameter: an object or Parameter that the
+        model doesn't define (reported once per subtree; vendor extensions
+        are skipped)
+     - missing-object / missing-parameter: an object or Parameter that one
+        of the profiles requires, in each instance of the tables it is in
+     - writable-mismatch: a Writable object or Parameter that the model
+        defines as readOnly, or a Parameter that a profile requires to be
+        readWrite but isn't Writable
+     - type-mismatch: a value whose xsi:type isn't that of the syntax
+
+    validate_all() validates many data models on a pool of processes, each
+     of which is handed the definition once; only the structure of the data
+     models (names, Writable Properties and xsi:types) is sent to them."""
+    logger = logging.getLogger("ConformanceValidator")
+
+    def __init__(self, definition, profiles=None, model_name=None, processes=None):
+        """Initialize the Conformance Validator"""
+        self.definition = definition
+        self.profiles = list(profiles) if profiles is not None else list(DEFAULT_PROFILES)
+        self.model_name = model_name
+        self.processes = processes if processes is not None else os.cpu_count() or 1
+
+
+    def get_definition(self):
+        """Retrieve the DataModelDefinition that is validated against"""
+        return self.definition
+
+
+    def validate(self, data_model):
+        """Validate an implemented data model, returning its ConformanceFindings in path order"""
+        return self._validate_structure(_describe_data_model(data_model))
+
+    def validate_all(self, data_models):
+        """Validate the implemented data model of each device (a dict keyed by
+            Device ID), returning the ConformanceFindings of each device"""
+        process_count = min(self.processes, len(data_models))
+
+        if process_count <= 1:
+            return {device_id: self.validate(data_model) for device_id, data_model in data_models.items()}
+
+        self.logger.info("Validating %s data models on %s processes", len(data_models), process_count)
+        with concurrent.futures.ProcessPoolExecutor(
+                process_count, multiprocessing.get_context(VALIDATION_START_METHOD),
+                _start_validation_worker, (self.definition, self.profiles, self.model_name)) as executor:
+            future_list = [executor.submit(_validate_in_worker, device_id, _describe_data_model(data_model))
+                           for device_id, data_model in data_models.items()]
+
+            return dict(future.result() for future in future_list)
+
+
+    def _validate_structure(self, structure):
+        """Validate the structure (see _describe_data_model) of a data model"""
+        if len(structure) == 0:
+            return []
+
+        root_name = structure[0][0].split(".", 1)[0] + "."
+        model_name = self.definition.find_model(root_name, self.model_name)
+        if model_name is None:
+            return [ConformanceFinding(UNKNOWN_OBJECT, root_name, self.model_name, None)]
+
+        object_defs = self.definition.get_objects(model_name)
+        finding_list = []
+        object_params = {}
+        generic_objects = collections.defaultdict(list)
+        unknown_paths = set()
+
+        for name, writable, param_list in structure:
+            generic_name = _get_generic_path(name)
+            parent_name = generic_name.rsplit(".", 2)[0] + "."
+            object_params[name] = {param_name: param_writable for param_name, param_writable, _ in param_list}
+            generic_objects[generic_name].append(name)
+
+            if parent_name in unknown_paths:
+                # Only the top of an unknown subtree is reported
+                unknown_paths.add(generic_name)
+                continue
+
+            object_def = object_defs.get(generic_name)
+            if object_def is None and generic_name + PATH_INSTANCE_PLACEHOLDER + "." in object_defs:
+                # A table, whose access is that of its instances
+                object_def = ObjectDefinition(object_defs[generic_name + PATH_INSTANCE_PLACEHOLDER + "."].writable, {})
+            elif object_def is None:
+                unknown_paths.add(generic_name)
+                if not name.rsplit(".", 2)[-2].startswith(VENDOR_EXTENSION_PREFIX):
+                    finding_list.append(ConformanceFinding(UNKNOWN_OBJECT, name, None, _access_text(writable)))
+                continue
+
+            if writable and not object_def.writable:
+                finding_list.append(ConformanceFinding(WRITABLE_MISMATCH, name, "readOnly", "readWrite"))
+
+            finding_list.extend(_check_parameters(name, object_def, param_list))
+
+        finding_list.extend(self._check_profiles(model_name, object_params, generic_objects))
+
+        finding_list.sort(key=lambda finding: finding.path)
+        return finding_list
+
+    def _check_profiles(self, model_name, object_params, generic_objects):
+        """Check that the objects and Parameters that the profiles require
+            are in (every instance of) the data model"""
+        finding_list = []
+        requirement_dict = {}
+
+        for profile_name in self.profiles:
+            profile = self.definition.get_profile(model_name, profile_name)
+            if profile is None:
+                self.logger.warning("The %s model has no %s profile", model_name, profile_name)
+                continue
+            _merge_requirements(requirement_dict, profile)
+
+        for path, (object_requirement, param_requirements) in sorted(requirement_dict.items()):
+            # The required object is checked in each instance of the innermost table it is in
+            anchor_length = path.rfind(PATH_INSTANCE_PLACEHOLDER + ".") + len(PATH_INSTANCE_PLACEHOLDER) + 1
+            if anchor_length <= len(PATH_INSTANCE_PLACEHOLDER):
+                name_list = [path]
+            else:
+                name_list = [anchor_name + path[anchor_length:] for anchor_name in
+                             generic_objects.get(path[:anchor_length], [])]
+
+            for name in name_list:
+                params = object_params.get(name)
+
+                if params is None:
+                    if object_requirement != "notSpecified":
+                        finding_list.append(ConformanceFinding(MISSING_OBJECT, name, object_requirement, None))
+                    continue
+
+                for param_name, param_requirement in sorted(param_requirements.items()):
+                    if param_name not in params:
+                        finding_list.append(ConformanceFinding(MISSING_PARAMETER, name + param_name,
+                                                               param_requirement, None))
+                    elif param_requirement == "readWrite" and params[param_name] is False:
+                        finding_list.append(ConformanceFinding(WRITABLE_MISMATCH, name + param_name,
+                                                               "readWrite", "readOnly"))
+
+        return finding_list
+
+
+
+
+def compile_definition(xml_files):
+    """Compile the data models of BBF cwmp-datamodel XML files (e.g. the
+        "full" TR-098 and TR-181 definitions) into a DataModelDefinition
+
+    The data types and components of every file are shared, so a model may
+     use those of the files it imports (when they are compiled along with
+     it), and a model is built on its base model (e.g. Device:2.15 on
+     Device:2.14) when that is in one of the files."""
+    data_type_elements = {}
+    component_elements = {}
+    model_elements = collections.OrderedDict()
+
+    for xml_file in xml_files:
+        for element in ElementTree.parse(xml_file).getroot():
+            tag = _local_name(element.tag)
+            if tag == "dataType" and element.get("name") is not None:
+                data_type_elements[element.get("name")] = element
+            elif tag == "component":
+                component_elements[element.get("name")] = element
+            elif tag == "model":
+                model_elements[element.get("name")] = element
+
+    compiler = _DefinitionCompiler(data_type_elements, component_elements, model_elements)
+    for model_name in model_elements:
+        compiler.compile_model(model_name)
+
+    logging.getLogger("DataModelDefinition").info(
+        "Compiled the %s models of %s", ", ".join(model_elements), ", ".join(xml_files))
+    return DataModelDefinition(xml_files, compiler.models, compiler.profiles)
+
+
+
+class _DefinitionCompiler(object):
+    """Compiles the model elements of the definition XML (see compile_definition)"""
+    def __init__(self, data_type_elements, component_elements, model_elements):
+        self.data_type_elements = data_type_elements
+        self.component_elements = component_elements
+        self.model_elements = model_elements
+        self.data_types = {}
+        self.models = {}
+        self.profiles = {}
+
+
+    def compile_model(self, model_name):
+        """Compile a model (and its base model), unless it is compiled already"""
+        if model_name in self.models:
+            return
+
+        model_element = self.model_elements[model_name]
+        objects = {}
+        profile_elements = collections.OrderedDict()
+
+        base_name = model_element.get("base")
+        if base_name in self.model_elements and base_name != model_name:
+            self.compile_model(base_name)
+            objects.update(self.models[base_name])
+
+        self._compile_items(model_element, "", objects, profile_elements)
+        self.models[model_name] = objects
+
+        self.profiles[model_name] = dict(self.profiles.get(base_name, {}))
+        for profile_name in list(profile_elements):
+            self._compile_profile(model_name, profile_name, profile_elements)
+
+
+    def _compile_items(self, element, path_prefix, objects, profile_elements):
+        """Compile the objects, components and profiles that an element holds"""
+        for child in element:
+            tag = _local_name(child.tag)
+
+            if tag == "object":
+                self._compile_object(child, path_prefix, objects)
+            elif tag == "component" and child.get("ref") in self.component_elements:
+                self._compile_items(self.component_elements[child.get("ref")], path_prefix + child.get("path", ""),
+                                    objects, profile_elements)
+            elif tag == "profile":
+                name = child.get("name") or child.get("base")
+                profile_elements.setdefault(name, []).append((child, path_prefix))
+
+    def _compile_object(self, element, path_prefix, objects):
+        """Compile an object (or the changes to it, for a base object)"""
+        path = path_prefix + (element.get("name") or element.get("base"))
+        base_def = objects.get(path)
+        access = element.get("access")
+        parameters = dict(base_def.parameters) if base_def is not None else {}
+
+        for child in element:
+            if _local_name(child.tag) != "parameter":
+                continue
+
+            param_name = child.get("name") or child.get("base")
+            base_param = parameters.get(param_name)
+            param_access = child.get("access")
+            value_type = self._get_syntax_type(child)
+
+            parameters[param_name] = ParameterDefinition(
+                param_access == "readWrite" if param_access is not None else
+                base_param is not None and base_param.writable,
+                value_type if value_type is not None else base_param and base_param.value_type)
+
+        objects[path] = ObjectDefinition(access == "readWrite" if access is not None else
+                                         base_def is not None and base_def.writable, parameters)
+
+    def _compile_profile(self, model_name, profile_name, profile_elements):
+        """Compile a profile, merging in the requirements of the profiles that
+            it is based on or extends"""
+        if profile_name not in profile_elements:
+            # Compiled already (or unknown)
+            return self.profiles[model_name].get(profile_name, {})
+
+        requirement_dict = {}
+        # Mark the profile as compiled before merging, so a cycle ends here
+        self.profiles[model_name][profile_name] = requirement_dict
+
+        for element, path_prefix in profile_elements.pop(profile_name):
+            for parent_name in (element.get("base") or "").split() + (element.get("extends") or "").split():
+                _merge_requirements(requirement_dict, self._compile_profile(model_name, parent_name, profile_elements))
+
+            for object_element in element:
+                if _local_name(object_element.tag) != "object":
+                    continue
+
+                path = path_prefix + object_element.get("ref")
+                param_requirements = {param_element.get("ref"): param_element.get("requirement")
+                                      for param_element in object_element
+                                      if _local_name(param_element.tag) == "parameter"}
+                _merge_requirements(requirement_dict, {path: (object_element.get("requirement"),
+                                                              param_requirements)})
+
+        return requirement_dict
+
+
+    def _get_syntax_type(self, param_element):
+        """Retrieve the xsi:type of a Parameter's syntax, or None"""
+        for child in param_element:
+            if _local_name(child.tag) == "syntax":
+                return self._get_element_type(child)
+
+        return None
+
+    def _get_element_type(self, element):
+        """Retrieve the base type of a syntax (or dataType) element, or None"""
+        if element.get("base") is not None:
+            return self._get_data_type(element.get("base"))
+
+        for child in element:
+            tag = _local_name(child.tag)
+
+            if tag == "list":
+                # A list is a comma-separated string
+                return "string"
+            elif tag in _BASE_TYPES:
+                return tag
+            elif tag == "dataType" and child.get("ref") is not None:
+                return self._get_data_type(child.get("ref"))
+
+        return None
+
+    def _get_data_type(self, name):
+        """Retrieve the base type of a named dataType (e.g. IPAddress), or None"""
+        if name in _BASE_TYPES:
+            return name
+
+        if name not in self.data_types:
+            # Mark the dataType as resolved before descending, so a cycle ends here
+            self.data_types[name] = None
+            element = self.data_type_elements.get(name)
+            if element is not None:
+                self.data_types[name] = self._get_element_type(element)
+
+        return self.data_types[name]
+
+
+
+
+def _start_validation_worker(definition, profiles, model_name):
+    """Create the ConformanceValidator of a validation process"""
+    global _worker_validator
+    _worker_validator = ConformanceValidator(definition, profiles, model_name, processes=1)
+
+
+def _validate_in_worker(device_id, structure):
+    """Validate the structure of a device's data model in a validation process"""
+    return device_id, _worker_validator._validate_structure(structure)
+
+
+def _describe_data_model(data_model):
+    """Describe the structure of a data model: the (name, Writable Property,
+        [(name, Writable Property, xsi:type)]) of each object, parents first"""
+    return [(data_model_obj.get_name(), data_model_obj.get_writable(),
+             [(dm_param.get_name(), dm_param.get_writable(), dm_param.get_value_type())
+              for dm_param in data_model_obj.get_parameters()])
+            for data_model_obj in data_model]
+
+
+def _check_parameters(name, object_def, param_list):
+    """Check an object's Parameters against their ParameterDefinitions"""
+    finding_list = []
+
+    for param_name, writable, value_type in param_list:
+        param_def = object_def.parameters.get(param_name)
+
+        if param_def is None:
+            if not param_name.startswith(VENDOR_EXTENSION_PREFIX):
+                finding_list.append(ConformanceFinding(UNKNOWN_PARAMETER, name + param_name, None,
+                                                       _access_text(writable)))
+            continue
+
+        if writable and not param_def.writable:
+            finding_list.append(ConformanceFinding(WRITABLE_MISMATCH, name + param_name, "readOnly", "readWrite"))
+        if value_type is not None and param_def.value_type is not None and value_type != param_def.value_type:
+            finding_list.append(ConformanceFinding(TYPE_MISMATCH, name + param_name, param_def.value_type,
+                                                   value_type))
+
+    return finding_list
+
+
+def _merge_requirements(requirement_dict, profile):
+    """Merge the object and Parameter requirements of a profile into others"""
+    for path, (object_requirement, param_requirements) in profile.items():
+        merged_requirement, merged_params = requirement_dict.get(path, (None, {}))
+        merged_params = dict(merged_params)
+        merged_params.update(param_requirements)
+        requirement_dict[path] = (object_requirement or merged_requirement, merged_params)
+
+
+def _get_generic_path(name):
+    """Replace the instance numbers of an object path with {i}"""
+    return ".".join(PATH_INSTANCE_PLACEHOLDER if segment.isdigit() else segment for segment in name.split("."))
+
+
+def _get_model_version(model_name):
+    """Retrieve the version of a model name (e.g. (2, 15) for Device:2.15)"""
+    return tuple(int(number) for number in re.findall(r"\d+", model_name.partition(":")[2]))
+
+
+def _access_text(writable):
+    """Convert a Writable Property into the access of the definitions"""
+    if writable is None:
+        return None
+
+    return "readWrite" if writable else "readOnly"
+
+
+def _local_name(tag):
+    """Strip the namespace of an element tag"""
+    return tag.rsplit("}", 1)[-1]
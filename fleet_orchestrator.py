@@ -0,0 +1,538 @@
+"""
+# File Name: fleet_orchestrator.py
+#
+# Description: Walks a fleet of devices on demand, by sending each device a
+#               Connection Request and following its walk on the CWMPServer
+#
+# Functionality:
+#  - FleetDevice:
+#      A device of the fleet (its Connection Request URL and credentials),
+#        and how far its walk has got
+#  - TokenBucket:
+#      Limits the rate of the Connection Requests, while allowing a burst
+#  - FleetOrchestrator:
+#      Sends the Connection Requests (with at most max_walks walks at a
+#        time, at the rate of a TokenBucket), follows the Informs and the
+#        walks that they start, retries the devices that don't Inform or
+#        whose walk fails, and reports the completion rate and throughput
+#        of the fleet
+#  - FleetWalkListener:
+#      The WalkExporter that the CWMPServer notifies of the walks, which
+#        hands them to the FleetOrchestrator
+#
+"""
+
+
+import csv
+import time
+import heapq
+import logging
+import itertools
+import threading
+import concurrent.futures
+import http.client
+import urllib.error
+import urllib.request
+
+from walk_export import WalkExporter, WALK_COMPLETED
+
+
+# The columns of a fleet file (the Username and Password are optional)
+FLEET_COLUMNS = ("DeviceId", "ConnectionRequestURL", "Username", "Password")
+
+# Connection Requests per second, and the burst of them, by default
+DEFAULT_CONNECTION_REQUEST_RATE = 10.0
+
+# Connection Requests (the first one and the retries) sent to a device at most
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Seconds that a device is given to Inform after its Connection Request
+DEFAULT_INFORM_TIMEOUT = 60.0
+
+# Seconds that a device is given to complete its walk after its Inform
+DEFAULT_WALK_TIMEOUT = 1800.0
+
+# Seconds before a device whose attempt failed is sent a Connection Request again
+DEFAULT_RETRY_DELAY = 10.0
+
+# Seconds that a device is given to answer its Connection Request
+CONNECTION_REQUEST_TIMEOUT = 10.0
+
+# The most threads that send Connection Requests at once
+MAX_CONNECTION_REQUEST_THREADS = 32
+
+# The states of a device of the fleet
+DEVICE_PENDING = "pending"
+DEVICE_REQUESTED = "requested"
+DEVICE_WALKING = "walking"
+DEVICE_COMPLETED = "completed"
+DEVICE_FAILED = "failed"
+
+
+
+class FleetDevice(object):
+    """A device of the fleet, and how far its walk has got
+
+    A device is pending until it is sent a Connection Request, requested
+     until it Informs, and walking until its walk ends; a completed walk
+     completes the device, while a failed attempt makes it pending again
+     (or failed, after the last attempt)."""
+    def __init__(self, device_id, url, username=None, password=None):
+        """Initialize the Fleet Device"""
+        self.device_id = device_id
+        self.url = url
+        self.username = username
+        self.password = password
+        self.state = DEVICE_PENDING
+        self.attempt_count = 0
+        self.deadline = None
+        self.failure = None
+        self.start_time = None
+        self.end_time = None
+        self.parameter_count = 0
+
+
+    def get_device_id(self):
+        """Retrieve the Device ID (OUI-SerialNumber) of the device"""
+        return self.device_id
+
+    def get_url(self):
+        """Retrieve the Connection Request URL of the device"""
+        return self.url
+
+    def get_credentials(self):
+        """Retrieve the (Username, Password) of the device's Connection Requests"""
+        return self.username, self.password
+
+    def get_state(self):
+        """Retrieve the state of the device's walk"""
+        return self.state
+
+    def get_attempt_count(self):
+        """Retrieve the number of Connection Requests sent to the device"""
+        return self.attempt_count
+
+    def get_failure(self):
+        """Retrieve why the last attempt of the device failed (or None)"""
+        return self.failure
+
+    def get_parameter_count(self):
+        """Retrieve the number of Parameters walked on the device"""
+        return self.parameter_count
+
+    def get_walk_time(self):
+        """Retrieve the seconds from the Inform to the end of the completed walk"""
+        if self.start_time is None or self.end_time is None:
+            return None
+
+        return self.end_time - self.start_time
+
+
+    def is_active(self):
+        """Check to see if the device is waiting for its Inform or its walk"""
+        return self.state in (DEVICE_REQUESTED, DEVICE_WALKING)
+
+    def is_done(self):
+        """Check to see if the device's walk has completed or failed for good"""
+        return self.state in (DEVICE_COMPLETED, DEVICE_FAILED)
+
+
+
+class TokenBucket(object):
+    """A token bucket, which allows rate tokens per second and a burst of
+        up to burst tokens (by default one second's worth)"""
+    def __init__(self, rate, burst=None):
+        """Initialize the Token Bucket, full"""
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.last_time = time.monotonic()
+
+
+    def get_rate(self):
+        """Retrieve the tokens allowed per second"""
+        return self.rate
+
+
+    def take(self):
+        """Take a token, returning 0 if it was taken or otherwise the
+            seconds until the next token is due"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+
+        return (1.0 - self.tokens) / self.rate
+
+
+
+class FleetOrchestrator(object):
+    """Walks a fleet of devices, by sending each one a Connection Request
+        and following its walk through a FleetWalkListener
+
+    The listener (get_walk_listener()) has to be handed to the CWMPServer
+     (or WalkCoordinator) as one of its exporters.  run() sends the
+     Connection Requests (an HTTP GET, with Digest or Basic authentication)
+     on a pool of threads, to at most max_walks devices at a time and at
+     the rate of the TokenBucket, and returns once every device has
+     completed its walk or failed max_attempts times.  An attempt fails if
+     the Connection Request is refused, if the device doesn't Inform within
+     inform_timeout seconds, or if its walk is abandoned or isn't complete
+     within walk_timeout seconds; the device is then retried after
+     retry_delay seconds.  A device of the fleet that Informs on its own is
+     walked all the same."""
+    logger = logging.getLogger("FleetOrchestrator")
+
+    def __init__(self, device_list, max_walks=16, rate=DEFAULT_CONNECTION_REQUEST_RATE, burst=None,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, inform_timeout=DEFAULT_INFORM_TIMEOUT,
+                 walk_timeout=DEFAULT_WALK_TIMEOUT, retry_delay=DEFAULT_RETRY_DELAY,
+                 request_timeout=CONNECTION_REQUEST_TIMEOUT):
+        """Initialize the Fleet Orchestrator"""
+        if max_walks < 1 or rate <= 0 or max_attempts < 1:
+            raise ValueError("The fleet needs at least one walk at a time, a positive Connection Request "
+                             "rate and at least one attempt per device")
+
+        self.device_dict = {}
+        for device in device_list:
+            if device.get_device_id() in self.device_dict:
+                raise ValueError("Duplicate device in the fleet: {}".format(device.get_device_id()))
+            self.device_dict[device.get_device_id()] = device
+
+        self.max_walks = max_walks
+        self.token_bucket = TokenBucket(rate, burst)
+        self.max_attempts = max_attempts
+        self.inform_timeout = inform_timeout
+        self.walk_timeout = walk_timeout
+        self.retry_delay = retry_delay
+        self.request_timeout = request_timeout
+        self.walk_listener = FleetWalkListener(self)
+        self.condition = threading.Condition()
+        self.pending_heap = []
+        self.pending_sequence = itertools.count()
+        self.active_devices = {}
+        self.request_count = 0
+        self.stopped = False
+        self.start_time = None
+        self.end_time = None
+
+
+    def get_walk_listener(self):
+        """Retrieve the FleetWalkListener to hand to the CWMPServer as an exporter"""
+        return self.walk_listener
+
+    def get_devices(self):
+        """Retrieve the devices of the fleet"""
+        return list(self.device_dict.values())
+
+    def get_request_count(self):
+        """Retrieve the number of Connection Requests sent so far"""
+        return self.request_count
+
+
+    def get_completion_rate(self):
+        """Retrieve the fraction of the fleet's devices whose walk has completed"""
+        if len(self.device_dict) == 0:
+            return 1.0
+
+        return self._count_devices(DEVICE_COMPLETED) / len(self.device_dict)
+
+    def get_throughput(self):
+        """Retrieve the (completed walks, walked Parameters) per second of the fleet's walk"""
+        wall_time = self._get_wall_time()
+        if wall_time is None or wall_time <= 0:
+            return 0.0, 0.0
+
+        return (self._count_devices(DEVICE_COMPLETED) / wall_time,
+                sum(device.get_parameter_count() for device in self.device_dict.values()) / wall_time)
+
+
+    def run(self):
+        """Walk the fleet: send the Connection Requests, and wait until every
+            device has completed its walk or failed"""
+        self.start_time = time.monotonic()
+        self.logger.info("Walking a fleet of %s devices (%s at a time, %s Connection Requests per second)",
+                         len(self.device_dict), self.max_walks, self.token_bucket.get_rate())
+
+        with self.condition:
+            for device in self.device_dict.values():
+                if device.get_state() == DEVICE_PENDING:
+                    self._schedule_device(device, self.start_time)
+
+        thread_count = min(self.max_walks, MAX_CONNECTION_REQUEST_THREADS)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=thread_count,
+                                                   thread_name_prefix="ConnectionRequest") as executor:
+            with self.condition:
+                while not self.stopped:
+                    now = time.monotonic()
+                    self._expire_attempts(now)
+                    wake_time = self._request_walks(executor, now)
+
+                    if len(self.active_devices) == 0 and len(self.pending_heap) == 0:
+                        break
+
+                    for device in self.active_devices.values():
+                        wake_time = min(wake_time, device.deadline)
+                    self.condition.wait(max(0.0, wake_time - time.monotonic()))
+
+                for device in self.device_dict.values():
+                    if not device.is_done():
+                        device.state = DEVICE_FAILED
+                        device.failure = "The fleet walk was stopped"
+
+        self.end_time = time.monotonic()
+        self.logger.info("Walked the fleet: %s of %s devices completed", self._count_devices(DEVICE_COMPLETED),
+                         len(self.device_dict))
+
+
+    def stop(self):
+        """Stop the fleet walk, failing the devices that aren't done yet"""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+
+    def print_report(self):
+        """Print the completion rate and the throughput of the fleet's walk"""
+        completed_list = [device for device in self.device_dict.values() if device.get_state() == DEVICE_COMPLETED]
+        failed_list = [device for device in self.device_dict.values() if device.get_state() == DEVICE_FAILED]
+        walk_rate, parameter_rate = self.get_throughput()
+        wall_time = self._get_wall_time() or 0.0
+
+        print("Fleet devices:       {} ({} completed, {} failed)".format(
+            len(self.device_dict), len(completed_list), len(failed_list)))
+        print("Completion rate:     {:.1f} %".format(self.get_completion_rate() * 100))
+        print("Connection Requests: {} ({} retries)".format(
+            self.request_count, max(0, self.request_count - len(self.device_dict))))
+        print("Wall time:           {:.2f} s".format(wall_time))
+        print("Throughput:          {:.2f} walks per second, {:.0f} Parameters per second".format(
+            walk_rate, parameter_rate))
+        print("Walk time:           {}".format(_format_percentiles(
+            [device.get_walk_time() for device in completed_list])))
+
+        for device in failed_list[:10]:
+            print("  {} failed after {} attempts: {}".format(
+                device.get_device_id(), device.get_attempt_count(), device.get_failure()))
+        if len(failed_list) > 10:
+            print("  ... and {} more".format(len(failed_list) - 10))
+
+
+    def _request_walks(self, executor, now):
+        """Send Connection Requests to the due devices while there is room
+            for their walks and the TokenBucket allows, returning when the
+            next one could be sent"""
+        while len(self.active_devices) < self.max_walks and len(self.pending_heap) > 0:
+            due_time, _, device, attempt_count = self.pending_heap[0]
+
+            if device.get_state() != DEVICE_PENDING or device.get_attempt_count() != attempt_count:
+                # The device Informed on its own in the meantime
+                heapq.heappop(self.pending_heap)
+                continue
+            elif due_time > now:
+                return due_time
+
+            token_wait = self.token_bucket.take()
+            if token_wait > 0:
+                return now + token_wait
+
+            heapq.heappop(self.pending_heap)
+            device.state = DEVICE_REQUESTED
+            device.attempt_count += 1
+            device.deadline = now + self.request_timeout + self.inform_timeout
+            self.active_devices[device.get_device_id()] = device
+            self.request_count += 1
+            executor.submit(self._send_connection_request, device, device.get_attempt_count())
+
+        return now + self.inform_timeout
+
+    def _expire_attempts(self, now):
+        """Fail the attempts of the devices that didn't Inform, or didn't
+            complete their walk, in time"""
+        for device in list(self.active_devices.values()):
+            if device.deadline > now:
+                continue
+            elif device.get_state() == DEVICE_REQUESTED:
+                self._fail_attempt(device, "No Inform within {:g} seconds of the Connection Request".format(
+                    self.inform_timeout))
+            else:
+                self._fail_attempt(device, "The walk wasn't complete within {:g} seconds".format(
+                    self.walk_timeout))
+
+    def _fail_attempt(self, device, failure):
+        """Fail the attempt of a device, which is retried unless it was the last one"""
+        self.active_devices.pop(device.get_device_id(), None)
+        device.failure = failure
+
+        if device.get_attempt_count() >= self.max_attempts:
+            device.state = DEVICE_FAILED
+            self.logger.warning("Giving up on %s after %s attempts: %s", device.get_device_id(),
+                                device.get_attempt_count(), failure)
+        else:
+            device.state = DEVICE_PENDING
+            self._schedule_device(device, time.monotonic() + self.retry_delay)
+            self.logger.info("Retrying %s in %s seconds: %s", device.get_device_id(), self.retry_delay, failure)
+
+        self.condition.notify_all()
+
+    def _schedule_device(self, device, due_time):
+        """Queue a pending device for a Connection Request at the due time"""
+        heapq.heappush(self.pending_heap, (due_time, next(self.pending_sequence), device,
+                                           device.get_attempt_count()))
+
+
+    def _send_connection_request(self, device, attempt_count):
+        """Send the Connection Request of a device (on a thread of the pool),
+            failing the attempt if the device refuses it"""
+        password_manager = urllib.request.HTTPPasswordMgrWithDefaultRealm()
+        username, password = device.get_credentials()
+        if username is not None:
+            password_manager.add_password(None, device.get_url(), username, password or "")
+
+        # The Connection Request goes straight to the device, never through a proxy
+        opener = urllib.request.build_opener(urllib.request.ProxyHandler({}),
+                                             urllib.request.HTTPDigestAuthHandler(password_manager),
+                                             urllib.request.HTTPBasicAuthHandler(password_manager))
+        failure = None
+
+        try:
+            with opener.open(device.get_url(), timeout=self.request_timeout) as response:
+                response.read()
+                self.logger.debug("Connection Request of %s answered with HTTP %s", device.get_device_id(),
+                                  response.status)
+        except urllib.error.HTTPError as err:
+            failure = "The Connection Request was answered with HTTP {}".format(err.code)
+        except (urllib.error.URLError, http.client.HTTPException, OSError, ValueError) as err:
+            failure = "The Connection Request failed ({})".format(getattr(err, "reason", err))
+
+        with self.condition:
+            # The device may have Informed (or its attempt expired) in the meantime
+            if device.get_state() != DEVICE_REQUESTED or device.get_attempt_count() != attempt_count:
+                return
+            elif failure is not None:
+                self._fail_attempt(device, failure)
+            else:
+                device.deadline = time.monotonic() + self.inform_timeout
+
+
+    def _start_device_walk(self, device_id):
+        """Record that a device of the fleet has Informed, and its walk started"""
+        device = self.device_dict.get(device_id)
+        if device is None:
+            return
+
+        with self.condition:
+            if device.is_done():
+                return
+
+            device.state = DEVICE_WALKING
+            device.start_time = time.monotonic()
+            device.deadline = device.start_time + self.walk_timeout
+            device.parameter_count = 0
+            self.active_devices[device_id] = device
+            self.condition.notify_all()
+
+    def _count_device_parameters(self, device_id, parameter_count):
+        """Count the Parameters walked on a device of the fleet"""
+        device = self.device_dict.get(device_id)
+        if device is not None:
+            device.parameter_count += parameter_count
+
+    def _end_device_walk(self, device_id, state):
+        """Record that the walk of a device of the fleet has ended"""
+        device = self.device_dict.get(device_id)
+        if device is None:
+            return
+
+        with self.condition:
+            if device.is_done():
+                return
+            elif state == WALK_COMPLETED:
+                # A walk that completes after its attempt expired still counts
+                self.active_devices.pop(device_id, None)
+                device.state = DEVICE_COMPLETED
+                device.end_time = time.monotonic()
+                device.failure = None
+                self.condition.notify_all()
+            elif device.get_state() == DEVICE_WALKING:
+                self._fail_attempt(device, "The CWMP Session was abandoned")
+
+
+    def _count_devices(self, state):
+        """Count the devices of the fleet in a state"""
+        return sum(1 for device in self.device_dict.values() if device.get_state() == state)
+
+    def _get_wall_time(self):
+        """Retrieve the seconds that the fleet has been walked for"""
+        if self.start_time is None:
+            return None
+
+        return (self.end_time if self.end_time is not None else time.monotonic()) - self.start_time
+
+
+
+class FleetWalkListener(WalkExporter):
+    """Hands the walks that the CWMPServer reports to its exporters over to
+        a FleetOrchestrator (nothing is written)"""
+    def __init__(self, orchestrator):
+        """Initialize the Fleet Walk Listener"""
+        super(FleetWalkListener, self).__init__(None, flush_interval=float("inf"))
+        self.orchestrator = orchestrator
+
+
+    def _write_start_device(self, device_id):
+        """Hand the start of a walk to the FleetOrchestrator"""
+        self.orchestrator._start_device_walk(device_id)
+
+    def _write_object(self, device_id, data_model_obj):
+        """Count the Parameters of a walked DataModelObject"""
+        self.orchestrator._count_device_parameters(device_id, len(data_model_obj.get_parameters()))
+
+    def _write_end_device(self, device_id, state):
+        """Hand the end of a walk to the FleetOrchestrator"""
+        self.orchestrator._end_device_walk(device_id, state)
+
+    def _flush_output(self):
+        """Nothing is buffered"""
+        pass
+
+    def _close_output(self):
+        """Nothing is kept open"""
+        pass
+
+
+
+
+def read_fleet_file(fleet_file):
+    """Read the devices of a fleet from a CSV file with a header row of
+        DeviceId, ConnectionRequestURL and (optionally) Username and Password"""
+    device_list = []
+
+    with open(fleet_file, "r", encoding="utf-8", newline="") as fleet_fh:
+        csv_reader = csv.DictReader(fleet_fh)
+        missing_columns = [column for column in FLEET_COLUMNS[:2] if column not in (csv_reader.fieldnames or [])]
+        if len(missing_columns) > 0:
+            raise ValueError("The fleet file {} has no {} column".format(fleet_file, " or ".join(missing_columns)))
+
+        for row in csv_reader:
+            if not row["DeviceId"] or not row["ConnectionRequestURL"]:
+                raise ValueError("Line {} of the fleet file {} has no DeviceId or ConnectionRequestURL".format(
+                    csv_reader.line_num, fleet_file))
+
+            device_list.append(FleetDevice(row["DeviceId"], row["ConnectionRequestURL"],
+                                           row.get("Username") or None, row.get("Password") or None))
+
+    return device_list
+
+
+def _format_percentiles(value_list):
+    """Format the median, 95th percentile and maximum of a list of seconds"""
+    if len(value_list) == 0:
+        return "-"
+
+    sorted_list = sorted(value_list)
+    return "p50 {:.1f} s, p95 {:.1f} s, max {:.1f} s".format(
+        sorted_list[len(sorted_list) // 2],
+        sorted_list[min(len(sorted_list) - 1, int(len(sorted_list) * 0.95))],
+        sorted_list[-1])
@@ -0,0 +1,36 @@
+"""
+# File Name: conftest.py
+#
+# Description: Puts cwmpwalk and the CPE-Sim modules on the path of the
+#               tests, and provides their shared fixtures
+#
+"""
+
+
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, ".."))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "CPE-Sim"))
+
+from cwmpwalk import CWMPServer
+
+
+
+@pytest.fixture
+def make_cwmp_server():
+    """Create CWMPServers on free local ports, closing them after the test"""
+    cwmp_server_list = []
+
+    def make(**kwargs):
+        cwmp_server = CWMPServer("127.0.0.1", 0, **kwargs)
+        cwmp_server_list.append(cwmp_server)
+        return cwmp_server
+
+    yield make
+
+    for cwmp_server in cwmp_server_list:
+        cwmp_server.get_http_server().server_close()
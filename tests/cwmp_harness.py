@@ -0,0 +1,156 @@
+"""
+# File Name: cwmp_harness.py
+#
+# Description: Runs the CWMP Sessions of SyntheticCPEs against a CWMPServer
+#               in-process, without sockets
+#
+# Functionality:
+#  - InProcessTransport:
+#      Hands each HTTP POST straight to a CWMPHandler, in the calling thread
+#  - LoopbackTransport:
+#      Sends each HTTP POST over a persistent loopback connection to a
+#        CWMPServer that is serving on its own thread
+#  - CPESession:
+#      Runs the CWMP Session of a SyntheticCPE over a transport, one HTTP
+#        exchange at a time
+#
+"""
+
+
+import io
+import http.client
+
+from cwmpwalk import CWMPHandler
+
+
+
+class InProcessSocket(object):
+    """A stand-in for a connected socket: makefile() reads the bytes it was
+        created with, and whatever is sent to it is collected"""
+    def __init__(self, incoming):
+        """Initialize the Socket with the bytes that can be read from it"""
+        self.incoming = incoming
+        self.sent = bytearray()
+
+
+    def makefile(self, mode, buffering=None):
+        """Retrieve the incoming bytes as a file"""
+        return io.BytesIO(self.incoming)
+
+    def sendall(self, data):
+        """Collect the sent bytes"""
+        self.sent += data
+
+    def get_sent(self):
+        """Retrieve the bytes sent to the Socket"""
+        return bytes(self.sent)
+
+
+    def settimeout(self, timeout):
+        """Ignore the timeout, as reading never blocks"""
+
+    def setsockopt(self, level, option, value):
+        """Ignore the socket options"""
+
+
+
+class InProcessTransport(object):
+    """Hands each HTTP POST straight to a CWMPHandler, in the calling
+        thread, and parses its HTTP Response"""
+    def __init__(self, cwmp_server, client_address=("127.0.0.1", 40000)):
+        """Initialize the Transport"""
+        self.http_server = cwmp_server.get_http_server()
+        self.client_address = client_address
+        self.cookie = None
+
+
+    def post(self, content):
+        """Send an HTTP POST, returning the (status, content) of the HTTP Response"""
+        request = ("POST / HTTP/1.1\r\n"
+                   "Host: 127.0.0.1\r\n"
+                   "Content-Type: text/xml; charset=utf-8\r\n"
+                   "Content-Length: {}\r\n".format(len(content)))
+        if self.cookie is not None:
+            request += "Cookie: {}\r\n".format(self.cookie)
+
+        connection = InProcessSocket(request.encode("ascii") + b"\r\n" + content)
+        CWMPHandler(connection, self.client_address, self.http_server)
+
+        response = http.client.HTTPResponse(InProcessSocket(connection.get_sent()))
+        response.begin()
+        if response.getheader("Set-Cookie") is not None:
+            self.cookie = response.getheader("Set-Cookie").split(";", 1)[0]
+
+        return response.status, response.read()
+
+
+
+class LoopbackTransport(object):
+    """Sends each HTTP POST over a persistent loopback connection"""
+    def __init__(self, cwmp_server):
+        """Initialize the Transport"""
+        self.port = cwmp_server.get_http_server().server_address[1]
+        self.connection = None
+        self.cookie = None
+
+
+    def post(self, content):
+        """Send an HTTP POST, returning the (status, content) of the HTTP Response"""
+        headers = {"Content-Type": "text/xml; charset=utf-8"}
+        if self.cookie is not None:
+            headers["Cookie"] = self.cookie
+
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+
+        self.connection.request("POST", "/", body=content, headers=headers)
+        response = self.connection.getresponse()
+        response_content = response.read()
+
+        if response.getheader("Set-Cookie") is not None:
+            self.cookie = response.getheader("Set-Cookie").split(";", 1)[0]
+        if response.getheader("Connection", "").lower() == "close":
+            self.close()
+
+        return response.status, response_content
+
+    def close(self):
+        """Close the connection"""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+
+class CPESession(object):
+    """Runs the CWMP Session of a SyntheticCPE, one HTTP exchange at a time"""
+    def __init__(self, cwmp_server, cpe, client_address=("127.0.0.1", 40000), transport=None):
+        """Initialize the Session with the CPE's Inform as the first HTTP POST"""
+        self.cpe = cpe
+        self.transport = transport if transport is not None else InProcessTransport(cwmp_server, client_address)
+        self.content = cpe.get_inform()
+        self.status = None
+
+
+    def step(self):
+        """Send the next HTTP POST and answer the RPC in its HTTP Response,
+            returning False once the CWMP Session is over"""
+        self.status, rpc_content = self.transport.post(self.content)
+
+        if self.status != 200:
+            return False
+
+        self.content = self.cpe.respond(rpc_content)
+        return True
+
+    def run(self):
+        """Run the whole CWMP Session"""
+        while self.step():
+            pass
+
+        return self
+
+
+    def is_complete(self):
+        """Check to see if the ACS ended the CWMP Session with an HTTP 204"""
+        return self.status == 204
@@ -0,0 +1,126 @@
+"""
+# File Name: test_cwmp_decoder.py
+#
+# Description: Tests of the incremental decoding of incoming CWMP Messages
+#
+"""
+
+
+import os
+
+import pytest
+
+from cwmp_decoder import CWMPDecoder, ParameterInfo, ParameterValue
+
+CPE_SIM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CPE-Sim")
+
+GPV_RESPONSE_TEMPLATE = (
+    '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xmlns:cwmp="urn:dslforum-org:cwmp-1-2">'
+    '<soapenv:Header><cwmp:ID soapenv:mustUnderstand="1">7</cwmp:ID></soapenv:Header>'
+    '<soapenv:Body><cwmp:GetParameterValuesResponse><ParameterList>{}</ParameterList>'
+    '</cwmp:GetParameterValuesResponse></soapenv:Body></soapenv:Envelope>')
+
+GPV_VALUE_TEMPLATE = ('<ParameterValueStruct><Name>Device.Stats.Counter{0}</Name>'
+                      '<Value xsi:type="xsd:unsignedInt">{0}</Value></ParameterValueStruct>')
+
+
+
+def read_fixture(file_name):
+    """Read a CWMP Message of the CPE Simulator"""
+    with open(os.path.join(CPE_SIM_DIR, file_name), "rb") as fixture_fh:
+        return fixture_fh.read()
+
+
+def split_chunks(content, chunk_size):
+    """Split a message into chunks, as it would be read from the socket"""
+    return [content[index:index + chunk_size] for index in range(0, len(content), chunk_size)]
+
+
+def decode(content, chunk_size):
+    """Decode a message, returning the Decoder and its RPC name and records"""
+    decoder = CWMPDecoder(split_chunks(content, chunk_size))
+    rpc_name = decoder.read_rpc_name()
+    return decoder, rpc_name, list(decoder.iter_records())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_inform_decodes_the_same_whatever_the_chunks(chunk_size):
+    decoder, rpc_name, record_list = decode(read_fixture("inform.xml"), chunk_size)
+
+    assert rpc_name == "Inform"
+    assert decoder.get_cwmp_id() == "3"
+    assert decoder.get_device_id()["OUI"] == "000CC3"
+    assert decoder.get_device_id()["SerialNumber"] == "190000047990940"
+    assert len(record_list) == 10
+    assert ParameterValue("InternetGatewayDevice.DeviceInfo.SpecVersion", "2.0", "string") in record_list
+
+
+@pytest.mark.parametrize("chunk_size", [1, 64 * 1024])
+def test_gpn_and_gpv_responses_decode_to_records(chunk_size):
+    _, rpc_name, record_list = decode(read_fixture("gpn_resp-IGD-DeviceInfo.xml"), chunk_size)
+    assert rpc_name == "GetParameterNamesResponse"
+    assert len(record_list) == 4
+    assert record_list[-1].name == "InternetGatewayDevice.DeviceInfo.MemoryStatus."
+    assert all(isinstance(record, ParameterInfo) and record.writable in ("0", "1") for record in record_list)
+
+    _, rpc_name, record_list = decode(read_fixture("gpv_resp-IGD-DeviceInfo.xml"), chunk_size)
+    assert rpc_name == "GetParameterValuesResponse"
+    assert record_list[-1] == ParameterValue("InternetGatewayDevice.DeviceInfo.UpTime", "1043195", "unsignedInt")
+
+
+def test_rpc_name_is_known_before_the_body_is_read():
+    content = GPV_RESPONSE_TEMPLATE.format("".join(GPV_VALUE_TEMPLATE.format(index) for index in range(1000)))
+    chunk_list = split_chunks(content.encode("utf-8"), 1024)
+    read_count = [0]
+
+    def counting_chunks():
+        for chunk in chunk_list:
+            read_count[0] += 1
+            yield chunk
+
+    decoder = CWMPDecoder(counting_chunks())
+
+    assert decoder.read_rpc_name() == "GetParameterValuesResponse"
+    assert decoder.get_cwmp_id() == "7"
+    assert read_count[0] == 1
+
+    # The records are emitted as their structs complete, not at the end
+    record_iter = decoder.iter_records()
+    assert next(record_iter) == ParameterValue("Device.Stats.Counter0", "0", "unsignedInt")
+    assert read_count[0] < len(chunk_list)
+    assert len(list(record_iter)) == 999
+
+
+def test_decoded_structs_are_discarded():
+    content = GPV_RESPONSE_TEMPLATE.format("".join(GPV_VALUE_TEMPLATE.format(index) for index in range(100)))
+    decoder = CWMPDecoder(split_chunks(content.encode("utf-8"), 512))
+    decoder.read_rpc_name()
+
+    check_count = 0
+    for _ in decoder.iter_records():
+        # The ParameterList keeps at most the struct that is being decoded
+        if len(decoder.element_stack) >= 4:
+            assert len(decoder.element_stack[3]) <= 1
+            check_count += 1
+
+    assert check_count > 0
+
+
+def test_escaped_names_and_fault_details_are_decoded():
+    content = GPV_RESPONSE_TEMPLATE.format(
+        '<ParameterValueStruct><Name>Device.Users.User.1.Username</Name>'
+        '<Value xsi:type="xsd:string">a&amp;b &lt;c&gt;</Value></ParameterValueStruct>')
+    _, _, record_list = decode(content.encode("utf-8"), 16)
+    assert record_list == [ParameterValue("Device.Users.User.1.Username", "a&b <c>", "string")]
+
+    fault = (b'<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+             b'xmlns:cwmp="urn:dslforum-org:cwmp-1-0"><soapenv:Body><soapenv:Fault>'
+             b'<faultcode>Client</faultcode><faultstring>CWMP fault</faultstring><detail>'
+             b'<cwmp:Fault><FaultCode>9005</FaultCode><FaultString>Invalid parameter name</FaultString>'
+             b'</cwmp:Fault></detail></soapenv:Fault></soapenv:Body></soapenv:Envelope>')
+    decoder, rpc_name, record_list = decode(fault, 5)
+    assert rpc_name == "Fault"
+    assert record_list == []
+    assert decoder.get_fault() == {"FaultCode": "9005", "FaultString": "Invalid parameter name"}
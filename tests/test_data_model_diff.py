@@ -0,0 +1,45 @@
+"""
+# File Name: test_data_model_diff.py
+#
+# Description: Tests of the DataModelDiff of two walks of a device
+#
+"""
+
+
+import pytest
+
+from cwmpwalk import DataModelStore
+from data_model_diff import DataModelDiff, VALUE_CHANGED
+from cwmp_harness import CPESession
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+
+
+def walk_data_model(make_cwmp_server, data_model):
+    """Walk a SyntheticCPE of the data model, returning its implemented data model"""
+    cwmp_server = make_cwmp_server()
+    cpe = SyntheticCPE(data_model)
+
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+    return cwmp_server.get_implemented_data_models()[cpe.get_device_id()]
+
+
+def test_walks_of_a_changed_value_differ_in_that_value(make_cwmp_server):
+    data_model = SyntheticDataModel(depth=2, fan_out=2, table_instances=2)
+    old_data_model = walk_data_model(make_cwmp_server, data_model)
+    assert DataModelDiff(old_data_model, walk_data_model(make_cwmp_server, data_model)).is_empty()
+
+    data_model.values["InternetGatewayDevice.DeviceInfo.UpTime"] = ("7200", "unsignedInt")
+    diff = DataModelDiff(old_data_model, walk_data_model(make_cwmp_server, data_model))
+
+    assert [(change.path, change.old_value, change.new_value) for change in diff.get_changes(VALUE_CHANGED)] == [
+        ("InternetGatewayDevice.DeviceInfo.UpTime", "3600", "7200")]
+
+
+def test_data_models_of_incomplete_walks_are_not_compared(make_cwmp_server):
+    data_model = walk_data_model(make_cwmp_server, SyntheticDataModel(depth=1, fan_out=1))
+
+    with pytest.raises(ValueError):
+        DataModelDiff(data_model, DataModelStore())
+    with pytest.raises(ValueError):
+        data_model.add_object(next(iter(data_model)))
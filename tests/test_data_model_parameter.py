@@ -0,0 +1,32 @@
+"""
+# File Name: test_data_model_parameter.py
+#
+# Description: Tests of the values of DataModelParameters
+#
+"""
+
+
+from cwmpwalk import DataModelParameter
+
+
+
+def make_parameter(value, value_type):
+    """Create a DataModelParameter with a value of an xsi:type"""
+    dm_param = DataModelParameter()
+    dm_param.set_full_param_name("Device.DeviceInfo.Value")
+    dm_param.set_value(value, value_type)
+    return dm_param
+
+
+def test_value_is_kept_as_the_device_sent_it():
+    assert make_parameter("007", "unsignedInt").get_value() == "007"
+    assert make_parameter("1", "boolean").get_value() == "1"
+    assert make_parameter("1", "boolean").get_value_text() == "1"
+
+
+def test_typed_value_is_converted_from_the_xsi_type():
+    assert make_parameter("007", "unsignedInt").get_typed_value() == 7
+    assert make_parameter("1", "boolean").get_typed_value() is True
+    assert make_parameter("false", "boolean").get_typed_value() is False
+    assert make_parameter("n/a", "int").get_typed_value() == "n/a"
+    assert make_parameter("007", "string").get_typed_value() == "007"
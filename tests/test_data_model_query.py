@@ -0,0 +1,55 @@
+"""
+# File Name: test_data_model_query.py
+#
+# Description: Tests of the DataModelQuery, with and without a DataModelIndex
+#
+"""
+
+
+import pytest
+
+from data_model_query import DataModelQuery
+from cwmp_harness import CPESession
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+
+
+@pytest.fixture(params=[False, True], ids=["scan", "indexed"])
+def data_model_store(request, make_cwmp_server):
+    """Walk a SyntheticCPE in-process, with or without a DataModelIndex"""
+    cwmp_server = make_cwmp_server(indexed=request.param)
+    cpe = SyntheticCPE(SyntheticDataModel(depth=2, fan_out=2, table_instances=2))
+
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+
+    data_model_store = cwmp_server.get_implemented_data_models()[cpe.get_device_id()]
+    assert (data_model_store.get_index() is not None) == request.param
+    return data_model_store
+
+
+def test_find_parameters_by_leaf_skips_objects_without_it(data_model_store):
+    match_list = DataModelQuery(data_model_store).find_parameters(leaf="Manufacturer")
+
+    assert [query_match.path for query_match in match_list] == ["InternetGatewayDevice.DeviceInfo.Manufacturer"]
+
+
+def test_find_parameters_by_parameter_pattern_excludes_descendants(data_model_store):
+    match_list = DataModelQuery(data_model_store).find_parameters(path="Object1.Param1")
+
+    assert [query_match.path for query_match in match_list] == ["InternetGatewayDevice.Object1.Param1"]
+
+    match_list = DataModelQuery(data_model_store).find_parameters(path="Object1.Table.{i}.Param1")
+
+    assert [query_match.path for query_match in match_list] == [
+        "InternetGatewayDevice.Object1.Table.1.Param1",
+        "InternetGatewayDevice.Object1.Table.2.Param1",
+    ]
+
+
+def test_find_parameters_by_object_pattern_includes_descendants(data_model_store):
+    match_list = DataModelQuery(data_model_store).find_parameters(path="Object1.", leaf="Param1")
+    path_list = [query_match.path for query_match in match_list]
+
+    assert "InternetGatewayDevice.Object1.Param1" in path_list
+    assert "InternetGatewayDevice.Object1.Table.2.Param1" in path_list
+    assert "InternetGatewayDevice.Param1" not in path_list
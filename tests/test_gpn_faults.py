@@ -0,0 +1,56 @@
+"""
+# File Name: test_gpn_faults.py
+#
+# Description: Tests of the walks of devices that fault on GetParameterNames
+#
+"""
+
+
+from cwmpwalk import DiscoveryPolicy, DISCOVERY_SUBTREE
+from walk_cache import WalkCache
+from cwmp_harness import CPESession
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+
+
+class FaultingDataModel(SyntheticDataModel):
+    """A SyntheticDataModel whose device faults on the GPNs of some paths,
+        or on every GPN with NextLevel=false"""
+    def __init__(self, faulted_paths=(), fault_subtree=False, **kwargs):
+        """Generate the data model"""
+        SyntheticDataModel.__init__(self, **kwargs)
+        self.faulted_paths = faulted_paths
+        self.fault_subtree = fault_subtree
+
+    def get_parameter_names(self, path, next_level):
+        """Fault (with an Invalid parameter name) on the faulted paths"""
+        if path in self.faulted_paths or (self.fault_subtree and not next_level):
+            return None
+
+        return SyntheticDataModel.get_parameter_names(self, path, next_level)
+
+
+
+def test_walk_with_a_skipped_subtree_is_not_cached(make_cwmp_server, tmp_path):
+    data_model = FaultingDataModel(["InternetGatewayDevice.Object2."], depth=2, fan_out=2, table_instances=2)
+    cpe = SyntheticCPE(data_model)
+    walk_cache = WalkCache(str(tmp_path))
+
+    assert CPESession(make_cwmp_server(walk_cache=walk_cache), cpe).run().is_complete()
+
+    assert walk_cache.load(cpe.get_device_id(), data_model.get_software_version()) is None
+
+
+def test_subtree_discovery_fault_falls_back_to_next_level(make_cwmp_server, tmp_path):
+    data_model = FaultingDataModel(fault_subtree=True, depth=2, fan_out=2, table_instances=2)
+    cpe = SyntheticCPE(data_model)
+    walk_cache = WalkCache(str(tmp_path))
+    cwmp_server = make_cwmp_server(discovery_policy=DiscoveryPolicy(DISCOVERY_SUBTREE), walk_cache=walk_cache)
+
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+
+    implemented_data_model = cwmp_server.get_implemented_data_models()[cpe.get_device_id()]
+    assert len(implemented_data_model) == data_model.get_object_count()
+    assert (sum(len(data_model_obj.get_parameters()) for data_model_obj in implemented_data_model) ==
+            data_model.get_parameter_count())
+    assert walk_cache.load(cpe.get_device_id(), data_model.get_software_version()) is not None
@@ -0,0 +1,66 @@
+"""
+# File Name: test_memory_budget.py
+#
+# Description: Tests of the MemoryBudget accounting of walked data models
+#
+"""
+
+
+from cwmpwalk import MemoryBudget
+from cwmp_harness import CPESession
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+
+
+def test_rewalk_releases_the_replaced_data_model(make_cwmp_server, tmp_path):
+    data_model = SyntheticDataModel(depth=2, fan_out=2, table_instances=2)
+    cpe = SyntheticCPE(data_model)
+
+    # Measure the resident size of one walk, without a limit
+    memory_budget = MemoryBudget(spill_dir=str(tmp_path))
+    cwmp_server = make_cwmp_server(concurrent=True, memory_budget=memory_budget)
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+    walk_resident_bytes = memory_budget.get_resident_bytes()
+
+    # The replaced data model is held until the re-walk completes, so the
+    #  budget fits two walks, but not the bytes of the replaced ones
+    memory_budget = MemoryBudget(max_process_bytes=walk_resident_bytes * 5 // 2, spill_dir=str(tmp_path))
+    cwmp_server = make_cwmp_server(concurrent=True, memory_budget=memory_budget)
+    for _ in range(3):
+        assert CPESession(cwmp_server, cpe).run().is_complete()
+        data_model_store = cwmp_server.get_implemented_data_models()[cpe.get_device_id()]
+
+        assert data_model_store.get_spilled_count() == 0
+        assert memory_budget.get_resident_bytes() == walk_resident_bytes
+
+
+def test_abandoned_walk_releases_its_data_model(make_cwmp_server, tmp_path):
+    cpe = SyntheticCPE(SyntheticDataModel(depth=2, fan_out=2, table_instances=2))
+    memory_budget = MemoryBudget(spill_dir=str(tmp_path))
+    cwmp_server = make_cwmp_server(concurrent=True, memory_budget=memory_budget)
+
+    session = CPESession(cwmp_server, cpe)
+    while memory_budget.get_resident_bytes() == 0:
+        assert session.step()
+
+    # The device starts over, abandoning its first CWMP Session
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+    data_model_store = cwmp_server.get_implemented_data_models()[cpe.get_device_id()]
+
+    assert memory_budget.get_resident_bytes() == data_model_store.resident_bytes
+
+
+def test_released_data_model_closes_its_spill_file(make_cwmp_server, tmp_path):
+    cpe = SyntheticCPE(SyntheticDataModel(depth=2, fan_out=2, table_instances=2))
+    memory_budget = MemoryBudget(max_walk_bytes=1, spill_dir=str(tmp_path))
+    cwmp_server = make_cwmp_server(concurrent=True, memory_budget=memory_budget)
+
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+    replaced_store = cwmp_server.get_implemented_data_models()[cpe.get_device_id()]
+    spill_file = replaced_store.spill_file
+    assert replaced_store.get_spilled_count() > 0
+
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+
+    assert spill_file.spill_fh.closed
+    assert cwmp_server.get_implemented_data_models()[cpe.get_device_id()].spill_file is not spill_file
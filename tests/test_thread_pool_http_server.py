@@ -0,0 +1,55 @@
+"""
+# File Name: test_thread_pool_http_server.py
+#
+# Description: Tests of the persistent connections of the ThreadPoolHTTPServer
+#
+"""
+
+
+import threading
+
+import pytest
+
+from cwmp_harness import CPESession, LoopbackTransport
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+
+
+@pytest.fixture
+def serving_cwmp_server(make_cwmp_server):
+    """Create a concurrent CWMPServer with a single worker thread, serving
+        on a thread of its own"""
+    cwmp_server = make_cwmp_server(concurrent=True, max_workers=1)
+    server_thread = threading.Thread(target=cwmp_server.get_http_server().serve_forever)
+    server_thread.start()
+
+    yield cwmp_server
+
+    cwmp_server.stop_server()
+    server_thread.join()
+
+
+def test_idle_persistent_connection_does_not_hold_a_worker_thread(serving_cwmp_server):
+    data_model = SyntheticDataModel(depth=1, fan_out=2, table_instances=1)
+
+    # A device that Informs and then leaves its persistent connection idle
+    idle_transport = LoopbackTransport(serving_cwmp_server)
+    idle_session = CPESession(serving_cwmp_server, SyntheticCPE(data_model, serial_number="000000000001"),
+                              transport=idle_transport)
+    assert idle_session.step()
+
+    # Another device is walked on the only worker thread meanwhile
+    transport = LoopbackTransport(serving_cwmp_server)
+    session = CPESession(serving_cwmp_server, SyntheticCPE(data_model, serial_number="000000000002"),
+                         transport=transport)
+    walk_thread = threading.Thread(target=session.run)
+    walk_thread.start()
+    walk_thread.join(10)
+
+    assert not walk_thread.is_alive()
+    assert session.is_complete()
+
+    # The idle device carries on over the same connection
+    assert idle_session.run().is_complete()
+    idle_transport.close()
+    transport.close()
@@ -0,0 +1,46 @@
+"""
+# File Name: test_unexpected_responses.py
+#
+# Description: Tests of the responses that a device sends to RPCs that
+#               aren't outstanding
+#
+"""
+
+
+import os
+
+from cwmp_harness import CPESession
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+CPE_SIM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CPE-Sim")
+
+
+
+def read_fixture(file_name):
+    """Read a CWMP Message of the CPE-Sim fixtures"""
+    with open(os.path.join(CPE_SIM_DIR, file_name), "rb") as fixture_fh:
+        return fixture_fh.read()
+
+
+def test_gpv_response_without_an_outstanding_gpv_ends_the_session(make_cwmp_server):
+    cwmp_server = make_cwmp_server(concurrent=True)
+    session = CPESession(cwmp_server, SyntheticCPE(SyntheticDataModel(depth=1, fan_out=1)))
+
+    # The Inform, then the empty HTTP POST that is answered with a GPN
+    assert session.step() and session.step()
+    status, _ = session.transport.post(read_fixture("gpv_resp-IGD-DeviceInfo.xml"))
+
+    assert status == 500
+    assert cwmp_server.get_active_device_ids() == []
+
+
+def test_gpn_response_without_an_outstanding_gpn_ends_the_session(make_cwmp_server):
+    cwmp_server = make_cwmp_server(concurrent=True)
+    session = CPESession(cwmp_server, SyntheticCPE(SyntheticDataModel(depth=1, fan_out=1)))
+
+    # The Inform, which is answered with an InformResponse
+    assert session.step()
+    status, _ = session.transport.post(read_fixture("gpn_resp-IGD.xml"))
+
+    assert status == 500
+    assert cwmp_server.get_active_device_ids() == []
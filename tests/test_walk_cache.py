@@ -0,0 +1,64 @@
+"""
+# File Name: test_walk_cache.py
+#
+# Description: Tests of the re-walks of known devices from the Walk Cache
+#
+"""
+
+
+import os
+
+import pytest
+
+import walk_cache
+from cwmp_harness import CPESession
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+
+
+def test_rewalk_from_the_walk_cache_looks_up_each_object_once(make_cwmp_server, tmp_path, monkeypatch):
+    data_model = SyntheticDataModel(depth=3, fan_out=2, table_instances=2)
+    cache = walk_cache.WalkCache(str(tmp_path))
+
+    first_cpe = SyntheticCPE(data_model)
+    cwmp_server = make_cwmp_server(walk_cache=cache)
+    assert CPESession(cwmp_server, first_cpe).run().is_complete()
+    first_names = [data_model_obj.get_name()
+                   for data_model_obj in cwmp_server.get_implemented_data_models()[first_cpe.get_device_id()]]
+
+    lookup_names = []
+    get_next_level_items = walk_cache.CachedWalk.get_next_level_items
+
+    def counting_get_next_level_items(cached_walk, name):
+        lookup_names.append(name)
+        return get_next_level_items(cached_walk, name)
+
+    monkeypatch.setattr(walk_cache.CachedWalk, "get_next_level_items", counting_get_next_level_items)
+
+    second_cpe = SyntheticCPE(data_model)
+    cwmp_server = make_cwmp_server(walk_cache=cache)
+    assert CPESession(cwmp_server, second_cpe).run().is_complete()
+    second_names = [data_model_obj.get_name()
+                    for data_model_obj in cwmp_server.get_implemented_data_models()[second_cpe.get_device_id()]]
+
+    # Only the tables are discovered again, and each object is looked up once
+    assert second_names == first_names
+    assert second_cpe.get_gpn_count() < first_cpe.get_gpn_count()
+    assert len(lookup_names) == len(set(lookup_names))
+
+
+def test_failed_store_leaves_no_temporary_file(make_cwmp_server, tmp_path, monkeypatch):
+    cpe = SyntheticCPE(SyntheticDataModel(depth=1, fan_out=2, table_instances=1))
+    cwmp_server = make_cwmp_server()
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+
+    def interrupted_dump(obj, fp):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(walk_cache.json, "dump", interrupted_dump)
+
+    with pytest.raises(KeyboardInterrupt):
+        walk_cache.WalkCache(str(tmp_path)).store(cpe.get_device_id(), "1.0.0",
+                                                  cwmp_server.get_implemented_data_models()[cpe.get_device_id()])
+
+    assert os.listdir(str(tmp_path)) == []
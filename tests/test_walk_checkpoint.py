@@ -0,0 +1,52 @@
+"""
+# File Name: test_walk_checkpoint.py
+#
+# Description: Tests of the walks that resume from a Walk Checkpoint
+#
+"""
+
+
+import json
+
+import walk_checkpoint
+from cwmp_harness import CPESession
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+
+
+def test_resumed_walk_takes_each_checkpoint_record_once(make_cwmp_server, tmp_path, monkeypatch):
+    data_model = SyntheticDataModel(depth=3, fan_out=2, table_instances=2)
+    cwmp_server = make_cwmp_server(concurrent=True,
+                                   walk_checkpoints=walk_checkpoint.WalkCheckpoints(str(tmp_path)))
+
+    full_cpe = SyntheticCPE(data_model, serial_number="000000000001")
+    assert CPESession(cwmp_server, full_cpe).run().is_complete()
+
+    # Drop the CWMP Session of another device half way through its walk
+    cpe = SyntheticCPE(data_model, serial_number="000000000002")
+    session = CPESession(cwmp_server, cpe)
+    while cpe.get_gpn_count() < full_cpe.get_gpn_count() // 2:
+        assert session.step()
+    dropped_gpn_count = cpe.get_gpn_count()
+
+    # The journal also has a GPN of an object that the device no longer has
+    with open(str(next(tmp_path.glob("*.jsonl"))), "a", encoding="utf-8") as checkpoint_fh:
+        checkpoint_fh.write(json.dumps(["N", "InternetGatewayDevice.Removed.", 1, []]) + "\n")
+
+    taken_names = []
+    take_gpn_items = walk_checkpoint.WalkCheckpoint.take_gpn_items
+
+    def counting_take_gpn_items(checkpoint, object_name):
+        taken_names.append(object_name)
+        return take_gpn_items(checkpoint, object_name)
+
+    monkeypatch.setattr(walk_checkpoint.WalkCheckpoint, "take_gpn_items", counting_take_gpn_items)
+
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+
+    # The resumed walk only sends the GPNs that the dropped one didn't
+    data_models = cwmp_server.get_implemented_data_models()
+    assert ([data_model_obj.get_name() for data_model_obj in data_models[cpe.get_device_id()]] ==
+            [data_model_obj.get_name() for data_model_obj in data_models[full_cpe.get_device_id()]])
+    assert cpe.get_gpn_count() - dropped_gpn_count == full_cpe.get_gpn_count() - (dropped_gpn_count - 1)
+    assert len(taken_names) == len(set(taken_names))
@@ -0,0 +1,62 @@
+"""
+# File Name: test_walk_coordinator.py
+#
+# Description: Tests of the Walk Coordinator's hand-off of the connections
+#
+"""
+
+
+import time
+import socket
+import threading
+
+import pytest
+
+from cwmpwalk import WalkCoordinator
+
+
+
+@pytest.fixture
+def walk_coordinator():
+    """Create a Walk Coordinator on a free local port, without its workers"""
+    walk_coordinator = WalkCoordinator("127.0.0.1", 0, 1)
+    yield walk_coordinator
+    walk_coordinator.listen_socket.close()
+
+
+def test_metrics_get_does_not_hold_up_the_hand_off(walk_coordinator, monkeypatch):
+    served = threading.Event()
+
+    def slow_serve_metrics(connection, head):
+        time.sleep(1.0)
+        connection.close()
+        served.set()
+
+    monkeypatch.setattr(walk_coordinator, "_serve_metrics", slow_serve_metrics)
+    client_socket, connection = socket.socketpair()
+    client_socket.sendall(b"GET /metrics HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+
+    start_time = time.monotonic()
+    assert walk_coordinator._route_connection(connection, ("127.0.0.1", 40000), False)
+
+    assert time.monotonic() - start_time < 0.5
+    assert served.wait(5)
+    client_socket.close()
+
+
+def test_metrics_get_is_answered(walk_coordinator):
+    client_socket, connection = socket.socketpair()
+    client_socket.sendall(b"GET /metrics.json HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+
+    assert walk_coordinator._route_connection(connection, ("127.0.0.1", 40000), False)
+
+    client_socket.settimeout(5)
+    response = b""
+    while True:
+        data = client_socket.recv(65536)
+        if len(data) == 0:
+            break
+        response += data
+    client_socket.close()
+
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
@@ -0,0 +1,54 @@
+"""
+# File Name: test_walk_metrics.py
+#
+# Description: Tests of the Prometheus text of the walk metrics
+#
+"""
+
+
+from walk_metrics import WalkMetrics, SessionMetrics, RPC_GPV
+
+
+
+def start_session(walk_metrics, session_key, device_id=None):
+    """Start the metrics of a CWMP Session, of a known device or not"""
+    session_metrics = SessionMetrics(session_key)
+    session_metrics.set_device_id(device_id)
+    walk_metrics.start_session(session_metrics)
+    return session_metrics
+
+
+def get_samples(prometheus_text, metric_name):
+    """Retrieve the sample lines of a metric"""
+    return [line for line in prometheus_text.splitlines()
+            if line.startswith(metric_name + "{") or line.startswith(metric_name + " ")]
+
+
+def test_sessions_before_their_inform_have_no_series():
+    walk_metrics = WalkMetrics()
+    start_session(walk_metrics, "secret-session-key")
+
+    prometheus_text = walk_metrics.render_prometheus()
+
+    assert get_samples(prometheus_text, "cwmpwalk_session_parameters_walked") == []
+    assert 'device="None"' not in prometheus_text
+    assert "secret-session-key" not in prometheus_text
+
+
+def test_concurrent_sessions_of_a_device_have_one_series():
+    walk_metrics = WalkMetrics()
+    for session_key, parameter_count, latency in (("first", 10, 0.5), ("second", 5, 0.25)):
+        session_metrics = start_session(walk_metrics, session_key, "000CC3-000000000001")
+        walk_metrics.record_gpv_parameters(session_metrics, parameter_count)
+        walk_metrics.record_rpc_response(session_metrics, RPC_GPV, latency, 100)
+    start_session(walk_metrics, "third", "000CC3-000000000002")
+
+    prometheus_text = walk_metrics.render_prometheus()
+
+    assert sorted(get_samples(prometheus_text, "cwmpwalk_session_parameters_walked")) == [
+        'cwmpwalk_session_parameters_walked{device="000CC3-000000000001"} 15',
+        'cwmpwalk_session_parameters_walked{device="000CC3-000000000002"} 0']
+    assert ('cwmpwalk_session_rpc_latency_seconds_count{device="000CC3-000000000001",rpc="GetParameterValues"} 2'
+            in prometheus_text)
+    assert ('cwmpwalk_session_rpc_latency_seconds_sum{device="000CC3-000000000001",rpc="GetParameterValues"} 0.75'
+            in prometheus_text)
@@ -0,0 +1,101 @@
+"""
+# File Name: test_walk_order.py
+#
+# Description: Tests of the order of the GetParameterNames of a walk, and
+#               of the Walk Budget that cuts it short
+#
+"""
+
+
+import pytest
+
+from cwmpwalk import DFSWalkScheduler, BFSWalkScheduler, WalkBudget, WALK_ORDER_BFS, WALK_ORDER_DFS
+from walk_cache import WalkCache
+from cwmp_harness import CPESession
+from synthetic_cpe import SyntheticDataModel, SyntheticCPE
+
+
+
+class RecordingDataModel(SyntheticDataModel):
+    """A SyntheticDataModel that records the paths of the GPNs of its device"""
+    def __init__(self, **kwargs):
+        """Generate the data model"""
+        SyntheticDataModel.__init__(self, **kwargs)
+        self.gpn_path_list = []
+
+    def get_parameter_names(self, path, next_level):
+        """Record the path of the GPN"""
+        self.gpn_path_list.append(path)
+        return SyntheticDataModel.get_parameter_names(self, path, next_level)
+
+
+
+def walk(cwmp_server):
+    """Walk the device of a RecordingDataModel, returning the CPE"""
+    cpe = SyntheticCPE(RecordingDataModel(depth=3, fan_out=2, table_instances=2))
+    assert CPESession(cwmp_server, cpe).run().is_complete()
+    return cpe
+
+
+def record_max_pending(monkeypatch, scheduler_class):
+    """Record the most DataModelObjects that were ever waiting in a Scheduler"""
+    max_pending = [0]
+    push_items = scheduler_class.push_items
+
+    def recording_push_items(self, data_model_obj_list):
+        push_items(self, data_model_obj_list)
+        max_pending[0] = max(max_pending[0], len(self))
+
+    monkeypatch.setattr(scheduler_class, "push_items", recording_push_items)
+    return max_pending
+
+
+def test_bfs_discovers_each_level_before_the_next(make_cwmp_server):
+    data_model = walk(make_cwmp_server(walk_order=WALK_ORDER_BFS)).data_model
+
+    depth_list = [path.count(".") for path in data_model.gpn_path_list]
+    assert depth_list == sorted(depth_list)
+    assert len(data_model.gpn_path_list) == data_model.get_object_count()
+
+
+def test_dfs_discovers_each_subtree_before_the_next(make_cwmp_server):
+    data_model = walk(make_cwmp_server(walk_order=WALK_ORDER_DFS)).data_model
+
+    gpn_path_list = data_model.gpn_path_list
+    assert len(gpn_path_list) == data_model.get_object_count()
+    for index, path in enumerate(gpn_path_list):
+        # The objects below the path directly follow it
+        subtree_size = sum(1 for name in gpn_path_list if name.startswith(path))
+        assert all(name.startswith(path) for name in gpn_path_list[index:index + subtree_size])
+
+
+def test_dfs_pending_objects_are_bounded_by_depth_times_fan_out(make_cwmp_server, monkeypatch):
+    bfs_max_pending = record_max_pending(monkeypatch, BFSWalkScheduler)
+    dfs_max_pending = record_max_pending(monkeypatch, DFSWalkScheduler)
+
+    walk(make_cwmp_server(walk_order=WALK_ORDER_BFS))
+    data_model = walk(make_cwmp_server(walk_order=WALK_ORDER_DFS)).data_model
+
+    # Each object has fan_out named sub-objects, a table and DeviceInfo (the root)
+    max_fan_out = data_model.fan_out + 2
+    assert dfs_max_pending[0] <= (data_model.depth + 1) * max_fan_out
+    assert dfs_max_pending[0] < bfs_max_pending[0]
+
+
+@pytest.mark.parametrize("walk_order", [WALK_ORDER_BFS, WALK_ORDER_DFS])
+def test_exhausted_walk_budget_retrieves_the_discovered_values(make_cwmp_server, tmp_path, walk_order):
+    walk_cache = WalkCache(str(tmp_path))
+    cwmp_server = make_cwmp_server(walk_order=walk_order, walk_budget=WalkBudget(max_rpcs=4),
+                                   walk_cache=walk_cache)
+    cpe = walk(cwmp_server)
+    data_model = cpe.data_model
+
+    assert len(data_model.gpn_path_list) < data_model.get_object_count()
+    implemented_data_model = cwmp_server.get_implemented_data_models()[cpe.get_device_id()]
+    assert len(implemented_data_model) > 0
+    for data_model_obj in implemented_data_model:
+        for dm_param in data_model_obj.get_parameters():
+            assert dm_param.get_value() == data_model.values[dm_param.get_full_param_name()][0]
+
+    # A truncated walk isn't cached
+    assert walk_cache.load(cpe.get_device_id(), data_model.get_software_version()) is None
@@ -0,0 +1,46 @@
+"""
+# File Name: test_walk_poll.py
+#
+# Description: Tests of the choice of the Parameters that the WalkPoller polls
+#
+"""
+
+
+from cwmpwalk import DataModelStore, DataModelObject, DataModelParameter, PathFilter
+from walk_poll import WalkPoller
+
+
+
+def make_data_model(param_count):
+    """Create a DataModelStore with one object of param_count Parameters"""
+    data_model_obj = DataModelObject()
+    data_model_obj.set_name("Device.Stats.")
+
+    for index in range(param_count):
+        dm_param = DataModelParameter()
+        dm_param.set_full_param_name("Device.Stats.Counter{:02d}".format(index))
+        dm_param.set_value(str(index), "unsignedInt")
+        data_model_obj.add_parameter(dm_param)
+
+    data_model = DataModelStore()
+    data_model.add_object(data_model_obj)
+    return data_model
+
+
+def test_nothing_to_poll_walks_the_device_in_full():
+    poller = WalkPoller(poll_filter=PathFilter(include_paths=["Device.DeviceInfo."]))
+    poller.learn("dev", "1.0", make_data_model(4))
+
+    assert poller.plan("dev", "1.0") is None
+    assert not poller.is_known("dev")
+
+
+def test_polls_sweep_a_slice_of_the_values_in_turn():
+    poller = WalkPoller(refresh_interval=4)
+    poller.learn("dev", "1.0", make_data_model(20))
+
+    plan_list = [poller.plan("dev", "1.0") for _ in range(4)]
+
+    assert all(len(poll_names) == 5 for poll_names in plan_list)
+    assert len(set().union(*plan_list)) == 20
+    assert poller.plan("dev", "1.0") == plan_list[0]
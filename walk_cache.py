@@ -0,0 +1,165 @@
+"""
+# File Name: walk_cache.py
+#
+# Description: An on-disk cache of the data model structure of walked devices
+#
+# Functionality:
+#  - WalkCache:
+#      Keeps the discovered structure (objects, parameters and their Writable
+#        Property) of each device in a file keyed by OUI-SerialNumber, and
+#        invalidates it when the device's SoftwareVersion changes
+#  - CachedWalk
+#      The cached structure of a single device, which answers the
+#        GetParameterNames (NextLevel=true) of its known objects
+#
+"""
+
+
+import os
+import re
+import json
+import logging
+import tempfile
+
+from cwmp_decoder import ParameterInfo
+
+
+
+class WalkCache(object):
+    """An on-disk cache of the data model structure of walked devices
+
+    Each device has a JSON file in the cache directory, which records the
+     SoftwareVersion the structure was discovered with and, for each object,
+     the items that a GetParameterNames (NextLevel=true) of it returns."""
+    logger = logging.getLogger("WalkCache")
+
+    def __init__(self, cache_dir):
+        """Initialize the Walk Cache, creating the cache directory if needed"""
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    def get_cache_dir(self):
+        """Retrieve the directory that the Walk Cache is kept in"""
+        return self.cache_dir
+
+
+    def load(self, device_id, software_version):
+        """Retrieve the CachedWalk of a device, or None if the device isn't
+            cached or was cached with a different SoftwareVersion"""
+        cache_file = self._get_cache_file(device_id)
+
+        try:
+            with open(cache_file, "r", encoding="utf-8") as cache_fh:
+                cache_entry = json.load(cache_fh)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            self.logger.warning("Ignoring the unreadable Walk Cache entry of %s (%s)", device_id, err)
+            return None
+
+        if cache_entry.get("SoftwareVersion") != software_version:
+            # The firmware has changed, so the structure may have too
+            self.logger.info("The SoftwareVersion of %s changed from %s to %s; invalidating its Walk Cache entry",
+                             device_id, cache_entry.get("SoftwareVersion"), software_version)
+            self.invalidate(device_id)
+            return None
+
+        self.logger.info("Found a Walk Cache entry for %s with %s objects", device_id, len(cache_entry["Objects"]))
+        return CachedWalk(cache_entry["Objects"])
+
+
+    def store(self, device_id, software_version, data_model):
+        """Store the structure of a device's implemented data model"""
+        object_items = {}
+
+        for data_model_obj in data_model:
+            object_items[data_model_obj.get_name()] = [
+                [dm_param.get_full_param_name(), _writable_text(dm_param.get_writable())]
+                for dm_param in data_model_obj.get_parameters()]
+
+        # List each object as an item of its parent object
+        for data_model_obj in data_model:
+            parent_name = data_model_obj.get_name().rsplit(".", 2)[0] + "."
+            if parent_name in object_items and parent_name != data_model_obj.get_name():
+                object_items[parent_name].append(
+                    [data_model_obj.get_name(), _writable_text(data_model_obj.get_writable())])
+
+        cache_entry = {"DeviceId": device_id,
+                       "SoftwareVersion": software_version,
+                       "Objects": object_items}
+
+        # Write the entry atomically, so that a reader never sees half of it
+        cache_fd, temp_file = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(cache_fd, "w", encoding="utf-8") as cache_fh:
+                json.dump(cache_entry, cache_fh)
+            os.replace(temp_file, self._get_cache_file(device_id))
+        except BaseException:
+            # Don't leave the temporary file behind, whatever went wrong
+            os.unlink(temp_file)
+            raise
+
+        self.logger.info("Stored the Walk Cache entry of %s with %s objects", device_id, len(object_items))
+
+
+    def invalidate(self, device_id):
+        """Remove the Walk Cache entry of a device"""
+        try:
+            os.unlink(self._get_cache_file(device_id))
+        except FileNotFoundError:
+            pass
+
+
+    def _get_cache_file(self, device_id):
+        """Retrieve the path of the cache file of a device"""
+        return os.path.join(self.cache_dir, re.sub(r"[^\w.-]", "_", device_id) + ".json")
+
+
+
+class CachedWalk(object):
+    """The cached data model structure of a single device
+
+    A table (an object with instances as sub-objects, or an empty object,
+     which could be a table without instances) isn't answered from the
+     cache, as its instances may have been added or deleted since; it has to
+     be discovered again with GetParameterNames (NextLevel=true)."""
+    def __init__(self, object_items):
+        """Initialize the Cached Walk from the items of each object"""
+        self.object_items = object_items
+
+
+    def get_object_count(self):
+        """Retrieve the number of cached objects"""
+        return len(self.object_items)
+
+
+    def is_table(self, name):
+        """Check to see if the cached object may be a table"""
+        item_list = self.object_items.get(name)
+
+        if item_list is None:
+            return False
+
+        for item_name, _ in item_list:
+            if item_name.endswith(".") and item_name.rsplit(".", 2)[-2].isdigit():
+                return True
+
+        return len(item_list) == 0
+
+
+    def get_next_level_items(self, name):
+        """Retrieve the ParameterInfo records that a GetParameterNames
+            (NextLevel=true) of the object returned, or None if the object
+            isn't cached or is a table"""
+        if name not in self.object_items or self.is_table(name):
+            return None
+
+        return [ParameterInfo(item_name, writable) for item_name, writable in self.object_items[name]]
+
+
+
+
+def _writable_text(writable):
+    """Convert a Writable Property into its CWMP text"""
+    return "1" if writable else "0"
@@ -0,0 +1,233 @@
+"""
+# File Name: walk_checkpoint.py
+#
+# Description: On-disk checkpoints of unfinished walks, so that the walk of a
+#               device whose CWMP Session was dropped resumes where it stopped
+#
+# Functionality:
+#  - WalkCheckpoints:
+#      Keeps the checkpoint of each device's walk in a file keyed by
+#        OUI-SerialNumber until the walk is complete, and opens it again
+#        (if the SoftwareVersion and the root object still match) when the
+#        device Informs again
+#  - WalkCheckpoint
+#      The checkpoint of a single device's walk: an append-only journal with
+#        a record per completed GetParameterNames and GetParameterValues,
+#        which answers those RPCs again when the walk is resumed
+#
+"""
+
+
+import os
+import re
+import json
+import logging
+
+from cwmp_decoder import ParameterInfo
+
+
+# The kinds of checkpoint records
+RECORD_GPN = "N"
+RECORD_GPV = "V"
+
+
+
+class WalkCheckpoints(object):
+    """An on-disk store of the checkpoints of unfinished walks
+
+    Each device has a JSON Lines file in the checkpoint directory: a header
+     with the SoftwareVersion and root object of the walk, followed by a
+     record per completed RPC.  The file is removed once the walk is
+     complete."""
+    logger = logging.getLogger("WalkCheckpoints")
+
+    def __init__(self, checkpoint_dir):
+        """Initialize the Walk Checkpoints, creating the checkpoint directory if needed"""
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+
+    def get_checkpoint_dir(self):
+        """Retrieve the directory that the Walk Checkpoints are kept in"""
+        return self.checkpoint_dir
+
+
+    def open(self, device_id, software_version, root_data_model):
+        """Open the WalkCheckpoint of a device's walk: the checkpoint of an
+            unfinished walk is resumed if it was taken with the same
+            SoftwareVersion and root object, otherwise a new one is started"""
+        checkpoint_file = self._get_checkpoint_file(device_id)
+        header = {"DeviceId": device_id, "SoftwareVersion": software_version, "Root": root_data_model}
+        gpn_records = {}
+        value_records = {}
+
+        try:
+            with open(checkpoint_file, "r", encoding="utf-8") as checkpoint_fh:
+                if _load_record(checkpoint_fh.readline()) != header:
+                    # The firmware (or the data model) has changed since
+                    self.logger.info("Discarding the Walk Checkpoint of %s, which was taken with another "
+                                     "SoftwareVersion", device_id)
+                else:
+                    _load_records(checkpoint_fh, gpn_records, value_records)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as err:
+            self.logger.warning("Discarding the unreadable Walk Checkpoint of %s (%s)", device_id, err)
+
+        try:
+            if len(gpn_records) == 0 and len(value_records) == 0:
+                checkpoint_fh = open(checkpoint_file, "w", encoding="utf-8")
+                checkpoint_fh.write(json.dumps(header, separators=(",", ":")) + "\n")
+                checkpoint_fh.flush()
+            else:
+                self.logger.info("Resuming the walk of %s from its Walk Checkpoint: %s GetParameterNames "
+                                 "and %s values", device_id, len(gpn_records), len(value_records))
+                checkpoint_fh = open(checkpoint_file, "a", encoding="utf-8")
+        except OSError as err:
+            self.logger.warning("Unable to write the Walk Checkpoint of %s (%s)", device_id, err)
+            checkpoint_fh = None
+
+        return WalkCheckpoint(device_id, checkpoint_fh, gpn_records, value_records)
+
+
+    def discard(self, device_id):
+        """Remove the Walk Checkpoint of a device, whose walk is complete"""
+        try:
+            os.unlink(self._get_checkpoint_file(device_id))
+        except FileNotFoundError:
+            pass
+
+
+    def _get_checkpoint_file(self, device_id):
+        """Retrieve the path of the checkpoint file of a device"""
+        return os.path.join(self.checkpoint_dir, re.sub(r"[^\w.-]", "_", device_id) + ".jsonl")
+
+
+
+class WalkCheckpoint(object):
+    """The checkpoint of a single device's walk
+
+    A GetParameterNames record holds the requested object, its NextLevel and
+     the returned items (their names relative to the object); a
+     GetParameterValues record holds the values of a batch of Parameters
+     requested by name.  Each record is written (and flushed) as soon as the
+     device has answered the RPC.  The records of the walk that is resumed
+     are taken once each, as the walk reaches the objects and Parameters
+     again.  A write error stops the checkpoint (with a warning) rather than
+     the walk."""
+    logger = logging.getLogger("WalkCheckpoint")
+
+    def __init__(self, device_id, checkpoint_fh, gpn_records=None, value_records=None):
+        """Initialize the Walk Checkpoint"""
+        self.device_id = device_id
+        self.checkpoint_fh = checkpoint_fh
+        self.gpn_records = gpn_records or {}
+        self.value_records = value_records or {}
+
+
+    def is_resumed(self):
+        """Check to see if records of the resumed walk are still to be taken"""
+        return len(self.gpn_records) > 0 or len(self.value_records) > 0
+
+
+
+    def take_gpn_items(self, object_name):
+        """Take the (NextLevel, ParameterInfo records) of the resumed walk's
+            GetParameterNames of an object, or None if it wasn't answered"""
+        gpn_record = self.gpn_records.pop(object_name, None)
+
+        if gpn_record is None:
+            return None
+
+        next_level, item_list = gpn_record
+        return next_level, [ParameterInfo(_get_full_name(object_name, relative_name), writable)
+                            for relative_name, writable in item_list]
+
+    def take_parameter_values(self, param_list):
+        """Set the values of the DataModelParameters that the resumed walk
+            retrieved, returning the Parameters whose values are still pending"""
+        if len(self.value_records) == 0:
+            return param_list
+
+        pending_list = []
+        for dm_param in param_list:
+            value_record = self.value_records.pop(dm_param.get_full_param_name(), None)
+
+            if value_record is None:
+                pending_list.append(dm_param)
+            else:
+                dm_param.set_value(value_record[0], value_record[1])
+
+        return pending_list
+
+
+    def record_gpn(self, object_name, next_level, dm_item_list):
+        """Record the items (DataModelObjects and DataModelParameters) that a
+            GetParameterNames of an object returned"""
+        self._write_record([RECORD_GPN, object_name, 1 if next_level else 0,
+                            [[_get_relative_name(object_name, dm_item.get_name() if dm_item.is_object() else
+                                                 dm_item.get_full_param_name()),
+                              "1" if dm_item.get_writable() else "0"]
+                             for dm_item in dm_item_list]])
+
+    def record_gpv(self, param_list):
+        """Record the values of a batch of DataModelParameters retrieved by name"""
+        value_list = [[dm_param.get_full_param_name(), dm_param.get_value_text(), dm_param.get_value_type()]
+                      for dm_param in param_list if dm_param.get_value() is not None]
+
+        if len(value_list) > 0:
+            self._write_record([RECORD_GPV, value_list])
+
+
+    def close(self):
+        """Close the checkpoint file (which is kept until the walk is complete)"""
+        if self.checkpoint_fh is not None:
+            self.checkpoint_fh.close()
+            self.checkpoint_fh = None
+
+
+    def _write_record(self, record):
+        """Append a record to the checkpoint file, and flush it"""
+        if self.checkpoint_fh is None:
+            return
+
+        try:
+            self.checkpoint_fh.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.checkpoint_fh.flush()
+        except OSError as err:
+            self.logger.warning("Stopping the Walk Checkpoint of %s (%s)", self.device_id, err)
+            self.close()
+
+
+
+
+def _load_record(line):
+    """Decode a line of a checkpoint file"""
+    return json.loads(line)
+
+
+def _load_records(checkpoint_fh, gpn_records, value_records):
+    """Load the records of a checkpoint file, up to a line that was only
+        partly written (when the walk was cut off while it was written)"""
+    for line in checkpoint_fh:
+        try:
+            record = _load_record(line)
+        except ValueError:
+            break
+
+        if record[0] == RECORD_GPN:
+            gpn_records[record[1]] = (record[2] == 1, record[3])
+        elif record[0] == RECORD_GPV:
+            for name, value_text, value_type in record[1]:
+                value_records[name] = (value_text, value_type)
+
+
+def _get_relative_name(object_name, name):
+    """Retrieve the name of an item relative to the object it was discovered
+        under (an item outside of the object keeps its full name, after a dot)"""
+    return name[len(object_name):] if name.startswith(object_name) else "." + name
+
+
+def _get_full_name(object_name, relative_name):
+    """Retrieve the full name of an item from its name relative to the object"""
+    return relative_name[1:] if relative_name.startswith(".") else object_name + relative_name
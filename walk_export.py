@@ -0,0 +1,321 @@
+"""
+# File Name: walk_export.py
+#
+# Description: Exporters that stream the walked data models to files while
+#               the walk is still running
+#
+# Functionality:
+#  - WalkExporter:
+#      The observer interface of an export: it is told when the walk of a
+#        device starts and ends, and is handed each DataModelObject as soon
+#        as the values of its Parameters have been retrieved; the output is
+#        buffered and flushed every flush_interval seconds
+#  - JSONLinesExporter:
+#      Writes a JSON record per object (with its Parameters), and one per
+#        device when its walk ends
+#  - CSVExporter:
+#      Writes a CSV row per Parameter (or per object without Parameters)
+#  - SQLiteExporter:
+#      Keeps the devices, objects and Parameters in an SQLite database,
+#        replacing the rows of a device when it is walked again
+#
+"""
+
+
+import os
+import csv
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+
+# The buffer size of the export files
+EXPORT_BUFFER_SIZE = 1024 * 1024
+
+# Seconds between the flushes of an export, so that its readers see the walk progress
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# The states of an exported device walk
+WALK_STARTED = "started"
+WALK_COMPLETED = "completed"
+WALK_ABANDONED = "abandoned"
+
+# The columns of a CSV export
+CSV_COLUMNS = ("DeviceId", "Object", "Parameter", "Value", "Type", "Writable")
+
+_SQLITE_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS devices (device_id TEXT PRIMARY KEY, state TEXT, updated REAL)",
+    "CREATE TABLE IF NOT EXISTS objects (device_id TEXT, name TEXT, writable INTEGER,"
+    " PRIMARY KEY (device_id, name))",
+    "CREATE TABLE IF NOT EXISTS parameters (device_id TEXT, name TEXT, value TEXT, type TEXT,"
+    " writable INTEGER, PRIMARY KEY (device_id, name))")
+
+
+
+class WalkExporter(object):
+    """The base class of the exporters, which the CWMPServer notifies as the walks progress
+
+    The hooks may be called from the worker threads of a concurrent walk, so
+     they are serialized by a lock.  A write error stops the export (with a
+     warning) rather than the walk."""
+    logger = logging.getLogger("WalkExporter")
+    write_errors = (OSError,)
+
+    def __init__(self, export_file, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """Initialize the Exporter"""
+        self.export_file = export_file
+        self.flush_interval = flush_interval
+        self.object_count = 0
+        self.failed = False
+        self.closed = False
+        self.last_flush_time = time.monotonic()
+        self.lock = threading.Lock()
+
+
+    def get_export_file(self):
+        """Retrieve the file that the walks are exported to"""
+        return self.export_file
+
+    def get_object_count(self):
+        """Retrieve the number of DataModelObjects exported so far"""
+        return self.object_count
+
+
+    def start_device(self, device_id):
+        """Record that the walk of a device has started"""
+        self._run_hook(self._write_start_device, (device_id,))
+
+    def export_object(self, device_id, data_model_obj):
+        """Export a DataModelObject whose Parameter values have been retrieved"""
+        self._run_hook(self._count_object, (device_id, data_model_obj))
+
+    def end_device(self, device_id, completed=True):
+        """Record that the walk of a device has ended, and flush the export"""
+        self._run_hook(self._write_end_device, (device_id, WALK_COMPLETED if completed else WALK_ABANDONED), True)
+
+    def close(self):
+        """Flush and close the export"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+
+            try:
+                if not self.failed:
+                    self._flush_output()
+            except self.write_errors as err:
+                self.logger.warning("Unable to flush the export to %s (%s)", self.export_file, err)
+            finally:
+                self._close_output()
+
+        self.logger.info("Exported %s objects to %s", self.object_count, self.export_file)
+
+
+    def _run_hook(self, write_function, args, force_flush=False):
+        """Run a write hook under the lock, flushing the output when it's due"""
+        with self.lock:
+            if self.failed or self.closed:
+                return
+
+            try:
+                write_function(*args)
+                if force_flush or time.monotonic() - self.last_flush_time >= self.flush_interval:
+                    self._flush_output()
+                    self.last_flush_time = time.monotonic()
+            except self.write_errors as err:
+                self.logger.warning("Stopping the export to %s (%s)", self.export_file, err)
+                self.failed = True
+
+
+    def _count_object(self, device_id, data_model_obj):
+        """Write a DataModelObject, counting it once it's written"""
+        self._write_object(device_id, data_model_obj)
+        self.object_count += 1
+
+
+    def _write_start_device(self, device_id):
+        """Write the start of a device's walk (nothing by default)"""
+        pass
+
+    def _write_object(self, device_id, data_model_obj):
+        """Write a DataModelObject and its Parameters"""
+        raise NotImplementedError
+
+    def _write_end_device(self, device_id, state):
+        """Write the end of a device's walk (nothing by default)"""
+        pass
+
+    def _flush_output(self):
+        """Flush the buffered output"""
+        raise NotImplementedError
+
+    def _close_output(self):
+        """Close the output"""
+        raise NotImplementedError
+
+
+
+class JSONLinesExporter(WalkExporter):
+    """Exports the walks as JSON Lines: a record per object, with its
+        Parameters, and a record per device when its walk ends"""
+    def __init__(self, export_file, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """Open the JSON Lines file"""
+        super(JSONLinesExporter, self).__init__(export_file, flush_interval)
+        self.export_fh = open(export_file, "w", encoding="utf-8", buffering=EXPORT_BUFFER_SIZE)
+
+
+    def _write_object(self, device_id, data_model_obj):
+        """Write the record of a DataModelObject"""
+        self.export_fh.write(json.dumps({
+            "DeviceId": device_id,
+            "Object": data_model_obj.get_name(),
+            "Writable": bool(data_model_obj.get_writable()),
+            "Parameters": [{"Name": dm_param.get_name(),
+                            "Value": dm_param.get_value(),
+                            "Type": dm_param.get_value_type(),
+                            "Writable": dm_param.get_writable()}
+                           for dm_param in data_model_obj.get_parameters()]},
+            separators=(",", ":")) + "\n")
+
+    def _write_end_device(self, device_id, state):
+        """Write the record of a device whose walk has ended"""
+        self.export_fh.write(json.dumps({"DeviceId": device_id, "Walk": state}, separators=(",", ":")) + "\n")
+
+    def _flush_output(self):
+        """Flush the JSON Lines file"""
+        self.export_fh.flush()
+
+    def _close_output(self):
+        """Close the JSON Lines file"""
+        self.export_fh.close()
+
+
+
+class CSVExporter(WalkExporter):
+    """Exports the walks as CSV, a row per Parameter (or per object without Parameters)"""
+    def __init__(self, export_file, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """Open the CSV file and write its header"""
+        super(CSVExporter, self).__init__(export_file, flush_interval)
+        self.export_fh = open(export_file, "w", encoding="utf-8", newline="", buffering=EXPORT_BUFFER_SIZE)
+        self.csv_writer = csv.writer(self.export_fh)
+        self.csv_writer.writerow(CSV_COLUMNS)
+
+
+    def _write_object(self, device_id, data_model_obj):
+        """Write the rows of a DataModelObject"""
+        object_name = data_model_obj.get_name()
+        row_list = [(device_id, object_name, dm_param.get_name(), dm_param.get_value_text(),
+                     dm_param.get_value_type(), _writable_text(dm_param.get_writable()))
+                    for dm_param in data_model_obj.get_parameters()]
+
+        if len(row_list) == 0:
+            row_list.append((device_id, object_name, None, None, None,
+                             _writable_text(data_model_obj.get_writable())))
+
+        self.csv_writer.writerows(row_list)
+
+    def _flush_output(self):
+        """Flush the CSV file"""
+        self.export_fh.flush()
+
+    def _close_output(self):
+        """Close the CSV file"""
+        self.export_fh.close()
+
+
+
+class SQLiteExporter(WalkExporter):
+    """Exports the walks into an SQLite database (in WAL mode, so that it
+        can be read while the walk is running)
+
+    The devices table records the state of each device's walk; the rows of
+     the objects and parameters tables are committed every flush_interval
+     seconds, and replaced when the device is walked again."""
+    write_errors = (sqlite3.Error,)
+
+    def __init__(self, export_file, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """Open the SQLite database, creating its tables if needed"""
+        super(SQLiteExporter, self).__init__(export_file, flush_interval)
+        self.connection = sqlite3.connect(export_file, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+        for statement in _SQLITE_SCHEMA:
+            self.connection.execute(statement)
+        self.connection.commit()
+
+
+    def _write_start_device(self, device_id):
+        """Remove the rows of the device's previous walk"""
+        self.connection.execute("DELETE FROM objects WHERE device_id = ?", (device_id,))
+        self.connection.execute("DELETE FROM parameters WHERE device_id = ?", (device_id,))
+        self._write_device_state(device_id, WALK_STARTED)
+
+    def _write_object(self, device_id, data_model_obj):
+        """Insert the rows of a DataModelObject and its Parameters"""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO objects VALUES (?, ?, ?)",
+            (device_id, data_model_obj.get_name(), _writable_flag(data_model_obj.get_writable())))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO parameters VALUES (?, ?, ?, ?, ?)",
+            [(device_id, dm_param.get_full_param_name(), dm_param.get_value_text(),
+              dm_param.get_value_type(), _writable_flag(dm_param.get_writable()))
+             for dm_param in data_model_obj.get_parameters()])
+
+    def _write_end_device(self, device_id, state):
+        """Record the end state of a device's walk"""
+        self._write_device_state(device_id, state)
+
+    def _write_device_state(self, device_id, state):
+        """Insert or update the row of a device"""
+        self.connection.execute("INSERT OR REPLACE INTO devices VALUES (?, ?, ?)", (device_id, state, time.time()))
+
+    def _flush_output(self):
+        """Commit the rows written since the last flush"""
+        self.connection.commit()
+
+    def _close_output(self):
+        """Close the SQLite database"""
+        self.connection.close()
+
+
+
+# The exporter of each export file extension
+EXPORTERS = {
+    ".jsonl": JSONLinesExporter,
+    ".csv": CSVExporter,
+    ".db": SQLiteExporter,
+    ".sqlite": SQLiteExporter,
+    ".sqlite3": SQLiteExporter,
+}
+
+
+
+
+def create_exporter(export_file, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """Create the WalkExporter that matches the extension of the export file"""
+    extension = os.path.splitext(export_file)[1].lower()
+
+    if extension not in EXPORTERS:
+        raise ValueError("Unknown export format: {} (expected one of {})".format(
+            export_file, ", ".join(sorted(EXPORTERS))))
+
+    return EXPORTERS[extension](export_file, flush_interval)
+
+
+def _writable_text(writable):
+    """Convert a Writable Property into its CWMP text"""
+    if writable is None:
+        return None
+
+    return "1" if writable else "0"
+
+
+def _writable_flag(writable):
+    """Convert a Writable Property into an SQLite integer"""
+    if writable is None:
+        return None
+
+    return 1 if writable else 0
@@ -0,0 +1,574 @@
+"""
+# File Name: walk_metrics.py
+#
+# Description: Live metrics of the CWMP Sessions of a walk
+#
+# Functionality:
+#  - WalkMetrics:
+#      The global counters, gauges and histograms of the CWMP Server and
+#        the metrics of each CWMP Session, rendered as Prometheus text or JSON
+#  - SessionMetrics:
+#      The counters, gauges and histograms of a single CWMP Session
+#  - RPCMetrics:
+#      The count, faults, round trip latency and request/response sizes of
+#        one kind of RPC (Inform, GetParameterNames, GetParameterValues)
+#  - Histogram:
+#      A histogram with fixed bucket bounds (in the Prometheus style, where
+#        each bucket counts the observations up to its bound)
+#  - combine_metrics(), render_json_text() and render_prometheus_text()
+#     combine the metrics of several CWMP Servers (e.g. worker processes)
+#     and render them
+#
+"""
+
+
+import json
+import time
+import bisect
+import logging
+import threading
+import collections
+
+
+# The RPCs that the metrics are kept for
+RPC_INFORM = "Inform"
+RPC_GPN = "GetParameterNames"
+RPC_GPV = "GetParameterValues"
+RPC_NAMES = (RPC_INFORM, RPC_GPN, RPC_GPV)
+
+# The bucket bounds of the histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+GPV_PARAMETER_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+# The window, in seconds, of the global Parameters walked per second
+RATE_WINDOW = 60.0
+
+# The number of completed CWMP Sessions whose metrics are kept
+MAX_RECENT_SESSIONS = 100
+
+# The Content-Type of the Prometheus text format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# The states of a CWMP Session
+SESSION_ACTIVE = "active"
+SESSION_COMPLETED = "completed"
+SESSION_ABANDONED = "abandoned"
+
+
+
+class WalkMetrics(object):
+    """The live metrics of a CWMP Server's walks
+
+    The global metrics cover every CWMP Session since the CWMP Server
+     started; each session also has its own SessionMetrics, which are kept
+     while it is active and for the last MAX_RECENT_SESSIONS completed
+     sessions.  Every update and rendering holds the metrics lock, so the
+     metrics can be read by an HTTP GET while the walks update them."""
+    logger = logging.getLogger("WalkMetrics")
+
+    def __init__(self):
+        """Initialize the Walk Metrics"""
+        self.start_time = time.monotonic()
+        self.sessions_started = 0
+        self.sessions_completed = 0
+        self.sessions_abandoned = 0
+        self.parameter_count = 0
+        self.rpc_metrics = {rpc_name: RPCMetrics() for rpc_name in RPC_NAMES}
+        self.gpv_parameters = Histogram(GPV_PARAMETER_BUCKETS)
+        self.active_sessions = {}
+        self.recent_sessions = collections.deque(maxlen=MAX_RECENT_SESSIONS)
+        self.rate_samples = collections.deque()
+        self.rate_sample_total = 0
+        self.lock = threading.Lock()
+
+
+    def start_session(self, session_metrics):
+        """Start keeping the metrics of a new CWMP Session"""
+        with self.lock:
+            self.sessions_started += 1
+            self.active_sessions[session_metrics.get_session_key()] = session_metrics
+
+    def end_session(self, session_metrics, completed=True):
+        """Stop updating the metrics of a completed (or abandoned) CWMP Session"""
+        with self.lock:
+            if self.active_sessions.pop(session_metrics.get_session_key(), None) is None:
+                return
+
+            if completed:
+                self.sessions_completed += 1
+            else:
+                self.sessions_abandoned += 1
+
+            session_metrics.end(SESSION_COMPLETED if completed else SESSION_ABANDONED)
+            self.recent_sessions.append(session_metrics)
+
+
+    def record_rpc_sent(self, session_metrics, rpc_name, byte_count):
+        """Record an RPC (or InformResponse) of byte_count bytes sent to a device"""
+        with self.lock:
+            for rpc_metrics in (self.rpc_metrics[rpc_name], session_metrics.get_rpc_metrics(rpc_name)):
+                rpc_metrics.record_sent(byte_count)
+
+    def record_rpc_response(self, session_metrics, rpc_name, latency, byte_count, fault=False):
+        """Record the response (or Fault) of byte_count bytes to an RPC, which
+            took latency seconds (for an Inform: the time to handle it)"""
+        with self.lock:
+            for rpc_metrics in (self.rpc_metrics[rpc_name], session_metrics.get_rpc_metrics(rpc_name)):
+                rpc_metrics.record_response(latency, byte_count, fault)
+
+    def record_gpv_parameters(self, session_metrics, parameter_count):
+        """Record the number of Parameter values in a GetParameterValues Response"""
+        with self.lock:
+            now = time.monotonic()
+            self.parameter_count += parameter_count
+            self.gpv_parameters.observe(parameter_count)
+            self.rate_samples.append((now, parameter_count))
+            self.rate_sample_total += parameter_count
+            self._expire_rate_samples(now)
+            session_metrics.record_gpv_parameters(parameter_count)
+
+    def record_pending(self, session_metrics, pending_objects, pending_parameters):
+        """Record the number of objects and Parameters waiting for a GPN or GPV"""
+        with self.lock:
+            session_metrics.set_pending(pending_objects, pending_parameters)
+
+
+    def to_dict(self):
+        """Retrieve the global and per-session metrics as a dict"""
+        with self.lock:
+            now = time.monotonic()
+            self._expire_rate_samples(now)
+            active_sessions = list(self.active_sessions.values())
+
+            return {
+                "uptime_seconds": now - self.start_time,
+                "active_sessions": len(active_sessions),
+                "sessions_started": self.sessions_started,
+                "sessions_completed": self.sessions_completed,
+                "sessions_abandoned": self.sessions_abandoned,
+                "parameters_walked": self.parameter_count,
+                "parameters_per_second": self._get_parameter_rate(now),
+                "pending_objects": sum(metrics.get_pending_objects() for metrics in active_sessions),
+                "pending_parameters": sum(metrics.get_pending_parameters() for metrics in active_sessions),
+                "rpcs": {rpc_name: rpc_metrics.to_dict() for rpc_name, rpc_metrics in self.rpc_metrics.items()},
+                "gpv_parameters": self.gpv_parameters.to_dict(),
+                "sessions": [metrics.to_dict(now) for metrics in active_sessions],
+                "recent_sessions": [metrics.to_dict(now) for metrics in self.recent_sessions]}
+
+    def render_json(self):
+        """Render the global and per-session metrics as JSON"""
+        return render_json_text(self.to_dict())
+
+    def render_prometheus(self):
+        """Render the global metrics, and those of the active CWMP Sessions
+            (labelled by device), in the Prometheus text format"""
+        return render_prometheus_text(self.to_dict())
+
+
+    def _expire_rate_samples(self, now):
+        """Drop the Parameter rate samples that are older than the rate window"""
+        while len(self.rate_samples) > 0 and self.rate_samples[0][0] < now - RATE_WINDOW:
+            self.rate_sample_total -= self.rate_samples.popleft()[1]
+
+    def _get_parameter_rate(self, now):
+        """Retrieve the Parameter values retrieved per second over the rate window"""
+        return self.rate_sample_total / max(min(RATE_WINDOW, now - self.start_time), 1.0)
+
+
+
+class SessionMetrics(object):
+    """The metrics of a single CWMP Session, which the WalkMetrics update
+        while holding the metrics lock"""
+    def __init__(self, session_key, client_address=None):
+        """Initialize the Session Metrics"""
+        self.session_key = session_key
+        self.client_address = client_address
+        self.device_id = None
+        self.state = SESSION_ACTIVE
+        self.start_time = time.monotonic()
+        self.end_time = None
+        self.parameter_count = 0
+        self.pending_objects = 0
+        self.pending_parameters = 0
+        self.rpc_metrics = {rpc_name: RPCMetrics() for rpc_name in RPC_NAMES}
+        self.gpv_parameters = Histogram(GPV_PARAMETER_BUCKETS)
+
+
+    def get_session_key(self):
+        """Retrieve the session key of the CWMP Session"""
+        return self.session_key
+
+
+    def get_device_id(self):
+        """Retrieve the Device ID (OUI-SerialNumber) of the CWMP Session"""
+        return self.device_id
+
+    def set_device_id(self, value):
+        """Set the Device ID (OUI-SerialNumber) of the CWMP Session"""
+        self.device_id = value
+
+
+    def get_rpc_metrics(self, rpc_name):
+        """Retrieve the RPCMetrics of one kind of RPC"""
+        return self.rpc_metrics[rpc_name]
+
+
+    def get_elapsed_time(self, now):
+        """Retrieve the seconds that the CWMP Session ran (up to now, while it is active)"""
+        return (self.end_time if self.end_time is not None else now) - self.start_time
+
+    def end(self, state):
+        """Record the end (completion or abandonment) of the CWMP Session"""
+        self.state = state
+        self.end_time = time.monotonic()
+        self.pending_objects = 0
+        self.pending_parameters = 0
+
+
+    def get_parameter_count(self):
+        """Retrieve the number of Parameter values retrieved"""
+        return self.parameter_count
+
+    def get_parameter_rate(self, now):
+        """Retrieve the Parameter values retrieved per second of the CWMP Session"""
+        return self.parameter_count / max(self.get_elapsed_time(now), 0.001)
+
+    def record_gpv_parameters(self, parameter_count):
+        """Record the number of Parameter values in a GetParameterValues Response"""
+        self.parameter_count += parameter_count
+        self.gpv_parameters.observe(parameter_count)
+
+
+    def get_pending_objects(self):
+        """Retrieve the number of objects waiting for a GetParameterNames"""
+        return self.pending_objects
+
+    def get_pending_parameters(self):
+        """Retrieve the number of Parameters waiting for a GetParameterValues"""
+        return self.pending_parameters
+
+    def set_pending(self, pending_objects, pending_parameters):
+        """Set the number of objects and Parameters waiting for a GPN or GPV"""
+        self.pending_objects = pending_objects
+        self.pending_parameters = pending_parameters
+
+
+    def to_dict(self, now):
+        """Retrieve the metrics of the CWMP Session as a dict"""
+        return {
+            "device_id": self.device_id,
+            "client_address": self.client_address,
+            "state": self.state,
+            "elapsed_seconds": self.get_elapsed_time(now),
+            "parameters_walked": self.parameter_count,
+            "parameters_per_second": self.get_parameter_rate(now),
+            "pending_objects": self.pending_objects,
+            "pending_parameters": self.pending_parameters,
+            "rpcs": {rpc_name: rpc_metrics.to_dict() for rpc_name, rpc_metrics in self.rpc_metrics.items()},
+            "gpv_parameters": self.gpv_parameters.to_dict()}
+
+
+
+class RPCMetrics(object):
+    """The metrics of one kind of RPC"""
+    def __init__(self):
+        """Initialize the RPC Metrics"""
+        self.sent_count = 0
+        self.fault_count = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.request_bytes = Histogram(SIZE_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+
+
+    def get_sent_count(self):
+        """Retrieve the number of RPCs sent"""
+        return self.sent_count
+
+    def get_fault_count(self):
+        """Retrieve the number of CWMP Faults received"""
+        return self.fault_count
+
+    def get_latency(self):
+        """Retrieve the Histogram of the round trip times, in seconds"""
+        return self.latency
+
+    def get_request_bytes(self):
+        """Retrieve the Histogram of the HTTP Request (device to server) sizes"""
+        return self.request_bytes
+
+    def get_response_bytes(self):
+        """Retrieve the Histogram of the HTTP Response (server to device) sizes"""
+        return self.response_bytes
+
+
+    def record_sent(self, byte_count):
+        """Record an RPC of byte_count bytes sent to the device"""
+        self.sent_count += 1
+        self.response_bytes.observe(byte_count)
+
+    def record_response(self, latency, byte_count, fault=False):
+        """Record a response (or Fault) of byte_count bytes after latency seconds"""
+        if fault:
+            self.fault_count += 1
+
+        self.latency.observe(latency)
+        self.request_bytes.observe(byte_count)
+
+
+    def to_dict(self):
+        """Retrieve the RPC Metrics as a dict"""
+        return {
+            "sent": self.sent_count,
+            "faults": self.fault_count,
+            "latency_seconds": self.latency.to_dict(),
+            "request_bytes": self.request_bytes.to_dict(),
+            "response_bytes": self.response_bytes.to_dict()}
+
+
+
+class Histogram(object):
+    """A histogram with fixed bucket bounds, which counts each observation
+        in the first bucket whose bound is at least the observed value"""
+    __slots__ = ("bounds", "bucket_counts", "count", "total")
+
+    def __init__(self, bounds):
+        """Initialize the Histogram with its (ascending) bucket bounds"""
+        self.bounds = bounds
+        self.bucket_counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+
+
+    def observe(self, value):
+        """Add an observed value to the Histogram"""
+        self.bucket_counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+
+    def get_count(self):
+        """Retrieve the number of observed values"""
+        return self.count
+
+    def get_sum(self):
+        """Retrieve the sum of the observed values"""
+        return self.total
+
+    def get_cumulative_buckets(self):
+        """Retrieve the (bound, count of values up to the bound) of each
+            bucket, ending with the +Inf bucket"""
+        cumulative_buckets = []
+        cumulative_count = 0
+
+        for bound, bucket_count in zip(self.bounds + (float("inf"),), self.bucket_counts):
+            cumulative_count += bucket_count
+            cumulative_buckets.append((bound, cumulative_count))
+
+        return cumulative_buckets
+
+
+    def to_dict(self):
+        """Retrieve the Histogram as a dict, with cumulative bucket counts"""
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": {_format_value(bound): bucket_count
+                        for bound, bucket_count in self.get_cumulative_buckets()}}
+
+
+
+
+def combine_metrics(metrics_dict_list):
+    """Combine the metrics dicts (see WalkMetrics.to_dict) of several CWMP
+        Servers, such as the worker processes of a walk, into one"""
+    combined = {"uptime_seconds": max([metrics["uptime_seconds"] for metrics in metrics_dict_list] or [0.0])}
+
+    for key in ("active_sessions", "sessions_started", "sessions_completed", "sessions_abandoned",
+                "parameters_walked", "parameters_per_second", "pending_objects", "pending_parameters"):
+        combined[key] = sum(metrics[key] for metrics in metrics_dict_list)
+
+    combined["rpcs"] = {rpc_name: {
+        "sent": sum(metrics["rpcs"][rpc_name]["sent"] for metrics in metrics_dict_list),
+        "faults": sum(metrics["rpcs"][rpc_name]["faults"] for metrics in metrics_dict_list),
+        "latency_seconds": _combine_histograms(
+            [metrics["rpcs"][rpc_name]["latency_seconds"] for metrics in metrics_dict_list], LATENCY_BUCKETS),
+        "request_bytes": _combine_histograms(
+            [metrics["rpcs"][rpc_name]["request_bytes"] for metrics in metrics_dict_list], SIZE_BUCKETS),
+        "response_bytes": _combine_histograms(
+            [metrics["rpcs"][rpc_name]["response_bytes"] for metrics in metrics_dict_list], SIZE_BUCKETS)}
+        for rpc_name in RPC_NAMES}
+    combined["gpv_parameters"] = _combine_histograms(
+        [metrics["gpv_parameters"] for metrics in metrics_dict_list], GPV_PARAMETER_BUCKETS)
+    combined["sessions"] = [session for metrics in metrics_dict_list for session in metrics["sessions"]]
+    combined["recent_sessions"] = [session for metrics in metrics_dict_list
+                                   for session in metrics["recent_sessions"]][-MAX_RECENT_SESSIONS:]
+
+    return combined
+
+
+def render_json_text(metrics_dict):
+    """Render a metrics dict (see WalkMetrics.to_dict) as JSON"""
+    return json.dumps(metrics_dict, indent=2)
+
+
+def render_prometheus_text(metrics_dict):
+    """Render a metrics dict (see WalkMetrics.to_dict): the global metrics,
+        and those of the active CWMP Sessions (combined by device), in the
+        Prometheus text format"""
+    rpcs = metrics_dict["rpcs"]
+    active_sessions = _combine_device_sessions(metrics_dict["sessions"])
+    lines = []
+
+    _add_metric(lines, "cwmpwalk_uptime_seconds", "gauge",
+                "Seconds since the CWMP Server started", [("", {}, metrics_dict["uptime_seconds"])])
+    _add_metric(lines, "cwmpwalk_active_sessions", "gauge",
+                "CWMP Sessions in progress", [("", {}, metrics_dict["active_sessions"])])
+    _add_metric(lines, "cwmpwalk_sessions_started_total", "counter",
+                "CWMP Sessions started", [("", {}, metrics_dict["sessions_started"])])
+    _add_metric(lines, "cwmpwalk_sessions_completed_total", "counter",
+                "CWMP Sessions completed", [("", {}, metrics_dict["sessions_completed"])])
+    _add_metric(lines, "cwmpwalk_sessions_abandoned_total", "counter",
+                "CWMP Sessions abandoned by their device", [("", {}, metrics_dict["sessions_abandoned"])])
+    _add_metric(lines, "cwmpwalk_parameters_walked_total", "counter",
+                "Parameter values retrieved", [("", {}, metrics_dict["parameters_walked"])])
+    _add_metric(lines, "cwmpwalk_parameters_per_second", "gauge",
+                "Parameter values retrieved per second over the last minute",
+                [("", {}, metrics_dict["parameters_per_second"])])
+    _add_metric(lines, "cwmpwalk_pending_objects", "gauge",
+                "Objects waiting for a GetParameterNames in the active CWMP Sessions",
+                [("", {}, metrics_dict["pending_objects"])])
+    _add_metric(lines, "cwmpwalk_pending_parameters", "gauge",
+                "Parameters waiting for a GetParameterValues in the active CWMP Sessions",
+                [("", {}, metrics_dict["pending_parameters"])])
+
+    _add_metric(lines, "cwmpwalk_rpcs_total", "counter", "RPCs sent, by RPC",
+                [("", {"rpc": rpc_name}, rpc_metrics["sent"]) for rpc_name, rpc_metrics in rpcs.items()])
+    _add_metric(lines, "cwmpwalk_faults_total", "counter", "CWMP Faults received, by RPC",
+                [("", {"rpc": rpc_name}, rpc_metrics["faults"]) for rpc_name, rpc_metrics in rpcs.items()])
+    _add_metric(lines, "cwmpwalk_rpc_latency_seconds", "histogram",
+                "RPC round trip time (for an Inform: the time to handle it), by RPC",
+                _histogram_samples("rpc", {rpc_name: rpc_metrics["latency_seconds"]
+                                           for rpc_name, rpc_metrics in rpcs.items()}))
+    _add_metric(lines, "cwmpwalk_http_request_bytes", "histogram",
+                "Size of the HTTP Request content sent by the devices, by RPC",
+                _histogram_samples("rpc", {rpc_name: rpc_metrics["request_bytes"]
+                                           for rpc_name, rpc_metrics in rpcs.items()}))
+    _add_metric(lines, "cwmpwalk_http_response_bytes", "histogram",
+                "Size of the HTTP Response content sent to the devices, by RPC",
+                _histogram_samples("rpc", {rpc_name: rpc_metrics["response_bytes"]
+                                           for rpc_name, rpc_metrics in rpcs.items()}))
+    _add_metric(lines, "cwmpwalk_gpv_parameters", "histogram",
+                "Parameter values per GetParameterValues Response",
+                _histogram_samples(None, {None: metrics_dict["gpv_parameters"]}))
+
+    _add_metric(lines, "cwmpwalk_session_elapsed_seconds", "gauge",
+                "Seconds since the CWMP Session started, by device",
+                [("", {"device": session["device_id"]}, session["elapsed_seconds"]) for session in active_sessions])
+    _add_metric(lines, "cwmpwalk_session_parameters_walked", "gauge",
+                "Parameter values retrieved in the CWMP Session, by device",
+                [("", {"device": session["device_id"]}, session["parameters_walked"]) for session in active_sessions])
+    _add_metric(lines, "cwmpwalk_session_parameters_per_second", "gauge",
+                "Parameter values retrieved per second of the CWMP Session, by device",
+                [("", {"device": session["device_id"]}, session["parameters_per_second"])
+                 for session in active_sessions])
+    _add_metric(lines, "cwmpwalk_session_pending_objects", "gauge",
+                "Objects waiting for a GetParameterNames, by device",
+                [("", {"device": session["device_id"]}, session["pending_objects"]) for session in active_sessions])
+    _add_metric(lines, "cwmpwalk_session_pending_parameters", "gauge",
+                "Parameters waiting for a GetParameterValues, by device",
+                [("", {"device": session["device_id"]}, session["pending_parameters"])
+                 for session in active_sessions])
+    _add_metric(lines, "cwmpwalk_session_rpc_latency_seconds", "summary",
+                "RPC round trip time of the CWMP Session, by device and RPC",
+                [(suffix, {"device": session["device_id"], "rpc": rpc_name}, value)
+                 for session in active_sessions
+                 for rpc_name in RPC_NAMES
+                 for suffix, value in (
+                     ("_sum", session["rpcs"][rpc_name]["latency_seconds"]["sum"]),
+                     ("_count", session["rpcs"][rpc_name]["latency_seconds"]["count"]))])
+
+    return "\n".join(lines) + "\n"
+
+
+def _combine_device_sessions(session_dict_list):
+    """Combine the session dicts (see SessionMetrics.to_dict) of the same
+        device, so that each device has one series per metric, skipping the
+        sessions whose device isn't known yet (before their Inform)"""
+    device_sessions = collections.OrderedDict()
+
+    for session in session_dict_list:
+        if session["device_id"] is not None:
+            device_sessions.setdefault(session["device_id"], []).append(session)
+
+    return [{
+        "device_id": device_id,
+        "elapsed_seconds": max(session["elapsed_seconds"] for session in session_list),
+        "parameters_walked": sum(session["parameters_walked"] for session in session_list),
+        "parameters_per_second": sum(session["parameters_per_second"] for session in session_list),
+        "pending_objects": sum(session["pending_objects"] for session in session_list),
+        "pending_parameters": sum(session["pending_parameters"] for session in session_list),
+        "rpcs": {rpc_name: {"latency_seconds": {
+            "sum": sum(session["rpcs"][rpc_name]["latency_seconds"]["sum"] for session in session_list),
+            "count": sum(session["rpcs"][rpc_name]["latency_seconds"]["count"] for session in session_list)}}
+            for rpc_name in RPC_NAMES}}
+        for device_id, session_list in device_sessions.items()]
+
+
+def _combine_histograms(histogram_dict_list, bounds):
+    """Combine the dicts (see Histogram.to_dict) of histograms with the same bounds"""
+    bucket_keys = [_format_value(bound) for bound in bounds + (float("inf"),)]
+
+    return {
+        "count": sum(histogram["count"] for histogram in histogram_dict_list),
+        "sum": sum(histogram["sum"] for histogram in histogram_dict_list),
+        "buckets": {bucket_key: sum(histogram["buckets"][bucket_key] for histogram in histogram_dict_list)
+                    for bucket_key in bucket_keys}}
+
+
+def _add_metric(lines, name, metric_type, help_text, samples):
+    """Add a metric, with its HELP and TYPE lines, to the Prometheus text
+        lines; each sample is a (name suffix, labels, value)"""
+    lines.append("# HELP {} {}".format(name, help_text))
+    lines.append("# TYPE {} {}".format(name, metric_type))
+
+    for suffix, labels, value in samples:
+        if len(labels) == 0:
+            lines.append("{}{} {}".format(name, suffix, _format_value(value)))
+        else:
+            label_text = ",".join('{}="{}"'.format(label_name, _escape_label_value(label_value))
+                                  for label_name, label_value in labels.items())
+            lines.append("{}{}{{{}}} {}".format(name, suffix, label_text, _format_value(value)))
+
+
+def _histogram_samples(label_name, histograms):
+    """Build the bucket, sum and count samples of histogram dicts (see
+        Histogram.to_dict) that are keyed by a label value (or of a single
+        histogram, keyed by None)"""
+    samples = []
+
+    for label_value, histogram in histograms.items():
+        labels = {} if label_name is None else {label_name: label_value}
+
+        for bucket_key, bucket_count in histogram["buckets"].items():
+            samples.append(("_bucket", dict(labels, le=bucket_key), bucket_count))
+
+        samples.append(("_sum", labels, histogram["sum"]))
+        samples.append(("_count", labels, histogram["count"]))
+
+    return samples
+
+
+def _format_value(value):
+    """Format a sample value or bucket bound the way Prometheus writes it"""
+    if value == float("inf"):
+        return "+Inf"
+    elif isinstance(value, float):
+        return repr(value)
+
+    return str(value)
+
+
+def _escape_label_value(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
@@ -0,0 +1,329 @@
+"""
+# File Name: walk_poll.py
+#
+# Description: Value-only polling of devices that were walked before, and the
+#               time series of the polled Parameter values
+#
+# Functionality:
+#  - ParameterSeries:
+#      A ring buffer of the (timestamp, value) samples of one Parameter,
+#        kept in arrays of the value's type
+#  - PollHistory:
+#      The ParameterSeries of each device's polled Parameters, and the
+#        queries over their recent history
+#  - WalkPoller:
+#      Remembers the Parameters of each walked device, chooses the
+#        Parameters that a later CWMP Session only retrieves the values of
+#        (a chosen set, or those detected as changing), and records the
+#        polled values into the PollHistory
+#
+"""
+
+
+import time
+import array
+import logging
+import threading
+
+
+# The samples kept per polled Parameter by default
+DEFAULT_HISTORY_SIZE = 1024
+
+# Every this many polls of a device (starting with the first one) the values
+#  of all of its Parameters are retrieved, to detect the ones that change
+DEFAULT_POLL_REFRESH_INTERVAL = 10
+
+# The array typecodes of the sample values (others are kept in a list)
+_VALUE_TYPECODES = {bool: "b", int: "q", float: "d"}
+
+
+
+class ParameterSeries(object):
+    """A ring buffer of the (timestamp, value) samples of one Parameter
+
+    The timestamps (seconds since the epoch) are kept in an array of
+     doubles; the values in an array of their type (bool, int or float) as
+     long as they all fit, otherwise (as strings are) in a list.  Once the
+     buffer is full, each sample replaces the oldest one."""
+    def __init__(self, capacity=DEFAULT_HISTORY_SIZE):
+        """Initialize the Parameter Series, empty"""
+        if capacity < 1:
+            raise ValueError("A Parameter Series holds at least one sample")
+
+        self.capacity = capacity
+        self.timestamps = array.array("d", bytes(8 * capacity))
+        self.value_type = None
+        self.values = None
+        self.sample_count = 0
+
+
+    def __len__(self):
+        """Retrieve the number of samples held"""
+        return min(self.sample_count, self.capacity)
+
+
+    def get_capacity(self):
+        """Retrieve the most samples held"""
+        return self.capacity
+
+    def get_sample_count(self):
+        """Retrieve the number of samples appended, including those dropped since"""
+        return self.sample_count
+
+
+    def append(self, timestamp, value):
+        """Append a sample, replacing the oldest one once the buffer is full"""
+        index = self.sample_count % self.capacity
+
+        if self.values is None:
+            self.value_type = type(value)
+            typecode = _VALUE_TYPECODES.get(self.value_type)
+            self.values = [None] * self.capacity if typecode is None else array.array(
+                typecode, bytes(array.array(typecode).itemsize * self.capacity))
+
+        if isinstance(self.values, array.array):
+            try:
+                if type(value) is not self.value_type:
+                    raise TypeError("The value type changed")
+                self.values[index] = value
+            except (TypeError, OverflowError):
+                # The value doesn't fit the array, so keep the values in a list from now on
+                self.values = [self.value_type(item) for item in self.values]
+                self.values[index] = value
+        else:
+            self.values[index] = value
+
+        self.timestamps[index] = timestamp
+        self.sample_count += 1
+
+    def get_latest(self):
+        """Retrieve the (timestamp, value) of the latest sample, or None"""
+        if self.sample_count == 0:
+            return None
+
+        return self._get_sample((self.sample_count - 1) % self.capacity)
+
+    def get_samples(self, since=None, limit=None):
+        """Retrieve the (timestamp, value) samples, oldest first: those taken
+            after the since timestamp, and at most the latest limit of them"""
+        sample_list = []
+
+        for offset in range(len(self)):
+            index = (self.sample_count - 1 - offset) % self.capacity
+            if (since is not None and self.timestamps[index] <= since) or \
+                    (limit is not None and len(sample_list) >= limit):
+                break
+            sample_list.append(self._get_sample(index))
+
+        sample_list.reverse()
+        return sample_list
+
+
+    def _get_sample(self, index):
+        """Retrieve the (timestamp, value) sample at an index of the buffer"""
+        value = self.values[index]
+        if self.value_type is bool and isinstance(self.values, array.array):
+            value = bool(value)
+
+        return self.timestamps[index], value
+
+
+
+class PollHistory(object):
+    """The time series of the polled Parameters of each device, a
+        ParameterSeries of up to history_size samples per Parameter
+
+    The series are recorded and queried from the worker threads of a
+     concurrent walk, so they are guarded by a lock."""
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE):
+        """Initialize the Poll History, empty"""
+        self.history_size = history_size
+        self.device_series = {}
+        self.lock = threading.Lock()
+
+
+    def get_history_size(self):
+        """Retrieve the most samples kept per Parameter"""
+        return self.history_size
+
+
+    def record(self, device_id, timestamp, value_list):
+        """Record a sample of each (full Parameter name, value) of a device"""
+        with self.lock:
+            series_dict = self.device_series.setdefault(device_id, {})
+
+            for name, value in value_list:
+                series = series_dict.get(name)
+                if series is None:
+                    series = series_dict[name] = ParameterSeries(self.history_size)
+                series.append(timestamp, value)
+
+
+    def get_device_ids(self):
+        """Retrieve the Device IDs that have a history"""
+        with self.lock:
+            return list(self.device_series)
+
+    def get_parameter_names(self, device_id):
+        """Retrieve the full names of a device's Parameters that have a history"""
+        with self.lock:
+            return sorted(self.device_series.get(device_id, {}))
+
+
+    def get_latest(self, device_id, param_name):
+        """Retrieve the (timestamp, value) of a Parameter's latest sample, or None"""
+        with self.lock:
+            series = self.device_series.get(device_id, {}).get(param_name)
+            return None if series is None else series.get_latest()
+
+    def get_samples(self, device_id, param_name, since=None, limit=None):
+        """Retrieve the (timestamp, value) samples of a Parameter, oldest
+            first (see ParameterSeries.get_samples)"""
+        with self.lock:
+            series = self.device_series.get(device_id, {}).get(param_name)
+            return [] if series is None else series.get_samples(since, limit)
+
+    def get_recent(self, device_id, seconds, prefix=""):
+        """Retrieve the samples of the last seconds of each of a device's
+            Parameters (below a path prefix), keyed by full name"""
+        since = time.time() - seconds
+        recent_dict = {}
+
+        with self.lock:
+            for name, series in self.device_series.get(device_id, {}).items():
+                if name.startswith(prefix):
+                    sample_list = series.get_samples(since)
+                    if len(sample_list) > 0:
+                        recent_dict[name] = sample_list
+
+        return recent_dict
+
+    def forget(self, device_id):
+        """Drop the history of a device"""
+        with self.lock:
+            self.device_series.pop(device_id, None)
+
+
+
+class WalkPoller(object):
+    """Turns the CWMP Sessions of devices that were walked before into polls
+        of their Parameter values, without a GetParameterNames
+
+    A complete walk of a device teaches the poller the device's Parameters
+     (and its SoftwareVersion).  The device's later sessions only request
+     the values of a chosen set of Parameters (those that the poll filter,
+     a PathFilter, allows) or, without one, of the Parameters that were
+     seen to change: each poll also sweeps a slice of the other Parameters
+     (a refresh_interval-th of them, in turn, so that all of them are swept
+     every refresh_interval polls), and those whose values differ from the
+     previous ones are polled from then on.  The polled values are recorded
+     into the PollHistory.  A new SoftwareVersion, a polled Parameter that no
+     longer has a value, or nothing to poll makes the device walked in full
+     again."""
+    logger = logging.getLogger("WalkPoller")
+
+    def __init__(self, poll_filter=None, history_size=DEFAULT_HISTORY_SIZE,
+                 refresh_interval=DEFAULT_POLL_REFRESH_INTERVAL):
+        """Initialize the Walk Poller"""
+        self.poll_filter = poll_filter
+        self.refresh_interval = max(1, refresh_interval)
+        self.history = PollHistory(history_size)
+        self.devices = {}
+        self.lock = threading.Lock()
+
+
+    def get_history(self):
+        """Retrieve the PollHistory of the polled values"""
+        return self.history
+
+    def is_known(self, device_id):
+        """Check to see if the poller knows the Parameters of a device"""
+        with self.lock:
+            return device_id in self.devices
+
+
+    def learn(self, device_id, software_version, data_model):
+        """Learn the Parameters of a device from the implemented data model
+            of its complete walk, recording the values of the chosen set"""
+        last_values = {}
+        polled_names = set()
+
+        for data_model_obj in data_model:
+            for dm_param in data_model_obj.get_parameters():
+                name = dm_param.get_full_param_name()
+                last_values[name] = dm_param.get_typed_value()
+
+                if self.poll_filter is not None and self.poll_filter.allows_parameter(name):
+                    polled_names.add(name)
+
+        with self.lock:
+            self.devices[device_id] = {"SoftwareVersion": software_version, "LastValues": last_values,
+                                       "SweptNames": sorted(last_values), "PolledNames": polled_names,
+                                       "PollCount": 0}
+
+        self.history.forget(device_id)
+        self.history.record(device_id, time.time(), [(name, last_values[name]) for name in polled_names
+                                                     if last_values[name] is not None])
+        self.logger.info("Polling %s from now on: %s Parameters known, %s polled", device_id,
+                         len(last_values), len(polled_names) if self.poll_filter is not None else "changing")
+
+    def plan(self, device_id, software_version):
+        """Choose the full names of the Parameters to poll in a device's new
+            CWMP Session, or None if the device is to be walked in full"""
+        with self.lock:
+            device = self.devices.get(device_id)
+
+            if device is None:
+                return None
+            elif device["SoftwareVersion"] != software_version:
+                self.logger.info("The SoftwareVersion of %s changed; walking it in full", device_id)
+                del self.devices[device_id]
+                return None
+
+            if self.poll_filter is not None:
+                poll_names = device["PolledNames"]
+            else:
+                # Sweep the next slice of the values too, to detect those that change
+                swept_names = device["SweptNames"]
+                slice_size = -(-len(swept_names) // self.refresh_interval)
+                slice_start = (device["PollCount"] % self.refresh_interval) * slice_size
+                poll_names = device["PolledNames"].union(swept_names[slice_start:slice_start + slice_size])
+
+            if len(poll_names) == 0:
+                self.logger.info("Nothing of %s is polled; walking it in full", device_id)
+                del self.devices[device_id]
+                return None
+
+            device["PollCount"] += 1
+            return sorted(poll_names)
+
+    def record_poll(self, device_id, data_model):
+        """Record the values that a poll of a device retrieved"""
+        timestamp = time.time()
+        value_list = []
+
+        with self.lock:
+            device = self.devices.get(device_id)
+            if device is None:
+                return
+
+            for data_model_obj in data_model:
+                for dm_param in data_model_obj.get_parameters():
+                    name = dm_param.get_full_param_name()
+                    value = dm_param.get_typed_value()
+
+                    if value is None:
+                        # The Parameter is gone (or faulted), so the structure may have changed
+                        self.logger.info("No value was polled for [%s] of %s; walking it in full next time",
+                                         name, device_id)
+                        del self.devices[device_id]
+                        return
+
+                    if self.poll_filter is None and device["LastValues"].get(name) != value:
+                        device["PolledNames"].add(name)
+                    device["LastValues"][name] = value
+
+                    if name in device["PolledNames"]:
+                        value_list.append((name, value))
+
+        self.history.record(device_id, timestamp, value_list)